@@ -0,0 +1,71 @@
+"""keyset pagination indexes
+
+Revision ID: 20261016_keyset_indexes
+Revises: 20261016_search_indexes
+Create Date: 2026-10-16
+
+Índices compostos para a paginação por cursor (app/core/pagination.py):
+cada listagem ordena por (coluna, id) e o índice permite continuar a partir
+do cursor sem OFFSET. lower(nome)/lower(name) servem o UNION ALL ordenado de
+GET /clients/with-leads. leads.created_at aceita NULL, por isso os índices
+das leads são sobre coalesce(created_at, 1970-01-01), a expressão ordenada
+por LEADS_KEYSET. Criados em public e em todos os schemas tenant_*.
+"""
+
+from alembic import op
+from sqlalchemy import inspect, text
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_keyset_indexes"
+down_revision = "20261016_search_indexes"
+branch_labels = None
+depends_on = None
+
+
+# Índices de versões anteriores desta migração (created_at sem coalesce)
+OBSOLETE_INDEXES = ["ix_leads_created_id", "ix_leads_agent_created_id"]
+
+# (tabela, nome do índice, expressão)
+INDEXES = [
+    ("leads", "ix_leads_created_nn_id", "coalesce(created_at, '1970-01-01 00:00:00.000000'), id"),
+    ("leads", "ix_leads_agent_created_nn_id", "assigned_agent_id, coalesce(created_at, '1970-01-01 00:00:00.000000'), id"),
+    ("leads", "ix_leads_name_lower", "lower(name), id"),
+    ("clients", "ix_clients_agent_nome_id", "agent_id, nome, id"),
+    ("clients", "ix_clients_nome_lower", "lower(nome), id"),
+    ("visits", "ix_visits_agent_scheduled_id", "agent_id, scheduled_date, id"),
+    ("portal_sync_jobs", "ix_portal_sync_jobs_created_id", "created_at, id"),
+]
+
+
+def _schemas(bind):
+    if bind.dialect.name != "postgresql":
+        return [None]
+    rows = bind.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name = 'public' OR schema_name LIKE 'tenant\\_%'"
+    ))
+    return [row[0] for row in rows]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        tables = set(inspector.get_table_names(schema=schema))
+        prefix = f'"{schema}".' if schema else ""
+        for name in OBSOLETE_INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {prefix}{name}")
+        for table, name, columns in INDEXES:
+            if table not in tables:
+                continue
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {prefix}\"{table}\" ({columns})")
+        print(f"[MIGRATION] Keyset indexes OK em {schema or 'default'}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    for schema in _schemas(bind):
+        prefix = f'"{schema}".' if schema else ""
+        for _table, name, _columns in INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {prefix}{name}")
@@ -0,0 +1,109 @@
+"""match plus: client matches and lookup indexes
+
+Revision ID: 20261016_match_plus_clients
+Revises: 20261016_portal_feed_index
+Create Date: 2026-10-16
+
+Adiciona client_id a lead_property_matches (matches de clientes compradores,
+calculados pelo motor em app/match_plus/engine.py) e a coluna computed que
+distingue as linhas do motor das criadas via CRUD, torna lead_id opcional,
+passa as FKs lead_id/property_id a ON DELETE CASCADE (apagar uma lead ou um
+imóvel com matches deixa de falhar) e cria índices para leitura do top-K por
+lead/cliente/imóvel, em public e em todos os schemas tenant_*.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect, text
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_match_plus_clients"
+down_revision = "20261016_portal_feed_index"
+branch_labels = None
+depends_on = None
+
+
+TABLE = "lead_property_matches"
+
+# (nome do índice, colunas)
+INDEXES = [
+    ("ix_lead_property_matches_lead_score", ["lead_id", "score"]),
+    ("ix_lead_property_matches_client_score", ["client_id", "score"]),
+    ("ix_lead_property_matches_property", ["property_id"]),
+]
+
+# FKs recriadas com ON DELETE CASCADE: coluna -> tabela referenciada
+CASCADE_FKS = {"lead_id": "leads", "property_id": "properties"}
+
+
+def _schemas(bind):
+    if bind.dialect.name != "postgresql":
+        return [None]
+    rows = bind.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name = 'public' OR schema_name LIKE 'tenant\\_%'"
+    ))
+    return [row[0] for row in rows]
+
+
+def _set_fk_ondelete(inspector, schema, ondelete):
+    """Recria as FKs lead_id/property_id existentes (as tabelas tenant copiadas com LIKE não as têm)."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for fk in inspector.get_foreign_keys(TABLE, schema=schema):
+        columns = fk["constrained_columns"]
+        if len(columns) != 1 or CASCADE_FKS.get(columns[0]) != fk["referred_table"]:
+            continue
+        op.drop_constraint(fk["name"], TABLE, type_="foreignkey", schema=schema)
+        op.create_foreign_key(
+            fk["name"], TABLE, fk["referred_table"], columns, fk["referred_columns"],
+            source_schema=schema, referent_schema=fk.get("referred_schema") or schema,
+            ondelete=ondelete,
+        )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        tables = set(inspector.get_table_names(schema=schema))
+        if TABLE not in tables:
+            print(f"[MIGRATION] Skipping {schema or 'default'} - {TABLE} table does not exist")
+            continue
+
+        columns = {col["name"] for col in inspector.get_columns(TABLE, schema=schema)}
+        if "client_id" not in columns:
+            client_fk = []
+            if "clients" in tables:
+                target = f"{schema}.clients.id" if schema else "clients.id"
+                client_fk = [sa.ForeignKey(target, ondelete="CASCADE")]
+            op.add_column(TABLE, sa.Column("client_id", sa.Integer(), *client_fk, nullable=True), schema=schema)
+        if "computed" not in columns:
+            op.add_column(
+                TABLE,
+                sa.Column("computed", sa.Boolean(), nullable=False, server_default=sa.false()),
+                schema=schema,
+            )
+        op.alter_column(TABLE, "lead_id", existing_type=sa.Integer(), nullable=True, schema=schema)
+        _set_fk_ondelete(inspector, schema, "CASCADE")
+
+        for name, index_columns in INDEXES:
+            op.create_index(name, TABLE, index_columns, schema=schema, if_not_exists=True)
+        print(f"[MIGRATION] Match plus clients OK em {schema or 'default'}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        if TABLE not in inspector.get_table_names(schema=schema):
+            continue
+        for name, _columns in INDEXES:
+            op.drop_index(name, table_name=TABLE, schema=schema, if_exists=True)
+        _set_fk_ondelete(inspector, schema, None)
+        columns = {col["name"] for col in inspector.get_columns(TABLE, schema=schema)}
+        if "computed" in columns:
+            op.drop_column(TABLE, "computed", schema=schema)
+        if "client_id" in columns:
+            op.drop_column(TABLE, "client_id", schema=schema)
@@ -0,0 +1,74 @@
+"""mobile dashboard: per-agent change counters and aggregate indexes
+
+Revision ID: 20261016_mobile_dashboard
+Revises: 20261016_mobile_sync
+Create Date: 2026-10-16
+
+ETag do dashboard mobile (app/mobile/dashboard.py): tabela
+agent_change_counters e índices por agente para as contagens por intervalo
+de due_date e para a atividade recente, em public e em todos os schemas
+tenant_*.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect, text
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_mobile_dashboard"
+down_revision = "20261016_mobile_sync"
+branch_labels = None
+depends_on = None
+
+
+# (tabela, nome do índice, colunas)
+INDEXES = [
+    ("tasks", "ix_tasks_agent_due", "assigned_agent_id, due_date"),
+    ("tasks", "ix_tasks_agent_created_id", "assigned_agent_id, created_at, id"),
+    ("properties", "ix_properties_agent_created_id", "agent_id, created_at, id"),
+]
+
+
+def _schemas(bind):
+    if bind.dialect.name != "postgresql":
+        return [None]
+    rows = bind.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name = 'public' OR schema_name LIKE 'tenant\\_%'"
+    ))
+    return [row[0] for row in rows]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        tables = set(inspector.get_table_names(schema=schema))
+        prefix = f'"{schema}".' if schema else ""
+
+        if "agent_change_counters" not in tables:
+            op.create_table(
+                "agent_change_counters",
+                sa.Column("agent_id", sa.Integer(), autoincrement=False, nullable=False),
+                sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+                sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+                sa.PrimaryKeyConstraint("agent_id"),
+                schema=schema,
+            )
+
+        for table, name, columns in INDEXES:
+            if table in tables:
+                op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {prefix}\"{table}\" ({columns})")
+        print(f"[MIGRATION] Mobile dashboard OK em {schema or 'default'}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        prefix = f'"{schema}".' if schema else ""
+        for _table, name, _columns in INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {prefix}{name}")
+        if "agent_change_counters" in set(inspector.get_table_names(schema=schema)):
+            op.drop_table("agent_change_counters", schema=schema)
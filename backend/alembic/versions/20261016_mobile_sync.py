@@ -0,0 +1,90 @@
+"""mobile delta sync: tombstones and updated_at indexes
+
+Revision ID: 20261016_mobile_sync
+Revises: 20261016_reminder_indexes
+Create Date: 2026-10-16
+
+Suporte a POST /mobile/sync (app/mobile/sync.py): tabela sync_tombstones,
+índices (agente, updated_at, id) nas entidades sincronizadas e preenchimento
+de updated_at nulo (linhas antigas de properties não o tinham), em public e
+em todos os schemas tenant_*.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect, text
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_mobile_sync"
+down_revision = "20261016_reminder_indexes"
+branch_labels = None
+depends_on = None
+
+
+# (tabela, nome do índice, colunas)
+INDEXES = [
+    ("properties", "ix_properties_updated_id", "updated_at, id"),
+    ("properties", "ix_properties_agent_updated_id", "agent_id, updated_at, id"),
+    ("leads", "ix_leads_agent_updated_id", "assigned_agent_id, updated_at, id"),
+    ("tasks", "ix_tasks_agent_updated_id", "assigned_agent_id, updated_at, id"),
+    ("visits", "ix_visits_agent_updated_id", "agent_id, updated_at, id"),
+    ("events", "ix_events_agent_updated_id", "agent_id, updated_at, id"),
+]
+
+
+def _schemas(bind):
+    if bind.dialect.name != "postgresql":
+        return [None]
+    rows = bind.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name = 'public' OR schema_name LIKE 'tenant\\_%'"
+    ))
+    return [row[0] for row in rows]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        tables = set(inspector.get_table_names(schema=schema))
+        prefix = f'"{schema}".' if schema else ""
+
+        if "sync_tombstones" not in tables:
+            op.create_table(
+                "sync_tombstones",
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("entity", sa.String(length=30), nullable=False),
+                sa.Column("entity_id", sa.Integer(), nullable=False),
+                sa.Column("agent_id", sa.Integer(), nullable=True),
+                sa.Column("reason", sa.String(length=20), nullable=False, server_default="deleted"),
+                sa.Column("deleted_at", sa.DateTime(), nullable=False),
+                sa.PrimaryKeyConstraint("id"),
+                schema=schema,
+            )
+            op.create_index(
+                "ix_sync_tombstones_entity_deleted_id", "sync_tombstones",
+                ["entity", "deleted_at", "id"], unique=False, schema=schema,
+            )
+
+        for table, name, columns in INDEXES:
+            if table not in tables:
+                continue
+            op.execute(
+                f"UPDATE {prefix}\"{table}\" SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+                f"WHERE updated_at IS NULL"
+            )
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {prefix}\"{table}\" ({columns})")
+        print(f"[MIGRATION] Mobile sync OK em {schema or 'default'}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        prefix = f'"{schema}".' if schema else ""
+        for _table, name, _columns in INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {prefix}{name}")
+        if "sync_tombstones" in set(inspector.get_table_names(schema=schema)):
+            op.drop_index("ix_sync_tombstones_entity_deleted_id", table_name="sync_tombstones", schema=schema)
+            op.drop_table("sync_tombstones", schema=schema)
@@ -0,0 +1,32 @@
+"""add portal feed index
+
+Revision ID: 20261016_portal_feed_index
+Revises: 20260218_portal_exports
+Create Date: 2026-10-16
+
+Índice (provider, status, updated_at) em portal_listings para o feed XML
+incremental (ETag agregado + varrimento dos listings publicados).
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_portal_feed_index"
+down_revision = "20260218_portal_exports"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_portal_listings_feed",
+        "portal_listings",
+        ["provider", "status", "updated_at"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_portal_listings_feed", table_name="portal_listings", if_exists=True)
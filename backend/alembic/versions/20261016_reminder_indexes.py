@@ -0,0 +1,63 @@
+"""reminder scheduler partial indexes
+
+Revision ID: 20261016_reminder_indexes
+Revises: 20261016_keyset_indexes
+Create Date: 2026-10-16
+
+Índices parciais para o scheduler de lembretes (app/core/scheduler.py):
+só visitas/tarefas com reminder_sent = false, ordenadas pela data, para a
+carga do horizonte ler apenas os lembretes por enviar. Criados em public
+e em todos os schemas tenant_*.
+"""
+
+from alembic import op
+from sqlalchemy import inspect, text
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_reminder_indexes"
+down_revision = "20261016_keyset_indexes"
+branch_labels = None
+depends_on = None
+
+
+# (tabela, nome do índice, coluna)
+INDEXES = [
+    ("visits", "ix_visits_reminder_due", "scheduled_date"),
+    ("tasks", "ix_tasks_reminder_due", "due_date"),
+]
+
+
+def _schemas(bind):
+    if bind.dialect.name != "postgresql":
+        return [None]
+    rows = bind.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name = 'public' OR schema_name LIKE 'tenant\\_%'"
+    ))
+    return [row[0] for row in rows]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    false = "false" if bind.dialect.name == "postgresql" else "0"
+    for schema in _schemas(bind):
+        tables = set(inspector.get_table_names(schema=schema))
+        prefix = f'"{schema}".' if schema else ""
+        for table, name, column in INDEXES:
+            if table not in tables:
+                continue
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {prefix}\"{table}\" ({column}) "
+                f"WHERE reminder_sent = {false}"
+            )
+        print(f"[MIGRATION] Reminder indexes OK em {schema or 'default'}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    for schema in _schemas(bind):
+        prefix = f'"{schema}".' if schema else ""
+        for _table, name, _column in INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {prefix}{name}")
@@ -0,0 +1,100 @@
+"""report rollups: daily fact tables and dirty-day queue
+
+Revision ID: 20261016_report_rollups
+Revises: 20261016_mobile_dashboard
+Create Date: 2026-10-16
+
+Séries temporais dos relatórios (app/reports/rollups.py): tabelas
+daily_rollups e rollup_dirty_days e índices nas colunas de data das
+métricas (recálculo de um dia por intervalo), em public e em todos os
+schemas tenant_*. O backfill é feito pelo catch-up do worker no arranque.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect, text
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_report_rollups"
+down_revision = "20261016_mobile_dashboard"
+branch_labels = None
+depends_on = None
+
+
+# (tabela, nome do índice, colunas) - colunas de data das métricas sem índice próprio
+INDEXES = [
+    ("properties", "ix_properties_created_at", "created_at"),
+    ("proposals", "ix_proposals_created_at", "created_at"),
+]
+
+
+def _schemas(bind):
+    if bind.dialect.name != "postgresql":
+        return [None]
+    rows = bind.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name = 'public' OR schema_name LIKE 'tenant\\_%'"
+    ))
+    return [row[0] for row in rows]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        tables = set(inspector.get_table_names(schema=schema))
+        prefix = f'"{schema}".' if schema else ""
+
+        if "daily_rollups" not in tables:
+            op.create_table(
+                "daily_rollups",
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("metric", sa.String(length=30), nullable=False),
+                sa.Column("day", sa.Date(), nullable=False),
+                sa.Column("dim1", sa.String(length=255), nullable=False, server_default=""),
+                sa.Column("dim2", sa.String(length=255), nullable=False, server_default=""),
+                sa.Column("dim3", sa.String(length=255), nullable=False, server_default=""),
+                sa.Column("count", sa.Integer(), nullable=False, server_default="0"),
+                sa.Column("amount", sa.Numeric(16, 2), nullable=True),
+                sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+                sa.PrimaryKeyConstraint("id"),
+                schema=schema,
+            )
+            op.create_index(
+                "ux_daily_rollups_metric_day_dims", "daily_rollups",
+                ["metric", "day", "dim1", "dim2", "dim3"], unique=True, schema=schema,
+            )
+
+        if "rollup_dirty_days" not in tables:
+            op.create_table(
+                "rollup_dirty_days",
+                sa.Column("id", sa.Integer(), nullable=False),
+                sa.Column("metric", sa.String(length=30), nullable=False),
+                sa.Column("day", sa.Date(), nullable=False),
+                sa.Column("marked_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+                sa.PrimaryKeyConstraint("id"),
+                schema=schema,
+            )
+            op.create_index(
+                "ix_rollup_dirty_days_day_metric", "rollup_dirty_days", ["day", "metric"], schema=schema,
+            )
+
+        for table, name, columns in INDEXES:
+            if table in tables:
+                op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {prefix}\"{table}\" ({columns})")
+        print(f"[MIGRATION] Report rollups OK em {schema or 'default'}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        prefix = f'"{schema}".' if schema else ""
+        tables = set(inspector.get_table_names(schema=schema))
+        for _table, name, _columns in INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {prefix}{name}")
+        if "rollup_dirty_days" in tables:
+            op.drop_table("rollup_dirty_days", schema=schema)
+        if "daily_rollups" in tables:
+            op.drop_table("daily_rollups", schema=schema)
@@ -0,0 +1,95 @@
+"""search: unaccent/pg_trgm full-text and trigram indexes
+
+Revision ID: 20261016_search_indexes
+Revises: 20261016_match_plus_clients
+Create Date: 2026-10-16
+
+Extensões unaccent + pg_trgm, função IMMUTABLE public.f_unaccent (unaccent
+não pode ser usada diretamente em índices) e índices GIN para a pesquisa de
+app/search/services.py em public e em todos os schemas tenant_*. As
+expressões têm de ser iguais às usadas nas queries.
+"""
+
+from alembic import op
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_search_indexes"
+down_revision = "20261016_match_plus_clients"
+branch_labels = None
+depends_on = None
+
+
+def _tsv(*columns):
+    document = " || ' ' || ".join(f"coalesce({c}, '')" for c in columns)
+    return f"to_tsvector('portuguese'::regconfig, public.f_unaccent({document}))"
+
+
+def _trgm(column):
+    return f"public.f_unaccent(lower(coalesce({column}, ''))) public.gin_trgm_ops"
+
+
+def _digits(column):
+    return f"regexp_replace(coalesce({column}, ''), '[^0-9]', '', 'g') public.gin_trgm_ops"
+
+
+# (tabela, nome do índice, expressão)
+INDEXES = [
+    ("properties", "ix_properties_search_tsv", _tsv("title", "reference", "location", "municipality", "parish")),
+    ("properties", "ix_properties_reference_trgm", "lower(coalesce(reference, '')) public.gin_trgm_ops"),
+    ("properties", "ix_properties_title_trgm", _trgm("title")),
+    ("clients", "ix_clients_nome_trgm", _trgm("nome")),
+    ("clients", "ix_clients_email_trgm", _trgm("email")),
+    ("clients", "ix_clients_nif_trgm", _digits("nif")),
+    ("clients", "ix_clients_telefone_trgm", _digits("telefone")),
+    ("leads", "ix_leads_name_trgm", _trgm("name")),
+    ("leads", "ix_leads_email_trgm", _trgm("email")),
+    ("leads", "ix_leads_phone_trgm", _digits("phone")),
+]
+
+
+def _schemas(bind):
+    rows = bind.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name = 'public' OR schema_name LIKE 'tenant\\_%'"
+    ))
+    return [row[0] for row in rows]
+
+
+def _has_table(bind, schema, table):
+    return bind.execute(text(
+        "SELECT 1 FROM information_schema.tables WHERE table_schema = :s AND table_name = :t"
+    ), {"s": schema, "t": table}).first() is not None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        print("[MIGRATION] Skipping - search indexes are PostgreSQL only")
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA public")
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION public.f_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """)
+
+    for schema in _schemas(bind):
+        for table, name, expression in INDEXES:
+            if not _has_table(bind, schema, table):
+                continue
+            op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON "{schema}"."{table}" USING gin ({expression})')
+        print(f"[MIGRATION] Search indexes OK em {schema}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    for schema in _schemas(bind):
+        for _table, name, _expression in INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS "{schema}".{name}')
+    op.execute("DROP FUNCTION IF EXISTS public.f_unaccent(text)")
@@ -0,0 +1,43 @@
+"""platform stats: tenant_stats_snapshots
+
+Revision ID: 20261017_platform_stats
+Revises: 20261016_report_rollups
+Create Date: 2026-10-17
+
+Snapshot das contagens por tenant (app/platform/stats.py), lido pelo
+dashboard de super-admin e por /platform/tenants/{id}/stats. Tabela de
+plataforma: só em public.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = "20261017_platform_stats"
+down_revision = "20261016_report_rollups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if "tenant_stats_snapshots" in inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "tenant_stats_snapshots",
+        sa.Column("schema_name", sa.String(length=100), nullable=False),
+        sa.Column("agents_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("properties_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("leads_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("users_count", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("estimated", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("collected_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("schema_name"),
+    )
+    print("[MIGRATION] tenant_stats_snapshots criada")
+
+
+def downgrade() -> None:
+    if "tenant_stats_snapshots" in inspect(op.get_bind()).get_table_names():
+        op.drop_table("tenant_stats_snapshots")
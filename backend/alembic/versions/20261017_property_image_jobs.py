@@ -0,0 +1,68 @@
+"""property image jobs: shared upload job status
+
+Revision ID: 20261017_property_image_jobs
+Revises: 20261017_platform_stats
+Create Date: 2026-10-17
+
+Estado dos jobs de upload de imagens (app/properties/image_jobs.py) na BD,
+para GET /properties/upload-jobs/{job_id} responder em qualquer worker ou
+réplica. Criada em public e em todos os schemas tenant_*.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect, text
+
+
+# revision identifiers, used by Alembic.
+revision = "20261017_property_image_jobs"
+down_revision = "20261017_platform_stats"
+branch_labels = None
+depends_on = None
+
+
+def _schemas(bind):
+    if bind.dialect.name != "postgresql":
+        return [None]
+    rows = bind.execute(text(
+        "SELECT schema_name FROM information_schema.schemata "
+        "WHERE schema_name = 'public' OR schema_name LIKE 'tenant\\_%'"
+    ))
+    return [row[0] for row in rows]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        tables = set(inspector.get_table_names(schema=schema))
+        if "property_image_jobs" in tables or "properties" not in tables:
+            continue
+        properties = f"{schema}.properties.id" if schema else "properties.id"
+        op.create_table(
+            "property_image_jobs",
+            sa.Column("id", sa.String(length=32), nullable=False),
+            sa.Column("property_id", sa.Integer(), sa.ForeignKey(properties, ondelete="CASCADE"), nullable=False),
+            sa.Column("agent_id", sa.Integer(), nullable=True),
+            sa.Column("status", sa.String(length=20), nullable=False),
+            sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("processed", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("results", sa.JSON(), nullable=True),
+            sa.Column("errors", sa.JSON(), nullable=True),
+            sa.Column("total_images", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+            schema=schema,
+        )
+        op.create_index("ix_property_image_jobs_property_id", "property_image_jobs", ["property_id"], schema=schema)
+        op.create_index("ix_property_image_jobs_finished_at", "property_image_jobs", ["finished_at"], schema=schema)
+        print(f"[MIGRATION] Property image jobs OK em {schema or 'default'}")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    for schema in _schemas(bind):
+        if "property_image_jobs" in inspector.get_table_names(schema=schema):
+            op.drop_table("property_image_jobs", schema=schema)
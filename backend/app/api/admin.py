@@ -12,7 +12,8 @@ from app.properties.agent_assignment import (
     AGENT_PREFIX_MAP,
     ORPHAN_PREFIXES
 )
-from app.security import require_staff
+from app.security import require_staff, invalidate_tenant_principals
+from app.core.cache import touch_on_commit
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -679,6 +680,10 @@ def update_watermark_settings(
     db.commit()
     db.refresh(settings)
     
+    # Opacidade/escala/posição mudaram: descartar logo e tiles em cache
+    from app.properties.routes import invalidate_watermark_cache
+    invalidate_watermark_cache()
+    
     return WatermarkSettingsOut(
         watermark_enabled=bool(settings.watermark_enabled),
         watermark_image_url=settings.watermark_image_url,
@@ -822,6 +827,9 @@ def delete_watermark_image(
     settings.watermark_enabled = 0
     db.commit()
     
+    from app.properties.routes import invalidate_watermark_cache
+    invalidate_watermark_cache()
+    
     return {"success": True, "message": "Marca de água removida"}
 
 
@@ -1025,6 +1033,8 @@ def update_branding_settings(
                 "slogan": update.agency_slogan or defaults["agency_slogan"],
                 "primary": update.primary_color or defaults["primary_color"]
             })
+            # SQL raw não dispara eventos do ORM: invalidar a cache de branding no commit
+            touch_on_commit(db, "crm_settings")
             db.commit()
         
         # Construir UPDATE dinâmico apenas com campos fornecidos
@@ -1079,6 +1089,7 @@ def update_branding_settings(
             update_sql = f"UPDATE crm_settings SET {', '.join(updates)}"
             print(f"[BRANDING PUT] Executing: {update_sql}")
             db.execute(text(update_sql), params)
+            touch_on_commit(db, "crm_settings")
             db.commit()
         
         # Obter valores atualizados via SQL direto
@@ -1238,6 +1249,7 @@ def set_user_role(
         {"role": role, "id": user_id}
     )
     db.commit()
+    invalidate_tenant_principals()
     
     if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Utilizador não encontrado")
@@ -1275,6 +1287,7 @@ def bulk_set_admin(
             results.append({"email": email, "status": "not_found"})
     
     db.commit()
+    invalidate_tenant_principals()
     return {"results": results}
 
 
@@ -215,7 +215,7 @@ def check_tasks_table(db: Session = Depends(get_db)):
     """Verifica se tabela tasks existe e quantos registros tem."""
     try:
         from sqlalchemy import inspect
-        inspector = inspect(db.bind)
+        inspector = inspect(db.get_bind())
         tables = inspector.get_table_names()
         
         exists = 'tasks' in tables
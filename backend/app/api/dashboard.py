@@ -1,19 +1,147 @@
+import os
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case
+from sqlalchemy import and_, func, case, inspect, select, true
 from datetime import datetime, timedelta
 from typing import List, Optional
 from app.database import get_db
+from app.core.cache import TenantCache, track_model_changes
 from app.properties.models import Property
 from app.leads.models import Lead
+from app.leads import assignment
 from app.agents.models import Agent
 from app.models.escritura import Escritura
 from app.api.v1.auth import get_current_user_email
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 
+# KPIs/distribuições/ranking são iguais para todos os utilizadores do tenant:
+# cache curta por tenant, invalidada em commits de leads/imóveis/agentes/escrituras
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "10"))
+dashboard_cache = TenantCache(
+    "dashboard",
+    ttl=DASHBOARD_CACHE_TTL,
+    topics=("leads", "properties", "agents", "escrituras"),
+)
+track_model_changes(Lead, "leads")
+track_model_changes(Property, "properties")
+track_model_changes(Agent, "agents")
+track_model_changes(Escritura, "escrituras")
+
 # ==================== KPIs ====================
 
+class _PartialKpis(Exception):
+    """KPIs calculados com zeros de fallback (erro de BD): devolver sem guardar em cache."""
+
+    def __init__(self, kpis: dict):
+        super().__init__("KPIs parciais")
+        self.kpis = kpis
+
+
+def _compute_dashboard_kpis(db: Session) -> dict:
+    """
+    KPIs do dashboard em duas queries agregadas (propriedades/leads/agentes
+    numa só, escrituras noutra porque a tabela pode ainda não existir).
+    Tenant sem tabela escrituras: escrituras a 0 (resultado completo, vai
+    para a cache). Se alguma query falhar, levanta _PartialKpis com o
+    resultado parcial (um erro transitório não fica em cache durante o TTL).
+    """
+    partial = False
+    now = datetime.now()
+    seven_days_ago = now - timedelta(days=7)
+    fourteen_days_ago = now - timedelta(days=14)
+
+    props_agg = select(
+        func.count(Property.id).label("propriedades_ativas"),
+        func.coalesce(func.sum(case((Property.created_at <= seven_days_ago, 1), else_=0)), 0).label("propriedades_ativas_7d_ago"),
+    ).where(func.upper(Property.status) == 'AVAILABLE').subquery()
+
+    leads_agg = select(
+        func.coalesce(func.sum(case((Lead.created_at >= seven_days_ago, 1), else_=0)), 0).label("novas_leads_7d"),
+        func.coalesce(func.sum(case((Lead.created_at < seven_days_ago, 1), else_=0)), 0).label("leads_7_14d"),
+    ).where(Lead.created_at.isnot(None), Lead.created_at >= fourteen_days_ago).subquery()
+
+    agents_agg = select(func.count(Agent.id).label("agentes_ativos")).subquery()
+
+    try:
+        row = db.execute(
+            select(props_agg, leads_agg, agents_agg)
+            .select_from(props_agg)
+            .join(leads_agg, true())
+            .join(agents_agg, true())
+        ).one()
+        propriedades_ativas = row.propriedades_ativas
+        propriedades_ativas_7d_ago = row.propriedades_ativas_7d_ago
+        novas_leads_7d = row.novas_leads_7d
+        seven_to_fourteen_days_ago = row.leads_7_14d
+        agentes_ativos = row.agentes_ativos
+    except Exception:
+        db.rollback()
+        partial = True
+        propriedades_ativas = propriedades_ativas_7d_ago = novas_leads_7d = 0
+        seven_to_fourteen_days_ago = agentes_ativos = 0
+
+    # Calcular trend de propriedades
+    if propriedades_ativas_7d_ago > 0:
+        prop_trend = ((propriedades_ativas - propriedades_ativas_7d_ago) / propriedades_ativas_7d_ago) * 100
+    else:
+        prop_trend = 0
+
+    # Calcular trend de leads
+    if seven_to_fourteen_days_ago > 0:
+        leads_trend = ((novas_leads_7d - seven_to_fourteen_days_ago) / seven_to_fourteen_days_ago) * 100
+    else:
+        leads_trend = novas_leads_7d * 100 if novas_leads_7d > 0 else 0
+
+    # Propostas em aberto (mock - adicionar tabela de propostas futuramente)
+    propostas_abertas = 12  # TODO: implementar quando tabela Proposta existir
+    propostas_trend = 5.0  # Mock
+
+    # === ESCRITURAS === (agendadas/confirmadas futuras e quantas têm documentação pronta)
+    # Tenant ainda sem a tabela: 0 escrituras (resultado completo, não é um erro)
+    escrituras_agendadas = escrituras_docs_ok = escrituras_docs_pendentes = 0
+    try:
+        if inspect(db.connection()).has_table(Escritura.__tablename__):
+            esc = db.execute(
+                select(
+                    func.count(Escritura.id).label("agendadas"),
+                    func.coalesce(func.sum(case((Escritura.documentacao_pronta == True, 1), else_=0)), 0).label("docs_ok"),
+                ).where(
+                    Escritura.data_escritura >= now,
+                    Escritura.status.in_(['agendada', 'confirmada']),
+                )
+            ).one()
+            escrituras_agendadas = esc.agendadas
+            escrituras_docs_ok = esc.docs_ok
+            escrituras_docs_pendentes = escrituras_agendadas - escrituras_docs_ok
+    except Exception:
+        db.rollback()
+        partial = True
+        escrituras_agendadas = escrituras_docs_ok = escrituras_docs_pendentes = 0
+
+    kpis = {
+        "propriedades_ativas": propriedades_ativas,
+        "novas_leads_7d": novas_leads_7d,
+        "propostas_abertas": propostas_abertas,
+        "agentes_ativos": agentes_ativos,
+        # Escrituras
+        "escrituras_agendadas": escrituras_agendadas,
+        "escrituras_docs_ok": escrituras_docs_ok,
+        "escrituras_docs_pendentes": escrituras_docs_pendentes,
+        "trends": {
+            "propriedades": f"+{prop_trend:.0f}%" if prop_trend > 0 else f"{prop_trend:.0f}%",
+            "propriedades_up": prop_trend > 0,
+            "leads": f"+{leads_trend:.0f}%" if leads_trend > 0 else f"{leads_trend:.0f}%",
+            "leads_up": leads_trend > 0,
+            "propostas": f"+{propostas_trend:.0f}%",
+            "propostas_up": True
+        }
+    }
+    if partial:
+        raise _PartialKpis(kpis)
+    return kpis
+
+
 @router.get("/kpis")
 def get_dashboard_kpis(
     db: Session = Depends(get_db),
@@ -28,120 +156,26 @@ def get_dashboard_kpis(
     - Trends (percentagens de crescimento)
     """
     try:
-        # Propriedades ativas
-        try:
-            propriedades_ativas = db.query(Property).filter(
-                func.upper(Property.status) == 'AVAILABLE'
-            ).count()
-        except Exception:
-            db.rollback()
-            propriedades_ativas = 0
-        
-        # Propriedades ativas há 7 dias (para calcular trend)
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        try:
-            propriedades_ativas_7d_ago = db.query(Property).filter(
-                func.upper(Property.status) == 'AVAILABLE',
-                Property.created_at <= seven_days_ago
-            ).count()
-        except Exception:
-            db.rollback()
-            propriedades_ativas_7d_ago = 0
-        
-        # Calcular trend de propriedades
-        if propriedades_ativas_7d_ago > 0:
-            prop_trend = ((propriedades_ativas - propriedades_ativas_7d_ago) / propriedades_ativas_7d_ago) * 100
-        else:
-            prop_trend = 0
-        
-        # Novas leads (últimos 7 dias) - apenas com created_at definido
-        try:
-            novas_leads_7d = db.query(Lead).filter(
-                Lead.created_at.isnot(None),
-                Lead.created_at >= seven_days_ago
-            ).count()
-        except Exception:
-            db.rollback()
-            novas_leads_7d = 0
-        
-        # Leads há 14 dias (para calcular trend)
-        fourteen_days_ago = datetime.now() - timedelta(days=14)
-        try:
-            seven_to_fourteen_days_ago = db.query(Lead).filter(
-                Lead.created_at.isnot(None),
-                Lead.created_at >= fourteen_days_ago,
-                Lead.created_at < seven_days_ago
-            ).count()
-        except Exception:
-            db.rollback()
-            seven_to_fourteen_days_ago = 0
-        
-        # Calcular trend de leads
-        if seven_to_fourteen_days_ago > 0:
-            leads_trend = ((novas_leads_7d - seven_to_fourteen_days_ago) / seven_to_fourteen_days_ago) * 100
-        else:
-            leads_trend = novas_leads_7d * 100 if novas_leads_7d > 0 else 0
-        
-        # Propostas em aberto (mock - adicionar tabela de propostas futuramente)
-        propostas_abertas = 12  # TODO: implementar quando tabela Proposta existir
-        propostas_trend = 5.0  # Mock
-        
-        # Agentes ativos (todos os agentes cadastrados)
-        try:
-            agentes_ativos = db.query(Agent).count()
-        except Exception:
-            db.rollback()
-            agentes_ativos = 0
-        
-        # === ESCRITURAS ===
-        try:
-            # Total de escrituras agendadas (próximos 60 dias)
-            hoje = datetime.now()
-            escrituras_agendadas = db.query(Escritura).filter(
-                Escritura.data_escritura >= hoje,
-                Escritura.status.in_(['agendada', 'confirmada'])
-            ).count()
-            
-            # Escrituras com documentação pronta
-            escrituras_docs_ok = db.query(Escritura).filter(
-                Escritura.data_escritura >= hoje,
-                Escritura.status.in_(['agendada', 'confirmada']),
-                Escritura.documentacao_pronta == True
-            ).count()
-            
-            # Escrituras com documentação pendente
-            escrituras_docs_pendentes = escrituras_agendadas - escrituras_docs_ok
-        except Exception:
-            db.rollback()
-            # Se tabela não existir ainda
-            escrituras_agendadas = 0
-            escrituras_docs_ok = 0
-            escrituras_docs_pendentes = 0
-        
-        return {
-            "propriedades_ativas": propriedades_ativas,
-            "novas_leads_7d": novas_leads_7d,
-            "propostas_abertas": propostas_abertas,
-            "agentes_ativos": agentes_ativos,
-            # Escrituras
-            "escrituras_agendadas": escrituras_agendadas,
-            "escrituras_docs_ok": escrituras_docs_ok,
-            "escrituras_docs_pendentes": escrituras_docs_pendentes,
-            "trends": {
-                "propriedades": f"+{prop_trend:.0f}%" if prop_trend > 0 else f"{prop_trend:.0f}%",
-                "propriedades_up": prop_trend > 0,
-                "leads": f"+{leads_trend:.0f}%" if leads_trend > 0 else f"{leads_trend:.0f}%",
-                "leads_up": leads_trend > 0,
-                "propostas": f"+{propostas_trend:.0f}%",
-                "propostas_up": True
-            }
-        }
+        return dashboard_cache.get_or_set("kpis", lambda: _compute_dashboard_kpis(db))
+    except _PartialKpis as e:
+        return e.kpis
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao carregar KPIs: {str(e)}")
 
 
 # ==================== DISTRIBUIÇÃO ====================
 
+def _properties_by_concelho(db: Session) -> list:
+    result = db.query(
+        Property.municipality.label('concelho'),
+        func.count(Property.id).label('total')
+    ).filter(
+        func.upper(Property.status) == 'AVAILABLE'
+    ).group_by(Property.municipality).order_by(func.count(Property.id).desc()).limit(5).all()
+
+    return [{"label": r.concelho or "Outros", "value": r.total} for r in result]
+
+
 @router.get("/distribution/concelho")
 def get_properties_by_concelho(
     db: Session = Depends(get_db),
@@ -149,18 +183,51 @@ def get_properties_by_concelho(
 ):
     """Retorna distribuição de propriedades por concelho"""
     try:
-        result = db.query(
-            Property.municipality.label('concelho'),
-            func.count(Property.id).label('total')
-        ).filter(
-            func.upper(Property.status) == 'AVAILABLE'
-        ).group_by(Property.municipality).order_by(func.count(Property.id).desc()).limit(5).all()
-        
-        return [{"label": r.concelho or "Outros", "value": r.total} for r in result]
+        return dashboard_cache.get_or_set("distribution:concelho", lambda: _properties_by_concelho(db))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao carregar distribuição por concelho: {str(e)}")
 
 
+def _properties_by_tipologia(db: Session) -> list:
+    # Mapear typology para categorias (T0, T1, T2, T3, T4+, Outros)
+    result = db.query(
+        Property.typology,
+        func.count(Property.id).label('total')
+    ).filter(
+        func.upper(Property.status) == 'AVAILABLE'
+    ).group_by(Property.typology).all()
+
+    total_props = sum(r.total for r in result)
+
+    # Agrupar em categorias
+    tipologias = {}
+    for r in result:
+        tipo = r.typology or "Outros"
+        if tipo not in tipologias:
+            tipologias[tipo] = 0
+        tipologias[tipo] += r.total
+
+    # Calcular percentagens
+    distribution = []
+    colors = {
+        "T1": "#3b82f6",
+        "T2": "#a855f7",
+        "T3": "#E10600",
+        "T4": "#14b8a6"
+    }
+
+    for tipo, count in sorted(tipologias.items(), key=lambda x: x[1], reverse=True):
+        percentage = (count / total_props * 100) if total_props > 0 else 0
+        color = colors.get(tipo, "#6b7280")
+        distribution.append({
+            "label": tipo,
+            "value": round(percentage, 1),
+            "color": color
+        })
+
+    return distribution[:4]  # Top 4 tipologias
+
+
 @router.get("/distribution/tipologia")
 def get_properties_by_tipologia(
     db: Session = Depends(get_db),
@@ -168,47 +235,38 @@ def get_properties_by_tipologia(
 ):
     """Retorna distribuição de propriedades por tipologia"""
     try:
-        # Mapear typology para categorias (T0, T1, T2, T3, T4+, Outros)
-        result = db.query(
-            Property.typology,
-            func.count(Property.id).label('total')
-        ).filter(
-            func.upper(Property.status) == 'AVAILABLE'
-        ).group_by(Property.typology).all()
-        
-        total_props = sum(r.total for r in result)
-        
-        # Agrupar em categorias
-        tipologias = {}
-        for r in result:
-            tipo = r.typology or "Outros"
-            if tipo not in tipologias:
-                tipologias[tipo] = 0
-            tipologias[tipo] += r.total
-        
-        # Calcular percentagens
-        distribution = []
-        colors = {
-            "T1": "#3b82f6",
-            "T2": "#a855f7",
-            "T3": "#E10600",
-            "T4": "#14b8a6"
-        }
-        
-        for tipo, count in sorted(tipologias.items(), key=lambda x: x[1], reverse=True):
-            percentage = (count / total_props * 100) if total_props > 0 else 0
-            color = colors.get(tipo, "#6b7280")
-            distribution.append({
-                "label": tipo,
-                "value": round(percentage, 1),
-                "color": color
-            })
-        
-        return distribution[:4]  # Top 4 tipologias
+        return dashboard_cache.get_or_set("distribution:tipologia", lambda: _properties_by_tipologia(db))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao carregar distribuição por tipologia: {str(e)}")
 
 
+def _properties_by_status(db: Session) -> list:
+    result = db.query(
+        Property.status,
+        func.count(Property.id).label('total')
+    ).group_by(Property.status).all()
+
+    total_props = sum(r.total for r in result)
+
+    status_map = {
+        "AVAILABLE": {"label": "Disponível", "color": "#10b981"},
+        "RESERVED": {"label": "Reservado", "color": "#f59e0b"},
+        "SOLD": {"label": "Vendido", "color": "#ef4444"}
+    }
+
+    distribution = []
+    for r in result:
+        status_info = status_map.get(r.status, {"label": r.status, "color": "#6b7280"})
+        percentage = (r.total / total_props * 100) if total_props > 0 else 0
+        distribution.append({
+            "label": status_info["label"],
+            "value": round(percentage, 1),
+            "color": status_info["color"]
+        })
+
+    return distribution
+
+
 @router.get("/distribution/status")
 def get_properties_by_status(
     db: Session = Depends(get_db),
@@ -216,36 +274,65 @@ def get_properties_by_status(
 ):
     """Retorna distribuição de propriedades por estado"""
     try:
-        result = db.query(
-            Property.status,
-            func.count(Property.id).label('total')
-        ).group_by(Property.status).all()
-        
-        total_props = sum(r.total for r in result)
-        
-        status_map = {
-            "AVAILABLE": {"label": "Disponível", "color": "#10b981"},
-            "RESERVED": {"label": "Reservado", "color": "#f59e0b"},
-            "SOLD": {"label": "Vendido", "color": "#ef4444"}
-        }
-        
-        distribution = []
-        for r in result:
-            status_info = status_map.get(r.status, {"label": r.status, "color": "#6b7280"})
-            percentage = (r.total / total_props * 100) if total_props > 0 else 0
-            distribution.append({
-                "label": status_info["label"],
-                "value": round(percentage, 1),
-                "color": status_info["color"]
-            })
-        
-        return distribution
+        return dashboard_cache.get_or_set("distribution:status", lambda: _properties_by_status(db))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao carregar distribuição por status: {str(e)}")
 
 
 # ==================== EQUIPA / AGENTES ====================
 
+def _agents_ranking(db: Session) -> list:
+    seven_days_ago = datetime.now() - timedelta(days=7)
+
+    # Uma query: todos os agentes EXCETO a agência "Imóveis Mais Leiria",
+    # com as leads atribuídas nos últimos 7 dias (LEFT JOIN + GROUP BY)
+    rows = db.execute(
+        select(
+            Agent.id,
+            Agent.name,
+            Agent.avatar_url,
+            func.count(Lead.id).label("leads_count"),
+        )
+        .outerjoin(
+            Lead,
+            and_(
+                Lead.assigned_agent_id == Agent.id,
+                Lead.created_at.isnot(None),
+                Lead.created_at >= seven_days_ago,
+            ),
+        )
+        .where(Agent.name != "Imóveis Mais Leiria")
+        .group_by(Agent.id, Agent.name, Agent.avatar_url)
+    ).all()
+
+    ranking = []
+    for idx, agent in enumerate(sorted(rows, key=lambda r: r.name), start=1):
+        leads_count = agent.leads_count
+
+        # Propostas e visitas (mock - implementar quando tabelas existirem)
+        propostas_count = int(leads_count * 0.5)  # Mock: ~50% das leads geram proposta
+        visitas_count = int(leads_count * 0.3)  # Mock: ~30% das leads geram visita
+
+        # Calcular performance score (0-100)
+        # Fórmula: (leads * 3 + propostas * 5 + visitas * 2) / fator_normalizacao
+        performance = min(100, (leads_count * 3 + propostas_count * 5 + visitas_count * 2) / 2)
+
+        ranking.append({
+            "id": agent.id,
+            "name": agent.name,
+            "avatar": agent.avatar_url or f"/avatars/{agent.id}.png",
+            "role": "Consultor Imobiliário",
+            "leads": leads_count,
+            "propostas": propostas_count,
+            "visitas": visitas_count,
+            "performance": round(performance, 0),
+            # Ordenado alfabeticamente por nome
+            "rank": idx,
+        })
+
+    return ranking
+
+
 @router.get("/agents/ranking")
 def get_agents_ranking(
     db: Session = Depends(get_db),
@@ -259,47 +346,7 @@ def get_agents_ranking(
     - Performance score
     """
     try:
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        
-        # Query todos os agentes EXCETO a agência "Imóveis Mais Leiria"
-        agents = db.query(Agent).filter(Agent.name != "Imóveis Mais Leiria").all()
-        
-        ranking = []
-        for agent in agents:
-            # Contar leads atribuídas ao agente (últimos 7 dias) - apenas com created_at
-            leads_count = db.query(Lead).filter(
-                Lead.assigned_agent_id == agent.id,
-                Lead.created_at.isnot(None),
-                Lead.created_at >= seven_days_ago
-            ).count()
-            
-            # Propostas e visitas (mock - implementar quando tabelas existirem)
-            propostas_count = int(leads_count * 0.5)  # Mock: ~50% das leads geram proposta
-            visitas_count = int(leads_count * 0.3)  # Mock: ~30% das leads geram visita
-            
-            # Calcular performance score (0-100)
-            # Fórmula: (leads * 3 + propostas * 5 + visitas * 2) / fator_normalizacao
-            performance = min(100, (leads_count * 3 + propostas_count * 5 + visitas_count * 2) / 2)
-            
-            ranking.append({
-                "id": agent.id,
-                "name": agent.name,
-                "avatar": agent.avatar_url or f"/avatars/{agent.id}.png",
-                "role": "Consultor Imobiliário",
-                "leads": leads_count,
-                "propostas": propostas_count,
-                "visitas": visitas_count,
-                "performance": round(performance, 0)
-            })
-        
-        # Ordenar alfabeticamente por nome
-        ranking.sort(key=lambda x: x['name'])
-        
-        # Adicionar rank
-        for idx, agent_data in enumerate(ranking, start=1):
-            agent_data['rank'] = idx
-        
-        return ranking
+        return dashboard_cache.get_or_set("agents:ranking", lambda: _agents_ranking(db))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao carregar ranking de agentes: {str(e)}")
 
@@ -408,61 +455,43 @@ def distribute_leads_automatically(
     - workload-balanced: Equilibra workload entre agentes
     """
     try:
-        # Buscar todos os agentes (exceto agência principal)
-        agents = db.query(Agent).filter(Agent.name != "Imóveis Mais Leiria").all()
-        if not agents:
+        # Agentes (exceto agência principal)
+        agent_ids = assignment.agent_pool(db, "distribution")
+        if not agent_ids:
             raise HTTPException(status_code=400, detail="Nenhum agente ativo disponível")
         
-        # Buscar leads pendentes (sem agente atribuído)
-        query = db.query(Lead).filter(Lead.assigned_agent_id == None)
-        if lead_ids:
-            query = query.filter(Lead.id.in_(lead_ids))
-        
-        pending_leads = query.all()
-        if not pending_leads:
-            return {"success": True, "message": "Nenhuma lead pendente para distribuir", "distributed": 0}
-        
-        # Estratégia de distribuição
-        if strategy == "round-robin":
-            # Distribuição circular simples
-            for idx, lead in enumerate(pending_leads):
-                agent = agents[idx % len(agents)]
-                lead.assigned_agent_id = agent.id
-                lead.updated_at = datetime.now()
-        
-        elif strategy == "performance-based":
+        if strategy == "performance-based":
             # Ordenar agentes por performance (mock - usar métricas reais)
-            agents_sorted = sorted(agents, key=lambda a: a.id, reverse=True)  # Mock
-            # Atribuir mais leads aos top performers
-            for idx, lead in enumerate(pending_leads):
-                # Top 50% dos agentes recebem 70% das leads
-                if idx < len(pending_leads) * 0.7:
-                    agent = agents_sorted[idx % (len(agents_sorted) // 2 or 1)]
+            agents_sorted = sorted(agent_ids, reverse=True)  # Mock
+            pending_ids = assignment.pending_lead_ids(db, lead_ids)
+            plan = {}
+            # Top 50% dos agentes recebem 70% das leads
+            for idx, lead_id in enumerate(pending_ids):
+                if idx < len(pending_ids) * 0.7:
+                    plan[lead_id] = agents_sorted[idx % (len(agents_sorted) // 2 or 1)]
                 else:
-                    agent = agents_sorted[idx % len(agents_sorted)]
-                lead.assigned_agent_id = agent.id
-                lead.updated_at = datetime.now()
-        
-        else:  # workload-balanced
-            # Contar workload atual de cada agente
-            workload = {}
-            for agent in agents:
-                count = db.query(Lead).filter(Lead.assigned_agent_id == agent.id).count()
-                workload[agent.id] = count
-            
-            # Atribuir leads ao agente com menos workload
-            for lead in pending_leads:
-                agent_id_min_workload = min(workload, key=workload.get)
-                lead.assigned_agent_id = agent_id_min_workload
-                lead.updated_at = datetime.now()
-                workload[agent_id_min_workload] += 1
-        
+                    plan[lead_id] = agents_sorted[idx % len(agents_sorted)]
+            distributed = len(assignment.apply_assignments(db, plan, only_unassigned=True))
+        else:
+            # round-robin: rotação contínua | workload-balanced: menor número total de leads
+            result = assignment.assign_leads(
+                db,
+                lead_ids,
+                "round_robin" if strategy == "round-robin" else "workload",
+                pool="distribution",
+                only_unassigned=True,
+            )
+            distributed = result["distributed"]
+        
+        if not distributed:
+            db.rollback()
+            return {"success": True, "message": "Nenhuma lead pendente para distribuir", "distributed": 0}
         db.commit()
         
         return {
             "success": True,
-            "message": f"{len(pending_leads)} leads distribuídas com estratégia '{strategy}'",
-            "distributed": len(pending_leads),
+            "message": f"{distributed} leads distribuídas com estratégia '{strategy}'",
+            "distributed": distributed,
             "strategy": strategy
         }
     except HTTPException:
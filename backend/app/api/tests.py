@@ -0,0 +1,37 @@
+def test_dashboard_kpis_cache_tenants_without_escrituras_but_not_errors(isolated_db, monkeypatch):
+    """[user-010] Sem tabela escrituras os KPIs ficam em cache (escrituras a 0); erros de BD não."""
+    from sqlalchemy import event, text
+    from app.api import dashboard
+    from app.properties.models import Property
+
+    db = isolated_db
+    db.add(Property(reference="KPI-1", title="Moradia", price=250000, status="AVAILABLE"))
+    db.commit()
+    db.execute(text("DROP TABLE escrituras"))
+    db.commit()
+    dashboard.dashboard_cache.clear()
+    queries = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: queries.append(args[2]))
+
+    try:
+        kpis = dashboard.get_dashboard_kpis(db=db, current_user="admin@acme.pt")
+        assert kpis["propriedades_ativas"] == 1
+        assert (kpis["escrituras_agendadas"], kpis["escrituras_docs_ok"], kpis["escrituras_docs_pendentes"]) == (0, 0, 0)
+        queries.clear()
+        assert dashboard.get_dashboard_kpis(db=db, current_user="admin@acme.pt") == kpis
+        assert not queries
+
+        # Erro transitório: devolve o resultado parcial sem o guardar
+        dashboard.dashboard_cache.clear()
+
+        def failing_inspect(bind):
+            raise RuntimeError("conexão perdida")
+
+        monkeypatch.setattr(dashboard, "inspect", failing_inspect)
+        assert dashboard.get_dashboard_kpis(db=db, current_user="admin@acme.pt") == kpis
+        monkeypatch.undo()
+        queries.clear()
+        assert dashboard.get_dashboard_kpis(db=db, current_user="admin@acme.pt") == kpis
+        assert queries
+    finally:
+        dashboard.dashboard_cache.clear()
@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLEnum, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLEnum, Boolean, Index, text
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 import enum
 from app.database import Base
@@ -46,6 +46,18 @@ class Task(Base):
     podendo ser associadas a leads, propriedades e agentes.
     """
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Lembretes pendentes (app/core/scheduler.py): só tarefas ainda sem lembrete
+        Index(
+            "ix_tasks_reminder_due", "due_date",
+            postgresql_where=text("reminder_sent = false"), sqlite_where=text("reminder_sent = 0"),
+        ),
+        # Sync incremental mobile (updated_at, id) por agente
+        Index("ix_tasks_agent_updated_id", "assigned_agent_id", "updated_at", "id"),
+        # Dashboard mobile: contagens por intervalo de due_date e últimas criadas
+        Index("ix_tasks_agent_due", "assigned_agent_id", "due_date"),
+        Index("ix_tasks_agent_created_id", "assigned_agent_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -64,7 +76,10 @@ class Task(Base):
     # Relacionamentos com outras entidades
     lead_id = Column(Integer, ForeignKey("leads.id", ondelete="SET NULL"), nullable=True, index=True)
     property_id = Column(Integer, ForeignKey("properties.id", ondelete="SET NULL"), nullable=True, index=True)
-    assigned_agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False, index=True)
+    # active_history: o dono anterior fica no histórico mesmo com o objeto expirado (dashboard mobile, sync)
+    assigned_agent_id = column_property(
+        Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False, index=True), active_history=True
+    )
     created_by_id = Column(Integer, ForeignKey("agents.id", ondelete="SET NULL"), nullable=True)
     
     # Metadados
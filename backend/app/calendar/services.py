@@ -216,24 +216,43 @@ def get_task_stats(db: Session, assigned_agent_id: Optional[int] = None):
     return stats
 
 
-def get_tasks_for_reminders(db: Session, hours_before: int = 1):
+REMINDER_TASK_STATUSES = (TaskStatus.PENDING, TaskStatus.IN_PROGRESS)
+
+
+def task_reminder_conditions(since: datetime, until: datetime) -> list:
+    """
+    Filtro das tarefas com lembrete pendente e vencimento em ]since, until].
+    Servido pelo índice parcial ix_tasks_reminder_due (due_date WHERE reminder_sent = false).
+    """
+    return [
+        Task.reminder_sent == False,
+        Task.due_date > since,
+        Task.due_date <= until,
+        Task.status.in_(REMINDER_TASK_STATUSES),
+    ]
+
+
+def get_tasks_for_reminders(
+    db: Session,
+    hours_before: float = 1,
+    task_ids: Optional[List[int]] = None,
+    now: Optional[datetime] = None,
+    since: Optional[datetime] = None,
+):
     """
     Retorna tarefas que precisam de lembrete.
     Por padrão, tarefas que vencem em 1 hora e ainda não receberam lembrete.
+    Usado pelo scheduler de lembretes (app/core/scheduler.py), que passa o
+    seu `now` e um `since` anterior para ainda apanhar lembretes atrasados.
     """
-    now = datetime.utcnow()
+    now = now or datetime.utcnow()
     reminder_time = now + timedelta(hours=hours_before)
     
-    tasks = db.query(Task).filter(
-        and_(
-            Task.due_date <= reminder_time,
-            Task.due_date > now,
-            Task.status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS]),
-            Task.reminder_sent == False
-        )
-    ).all()
+    query = db.query(Task).filter(and_(*task_reminder_conditions(since or now, reminder_time)))
+    if task_ids is not None:
+        query = query.filter(Task.id.in_(task_ids))
     
-    return tasks
+    return query.all()
 
 
 def mark_reminder_sent(db: Session, task_id: int):
@@ -19,3 +19,54 @@ def test_create_event():
     assert response.status_code == 201
     data = response.json()
     assert data["title"] == "Reunião comercial"
+
+
+def test_reminder_scheduler_fires_due_visits_and_tasks_once():
+    import asyncio
+    from datetime import datetime, timedelta
+    from app.calendar.models import Task
+    from app.core.events import event_bus
+    from app.core.scheduler import ReminderScheduler
+    from app.database import Base, SessionLocal, engine
+    from app.models.visit import Visit
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    now = datetime.utcnow()
+    visit = Visit(property_id=1, agent_id=1, scheduled_date=now + timedelta(minutes=40))
+    task = Task(title="Ligar ao cliente", assigned_agent_id=1, due_date=now + timedelta(minutes=90))
+    db.add_all([visit, task])
+    db.commit()
+    received = []
+
+    def capture(event):
+        if event.data.get("visit_id") == visit.id or event.data.get("task_id") == task.id:
+            received.append(event.event_type)
+
+    event_bus.subscribe("visit_reminder", capture)
+    event_bus.subscribe("task_reminder", capture)
+    try:
+        scheduler = ReminderScheduler(horizon_hours=6)
+
+        async def scenario():
+            await scheduler.refresh(now)
+            assert (None, "visit", visit.id) in scheduler.queue
+            assert (None, "task", task.id) in scheduler.queue
+            # Ainda não chegou a hora de nenhum lembrete
+            assert await scheduler.fire_due(now) == 0
+            await scheduler.fire_due(now + timedelta(minutes=11))
+            await scheduler.fire_due(now + timedelta(minutes=31))
+            await event_bus.drain()
+            # Já marcados reminder_sent: recarga não os volta a agendar
+            await scheduler.refresh(now)
+            assert (None, "visit", visit.id) not in scheduler.queue
+
+        asyncio.run(scenario())
+        assert received == ["visit_reminder", "task_reminder"]
+    finally:
+        event_bus.unsubscribe("visit_reminder", capture)
+        event_bus.unsubscribe("task_reminder", capture)
+        db.delete(visit)
+        db.delete(task)
+        db.commit()
+        db.close()
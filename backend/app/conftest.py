@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.fixture
+def isolated_db():
+    """
+    Sessão numa BD SQLite em memória só do teste, para testes cujos
+    resultados dependem de todas as linhas de uma tabela (agregados, filas).
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.pool import StaticPool
+    import app.main  # noqa: F401  regista todos os modelos em Base.metadata
+    from app.database import Base
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = Session(bind=engine)
+    try:
+        yield db
+    finally:
+        db.close()
+        engine.dispose()
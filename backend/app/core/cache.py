@@ -0,0 +1,193 @@
+"""
+Cache em memória por tenant com TTL curto e invalidação por eventos de escrita.
+
+Uso:
+    from app.core.cache import TenantCache, track_model_changes
+
+    dashboard_cache = TenantCache("dashboard", ttl=10, topics=("leads", "properties"))
+    track_model_changes(Lead, "leads")
+
+    data = dashboard_cache.get_or_set("kpis", lambda: compute_kpis(db))
+
+Quando uma sessão faz commit com inserts/updates/deletes de um modelo
+registado em track_model_changes, todas as caches subscritas a esse tópico
+são invalidadas para o tenant da sessão. Escritas fora do ORM (UPDATE em
+massa, SQL raw) não disparam eventos: ficam cobertas pelo TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database import DEFAULT_SCHEMA, get_tenant_schema
+
+_MISSING = object()
+
+
+def _schema_key(schema: Optional[str]) -> Optional[str]:
+    """'public' e ausência de tenant partilham a mesma partição"""
+    return None if schema in (None, DEFAULT_SCHEMA) else schema
+
+
+class TenantCache:
+    """
+    Cache LRU (key -> valor) particionada por tenant, com TTL por entrada.
+    Cada tenant tem uma versão; invalidar incrementa a versão e descarta
+    as entradas desse tenant.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 2000, topics: Iterable[str] = ()):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.topics = tuple(topics)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._versions: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        for topic in self.topics:
+            _subscribers.setdefault(topic, []).append(self)
+
+    def version(self, schema: Optional[str] = _MISSING) -> int:
+        """Versão atual do tenant (muda a cada invalidação; útil para ETags)."""
+        schema = _schema_key(get_tenant_schema() if schema is _MISSING else schema)
+        with self._lock:
+            return self._versions.get(schema, 0)
+
+    def get(self, key: Hashable, schema: Optional[str] = _MISSING) -> Any:
+        """Devolve o valor em cache ou None."""
+        schema = _schema_key(get_tenant_schema() if schema is _MISSING else schema)
+        full_key = (schema, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[full_key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, schema: Optional[str] = _MISSING, version: Optional[int] = None) -> None:
+        """
+        Guarda um valor. Se `version` for dada e o tenant entretanto tiver sido
+        invalidado, o valor (calculado com dados antigos) é descartado.
+        """
+        schema = _schema_key(get_tenant_schema() if schema is _MISSING else schema)
+        with self._lock:
+            if version is not None and self._versions.get(schema, 0) != version:
+                return
+            full_key = (schema, key)
+            self._entries[full_key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any], schema: Optional[str] = _MISSING) -> Any:
+        schema = get_tenant_schema() if schema is _MISSING else schema
+        value = self.get(key, schema)
+        if value is not None:
+            return value
+        version = self.version(schema)
+        value = compute()
+        if value is not None:
+            self.set(key, value, schema, version=version)
+        return value
+
+    def invalidate(self, schema: Optional[str] = _MISSING) -> None:
+        """Invalida um tenant (default: o atual)."""
+        schema = _schema_key(get_tenant_schema() if schema is _MISSING else schema)
+        with self._lock:
+            self._versions[schema] = self._versions.get(schema, 0) + 1
+            for full_key in [k for k in self._entries if k[0] == schema]:
+                del self._entries[full_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for schema in list(self._versions):
+                self._versions[schema] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# =====================================================
+# INVALIDAÇÃO POR EVENTOS DO ORM
+# =====================================================
+
+_subscribers: Dict[str, List[TenantCache]] = {}
+_tracked_models: Dict[type, str] = {}
+_topic_listeners: List[Callable[[str, Optional[str]], None]] = []
+
+
+def touch(topic: str, schema: Optional[str] = _MISSING) -> None:
+    """Sinaliza uma escrita em `topic` para o tenant (invalida as caches subscritas)."""
+    schema = get_tenant_schema() if schema is _MISSING else schema
+    for cache in _subscribers.get(topic, ()):
+        cache.invalidate(schema)
+    for listener in list(_topic_listeners):
+        try:
+            listener(topic, _schema_key(schema))
+        except Exception as e:
+            print(f"[Cache] Erro em listener de '{topic}': {e}")
+
+
+def on_topic_change(listener: Callable[[str, Optional[str]], None]) -> None:
+    """Regista um callback (topic, schema) chamado após cada commit com escritas."""
+    _topic_listeners.append(listener)
+
+
+def touch_on_commit(session: Session, topic: str) -> None:
+    """touch(topic) quando `session` fizer commit (escritas fora do ORM: UPDATE em massa, SQL raw)."""
+    session.info.setdefault("changed_topics", set()).add(topic)
+
+
+def _mark_changed(mapper, connection, target) -> None:
+    from sqlalchemy.orm import object_session
+
+    session = object_session(target)
+    topic = _tracked_models.get(type(target)) or _tracked_models.get(mapper.class_)
+    if session is not None and topic:
+        touch_on_commit(session, topic)
+
+
+def track_model_changes(model: type, topic: str) -> None:
+    """Após commit de inserts/updates/deletes de `model`, faz touch(topic) no tenant da sessão."""
+    if model in _tracked_models:
+        return
+    _tracked_models[model] = topic
+    for event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, event_name, _mark_changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_changed_topics(session: Session) -> None:
+    topics = session.info.pop("changed_topics", None)
+    if not topics:
+        return
+    schema = getattr(session, "tenant_schema", _MISSING)
+    for topic in topics:
+        touch(topic, schema)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_topics(session: Session) -> None:
+    session.info.pop("changed_topics", None)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True se o header If-None-Match do pedido inclui `etag` (ou '*')."""
+    if not if_none_match:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
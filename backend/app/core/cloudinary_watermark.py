@@ -16,7 +16,8 @@ Exemplo de URL transformada:
 https://res.cloudinary.com/cloud/image/upload/l_crm-plus:watermarks:tenant_slug:watermark,w_0.15,g_south_east,o_60,fl_layer_apply/v123/original_image.jpg
 """
 import re
-from typing import Optional, List, Dict
+from functools import lru_cache
+from typing import Callable, Optional, List, Dict
 from urllib.parse import quote
 
 
@@ -70,42 +71,21 @@ def apply_watermark_to_url(
     
     # Verificar se é URL do Cloudinary
     if "cloudinary.com" not in image_url and "res.cloudinary" not in image_url:
-        print(f"[Watermark] URL não é do Cloudinary, ignorando: {image_url[:50]}...")
         return image_url
     
     # Se já tem transformação de watermark/overlay, não aplicar novamente
     if "l_crm-plus" in image_url:
-        print(f"[Watermark] URL já tem watermark aplicado, ignorando")
         return image_url
     
     try:
-        # Converter public_id para formato de layer (/ -> :)
-        # Ex: crm-plus/watermarks/imoveismais/watermark -> crm-plus:watermarks:imoveismais:watermark
-        # Ex: crm-plus/crm-settings/watermark -> crm-plus:crm-settings:watermark
-        layer_id = watermark_public_id.replace("/", ":")
-        
-        print(f"[Watermark] Transformando URL com layer_id: {layer_id}")
-        
-        # Converter para percentagem (Cloudinary usa 0-100 para opacity)
-        opacity_percent = int(opacity * 100)
-        
-        # Converter scale para width relativa (Cloudinary usa 0.0-1.0)
-        # Usamos w_ com fl_relative para largura relativa à imagem base
-        width_relative = scale
-        
-        # Obter gravity
-        gravity = get_cloudinary_gravity(position)
-        
-        # Construir transformação de overlay
-        # Formato: l_{public_id},w_{scale},g_{gravity},o_{opacity},x_{padding},y_{padding},fl_relative,fl_layer_apply
-        overlay_transform = f"l_{layer_id},w_{width_relative},g_{gravity},o_{opacity_percent},x_{padding},y_{padding},fl_relative,fl_layer_apply"
+        overlay_transform = _overlay_transform(watermark_public_id, scale, opacity, position, padding)
         
         # Inserir transformação na URL
         # URL típica: https://res.cloudinary.com/{cloud}/image/upload/v123/path/image.jpg
         # Queremos:   https://res.cloudinary.com/{cloud}/image/upload/{transform}/v123/path/image.jpg
         
         # Padrão: encontrar /upload/ ou /image/upload/
-        match = re.search(r'(https://res\.cloudinary\.com/[^/]+/image/upload/)(v\d+/)?(.+)', image_url)
+        match = _IMAGE_UPLOAD_RE.search(image_url)
         
         if match:
             base = match.group(1)
@@ -113,17 +93,15 @@ def apply_watermark_to_url(
             path = match.group(3)
             
             # Construir nova URL com transformação
-            new_url = f"{base}{overlay_transform}/{version}{path}"
-            return new_url
+            return f"{base}{overlay_transform}/{version}{path}"
         
         # Fallback: tentar outro padrão (sem /image/)
-        match2 = re.search(r'(https://res\.cloudinary\.com/[^/]+/)([^/]+/upload/)(v\d+/)?(.+)', image_url)
+        match2 = _UPLOAD_RE.search(image_url)
         if match2:
             base = match2.group(1) + match2.group(2)
             version = match2.group(3) or ""
             path = match2.group(4)
-            new_url = f"{base}{overlay_transform}/{version}{path}"
-            return new_url
+            return f"{base}{overlay_transform}/{version}{path}"
         
         print(f"[Watermark] Não foi possível parsear URL: {image_url[:80]}...")
         return image_url
@@ -133,6 +111,75 @@ def apply_watermark_to_url(
         return image_url
 
 
+_IMAGE_UPLOAD_RE = re.compile(r'(https://res\.cloudinary\.com/[^/]+/image/upload/)(v\d+/)?(.+)')
+_UPLOAD_RE = re.compile(r'(https://res\.cloudinary\.com/[^/]+/)([^/]+/upload/)(v\d+/)?(.+)')
+
+
+@lru_cache(maxsize=256)
+def _overlay_transform(watermark_public_id: str, scale: float, opacity: float, position: str, padding: int) -> str:
+    """Transformação de overlay (igual para todas as imagens do tenant: calculada uma vez)."""
+    # Converter public_id para formato de layer (/ -> :)
+    # Ex: crm-plus/watermarks/imoveismais/watermark -> crm-plus:watermarks:imoveismais:watermark
+    # Ex: crm-plus/crm-settings/watermark -> crm-plus:crm-settings:watermark
+    layer_id = watermark_public_id.replace("/", ":")
+    
+    # Converter para percentagem (Cloudinary usa 0-100 para opacity)
+    opacity_percent = int(opacity * 100)
+    
+    # Converter scale para width relativa (Cloudinary usa 0.0-1.0)
+    # Usamos w_ com fl_relative para largura relativa à imagem base
+    width_relative = scale
+    
+    # Obter gravity
+    gravity = get_cloudinary_gravity(position)
+    
+    # Construir transformação de overlay
+    # Formato: l_{public_id},w_{scale},g_{gravity},o_{opacity},x_{padding},y_{padding},fl_relative,fl_layer_apply
+    return f"l_{layer_id},w_{width_relative},g_{gravity},o_{opacity_percent},x_{padding},y_{padding},fl_relative,fl_layer_apply"
+
+
+def make_images_watermarker(
+    watermark_settings: Optional[Dict]
+) -> Callable[[Optional[List[str]]], Optional[List[str]]]:
+    """
+    Função images -> images com o watermark do tenant, para aplicar a muitas
+    propriedades (settings validadas e log de auditoria uma só vez).
+    
+    ISOLAMENTO TENANT: watermark_settings DEVE conter o public_id específico do tenant.
+    """
+    if not watermark_settings or not watermark_settings.get("enabled"):
+        return _unchanged
+    
+    public_id = watermark_settings.get("public_id")
+    if not public_id:
+        print("[Watermark] Sem public_id configurado, retornando imagens originais")
+        return _unchanged
+    
+    # Log para auditoria de segurança
+    print(f"[Watermark] Aplicando watermark '{public_id}'")
+    
+    scale = watermark_settings.get("scale", 0.15)
+    opacity = watermark_settings.get("opacity", 0.6)
+    position = watermark_settings.get("position", "bottom-right")
+    
+    def watermark(images: Optional[List[str]]) -> Optional[List[str]]:
+        if not images:
+            return images
+        return [
+            apply_watermark_to_url(
+                image_url=img_url, watermark_public_id=public_id,
+                scale=scale, opacity=opacity, position=position,
+            )
+            for img_url in images
+        ]
+    
+    return watermark
+
+
+def _unchanged(images: Optional[List[str]]) -> Optional[List[str]]:
+    return images
+
+
 def apply_watermark_to_images(
     images: Optional[List[str]],
     watermark_settings: Optional[Dict]
@@ -157,32 +204,7 @@ def apply_watermark_to_images(
     if not images:
         return images
     
-    if not watermark_settings:
-        return images
-    
-    if not watermark_settings.get("enabled"):
-        return images
-    
-    public_id = watermark_settings.get("public_id")
-    if not public_id:
-        print("[Watermark] Sem public_id configurado, retornando imagens originais")
-        return images
-    
-    # Log para auditoria de segurança
-    print(f"[Watermark] Aplicando watermark '{public_id}' a {len(images)} imagens")
-    
-    result = []
-    for img_url in images:
-        transformed = apply_watermark_to_url(
-            image_url=img_url,
-            watermark_public_id=public_id,
-            scale=watermark_settings.get("scale", 0.15),
-            opacity=watermark_settings.get("opacity", 0.6),
-            position=watermark_settings.get("position", "bottom-right")
-        )
-        result.append(transformed)
-    
-    return result
+    return make_images_watermarker(watermark_settings)(images)
 
 
 def get_watermark_settings_for_response(db_session) -> Optional[Dict]:
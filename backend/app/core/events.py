@@ -1,93 +1,508 @@
 """
 Event Bus - Sistema pub/sub para eventos real-time
 Permite desacoplar lógica de negócio do sistema de notificações
+
+publish() não executa os handlers: coloca o evento na fila (limitada) de
+cada subscriber, e uma task por subscriber consome a fila. Um envio
+WebSocket lento atrasa só o seu subscriber, nunca o request que publicou.
+Quando uma fila está cheia aplica-se a política do subscriber:
+    drop_oldest  descarta o evento mais antigo da fila (default)
+    drop_new     descarta o evento novo
+    block        o publisher espera por espaço até EVENT_BUS_BLOCK_TIMEOUT (backpressure)
+
+Com vários workers (uvicorn --workers N / várias réplicas) os eventos são
+também enviados por um transporte partilhado (PostgreSQL LISTEN/NOTIFY) e
+entregues aos subscribers de todos os processos. O processo de origem
+entrega localmente e ignora o eco do seu próprio NOTIFY.
+
+Configuração via ENV:
+    EVENT_BUS_QUEUE_SIZE      capacidade da fila de cada subscriber (default: 1000)
+    EVENT_BUS_BLOCK_TIMEOUT   segundos de espera na política "block" (default: 1)
+    EVENT_BUS_TRANSPORT       "postgres" | "memory" | "none" (default: postgres com DATABASE_URL)
+    EVENT_BUS_CHANNEL         canal do LISTEN/NOTIFY (default: crmplus_events)
+    EVENT_BUS_OUTBOX_SIZE     NOTIFY pendentes por processo antes de descartar (default: 10000)
 """
-from typing import Dict, List, Callable, Any
+from typing import Dict, List, Callable, Any, Optional
+from collections import defaultdict
 from datetime import datetime
+import abc
 import asyncio
+import json
 import logging
+import os
+import time
+import uuid
+
+from app.database import DATABASE_URL, get_tenant_schema
 
 logger = logging.getLogger(__name__)
 
+EVENT_BUS_QUEUE_SIZE = int(os.getenv("EVENT_BUS_QUEUE_SIZE", "1000"))
+EVENT_BUS_BLOCK_TIMEOUT = float(os.getenv("EVENT_BUS_BLOCK_TIMEOUT", "1"))
+EVENT_BUS_TRANSPORT = os.getenv("EVENT_BUS_TRANSPORT", "postgres" if DATABASE_URL else "none").lower()
+EVENT_BUS_CHANNEL = os.getenv("EVENT_BUS_CHANNEL", "crmplus_events")
+EVENT_BUS_OUTBOX_SIZE = int(os.getenv("EVENT_BUS_OUTBOX_SIZE", "10000"))
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEW = "drop_new"
+BLOCK = "block"
+POLICIES = (DROP_OLDEST, DROP_NEW, BLOCK)
+
+# Limite do payload do NOTIFY (8000 bytes) com margem
+MAX_NOTIFY_BYTES = 7900
+
+_MISSING = object()
+
 
 class Event:
     """Representa um evento no sistema"""
-    def __init__(self, event_type: str, data: Dict[str, Any], agent_id: int = None):
+    def __init__(self, event_type: str, data: Dict[str, Any], agent_id: int = None, tenant_schema: Optional[str] = None):
         self.event_type = event_type
         self.data = data
         self.agent_id = agent_id  # Para events direcionados a agente específico
+        self.tenant_schema = tenant_schema  # Tenant de origem (agent_id só é único dentro do tenant)
         self.timestamp = datetime.utcnow()
+        self.origin: Optional[str] = None  # Processo que publicou (transporte)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "type": self.event_type,
+            "data": self.data,
+            "agent_id": self.agent_id,
+            "tenant": self.tenant_schema,
+            "ts": self.timestamp.isoformat(),
+            "origin": self.origin,
+        }, separators=(",", ":"), default=str)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Event":
+        payload = json.loads(raw)
+        event = cls(payload["type"], payload.get("data") or {}, payload.get("agent_id"), payload.get("tenant"))
+        event.timestamp = datetime.fromisoformat(payload["ts"])
+        event.origin = payload.get("origin")
+        return event
+
+
+class Subscription:
+    """Handler + fila limitada + task consumidora (criada no event loop em uso)."""
+
+    def __init__(self, event_type: str, handler: Callable, max_queue: int, policy: str):
+        if policy not in POLICIES:
+            raise ValueError(f"Política inválida: {policy}")
+        self.event_type = event_type
+        self.handler = handler
+        self.max_queue = max_queue
+        self.policy = policy
+        self.name = getattr(handler, "__qualname__", repr(handler))
+        self.stats = defaultdict(float)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = loop.create_task(self._consume())
+        return self._queue
+
+    async def offer(self, event: Event) -> bool:
+        """Coloca o evento na fila segundo a política; False se foi descartado."""
+        queue = self._ensure_worker()
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            if self.policy == DROP_NEW:
+                self.stats["dropped"] += 1
+                return False
+            if self.policy == DROP_OLDEST:
+                queue.get_nowait()
+                queue.task_done()
+                queue.put_nowait(event)
+                self.stats["dropped"] += 1
+            else:
+                try:
+                    await asyncio.wait_for(queue.put(event), timeout=EVENT_BUS_BLOCK_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.stats["dropped"] += 1
+                    return False
+        self.stats["max_depth"] = max(self.stats["max_depth"], queue.qsize())
+        return True
+
+    async def _consume(self) -> None:
+        queue = self._queue
+        while True:
+            event = await queue.get()
+            started = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(self.handler):
+                    await self.handler(event)
+                else:
+                    self.handler(event)
+                self.stats["delivered"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Erro ao executar handler para '{self.event_type}': {str(e)}")
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.stats["handler_ms_total"] += elapsed_ms
+                self.stats["handler_ms_max"] = max(self.stats["handler_ms_max"], elapsed_ms)
+                queue.task_done()
+
+    async def drain(self) -> None:
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    def close(self) -> None:
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+        self._worker = None
+
+    def snapshot(self) -> dict:
+        delivered = self.stats["delivered"]
+        return {
+            "event_type": self.event_type,
+            "handler": self.name,
+            "policy": self.policy,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "max_depth": int(self.stats["max_depth"]),
+            "delivered": int(delivered),
+            "dropped": int(self.stats["dropped"]),
+            "errors": int(self.stats["errors"]),
+            "avg_handler_ms": round(self.stats["handler_ms_total"] / delivered, 3) if delivered else 0.0,
+            "max_handler_ms": round(self.stats["handler_ms_max"], 3),
+        }
+
+
+# =====================================================
+# TRANSPORTES ENTRE PROCESSOS
+# =====================================================
+
+class EventTransport(abc.ABC):
+    """Interface: send() difunde o evento serializado; on_message é chamado com o recebido."""
+
+    @abc.abstractmethod
+    async def start(self, on_message: Callable[[str], None]) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def send(self, payload: str) -> None:
+        ...
+
+    async def stop(self) -> None:
+        pass
+
+
+class InMemoryHub:
+    """Substituto do PostgreSQL para testes: liga vários buses no mesmo processo."""
+
+    def __init__(self):
+        self.transports: List["InMemoryTransport"] = []
+
+
+class InMemoryTransport(EventTransport):
+    def __init__(self, hub: InMemoryHub):
+        self.hub = hub
+        self._on_message: Optional[Callable[[str], None]] = None
+
+    async def start(self, on_message: Callable[[str], None]) -> None:
+        self._on_message = on_message
+        self.hub.transports.append(self)
+
+    async def send(self, payload: str) -> None:
+        # Como no NOTIFY, todos os ouvintes recebem (incluindo o próprio)
+        for transport in list(self.hub.transports):
+            if transport._on_message is not None:
+                transport._on_message(payload)
+
+    async def stop(self) -> None:
+        if self in self.hub.transports:
+            self.hub.transports.remove(self)
+        self._on_message = None
+
+
+class PostgresNotifyTransport(EventTransport):
+    """
+    LISTEN/NOTIFY em duas conexões asyncpg dedicadas (fora do pool do
+    SQLAlchemy): uma só escuta (com keepalive), a outra só envia. send() apenas
+    coloca o payload numa fila limitada; uma task envia os NOTIFY pendentes em
+    lote, por isso o publisher nunca espera pela ida e volta ao PostgreSQL e as
+    duas conexões nunca têm operações concorrentes. Se uma conexão cair, volta
+    a ligar com backoff; com a fila cheia o evento é entregue só localmente.
+    """
+
+    def __init__(self, dsn: str, channel: str = EVENT_BUS_CHANNEL, outbox_size: int = EVENT_BUS_OUTBOX_SIZE):
+        self.dsn = dsn.replace("postgresql+psycopg2://", "postgresql://", 1)
+        self.channel = channel
+        self.outbox_size = outbox_size
+        self.stats = defaultdict(int)
+        self._conn = None
+        self._task: Optional[asyncio.Task] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._on_message: Optional[Callable[[str], None]] = None
+
+    async def _connect(self):
+        import asyncpg
+
+        return await asyncpg.connect(self.dsn)
+
+    async def start(self, on_message: Callable[[str], None]) -> None:
+        loop = asyncio.get_running_loop()
+        self._on_message = on_message
+        self._outbox = asyncio.Queue(maxsize=self.outbox_size)
+        self._task = loop.create_task(self._run())
+        self._sender = loop.create_task(self._send_loop())
+
+    def _listener(self, connection, pid, channel, payload) -> None:
+        if self._on_message is not None:
+            self._on_message(payload)
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                self._conn = await self._connect()
+                await self._conn.add_listener(self.channel, self._listener)
+                print(f"[EventBus] LISTEN {self.channel} ativo")
+                backoff = 1.0
+                while not self._conn.is_closed():
+                    await asyncio.sleep(5)
+                    await self._conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[EventBus] Conexão LISTEN perdida: {e}; nova tentativa em {backoff:.0f}s")
+            finally:
+                if self._conn is not None and not self._conn.is_closed():
+                    await self._conn.close()
+                self._conn = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    async def _send_loop(self) -> None:
+        """Única task que usa a conexão de envio: NOTIFY de tudo o que está na fila."""
+        conn = None
+        backoff = 1.0
+        while True:
+            payloads = [await self._outbox.get()]
+            while not self._outbox.empty():
+                payloads.append(self._outbox.get_nowait())
+            try:
+                if conn is None or conn.is_closed():
+                    conn = await self._connect()
+                await conn.executemany("SELECT pg_notify($1, $2)", [(self.channel, p) for p in payloads])
+                self.stats["sent"] += len(payloads)
+                backoff = 1.0
+            except asyncio.CancelledError:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+                raise
+            except Exception as e:
+                self.stats["errors"] += len(payloads)
+                print(f"[EventBus] NOTIFY falhou ({len(payloads)} eventos): {e}; nova tentativa em {backoff:.0f}s")
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+                conn = None
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    async def send(self, payload: str) -> None:
+        if self._outbox is None:
+            raise ConnectionError("LISTEN/NOTIFY indisponível")
+        try:
+            self._outbox.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            raise ConnectionError("Fila de NOTIFY cheia")
+
+    async def flush(self) -> None:
+        """Espera até a fila de envio estar vazia (testes/shutdown)."""
+        while self._outbox is not None and not self._outbox.empty():
+            await asyncio.sleep(0.01)
+
+    async def stop(self) -> None:
+        for task in (self._sender, self._task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._sender = None
+        self._outbox = None
+        self._on_message = None
+
+
+def create_transport(kind: str = EVENT_BUS_TRANSPORT) -> Optional[EventTransport]:
+    if kind == "postgres" and DATABASE_URL:
+        return PostgresNotifyTransport(DATABASE_URL)
+    if kind == "memory":
+        return InMemoryTransport(InMemoryHub())
+    return None
 
 
 class EventBus:
     """
     Event Bus singleton para publish/subscribe de eventos
-    
+
     Uso:
         from app.core.events import event_bus
-        
-        # Publicar evento
+
+        # Publicar evento (não espera pelos handlers)
         await event_bus.publish("new_lead", {"lead_id": 123}, agent_id=5)
-        
+
         # Subscrever (geralmente no WebSocket connection manager)
         event_bus.subscribe("new_lead", my_handler_function)
     """
-    
+
     def __init__(self):
-        self._subscribers: Dict[str, List[Callable]] = {}
-        self._lock = asyncio.Lock()
-    
-    def subscribe(self, event_type: str, handler: Callable):
+        self._subscribers: Dict[str, List[Subscription]] = {}
+        self.node_id = uuid.uuid4().hex[:12]
+        self.transport: Optional[EventTransport] = None
+        self.stats = defaultdict(int)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: set = set()
+
+    def subscribe(self, event_type: str, handler: Callable, max_queue: int = EVENT_BUS_QUEUE_SIZE, policy: str = DROP_OLDEST):
         """
         Regista handler para tipo de evento específico
-        
+
         Args:
             event_type: Nome do evento (ex: "new_lead", "visit_scheduled")
-            handler: Função async que recebe Event como argumento
+            handler: Função (sync ou async) que recebe Event como argumento
+            max_queue: Capacidade da fila deste subscriber
+            policy: drop_oldest | drop_new | block (quando a fila está cheia)
         """
-        if event_type not in self._subscribers:
-            self._subscribers[event_type] = []
-        
-        self._subscribers[event_type].append(handler)
+        subscription = Subscription(event_type, handler, max_queue, policy)
+        self._subscribers.setdefault(event_type, []).append(subscription)
         logger.info(f"Handler registado para evento '{event_type}'")
-    
+        return subscription
+
     def unsubscribe(self, event_type: str, handler: Callable):
         """Remove handler de evento"""
-        if event_type in self._subscribers:
-            try:
-                self._subscribers[event_type].remove(handler)
+        for subscription in list(self._subscribers.get(event_type, ())):
+            if subscription.handler == handler:
+                subscription.close()
+                self._subscribers[event_type].remove(subscription)
                 logger.info(f"Handler removido de evento '{event_type}'")
-            except ValueError:
-                pass
-    
-    async def publish(self, event_type: str, data: Dict[str, Any], agent_id: int = None):
+                return
+
+    async def publish(self, event_type: str, data: Dict[str, Any], agent_id: int = None, tenant_schema: Optional[str] = _MISSING):
         """
-        Publica evento para todos os subscribers
-        
+        Publica evento para todos os subscribers (deste e dos outros processos)
+
         Args:
             event_type: Nome do evento
             data: Dados do evento (será JSON no WebSocket)
             agent_id: ID do agente destinatário (opcional, para filtering)
+            tenant_schema: Tenant do evento (default: tenant do request atual)
+        """
+        tenant_schema = get_tenant_schema() if tenant_schema is _MISSING else tenant_schema
+        event = Event(event_type, data, agent_id, tenant_schema)
+        event.origin = self.node_id
+        self.stats["published"] += 1
+        await self._dispatch(event)
+        if self.transport is not None:
+            await self._send_remote(event)
+
+    def publish_threadsafe(
+        self, event_type: str, data: Dict[str, Any], agent_id: int = None, tenant_schema: Optional[str] = _MISSING
+    ) -> bool:
         """
-        event = Event(event_type, data, agent_id)
-        
-        if event_type not in self._subscribers:
-            logger.debug(f"Nenhum subscriber para evento '{event_type}'")
+        publish() a partir de código síncrono (threads do threadpool, eventos
+        do ORM), sem esperar. False se não houver event loop (scripts, testes).
+        """
+        tenant_schema = get_tenant_schema() if tenant_schema is _MISSING else tenant_schema
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            task = loop.create_task(self.publish(event_type, data, agent_id, tenant_schema))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+            return True
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.publish(event_type, data, agent_id, tenant_schema), self._loop)
+            return True
+        return False
+
+    async def _dispatch(self, event: Event) -> int:
+        subscriptions = self._subscribers.get(event.event_type)
+        if not subscriptions:
+            logger.debug(f"Nenhum subscriber para evento '{event.event_type}'")
+            return 0
+        accepted = 0
+        for subscription in list(subscriptions):
+            accepted += await subscription.offer(event)
+        return accepted
+
+    async def _send_remote(self, event: Event) -> None:
+        payload = event.to_json()
+        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+            self.stats["remote_oversize"] += 1
+            logger.warning(f"Evento '{event.event_type}' demasiado grande para o transporte; entregue só localmente")
             return
-        
-        # Executar todos os handlers assíncronos
-        handlers = self._subscribers[event_type].copy()
-        
-        for handler in handlers:
-            try:
-                if asyncio.iscoroutinefunction(handler):
-                    await handler(event)
-                else:
-                    handler(event)
-            except Exception as e:
-                logger.error(f"Erro ao executar handler para '{event_type}': {str(e)}")
-        
-        logger.info(f"Evento '{event_type}' publicado para {len(handlers)} subscriber(s)")
+        try:
+            await self.transport.send(payload)
+            self.stats["remote_sent"] += 1
+        except Exception as e:
+            self.stats["remote_errors"] += 1
+            logger.warning(f"Erro ao enviar evento '{event.event_type}' pelo transporte: {e}")
+
+    def _on_remote(self, payload: str) -> None:
+        """Evento recebido pelo transporte (no event loop)."""
+        try:
+            event = Event.from_json(payload)
+        except Exception as e:
+            self.stats["remote_invalid"] += 1
+            logger.warning(f"Evento inválido recebido pelo transporte: {e}")
+            return
+        if event.origin == self.node_id:
+            return
+        self.stats["remote_received"] += 1
+        asyncio.get_running_loop().create_task(self._dispatch(event))
+
+    async def start_transport(self, transport: Optional[EventTransport] = _MISSING) -> None:
+        """Liga o transporte entre processos (lifespan). Sem transporte: só local."""
+        self._loop = asyncio.get_running_loop()
+        transport = create_transport() if transport is _MISSING else transport
+        if transport is None:
+            return
+        await self.stop_transport()
+        await transport.start(self._on_remote)
+        self.transport = transport
+        print(f"[EventBus] Transporte {type(transport).__name__} iniciado (node {self.node_id})")
+
+    async def stop_transport(self) -> None:
+        if self.transport is not None:
+            await self.transport.stop()
+            self.transport = None
+
+    async def drain(self) -> None:
+        """Espera até todas as filas deste loop estarem vazias (testes/shutdown)."""
+        for subscriptions in list(self._subscribers.values()):
+            for subscription in list(subscriptions):
+                await subscription.drain()
+
+    async def close(self) -> None:
+        await self.stop_transport()
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+    def metrics(self) -> dict:
+        """Contadores do bus e de cada subscriber (profundidade, descartes, latência)."""
+        return {
+            "node_id": self.node_id,
+            "transport": type(self.transport).__name__ if self.transport is not None else None,
+            "transport_stats": dict(getattr(self.transport, "stats", {})),
+            **{key: value for key, value in self.stats.items()},
+            "subscribers": [s.snapshot() for subs in self._subscribers.values() for s in subs],
+        }
 
 
 # Singleton global
@@ -0,0 +1,139 @@
+"""
+Paginação por cursor (keyset).
+
+Em vez de OFFSET (que obriga a BD a ler e descartar todas as linhas
+anteriores), cada página continua a partir dos valores das colunas de
+ordenação da última linha da página anterior:
+
+    WHERE (created_at, id) < (:ultimo_created_at, :ultimo_id)
+    ORDER BY created_at DESC, id DESC LIMIT :limit + 1
+
+O cursor devolvido ao cliente é opaco (JSON em base64url). As colunas de
+ordenação devem estar indexadas e terminar numa coluna única (id). Uma
+coluna que aceita NULL indica `null_as`: ordena-se por coalesce(coluna,
+null_as) (índice sobre a mesma expressão), senão as linhas com NULL nunca
+passariam o filtro do cursor.
+
+Uso:
+    keyset = Keyset(KeysetColumn(Lead.created_at, descending=True), KeysetColumn(Lead.id, descending=True))
+    rows = db.execute(keyset.apply(select(Lead), cursor, limit)).scalars().all()
+    rows, next_cursor = keyset.page(rows, limit)
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, literal_column, or_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Valor de ordenação das datas NULL (ficam depois de todas numa ordem DESC)
+NULL_DATETIME = datetime(1970, 1, 1)
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Valores do cursor (HTTP 400 se estiver corrompido ou não for desta listagem)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("tamanho")
+        return [_decode_value(v) for v in values]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+
+
+def sql_literal(value: Any) -> str:
+    """Constante SQL de `value` (igual à usada nos índices sobre coalesce)."""
+    if isinstance(value, datetime):
+        return f"'{value.isoformat(' ', 'microseconds')}'"
+    if isinstance(value, date):
+        return f"'{value.isoformat()}'"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+class KeysetColumn:
+    """
+    Coluna de ordenação. `name` é o atributo/label lido da última linha da
+    página. Colunas que aceitam NULL precisam de `null_as` (valor usado no
+    lugar de NULL, na ordenação e no cursor).
+    """
+
+    def __init__(self, expr, descending: bool = False, name: Optional[str] = None, null_as: Any = None):
+        self.name = name or expr.key
+        self.descending = descending
+        self.null_as = null_as
+        if null_as is not None:
+            expr = func.coalesce(expr, literal_column(sql_literal(null_as)))
+        self.expr = expr
+
+    def value_of(self, row) -> Any:
+        if hasattr(row, "_mapping") and self.name in row._mapping:
+            value = row._mapping[self.name]
+        else:
+            value = getattr(row, self.name)
+        return self.null_as if value is None else value
+
+
+class Keyset:
+    """Ordenação + filtro "depois do cursor" para select() ou Query."""
+
+    def __init__(self, *columns: KeysetColumn):
+        self.columns = columns
+
+    def order_by(self) -> list:
+        return [c.expr.desc() if c.descending else c.expr.asc() for c in self.columns]
+
+    def after(self, values: Sequence[Any]):
+        """(c1 > v1) OR (c1 = v1 AND c2 > v2) OR ... respeitando a direção de cada coluna"""
+        clauses = []
+        for i, column in enumerate(self.columns):
+            equal = [self.columns[j].expr == values[j] for j in range(i)]
+            beyond = column.expr < values[i] if column.descending else column.expr > values[i]
+            clauses.append(and_(*equal, beyond))
+        return or_(*clauses)
+
+    def apply(self, query, cursor: Optional[str], limit: int):
+        """Aplica ordenação, cursor e LIMIT limit+1 (a linha extra indica se há mais)."""
+        if cursor:
+            query = query.where(self.after(decode_cursor(cursor, len(self.columns))))
+        return query.order_by(*self.order_by()).limit(limit + 1)
+
+    def page(self, rows: Sequence, limit: int) -> Tuple[list, Optional[str]]:
+        """(linhas da página, cursor da próxima página ou None)"""
+        rows = list(rows)
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor([c.value_of(rows[-1]) for c in self.columns])
@@ -0,0 +1,98 @@
+"""
+Respostas JSON rápidas para listagens grandes (opt-in por endpoint).
+
+O caminho normal do FastAPI valida cada objeto contra o response_model,
+passa o resultado por jsonable_encoder (recursivo, em Python) e só depois
+codifica com o json da stdlib. Nas listagens quentes isso é a maior parte
+do CPU do pedido. Aqui:
+
+    serializer = RowSerializer(schemas.PropertyOut)
+    items = serializer.many(properties, images=watermark)   # ORM -> dicts, sem validação
+    return FastJSONResponse(items, headers=...)             # orjson, sem jsonable_encoder
+
+O response_model do endpoint mantém-se (documentação OpenAPI); ao devolver
+uma Response o FastAPI não volta a validar. RowSerializer só serve schemas
+planos (campos que são atributos/colunas do modelo, sem modelos aninhados).
+
+Sem orjson instalado, FastJSONResponse usa o json da stdlib (mesmo output,
+mais lento).
+"""
+import enum
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from operator import attrgetter
+from typing import Any, Callable, Iterable, List
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    print("[Responses] ⚠️ orjson não instalado, a usar json da stdlib. Executar: pip install orjson")
+
+
+def _default(value: Any) -> Any:
+    """Tipos que o orjson/json não serializam nativamente (como o jsonable_encoder)."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+if ORJSON_AVAILABLE:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse codificada com orjson (conteúdo já em tipos simples/datetime/enum)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RowSerializer:
+    """
+    ORM -> dict com os campos de um schema Pydantic plano, sem validar.
+
+    Os getters são preparados uma vez (attrgetter de todos os campos). Enums,
+    datetime e Decimal ficam como estão: quem os codifica é o dumps() (mesmo
+    formato do response_model).
+    """
+
+    def __init__(self, schema: type, exclude: Iterable[str] = ()):
+        excluded = set(exclude)
+        self.fields: List[str] = [name for name in schema.model_fields if name not in excluded]
+        self._getter = attrgetter(*self.fields)
+
+    def one(self, obj: Any, **overrides: Callable[[Any], Any]) -> dict:
+        """`overrides`: campo -> função aplicada ao valor (p.ex. images=watermark)."""
+        values = self._getter(obj)
+        if len(self.fields) == 1:
+            values = (values,)
+        row = dict(zip(self.fields, values))
+        for name, transform in overrides.items():
+            row[name] = transform(row[name])
+        return row
+
+    def many(self, objs: Iterable[Any], **overrides: Callable[[Any], Any]) -> List[dict]:
+        return [self.one(obj, **overrides) for obj in objs]
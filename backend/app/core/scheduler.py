@@ -1,102 +1,537 @@
 """
-Background Scheduler para Visit Reminders
-Verifica a cada minuto se há visitas começando em 30min e envia notificação WebSocket
+Scheduler de lembretes de visitas e tarefas (todos os tenants).
+
+Em vez de consultar as tabelas a cada minuto, carrega numa passagem os
+lembretes das próximas REMINDER_HORIZON_HOURS horas de todos os schemas
+tenant_* (uma query por tenant, servida pelos índices parciais
+ix_visits_reminder_due / ix_tasks_reminder_due, todas numa única conexão
+do engine default via database.scan_schemas, sem tocar no LRU de pools)
+para um heap em memória ordenado pela hora de disparo, e dorme exatamente
+até ao próximo.
+
+- Escritas em Visit/Task (ORM) publicam após commit os ids alterados no
+  EventBus (reminder_changes); com o transporte LISTEN/NOTIFY chegam também
+  à réplica líder, que atualiza o heap só para esses ids. SQL raw fica
+  coberto pela recarga completa a cada REMINDER_REFRESH_INTERVAL segundos.
+- São carregados também lembretes atrasados (evento há menos que a
+  antecedência), para que um disparo tardio ainda seja enviado.
+- No disparo os registos são relidos em lote (visitas com a propriedade
+  num único JOIN), validados (estado, data) e marcados reminder_sent num
+  UPDATE em massa (RETURNING); só os ids efetivamente marcados são
+  publicados no EventBus (visit_reminder / task_reminder → WebSocket).
+- PostgreSQL: só a réplica que detém o advisory lock REMINDER_LOCK_KEY
+  dispara; as restantes tentam obtê-lo a cada REMINDER_LEADER_RETRY segundos.
+
+Configuração via ENV:
+    REMINDER_SCHEDULER_ENABLED  "false" para desligar (default: true)
+    REMINDER_HORIZON_HOURS      horas carregadas em memória (default: 6)
+    VISIT_REMINDER_MINUTES      antecedência do lembrete de visita (default: 30)
+    TASK_REMINDER_MINUTES       antecedência do lembrete de tarefa (default: 60)
+    REMINDER_REFRESH_INTERVAL   segundos entre recargas completas (default: 900)
+    REMINDER_LEADER_RETRY       segundos entre tentativas de obter o lock (default: 30)
+    REMINDER_LOCK_KEY           chave do pg advisory lock (default: 7311001)
 """
 import asyncio
-import logging
+import heapq
+import itertools
+import os
+import threading
+from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, literal, select, union_all, update
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.database import SessionLocal
-from app.models.visit import Visit
-from app.properties.models import Property
+from app.calendar.models import Task
+from app.calendar.services import get_tasks_for_reminders, task_reminder_conditions
 from app.core.events import event_bus
+from app.database import (
+    DATABASE_URL,
+    DEFAULT_SCHEMA,
+    engine,
+    get_tenant_schema,
+    list_tenant_schemas,
+    scan_schemas,
+    tenant_session,
+)
+from app.models.visit import Visit, VisitStatus
+from app.properties.models import Property
+
+REMINDER_SCHEDULER_ENABLED = os.getenv("REMINDER_SCHEDULER_ENABLED", "true").lower() not in ("0", "false", "no")
+REMINDER_HORIZON_HOURS = float(os.getenv("REMINDER_HORIZON_HOURS", "6"))
+VISIT_REMINDER_MINUTES = float(os.getenv("VISIT_REMINDER_MINUTES", "30"))
+TASK_REMINDER_MINUTES = float(os.getenv("TASK_REMINDER_MINUTES", "60"))
+REMINDER_REFRESH_INTERVAL = float(os.getenv("REMINDER_REFRESH_INTERVAL", "900"))
+REMINDER_LEADER_RETRY = float(os.getenv("REMINDER_LEADER_RETRY", "30"))
+REMINDER_LOCK_KEY = int(os.getenv("REMINDER_LOCK_KEY", "7311001"))
+
+IS_POSTGRES = bool(DATABASE_URL)
+
+VISIT_REMINDER_STATUSES = (VisitStatus.SCHEDULED.value, VisitStatus.CONFIRMED.value)
+
+# (schema, "visit" | "task", id)
+ReminderKey = Tuple[Optional[str], str, int]
+
+LEAD_TIMES = {
+    "visit": timedelta(minutes=VISIT_REMINDER_MINUTES),
+    "task": timedelta(minutes=TASK_REMINDER_MINUTES),
+}
+
+# Evento do EventBus com os ids alterados; ids por evento (limite do NOTIFY)
+CHANGES_EVENT = "reminder_changes"
+CHANGES_PER_EVENT = 200
 
-logger = logging.getLogger(__name__)
 
+def _schema_key(schema: Optional[str]) -> Optional[str]:
+    return None if schema in (None, DEFAULT_SCHEMA) else schema
 
-async def check_upcoming_visits():
+
+def fire_time(kind: str, due: datetime, now: datetime) -> datetime:
+    """Hora de disparo: `due` menos a antecedência (já, se estiver atrasado)."""
+    return max(due - LEAD_TIMES[kind], now)
+
+
+def late_since(kind: str, now: datetime) -> datetime:
+    """Limite inferior dos lembretes pendentes: eventos até `antecedência` no passado ainda disparam."""
+    return now - LEAD_TIMES[kind]
+
+
+class ReminderQueue:
     """
-    Verifica visitas que começam em 30 minutos
-    Envia evento visit_reminder via EventBus → WebSocket
+    Heap (hora de disparo, seq, chave) com remoção preguiçosa: reagendar ou
+    cancelar só atualiza o dicionário; entradas obsoletas são descartadas
+    quando chegam ao topo.
     """
-    db: Session = SessionLocal()
-    
-    try:
-        # Janela: visitas entre 29min e 31min no futuro
-        now = datetime.utcnow()
-        window_start = now + timedelta(minutes=29)
-        window_end = now + timedelta(minutes=31)
-        
-        # Buscar visitas nessa janela (não canceladas)
-        upcoming_visits = db.query(Visit).filter(
-            Visit.scheduled_date >= window_start,
-            Visit.scheduled_date <= window_end,
-            Visit.status != "cancelled"
-        ).all()
-        
-        if not upcoming_visits:
-            logger.debug(f"Nenhuma visita em 30min (checked at {now.strftime('%H:%M')})")
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, ReminderKey]] = []
+        self._due: Dict[ReminderKey, datetime] = {}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key: ReminderKey) -> bool:
+        return key in self._due
+
+    def schedule(self, key: ReminderKey, at: datetime) -> None:
+        if self._due.get(key) == at:
             return
-        
-        logger.info(f"Encontradas {len(upcoming_visits)} visitas em 30min")
-        
-        # Enviar reminder para cada visita
-        for visit in upcoming_visits:
-            # Buscar property para ter morada
-            property = db.query(Property).filter(Property.id == visit.property_id).first()
-            
-            # Agent ID do agente responsável
-            agent_id = visit.agent_id
-            
-            if not agent_id:
-                logger.warning(f"Visit {visit.id} sem agent_id, skip reminder")
-                continue
-            
-            # Preparar dados do reminder
-            reminder_data = {
-                "visit_id": visit.id,
-                "property_id": visit.property_id,
-                "property_address": property.address if property else "Morada não disponível",
-                "property_reference": property.reference if property else None,
-                "scheduled_at": visit.scheduled_at.isoformat(),
-                "lead_id": visit.lead_id,
-                "minutes_until": 30
-            }
-            
-            # Publicar evento (ConnectionManager vai receber e enviar WebSocket)
-            await event_bus.publish("visit_reminder", reminder_data, agent_id=agent_id)
-            
-            logger.info(f"Reminder enviado para agent {agent_id} (visit {visit.id})")
-    
-    except Exception as e:
-        logger.error(f"Erro ao verificar upcoming visits: {str(e)}", exc_info=True)
-    
+        self._due[key] = at
+        heapq.heappush(self._heap, (at, next(self._seq), key))
+
+    def cancel(self, key: ReminderKey) -> None:
+        self._due.pop(key, None)
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._due.clear()
+
+    def _drop_stale(self) -> None:
+        while self._heap:
+            at, _seq, key = self._heap[0]
+            if self._due.get(key) == at:
+                return
+            heapq.heappop(self._heap)
+
+    def next_at(self) -> Optional[datetime]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[ReminderKey]:
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _at, _seq, key = heapq.heappop(self._heap)
+            del self._due[key]
+            due.append(key)
+            self._drop_stale()
+        return due
+
+
+# =====================================================
+# ACESSO À BD (threadpool)
+# =====================================================
+
+def _visit_conditions(since: datetime, until: datetime) -> list:
+    """Visitas com lembrete pendente e data em ]since, until] (índice ix_visits_reminder_due)."""
+    return [
+        Visit.reminder_sent == False,  # noqa: E712
+        Visit.scheduled_date > since,
+        Visit.scheduled_date <= until,
+        Visit.status.in_(VISIT_REMINDER_STATUSES),
+    ]
+
+
+def _pending_statement(now: datetime, until: datetime, visit_ids=None, task_ids=None):
+    """UNION ALL (kind, id, due) de visitas e tarefas com lembrete pendente."""
+    visits = select(literal("visit").label("kind"), Visit.id, Visit.scheduled_date.label("due")).where(
+        *_visit_conditions(late_since("visit", now), until)
+    )
+    tasks = select(literal("task").label("kind"), Task.id, Task.due_date.label("due")).where(
+        *task_reminder_conditions(late_since("task", now), until)
+    )
+    if visit_ids is not None:
+        visits = visits.where(Visit.id.in_(visit_ids or [-1]))
+    if task_ids is not None:
+        tasks = tasks.where(Task.id.in_(task_ids or [-1]))
+    return union_all(visits, tasks)
+
+
+def load_pending(schema: Optional[str], now: datetime, until: datetime, visit_ids=None, task_ids=None) -> List[Tuple[str, int, datetime]]:
+    db = tenant_session(schema)
+    try:
+        return [(row.kind, row.id, row.due) for row in db.execute(_pending_statement(now, until, visit_ids, task_ids))]
     finally:
         db.close()
 
 
-async def start_visit_reminder_scheduler():
+def _visit_payloads(db: Session, schema: Optional[str], ids: List[int], now: datetime, until: datetime):
+    rows = db.execute(
+        select(Visit, Property.reference, Property.title, Property.location, Property.municipality)
+        .outerjoin(Property, Property.id == Visit.property_id)
+        .where(Visit.id.in_(ids), *_visit_conditions(late_since("visit", now), until))
+    ).all()
+    payloads, later = [], []
+    for visit, reference, title, location, municipality in rows:
+        at = fire_time("visit", visit.scheduled_date, now)
+        if at > now:
+            later.append(((schema, "visit", visit.id), at))
+            continue
+        address = ", ".join(part for part in (location, municipality) if part) or title or "Morada não disponível"
+        payloads.append(("visit_reminder", visit.id, visit.agent_id, {
+            "visit_id": visit.id,
+            "property_id": visit.property_id,
+            "property_address": address,
+            "property_reference": reference,
+            "scheduled_at": visit.scheduled_date.isoformat(),
+            "lead_id": visit.lead_id,
+            "minutes_until": max(0, round((visit.scheduled_date - now).total_seconds() / 60)),
+            "tenant_schema": schema,
+        }))
+    return payloads, later
+
+
+def _task_payloads(db: Session, schema: Optional[str], ids: List[int], now: datetime):
+    payloads, later = [], []
+    tasks = get_tasks_for_reminders(
+        db, hours_before=REMINDER_HORIZON_HOURS, task_ids=ids, now=now, since=late_since("task", now)
+    )
+    for task in tasks:
+        at = fire_time("task", task.due_date, now)
+        if at > now:
+            later.append(((schema, "task", task.id), at))
+            continue
+        payloads.append(("task_reminder", task.id, task.assigned_agent_id, {
+            "task_id": task.id,
+            "title": task.title,
+            "task_type": task.task_type.value if task.task_type else None,
+            "due_date": task.due_date.isoformat(),
+            "lead_id": task.lead_id,
+            "property_id": task.property_id,
+            "minutes_until": max(0, round((task.due_date - now).total_seconds() / 60)),
+            "tenant_schema": schema,
+        }))
+    return payloads, later
+
+
+def claim_due(schema: Optional[str], kind: str, ids: List[int], now: datetime):
     """
-    Background task infinito que verifica upcoming visits a cada 1 minuto
-    
-    Chamado no startup do FastAPI (lifespan)
-    Cancelado no shutdown
+    Relê os lembretes vencidos de um tenant, marca reminder_sent (UPDATE em
+    massa, sem eventos do ORM) e devolve (payloads, reagendamentos).
+
+    Só são devolvidos os payloads cujo UPDATE marcou a linha: se outra réplica
+    (ou uma escrita concorrente) já o fez entre a leitura e o UPDATE, o
+    lembrete não é publicado duas vezes.
     """
-    logger.info("Visit reminder scheduler STARTED")
-    
-    while True:
+    db = tenant_session(schema)
+    try:
+        until = now + timedelta(hours=REMINDER_HORIZON_HOURS)
+        if kind == "visit":
+            payloads, later = _visit_payloads(db, schema, ids, now, until)
+            model = Visit
+        else:
+            payloads, later = _task_payloads(db, schema, ids, now)
+            model = Task
+        if payloads:
+            claimed = set(db.execute(
+                update(model)
+                .where(model.id.in_([p[1] for p in payloads]), model.reminder_sent == False)  # noqa: E712
+                .values(reminder_sent=True)
+                .returning(model.id)
+                .execution_options(synchronize_session=False)
+            ).scalars())
+            db.commit()
+            if len(claimed) < len(payloads):
+                print(f"[Reminders] {len(payloads) - len(claimed)} {kind}(s) em {schema} já marcados noutra réplica")
+                payloads = [p for p in payloads if p[1] in claimed]
+        return payloads, later
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# =====================================================
+# SCHEDULER
+# =====================================================
+
+class ReminderScheduler:
+    """Heap de lembretes de todos os tenants, disparado no event loop da app."""
+
+    def __init__(self, horizon_hours: float = REMINDER_HORIZON_HOURS, refresh_interval: float = REMINDER_REFRESH_INTERVAL):
+        self.horizon = timedelta(hours=horizon_hours)
+        self.refresh_interval = refresh_interval
+        self.queue = ReminderQueue()
+        self.stats = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._changes: Dict[Optional[str], set] = defaultdict(set)
+        self._changes_lock = threading.Lock()
+        self._lock_conn = None
+        self._loaded_at: Optional[datetime] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def is_leader(self) -> bool:
+        return not IS_POSTGRES or self._lock_conn is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        event_bus.subscribe(CHANGES_EVENT, self._on_changes_event)
+        self._task = self._loop.create_task(self._run())
+        print(f"[Reminders] Iniciado (horizonte {self.horizon}, recarga {self.refresh_interval}s)")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        event_bus.unsubscribe(CHANGES_EVENT, self._on_changes_event)
+        self._task.cancel()
         try:
-            await check_upcoming_visits()
-            
-            # Esperar 1 minuto antes da próxima verificação
-            await asyncio.sleep(60)
-        
+            await self._task
         except asyncio.CancelledError:
-            logger.info("Visit reminder scheduler CANCELLED")
-            break
-        
+            pass
+        self._task = None
+        await run_in_threadpool(self._release_leadership)
+        print("[Reminders] Parado")
+
+    # --- liderança (pg advisory lock de sessão numa conexão dedicada) ---
+
+    def _acquire_leadership(self) -> bool:
+        if self.is_leader:
+            return True
+        conn = engine.connect()
+        try:
+            if conn.exec_driver_sql(f"SELECT pg_try_advisory_lock({REMINDER_LOCK_KEY})").scalar():
+                conn.commit()
+                self._lock_conn = conn
+                print("[Reminders] Advisory lock obtido: esta réplica dispara os lembretes")
+                return True
+        except Exception as e:
+            print(f"[Reminders] Erro ao obter advisory lock: {e}")
+        conn.close()
+        return False
+
+    def _leadership_alive(self) -> bool:
+        if not IS_POSTGRES or self._lock_conn is None:
+            return self.is_leader
+        try:
+            self._lock_conn.exec_driver_sql("SELECT 1").scalar()
+            self._lock_conn.commit()
+            return True
         except Exception as e:
-            logger.error(f"Erro no scheduler loop: {str(e)}", exc_info=True)
-            # Continuar mesmo com erro (não crashar o scheduler)
-            await asyncio.sleep(60)
+            print(f"[Reminders] Conexão do advisory lock perdida: {e}")
+            self._release_leadership()
+            return False
+
+    def _release_leadership(self) -> None:
+        if self._lock_conn is None:
+            return
+        try:
+            self._lock_conn.exec_driver_sql(f"SELECT pg_advisory_unlock({REMINDER_LOCK_KEY})")
+            self._lock_conn.commit()
+        except Exception:
+            pass
+        try:
+            self._lock_conn.close()
+        except Exception:
+            pass
+        self._lock_conn = None
+
+    # --- carregamento ---
+
+    async def refresh(self, now: Optional[datetime] = None) -> int:
+        """Recarga completa (todos os tenants) do horizonte; devolve nº de lembretes."""
+        now = now or datetime.utcnow()
+        until = now + self.horizon
+        schemas = await run_in_threadpool(list_tenant_schemas, "visits")
+        pending = await run_in_threadpool(
+            scan_schemas, schemas, lambda db, schema: db.execute(_pending_statement(now, until)).all(), None, "Reminders"
+        )
+        loaded: List[Tuple[ReminderKey, datetime]] = []
+        for schema, rows in pending.items():
+            loaded.extend(((_schema_key(schema), row.kind, row.id), fire_time(row.kind, row.due, now)) for row in rows)
+        self.queue.clear()
+        for key, at in loaded:
+            self.queue.schedule(key, at)
+        self._loaded_at = now
+        self.stats["refreshes"] += 1
+        return len(loaded)
+
+    def notify_changes(self, schema: Optional[str], changes: Iterable[Tuple[str, int]]) -> None:
+        """
+        Publica no EventBus as visitas/tarefas alteradas (chamado após commit,
+        de qualquer thread). O transporte entrega-as também às outras réplicas,
+        incluindo a líder; este processo recebe-as pela sua subscrição.
+        """
+        if not self.running:
+            return
+        changes = sorted(changes)
+        for start in range(0, len(changes), CHANGES_PER_EVENT):
+            data = {"changes": changes[start:start + CHANGES_PER_EVENT]}
+            asyncio.run_coroutine_threadsafe(
+                event_bus.publish(CHANGES_EVENT, data, tenant_schema=_schema_key(schema)), self._loop
+            )
+
+    def _on_changes_event(self, event) -> None:
+        """Subscrição de reminder_changes (local e remota): acorda o loop para aplicar."""
+        with self._changes_lock:
+            self._changes[_schema_key(event.tenant_schema)].update(
+                (kind, obj_id) for kind, obj_id in event.data.get("changes", ())
+            )
+        if self._wake is not None:
+            self._wake.set()
+
+    async def apply_changes(self, now: Optional[datetime] = None) -> int:
+        """Relê só os ids alterados e reagenda/cancela as respetivas entradas."""
+        with self._changes_lock:
+            pending, self._changes = self._changes, defaultdict(set)
+        now = now or datetime.utcnow()
+        applied = 0
+        for schema, changes in pending.items():
+            visit_ids = sorted(obj_id for kind, obj_id in changes if kind == "visit")
+            task_ids = sorted(obj_id for kind, obj_id in changes if kind == "task")
+            try:
+                rows = await run_in_threadpool(load_pending, schema, now, now + self.horizon, visit_ids, task_ids)
+            except Exception as e:
+                print(f"[Reminders] Erro ao atualizar {schema}: {e}")
+                continue
+            for kind, obj_id in changes:
+                self.queue.cancel((schema, kind, obj_id))
+            for kind, obj_id, due in rows:
+                self.queue.schedule((schema, kind, obj_id), fire_time(kind, due, now))
+            applied += len(changes)
+        self.stats["changes"] += applied
+        return applied
+
+    # --- disparo ---
+
+    async def fire_due(self, now: Optional[datetime] = None) -> int:
+        """Publica os lembretes vencidos; devolve quantos foram enviados."""
+        now = now or datetime.utcnow()
+        groups: Dict[Tuple[Optional[str], str], List[int]] = defaultdict(list)
+        for schema, kind, obj_id in self.queue.pop_due(now):
+            groups[(schema, kind)].append(obj_id)
+
+        sent = 0
+        for (schema, kind), ids in groups.items():
+            try:
+                payloads, later = await run_in_threadpool(claim_due, schema, kind, ids, now)
+            except Exception as e:
+                print(f"[Reminders] Erro ao disparar {kind} em {schema}: {e}")
+                self.stats["errors"] += 1
+                continue
+            for key, at in later:
+                self.queue.schedule(key, at)
+            for event_type, _obj_id, agent_id, data in payloads:
+                if not agent_id:
+                    continue
+                await event_bus.publish(event_type, data, agent_id=agent_id, tenant_schema=schema)
+                sent += 1
+        self.stats["sent"] += sent
+        return sent
+
+    def _sleep_seconds(self, now: datetime) -> float:
+        if not self.is_leader:
+            return REMINDER_LEADER_RETRY
+        wake_at = self._loaded_at + timedelta(seconds=self.refresh_interval)
+        next_at = self.queue.next_at()
+        if next_at is not None and next_at < wake_at:
+            wake_at = next_at
+        return max(0.0, (wake_at - now).total_seconds())
+
+    async def run_once(self) -> None:
+        if not self.is_leader and not await run_in_threadpool(self._acquire_leadership):
+            with self._changes_lock:
+                self._changes.clear()
+            return
+        now = datetime.utcnow()
+        if self._loaded_at is None or (now - self._loaded_at).total_seconds() >= self.refresh_interval:
+            if not await run_in_threadpool(self._leadership_alive):
+                self.queue.clear()
+                self._loaded_at = None
+                return
+            await self.refresh(now)
+        await self.apply_changes(now)
+        await self.fire_due(now)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Reminders] Erro no loop: {e}")
+                self._loaded_at = None
+            timeout = self._sleep_seconds(datetime.utcnow()) if self._loaded_at else REMINDER_LEADER_RETRY
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+
+# Singleton global
+reminder_scheduler = ReminderScheduler()
+
+
+# --- Eventos do ORM: visitas/tarefas alteradas → atualizar o heap após commit ---
+
+_KINDS = {Visit: "visit", Task: "task"}
+
+
+def _mark(mapper, connection, target) -> None:
+    from sqlalchemy.orm import object_session
+
+    session = object_session(target)
+    kind = _KINDS.get(mapper.class_)
+    if session is not None and kind and target.id is not None:
+        session.info.setdefault("reminder_changes", set()).add((kind, target.id))
+
+
+for _model in _KINDS:
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _mark)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_reminder_changes(session: Session) -> None:
+    changes = session.info.pop("reminder_changes", None)
+    if changes:
+        reminder_scheduler.notify_changes(getattr(session, "tenant_schema", get_tenant_schema()), changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_reminder_changes(session: Session) -> None:
+    session.info.pop("reminder_changes", None)
@@ -14,6 +14,8 @@ from typing import Optional, BinaryIO
 import tempfile
 from pathlib import Path
 
+from starlette.concurrency import run_in_threadpool
+
 
 class StorageProvider(ABC):
     """Interface abstrata para storage providers"""
@@ -93,7 +95,10 @@ class CloudinaryStorage(StorageProvider):
         print(f"[Cloudinary] Uploading to public_id: {public_id}")
         
         try:
-            result = cloudinary.uploader.upload(
+            # SDK é síncrono (HTTP bloqueante): correr fora do event loop
+            # para permitir uploads de variantes em paralelo
+            result = await run_in_threadpool(
+                cloudinary.uploader.upload,
                 file,
                 public_id=public_id,
                 resource_type="auto",  # Detecta tipo automaticamente
@@ -0,0 +1,174 @@
+"""
+Configuração pública por tenant (registo do tenant, branding, terminologia).
+
+/public/branding, /api/v1/tenant/config e /tenant/config|terminology são
+chamados em cada page load do site público e do backoffice. Em vez de
+consultar a tabela tenants (e, no branding, criar um engine novo para ler
+crm_settings) a cada pedido, os payloads ficam em memória:
+
+    tenant = tenant_record(db, slug)           # dict do registo ou None
+    body, etag = public_branding(tenant)       # JSON já codificado + ETag
+    return conditional_response(request, body, etag)
+
+Partições da cache (TenantCache):
+    - pública (schema None): registos de tenants e configs derivadas só
+      deles, por slug;
+    - schema do tenant: branding de crm_settings, lido pelo pool do tenant.
+
+Invalidação:
+    - commits de CRMSettings (ORM) e o PUT /admin/settings/branding (SQL raw,
+      via touch_on_commit) invalidam o schema do tenant (topic "crm_settings");
+    - commits de Tenant (platform: update/activate/provisioning) limpam a
+      cache toda (topic "tenants"; edições raras).
+Noutros workers a cache só expira pelo TTL.
+
+O ETag é o hash do corpo JSON: é estável entre workers e reinícios, por isso
+o cliente pode revalidar indefinidamente e só recebe o corpo quando muda.
+
+Configuração via ENV:
+    TENANT_CONFIG_CACHE_TTL   segundos em memória por entrada (default: 300)
+    TENANT_CONFIG_MAX_AGE     max-age do Cache-Control (default: 60)
+"""
+import hashlib
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.cache import TenantCache, etag_matches, on_topic_change, track_model_changes
+from app.core.responses import dumps
+from app.database import tenant_session
+from app.models.crm_settings import CRMSettings
+from app.platform.models import Tenant
+
+TENANT_CONFIG_CACHE_TTL = float(os.getenv("TENANT_CONFIG_CACHE_TTL", "300"))
+TENANT_CONFIG_MAX_AGE = int(os.getenv("TENANT_CONFIG_MAX_AGE", "60"))
+
+tenant_config_cache = TenantCache("tenant_config", ttl=TENANT_CONFIG_CACHE_TTL, topics=("crm_settings",))
+track_model_changes(CRMSettings, "crm_settings")
+track_model_changes(Tenant, "tenants")
+
+
+def _on_tenants_change(topic: str, schema: Optional[str]) -> None:
+    if topic == "tenants":
+        tenant_config_cache.clear()
+
+
+on_topic_change(_on_tenants_change)
+
+# Defaults do tema escuro (CRM Plus)
+DEFAULT_BRANDING = {
+    "agency_name": "CRM Plus",
+    "agency_slogan": "O seu negócio, simplificado",
+    "agency_logo_url": None,
+    "primary_color": "#E10600",
+    "secondary_color": "#C5C5C5",
+    "background_color": "#0B0B0D",
+    "background_secondary": "#1A1A1F",
+    "text_color": "#FFFFFF",
+    "text_muted": "#9CA3AF",
+    "border_color": "#2A2A2E",
+    "accent_color": "#E10600",
+    "sector": "real_estate",
+}
+
+_BRANDING_COLUMNS = [name for name in DEFAULT_BRANDING if name != "sector"]
+
+_NOT_FOUND: Dict[str, Any] = {}
+
+
+def encode_payload(payload: Any) -> Tuple[bytes, str]:
+    """(corpo JSON, ETag = hash do corpo)"""
+    body = dumps(payload)
+    return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+def conditional_response(request: Request, body: bytes, etag: str) -> Response:
+    """200 com o corpo ou 304 se o If-None-Match já tem este ETag."""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={TENANT_CONFIG_MAX_AGE}",
+        "Vary": "Host, X-Tenant-Slug",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# =====================================================
+# REGISTO DO TENANT (partição pública)
+# =====================================================
+
+def _as_dict(tenant: Tenant) -> Dict[str, Any]:
+    return {
+        "id": tenant.id,
+        "slug": tenant.slug,
+        "name": tenant.name,
+        "sector": tenant.sector,
+        "plan": tenant.plan,
+        "primary_color": tenant.primary_color,
+        "secondary_color": tenant.secondary_color,
+        "logo_url": tenant.logo_url,
+        "features": tenant.features,
+        "max_agents": tenant.max_agents,
+        "max_properties": tenant.max_properties,
+        "schema_name": tenant.schema_name,
+        "is_active": tenant.is_active,
+    }
+
+
+def tenant_record(db: Session, slug: str) -> Optional[Dict[str, Any]]:
+    """Registo do tenant com este slug (dict), ou None. Slugs inexistentes também ficam em cache."""
+    def load():
+        tenant = db.query(Tenant).filter(Tenant.slug == slug).first()
+        return _as_dict(tenant) if tenant else _NOT_FOUND
+
+    return tenant_config_cache.get_or_set(("tenant", slug), load, None) or None
+
+
+def default_tenant_record(db: Session) -> Optional[Dict[str, Any]]:
+    """Primeiro tenant ativo (fallback quando o pedido não identifica o tenant)."""
+    def load():
+        tenant = db.query(Tenant).filter(Tenant.is_active == True).first()
+        return _as_dict(tenant) if tenant else _NOT_FOUND
+
+    return tenant_config_cache.get_or_set(("default_tenant",), load, None) or None
+
+
+def cached_payload(key: Tuple, build, schema: Optional[str] = None) -> Tuple[bytes, str]:
+    """(corpo, ETag) em cache para um payload derivado (build() devolve o dict)."""
+    return tenant_config_cache.get_or_set(key, lambda: encode_payload(build()), schema)
+
+
+# =====================================================
+# BRANDING (partição do schema do tenant)
+# =====================================================
+
+def _load_branding(tenant: Dict[str, Any]) -> Optional[Tuple[bytes, str]]:
+    schema = tenant["schema_name"]
+    sector = tenant["sector"] or DEFAULT_BRANDING["sector"]
+    try:
+        with tenant_session(schema) as session:
+            row = session.execute(
+                text(f"SELECT {', '.join(_BRANDING_COLUMNS)} FROM crm_settings LIMIT 1")
+            ).mappings().first()
+    except Exception as e:
+        # Não fica em cache: o próximo pedido volta a tentar
+        print(f"[BRANDING] Error fetching settings for {schema}: {e}")
+        return None
+
+    if not row:
+        print(f"[BRANDING] No CRMSettings in schema {schema}, returning defaults")
+        return encode_payload({**DEFAULT_BRANDING, "sector": sector})
+
+    payload = {name: row[name] or DEFAULT_BRANDING[name] for name in _BRANDING_COLUMNS}
+    payload["sector"] = sector
+    return encode_payload(payload)
+
+
+def public_branding(tenant: Dict[str, Any]) -> Tuple[bytes, str]:
+    """(corpo, ETag) do branding público do tenant, lido de crm_settings uma vez por versão."""
+    entry = tenant_config_cache.get_or_set("branding", lambda: _load_branding(tenant), tenant["schema_name"])
+    return entry or encode_payload({**DEFAULT_BRANDING, "sector": tenant["sector"] or DEFAULT_BRANDING["sector"]})
@@ -0,0 +1,186 @@
+def test_tenant_engine_registry_keeps_engines_and_shrinks_idle_pools(tmp_path):
+    from sqlalchemy import create_engine, text
+    from app.database import TenantEngineRegistry
+
+    url = f"sqlite:///{tmp_path / 'pools.db'}"
+    default_engine = create_engine(url)
+    # Orçamento de 2 conexões abertas; o número de engines só é limitado por max_tenants
+    registry = TenantEngineRegistry(default_engine, url, max_tenants=3, max_connections=2)
+    for schema in ("tenant_a", "tenant_b", "tenant_c", "tenant_d"):
+        registry.set_plan(schema, "pro")
+
+    def use(schema):
+        with registry.get_engine(schema).connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    try:
+        engine_a = registry.get_engine("tenant_a")
+        use("tenant_a")
+        use("tenant_b")
+        pool_a = engine_a.pool
+        assert registry.stats()["connections"] == 2
+
+        # tenant_b tem uma conexão em uso: só o pool livre menos usado (tenant_a) encolhe
+        held = registry.get_engine("tenant_b").connect()
+        use("tenant_c")
+        stats = registry.stats()
+        assert list(stats["pools"]) == ["tenant_a", "tenant_b", "tenant_c"]
+        assert stats["connections"] == 2 and stats["max_connections"] == 2
+        assert registry.get_engine("tenant_a") is engine_a and engine_a.pool is not pool_a
+        held.close()
+
+        # Mais tenants do que max_tenants: o engine menos usado sai do registry
+        registry.get_engine("tenant_d")
+        assert list(registry.stats()["pools"]) == ["tenant_c", "tenant_a", "tenant_d"]
+
+        # Plano maior que o orçamento: o pool é reduzido ao orçamento
+        registry.max_connections = 6
+        registry.set_plan("tenant_e", "enterprise")
+        engine_e = registry.get_engine("tenant_e")
+        assert engine_e.pool.size() + engine_e.pool._max_overflow == 6
+
+        assert registry.get_engine(None) is default_engine
+        assert registry.get_engine("public") is default_engine
+    finally:
+        registry.dispose()
+        default_engine.dispose()
+
+
+def test_reminders_fire_late_entries_claim_once_and_follow_bus_changes(isolated_db, monkeypatch):
+    import asyncio
+    from datetime import datetime, timedelta
+    from sqlalchemy import update
+    from sqlalchemy.orm import Session
+    from app.calendar.models import Task
+    from app.core import scheduler
+    from app.models.visit import Visit
+
+    db = isolated_db
+    monkeypatch.setattr(scheduler, "tenant_session", lambda schema=None: Session(bind=db.get_bind()))
+    now = datetime.utcnow()
+    # Já passaram a hora do evento, mas ainda dentro da antecedência: o lembrete ainda dispara
+    late = Visit(property_id=1, agent_id=1, scheduled_date=now - timedelta(minutes=5), status="scheduled")
+    raced = Visit(property_id=1, agent_id=2, scheduled_date=now + timedelta(minutes=10), status="scheduled")
+    gone = Visit(property_id=1, agent_id=1, scheduled_date=now - timedelta(hours=2), status="scheduled")
+    task = Task(title="Ligar", assigned_agent_id=1, due_date=now - timedelta(minutes=5))
+    db.add_all([late, raced, gone, task])
+    db.commit()
+
+    pending = scheduler.load_pending(None, now, now + timedelta(hours=6))
+    assert sorted(pending) == sorted([("visit", late.id, late.scheduled_date), ("visit", raced.id, raced.scheduled_date),
+                                      ("task", task.id, task.due_date)])
+
+    # Outra réplica marca `raced` entre a leitura e o UPDATE: só `late` é publicado
+    read_payloads = scheduler._visit_payloads
+
+    def racing(session, schema, ids, at, until):
+        result = read_payloads(session, schema, ids, at, until)
+        session.execute(update(Visit).where(Visit.id == raced.id).values(reminder_sent=True))
+        return result
+
+    monkeypatch.setattr(scheduler, "_visit_payloads", racing)
+    payloads, later = scheduler.claim_due(None, "visit", [late.id, raced.id], now)
+    assert [p[1] for p in payloads] == [late.id] and later == []
+    payloads, _ = scheduler.claim_due(None, "task", [task.id], now)
+    assert [p[1] for p in payloads] == [task.id]
+
+    # Alterações chegam ao heap pelo EventBus (a mesma subscrição que recebe as das outras réplicas)
+    async def follow_changes():
+        reminders = scheduler.ReminderScheduler()
+        reminders.start()
+        try:
+            fresh = Visit(property_id=1, agent_id=1, scheduled_date=datetime.utcnow() + timedelta(hours=1), status="scheduled")
+            db.add(fresh)
+            db.commit()
+            reminders.notify_changes(None, {("visit", fresh.id)})
+            for _ in range(100):
+                if (None, "visit", fresh.id) in reminders.queue:
+                    break
+                await asyncio.sleep(0.01)
+            assert (None, "visit", fresh.id) in reminders.queue
+        finally:
+            await reminders.stop()
+
+    asyncio.run(follow_changes())
+
+
+def test_tenant_config_cache_matches_queries_revalidates_and_invalidates(isolated_db, monkeypatch):
+    """[user-025] Registos/branding em cache = leitura direta; 304 por ETag; commits invalidam."""
+    import json
+    from sqlalchemy import event
+    from starlette.requests import Request
+    from app.core import tenant_config
+    from app.database import TenantSession, current_tenant_schema
+    from app.models.crm_settings import CRMSettings
+    from app.platform.models import Tenant
+
+    db = isolated_db
+    bind = db.get_bind()
+    opened = []
+
+    def fake_tenant_session(schema):
+        opened.append(schema)
+        token = current_tenant_schema.set(schema)
+        try:
+            return TenantSession(bind=bind)
+        finally:
+            current_tenant_schema.reset(token)
+
+    monkeypatch.setattr(tenant_config, "tenant_session", fake_tenant_session)
+    tenant_config.tenant_config_cache.clear()
+    queries = []
+    event.listen(bind, "before_cursor_execute", lambda *args: queries.append(args[2]))
+
+    def request(etag=None):
+        headers = [(b"if-none-match", etag.encode())] if etag else []
+        return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": headers})
+
+    try:
+        db.add(Tenant(slug="acme", name="Acme", sector="automotive", plan="pro", schema_name="tenant_acme",
+                      features={"chat": True}, is_active=True))
+        settings = CRMSettings(agency_name="Acme Imóveis", primary_color="#123456", agency_slogan="")
+        db.add(settings)
+        db.commit()
+
+        # Registo: igual ao dict da query direta; segunda leitura e slugs inexistentes sem query
+        direct = tenant_config._as_dict(db.query(Tenant).filter(Tenant.slug == "acme").one())
+        assert tenant_config.tenant_record(db, "acme") == direct
+        assert tenant_config.tenant_record(db, "nao-existe") is None
+        queries.clear()
+        assert tenant_config.tenant_record(db, "acme") == direct
+        assert tenant_config.tenant_record(db, "nao-existe") is None
+        assert tenant_config.default_tenant_record(db)["slug"] == "acme"
+        assert tenant_config.default_tenant_record(db)["slug"] == "acme" and len(queries) == 1
+
+        # Branding: mesmo payload que o SELECT antigo (colunas vazias -> defaults), lido uma vez
+        body, etag = tenant_config.public_branding(direct)
+        defaults = tenant_config.DEFAULT_BRANDING
+        expected = {name: getattr(settings, name) or defaults[name] for name in tenant_config._BRANDING_COLUMNS}
+        assert json.loads(body) == dict(expected, sector="automotive")
+        assert expected["agency_slogan"] == defaults["agency_slogan"] and expected["primary_color"] == "#123456"
+        assert opened == ["tenant_acme"]
+        assert tenant_config.public_branding(direct) == (body, etag) and opened == ["tenant_acme"]
+
+        # ETag: 304 sem corpo na revalidação, 200 com outro ETag
+        fresh = tenant_config.conditional_response(request(), body, etag)
+        assert fresh.status_code == 200 and fresh.body == body and fresh.headers["etag"] == etag
+        revalidated = tenant_config.conditional_response(request(f'W/{etag}, "outro"'), body, etag)
+        assert revalidated.status_code == 304 and revalidated.body == b"" and revalidated.headers["etag"] == etag
+        assert tenant_config.conditional_response(request('"outro"'), body, etag).status_code == 200
+
+        # Commit de CRMSettings no schema do tenant invalida só esse branding
+        with fake_tenant_session("tenant_acme") as session:
+            session.get(CRMSettings, settings.id).agency_name = "Acme 2"
+            session.commit()
+        new_body, new_etag = tenant_config.public_branding(direct)
+        assert json.loads(new_body)["agency_name"] == "Acme 2" and new_etag != etag
+        assert opened == ["tenant_acme"] * 3
+        queries.clear()
+        assert tenant_config.tenant_record(db, "acme") == direct and not queries
+
+        # Commit de Tenant limpa a cache toda
+        db.query(Tenant).filter(Tenant.slug == "acme").one().plan = "enterprise"
+        db.commit()
+        assert tenant_config.tenant_record(db, "acme")["plan"] == "enterprise"
+    finally:
+        tenant_config.tenant_config_cache.clear()
@@ -1,102 +1,281 @@
 """
 WebSocket Connection Manager
 Gere conexões WebSocket para notificações real-time mobile
+
+Cada conexão tem uma fila de saída limitada e uma task escritora: enviar a
+um agente (ou a todos) só serializa a mensagem uma vez e coloca a mesma
+string na fila de cada conexão, sem esperar pelos sockets. Um telemóvel
+lento só atrasa (e, com a fila cheia, perde mensagens antigas de) a sua
+própria conexão.
+
+As conexões são indexadas por (tenant, agent_id): os ids de agente só são
+únicos dentro de cada schema. O reaper envia um heartbeat a cada
+WS_HEARTBEAT_INTERVAL segundos; contam como atividade as mensagens do
+cliente (p.ex. "ping") e cada heartbeat entregue ao socket. Conexões sem
+atividade há mais de WS_IDLE_TIMEOUT segundos (heartbeats presos na fila de
+um socket que não escoa) ou cujo envio falha/excede WS_SEND_TIMEOUT são
+fechadas, sem obrigar o cliente a enviar pings.
+
+Configuração via ENV:
+    WS_QUEUE_SIZE           mensagens pendentes por conexão (default: 256)
+    WS_SEND_TIMEOUT         segundos máximos por envio (default: 10)
+    WS_HEARTBEAT_INTERVAL   segundos entre heartbeats/verificações (default: 30)
+    WS_IDLE_TIMEOUT         segundos sem atividade (cliente ou heartbeat entregue) (default: 90)
 """
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List
+from fastapi import WebSocket
+from typing import Dict, Optional, Tuple
+from collections import defaultdict
 from datetime import datetime
+import asyncio
 import json
 import logging
+import os
+import time
 
 from app.core.events import Event, event_bus
+from app.database import DEFAULT_SCHEMA
 
 logger = logging.getLogger(__name__)
 
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "90"))
+
+# (schema do tenant ou None para public, agent_id)
+ConnectionKey = Tuple[Optional[str], int]
+
+
+def connection_key(agent_id: int, tenant_schema: Optional[str] = None) -> ConnectionKey:
+    return (None if tenant_schema in (None, DEFAULT_SCHEMA) else tenant_schema, agent_id)
+
+
+class HeartbeatFrame(str):
+    """Frame de heartbeat: entregá-lo ao socket conta como atividade da conexão."""
+
+
+def serialize(message: dict) -> str:
+    """Serializa uma vez; a mesma string é partilhada por todas as conexões."""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class Connection:
+    """Uma conexão WebSocket: fila de saída limitada + task escritora."""
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, key: ConnectionKey, max_queue: int):
+        self.manager = manager
+        self.websocket = websocket
+        self.key = key
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.last_seen = time.monotonic()
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    def touch(self) -> None:
+        """Conexão com sinal de vida (mensagem recebida ou heartbeat entregue)."""
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, frame: str) -> bool:
+        """Coloca um frame já serializado na fila (descarta o mais antigo se cheia)."""
+        if self.closed:
+            return False
+        dropped = False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.manager.stats["dropped"] += 1
+            dropped = True
+        self.queue.put_nowait(frame)
+        depth = self.queue.qsize()
+        if depth > self.manager.stats["max_queue_depth"]:
+            self.manager.stats["max_queue_depth"] = depth
+        return not dropped
+
+    def send(self, message: dict) -> bool:
+        return self.enqueue(serialize(message))
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                frame = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(frame), timeout=WS_SEND_TIMEOUT)
+                if isinstance(frame, HeartbeatFrame):
+                    self.touch()
+                self.sent += 1
+                self.manager.stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.manager.stats["send_errors"] += 1
+            logger.info(f"WebSocket {self.key} falhou no envio: {type(e).__name__} {e}")
+            await self.manager.close_connection(self, code=1011)
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
 
 class ConnectionManager:
     """
     Gere conexões WebSocket ativas
-    
+
     Cada agente pode ter múltiplas conexões (multi-device)
     Subscreve eventos do EventBus e envia via WebSocket
     """
-    
-    def __init__(self):
-        # agent_id -> List[WebSocket]
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        
+
+    def __init__(self, max_queue: int = WS_QUEUE_SIZE):
+        self.max_queue = max_queue
+        # (tenant, agent_id) -> {WebSocket: Connection}
+        self.active_connections: Dict[ConnectionKey, Dict[WebSocket, Connection]] = {}
+        self.stats = defaultdict(int)
+        self._reaper: Optional[asyncio.Task] = None
+
         # Registar handler no event bus
         event_bus.subscribe("new_lead", self._handle_new_lead)
         event_bus.subscribe("visit_scheduled", self._handle_visit_scheduled)
         event_bus.subscribe("visit_reminder", self._handle_visit_reminder)
-    
-    async def connect(self, websocket: WebSocket, agent_id: int):
-        """Aceita conexão WebSocket e adiciona ao pool do agente"""
+        event_bus.subscribe("task_reminder", self._handle_task_reminder)
+        event_bus.subscribe("image_job_progress", self._handle_image_job_progress)
+
+    async def connect(self, websocket: WebSocket, agent_id: int, tenant_schema: Optional[str] = None) -> Connection:
+        """Aceita conexão WebSocket e adiciona ao pool do agente (no tenant)"""
         await websocket.accept()
-        
-        if agent_id not in self.active_connections:
-            self.active_connections[agent_id] = []
-        
-        self.active_connections[agent_id].append(websocket)
-        logger.info(f"WebSocket conectado: agent_id={agent_id}, total={len(self.active_connections[agent_id])}")
-        
+
+        key = connection_key(agent_id, tenant_schema)
+        connection = Connection(self, websocket, key, self.max_queue)
+        self.active_connections.setdefault(key, {})[websocket] = connection
+        self.stats["connected_total"] += 1
+        self._ensure_reaper()
+        logger.info(f"WebSocket conectado: key={key}, total={len(self.active_connections[key])}")
+
         # Enviar mensagem de boas-vindas
-        await websocket.send_json({
+        connection.send({
             "type": "connected",
             "message": "WebSocket conectado com sucesso",
             "timestamp": datetime.utcnow().isoformat()
         })
-    
-    def disconnect(self, websocket: WebSocket, agent_id: int):
-        """Remove conexão do pool"""
-        if agent_id in self.active_connections:
-            try:
-                self.active_connections[agent_id].remove(websocket)
-                logger.info(f"WebSocket desconectado: agent_id={agent_id}")
-                
-                # Limpar lista vazia
-                if not self.active_connections[agent_id]:
-                    del self.active_connections[agent_id]
-            except ValueError:
-                pass
-    
-    async def send_to_agent(self, agent_id: int, message: dict):
+        return connection
+
+    def _remove(self, connection: Connection) -> bool:
+        connections = self.active_connections.get(connection.key)
+        if not connections or connections.get(connection.websocket) is not connection:
+            return False
+        del connections[connection.websocket]
+        if not connections:
+            del self.active_connections[connection.key]
+        self.stats["disconnected_total"] += 1
+        return True
+
+    def disconnect(self, websocket: WebSocket, agent_id: int, tenant_schema: Optional[str] = None):
+        """Remove conexão do pool (o cliente fechou)"""
+        connection = self.active_connections.get(connection_key(agent_id, tenant_schema), {}).get(websocket)
+        if connection is None:
+            return
+        self._remove(connection)
+        connection.closed = True
+        connection._writer.cancel()
+        logger.info(f"WebSocket desconectado: key={connection.key}")
+
+    async def close_connection(self, connection: Connection, code: int = 1000) -> None:
+        """Remove e fecha uma conexão (envio falhado ou inativa)"""
+        self._remove(connection)
+        await connection.close(code=code)
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.active_connections.values())
+
+    async def send_to_agent(self, agent_id: int, message: dict, tenant_schema: Optional[str] = None) -> int:
         """
         Envia mensagem para TODAS as conexões de um agente (multi-device)
-        
+
         Args:
             agent_id: ID do agente destinatário
-            message: Dict com dados (será convertido para JSON)
+            message: Dict com dados (serializado uma única vez)
+            tenant_schema: Tenant do agente
+
+        Returns:
+            Nº de conexões em cuja fila a mensagem foi colocada
         """
-        if agent_id not in self.active_connections:
-            logger.debug(f"Agente {agent_id} não tem conexões WebSocket ativas")
-            return
-        
-        # Enviar para todos os dispositivos do agente
-        dead_connections = []
-        
-        for websocket in self.active_connections[agent_id]:
+        connections = self.active_connections.get(connection_key(agent_id, tenant_schema))
+        if not connections:
+            logger.debug(f"Agente {agent_id} ({tenant_schema}) não tem conexões WebSocket ativas")
+            return 0
+        frame = serialize(message)
+        for connection in list(connections.values()):
+            connection.enqueue(frame)
+        self.stats["enqueued"] += len(connections)
+        return len(connections)
+
+    async def broadcast(self, message: dict, tenant_schema: Optional[str] = None) -> int:
+        """Envia mensagem para todos os agentes conectados (de um tenant, se indicado)"""
+        frame = serialize(message)
+        tenant = connection_key(0, tenant_schema)[0]
+        count = 0
+        for key, connections in list(self.active_connections.items()):
+            if tenant_schema is not None and key[0] != tenant:
+                continue
+            for connection in list(connections.values()):
+                connection.enqueue(frame)
+                count += 1
+        self.stats["enqueued"] += count
+        return count
+
+    # =====================================================
+    # HEARTBEAT / REAPER
+    # =====================================================
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.get_running_loop().create_task(self._reap_loop())
+
+    async def reap(self, now: Optional[float] = None) -> int:
+        """Fecha conexões inativas e envia heartbeat às restantes; devolve nº fechadas."""
+        now = time.monotonic() if now is None else now
+        heartbeat = HeartbeatFrame(serialize({"type": "heartbeat", "timestamp": datetime.utcnow().isoformat()}))
+        stale = []
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections.values()):
+                if now - connection.last_seen > WS_IDLE_TIMEOUT:
+                    stale.append(connection)
+                else:
+                    connection.enqueue(heartbeat)
+        for connection in stale:
+            await self.close_connection(connection, code=1001)
+        self.stats["reaped"] += len(stale)
+        return len(stale)
+
+    async def _reap_loop(self) -> None:
+        while self.active_connections:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
             try:
-                await websocket.send_json(message)
-            except WebSocketDisconnect:
-                dead_connections.append(websocket)
+                await self.reap()
             except Exception as e:
-                logger.error(f"Erro ao enviar WebSocket para agent {agent_id}: {str(e)}")
-                dead_connections.append(websocket)
-        
-        # Limpar conexões mortas
-        for ws in dead_connections:
-            self.disconnect(ws, agent_id)
-    
-    async def broadcast(self, message: dict):
-        """Envia mensagem para TODOS os agentes conectados"""
-        for agent_id in list(self.active_connections.keys()):
-            await self.send_to_agent(agent_id, message)
-    
+                logger.error(f"Erro no reaper WebSocket: {str(e)}")
+
+    def metrics(self) -> dict:
+        """Contadores: conexões, profundidade das filas, enviados, descartados"""
+        depths = [c.queue.qsize() for connections in self.active_connections.values() for c in connections.values()]
+        return {
+            "connections": len(depths),
+            "agents": len(self.active_connections),
+            "queued": sum(depths),
+            "deepest_queue": max(depths, default=0),
+            **dict(self.stats),
+        }
+
     # =====================================================
     # EVENT BUS HANDLERS
     # =====================================================
-    
+
     async def _handle_new_lead(self, event: Event):
         """
         Handler para evento new_lead
@@ -105,7 +284,7 @@ class ConnectionManager:
         if not event.agent_id:
             logger.warning("Evento new_lead sem agent_id")
             return
-        
+
         message = {
             "type": "new_lead",
             "title": "Novo Lead Recebido! 🎉",
@@ -114,10 +293,10 @@ class ConnectionManager:
             "timestamp": event.timestamp.isoformat(),
             "sound": "default"
         }
-        
-        await self.send_to_agent(event.agent_id, message)
+
+        await self.send_to_agent(event.agent_id, message, event.tenant_schema)
         logger.info(f"Notificação new_lead enviada para agent {event.agent_id}")
-    
+
     async def _handle_visit_scheduled(self, event: Event):
         """
         Handler para evento visit_scheduled
@@ -126,7 +305,7 @@ class ConnectionManager:
         if not event.agent_id:
             logger.warning("Evento visit_scheduled sem agent_id")
             return
-        
+
         message = {
             "type": "visit_scheduled",
             "title": "Visita Agendada 📅",
@@ -135,32 +314,69 @@ class ConnectionManager:
             "timestamp": event.timestamp.isoformat(),
             "sound": "default"
         }
-        
-        await self.send_to_agent(event.agent_id, message)
+
+        await self.send_to_agent(event.agent_id, message, event.tenant_schema)
         logger.info(f"Notificação visit_scheduled enviada para agent {event.agent_id}")
-    
+
     async def _handle_visit_reminder(self, event: Event):
         """
         Handler para evento visit_reminder
-        Lembrete 30min antes da visita
+        Lembrete antes da visita (VISIT_REMINDER_MINUTES, ver app/core/scheduler.py)
         """
         if not event.agent_id:
             logger.warning("Evento visit_reminder sem agent_id")
             return
-        
+
         message = {
             "type": "visit_reminder",
-            "title": "Lembrete: Visita em 30 minutos! ⏰",
+            "title": f"Lembrete: Visita em {event.data.get('minutes_until', 30)} minutos! ⏰",
             "body": event.data.get('property_address', 'Propriedade'),
             "data": event.data,
             "timestamp": event.timestamp.isoformat(),
             "sound": "alarm",
             "priority": "high"
         }
-        
-        await self.send_to_agent(event.agent_id, message)
+
+        await self.send_to_agent(event.agent_id, message, event.tenant_schema)
         logger.info(f"Notificação visit_reminder enviada para agent {event.agent_id}")
 
+    async def _handle_task_reminder(self, event: Event):
+        """
+        Handler para evento task_reminder
+        Lembrete antes do vencimento da tarefa (TASK_REMINDER_MINUTES)
+        """
+        if not event.agent_id:
+            logger.warning("Evento task_reminder sem agent_id")
+            return
+
+        message = {
+            "type": "task_reminder",
+            "title": f"Lembrete: Tarefa em {event.data.get('minutes_until', 60)} minutos! ⏰",
+            "body": event.data.get('title', 'Tarefa'),
+            "data": event.data,
+            "timestamp": event.timestamp.isoformat(),
+            "sound": "default"
+        }
+
+        await self.send_to_agent(event.agent_id, message, event.tenant_schema)
+        logger.info(f"Notificação task_reminder enviada para agent {event.agent_id}")
+
+    async def _handle_image_job_progress(self, event: Event):
+        """
+        Handler para evento image_job_progress
+        Progresso de upload de imagens de imóvel (ver app/properties/image_jobs.py)
+        """
+        if not event.agent_id:
+            return
+
+        message = {
+            "type": "image_job_progress",
+            "data": event.data,
+            "timestamp": event.timestamp.isoformat()
+        }
+
+        await self.send_to_agent(event.agent_id, message, event.tenant_schema)
+
 
 # Singleton global
 connection_manager = ConnectionManager()
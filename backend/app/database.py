@@ -3,12 +3,35 @@ PostgreSQL-compatible database configuration with Multi-Tenant Schema Isolation.
 Auto-detects DATABASE_URL (PostgreSQL) or falls back to SQLite.
 
 Multi-tenant: cada tenant tem o seu próprio schema PostgreSQL.
-O schema é selecionado via SET search_path baseado no tenant do request.
+Cada schema de tenant tem um pool de conexões próprio (TenantEngineRegistry)
+cujas conexões já nascem com o search_path fixado, evitando um SET search_path
+por checkout/request. Os pools são limitados (LRU) e dimensionados por plano.
+
+O registry guarda um engine por tenant ativo (até TENANT_POOL_MAX_TENANTS,
+LRU, dimensionado pelo número de tenants: um engine sem conexões abertas não
+ocupa nada no PostgreSQL). O orçamento TENANT_POOL_MAX_CONNECTIONS limita as
+conexões abertas (em uso + livres) dos pools de tenant de cada registry (sync
+e async): quando um pool abre uma conexão e o total excede o orçamento, as
+conexões livres dos pools menos usados sem conexões em uso são fechadas; o
+engine continua registado e volta a abrir conexões quando o tenant voltar.
+Dimensionamento por processo (worker):
+
+    engine default sync + async:      2 × (5 + 10)
+    pools de tenant sync + async:     2 × TENANT_POOL_MAX_CONNECTIONS
+    total no PostgreSQL ≈ processos × (30 + 2 × TENANT_POOL_MAX_CONNECTIONS)
+                          (processos = réplicas × workers) ≤ max_connections
+                          menos as reservadas (superuser, migrations, psql)
+
+Conexões em uso nunca são fechadas, pelo que o total pode exceder o
+orçamento enquanto vários tenants têm pedidos em curso.
 """
 import os
+import threading
+from collections import OrderedDict
 from contextvars import ContextVar
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from sqlalchemy import create_engine, text, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 
 # Context variable para armazenar o tenant atual por request
@@ -34,16 +57,6 @@ if DATABASE_URL:
         pool_pre_ping=True,  # Test connections before using
         echo=False
     )
-    
-    # Set search_path quando uma conexão é usada
-    @event.listens_for(engine, "checkout")
-    def set_search_path(dbapi_conn, connection_record, connection_proxy):
-        """Define o search_path baseado no tenant atual"""
-        schema = current_tenant_schema.get()
-        if schema:
-            cursor = dbapi_conn.cursor()
-            cursor.execute(f'SET search_path TO "{schema}", public')
-            cursor.close()
 else:
     # SQLite fallback (local development)
     DB_PATH = os.path.join(os.path.dirname(__file__), "test.db")
@@ -56,23 +69,325 @@ else:
     SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
     engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# =====================================================
+# POOLS POR TENANT
+# =====================================================
+
+# Marcador para conexões cujo search_path foi alterado por código da aplicação
+_SEARCH_PATH_DIRTY = object()
+
+
+def _parse_pool_plans(raw: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Converte 'basic:2:3,pro:5:5' em {'basic': (2, 3), 'pro': (5, 5)}.
+    Entradas inválidas são ignoradas.
+    """
+    plans: Dict[str, Tuple[int, int]] = {}
+    for item in raw.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if len(parts) != 3 or not parts[0]:
+            continue
+        try:
+            plans[parts[0]] = (int(parts[1]), int(parts[2]))
+        except ValueError:
+            continue
+    return plans
+
+
+# Dimensão do pool (pool_size, max_overflow) por plano de subscrição
+TENANT_POOL_PLANS: Dict[str, Tuple[int, int]] = {
+    "trial": (1, 2),
+    "basic": (2, 3),
+    "pro": (4, 6),
+    "enterprise": (8, 12),
+}
+TENANT_POOL_PLANS.update(_parse_pool_plans(os.environ.get("TENANT_POOL_PLANS", "")))
+TENANT_POOL_DEFAULT_PLAN = "basic"
+
+# Número máximo de engines de tenant registados (LRU); deve cobrir os tenants ativos
+TENANT_POOL_MAX_TENANTS = int(os.environ.get("TENANT_POOL_MAX_TENANTS", "1000"))
+
+# Máximo de conexões abertas (em uso + livres) dos pools de tenant de um registry
+TENANT_POOL_MAX_CONNECTIONS = int(os.environ.get("TENANT_POOL_MAX_CONNECTIONS", "40"))
+
+
+def budget_pool_size(pool_size: int, max_overflow: int, max_connections: int) -> Tuple[int, int]:
+    """Limita (pool_size, max_overflow) de um pool ao orçamento total do registry"""
+    max_connections = max(1, max_connections)
+    pool_size = max(1, min(pool_size, max_connections))
+    return pool_size, max(0, min(max_overflow, max_connections - pool_size))
+
+
+def evict_lru(engines: "OrderedDict", max_tenants: int) -> list:
+    """
+    Retira de `engines` (LRU, mais recente no fim) os menos usados até
+    respeitar max_tenants; devolve os engines retirados (a fechar fora do
+    lock). O mais recente nunca é retirado.
+    """
+    evicted = []
+    while len(engines) > max(1, max_tenants):
+        _schema, old_engine = engines.popitem(last=False)
+        evicted.append(old_engine)
+    return evicted
+
+
+def open_connections(pool) -> int:
+    """Conexões abertas de um QueuePool (em uso + livres)"""
+    return pool.checkedin() + pool.checkedout()
+
+
+def idle_pools_over_budget(pools: "OrderedDict", max_connections: int, keep: Optional[str] = None) -> list:
+    """
+    Schemas (LRU primeiro) cujas conexões livres devem ser fechadas para o
+    total de conexões abertas de `pools` voltar a caber em max_connections.
+    Pools com conexões em uso e o pool `keep` não são tocados.
+    """
+    total = sum(open_connections(pool) for pool in pools.values())
+    shrink = []
+    for schema, pool in pools.items():
+        if total <= max_connections:
+            break
+        if schema == keep or pool.checkedout():
+            continue
+        idle = pool.checkedin()
+        if idle:
+            shrink.append(schema)
+            total -= idle
+    return shrink
+
+
+def _apply_search_path(dbapi_conn, connection_record, schema: Optional[str]):
+    """Executa SET search_path (com commit, para sobreviver ao rollback do pool)"""
+    cursor = dbapi_conn.cursor()
+    try:
+        if schema and schema != DEFAULT_SCHEMA:
+            cursor.execute(f'SET search_path TO "{schema}", public')
+        else:
+            cursor.execute(f'SET search_path TO {DEFAULT_SCHEMA}')
+    finally:
+        cursor.close()
+    dbapi_conn.commit()
+    connection_record.info["search_path"] = schema
+
+
+def _install_search_path_tracking(target: Engine, pinned_schema: Optional[str] = None):
+    """
+    Regista os listeners que mantêm o search_path das conexões de um engine.
+
+    - pinned_schema definido (pool de tenant): o search_path é fixado quando a
+      conexão é criada e não volta a ser enviado ao servidor.
+    - pinned_schema None (engine default): segue o ContextVar, mas só emite
+      SET quando o schema pedido difere do que a conexão já tem.
+
+    Se código da aplicação executar o seu próprio SET search_path, a conexão é
+    marcada e reposta no próximo checkout.
+    """
+
+    @event.listens_for(target, "connect")
+    def _on_connect(dbapi_conn, connection_record):
+        if pinned_schema:
+            _apply_search_path(dbapi_conn, connection_record, pinned_schema)
+        else:
+            connection_record.info["search_path"] = None
+
+    @event.listens_for(target, "checkout")
+    def _on_checkout(dbapi_conn, connection_record, connection_proxy):
+        wanted = pinned_schema if pinned_schema else current_tenant_schema.get()
+        if wanted == DEFAULT_SCHEMA:
+            wanted = None
+        if connection_record.info.get("search_path") != wanted:
+            _apply_search_path(dbapi_conn, connection_record, wanted)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        if "search_path" in statement:
+            conn.info["search_path"] = _SEARCH_PATH_DIRTY
+
+
+class TenantEngineRegistry:
+    """
+    Registo de engines por schema de tenant.
+
+    Cada tenant tem um pool próprio e limitado (um tenant ruidoso esgota apenas
+    as suas conexões). Os engines ficam registados até haver mais de
+    max_tenants; quando as conexões abertas excedem max_connections, fecham-se
+    as conexões livres dos pools menos usados (o engine mantém-se).
+    """
+
+    def __init__(
+        self,
+        default_engine: Engine,
+        database_url: Optional[str],
+        max_tenants: int,
+        max_connections: int = TENANT_POOL_MAX_CONNECTIONS,
+    ):
+        self.default_engine = default_engine
+        self.database_url = database_url
+        self.max_tenants = max_tenants
+        self.max_connections = max_connections
+        self._engines: "OrderedDict[str, Engine]" = OrderedDict()
+        self._plans: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get_engine(self, schema: Optional[str]) -> Engine:
+        """Devolve o engine do schema (criando-o se necessário)"""
+        if not self.database_url or not schema or schema == DEFAULT_SCHEMA:
+            return self.default_engine
+
+        with self._lock:
+            tenant_engine = self._engines.get(schema)
+            if tenant_engine is not None:
+                self._engines.move_to_end(schema)
+                return tenant_engine
+
+        # Criar fora do lock (a query do plano pode demorar)
+        plan = self._plans.get(schema) or self._lookup_plan(schema)
+        pool_size, max_overflow = budget_pool_size(
+            *TENANT_POOL_PLANS.get(plan, TENANT_POOL_PLANS[TENANT_POOL_DEFAULT_PLAN]),
+            self.max_connections,
+        )
+        new_engine = create_engine(
+            self.database_url,
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            echo=False,
+        )
+        if new_engine.dialect.name == "postgresql":
+            _install_search_path_tracking(new_engine, pinned_schema=schema)
+        event.listen(new_engine, "connect", lambda dbapi_conn, record: self._shrink_idle(schema))
+
+        evicted = []
+        with self._lock:
+            existing = self._engines.get(schema)
+            if existing is not None:
+                # Outra thread criou primeiro
+                self._engines.move_to_end(schema)
+                evicted.append(new_engine)
+                result = existing
+            else:
+                self._engines[schema] = new_engine
+                self._plans[schema] = plan
+                evicted.extend(evict_lru(self._engines, self.max_tenants))
+                result = new_engine
+
+        for old_engine in evicted:
+            old_engine.dispose()
+        return result
+
+    def _shrink_idle(self, schema: str):
+        """Nova conexão no pool de `schema`: fecha conexões livres de outros pools se exceder o orçamento"""
+        with self._lock:
+            engines = list(self._engines.items())
+        pools = OrderedDict((name, tenant_engine.pool) for name, tenant_engine in engines)
+        shrink = set(idle_pools_over_budget(pools, self.max_connections, keep=schema))
+        for name, tenant_engine in engines:
+            if name in shrink:
+                tenant_engine.dispose()
+
+    def set_plan(self, schema: str, plan: Optional[str]):
+        """
+        Atualiza o plano de um tenant. O pool atual é descartado e recriado
+        com a nova dimensão no próximo acesso.
+        """
+        if not schema:
+            return
+        with self._lock:
+            if plan:
+                self._plans[schema] = plan
+            else:
+                self._plans.pop(schema, None)
+            old_engine = self._engines.pop(schema, None)
+        if old_engine is not None:
+            old_engine.dispose()
+
+    def plan_for(self, schema: str) -> str:
+        """Plano conhecido para o schema (sem consultar a BD)"""
+        return self._plans.get(schema) or TENANT_POOL_DEFAULT_PLAN
+
+    def dispose(self, schema: Optional[str] = None):
+        """Fecha o pool de um tenant (ou de todos se schema=None)"""
+        with self._lock:
+            if schema is None:
+                engines = list(self._engines.values())
+                self._engines.clear()
+            else:
+                old_engine = self._engines.pop(schema, None)
+                engines = [old_engine] if old_engine is not None else []
+        for old_engine in engines:
+            old_engine.dispose()
+
+    def stats(self) -> dict:
+        """Estado dos pools (para health checks)"""
+        with self._lock:
+            items = list(self._engines.items())
+        connections = sum(open_connections(tenant_engine.pool) for _schema, tenant_engine in items)
+        return {
+            "tenants": len(items),
+            "max_tenants": self.max_tenants,
+            "connections": connections,
+            "max_connections": self.max_connections,
+            "pools": {
+                schema: {
+                    "plan": self._plans.get(schema),
+                    "status": tenant_engine.pool.status(),
+                }
+                for schema, tenant_engine in items
+            },
+        }
+
+    def _lookup_plan(self, schema: str) -> str:
+        """Obtém o plano do tenant a partir da tabela de plataforma"""
+        try:
+            with self.default_engine.connect() as conn:
+                plan = conn.execute(
+                    text("SELECT plan FROM public.tenants WHERE schema_name = :schema LIMIT 1"),
+                    {"schema": schema},
+                ).scalar()
+            return plan or TENANT_POOL_DEFAULT_PLAN
+        except Exception as e:
+            print(f"[DATABASE] Não foi possível obter plano de '{schema}': {e}")
+            return TENANT_POOL_DEFAULT_PLAN
+
+
+if DATABASE_URL:
+    _install_search_path_tracking(engine)
+
+tenant_engines = TenantEngineRegistry(
+    engine,
+    SQLALCHEMY_DATABASE_URL if DATABASE_URL else None,
+    TENANT_POOL_MAX_TENANTS,
+)
+
+
+class TenantSession(Session):
+    """
+    Sessão que usa o pool do tenant ativo no momento em que é criada.
+    Uma sessão criada com bind explícito mantém esse bind.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tenant_schema = current_tenant_schema.get()
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.bind is not None:
+            return super().get_bind(mapper, clause=clause, **kw)
+        return tenant_engines.get_engine(self.tenant_schema)
+
+
+SessionLocal = sessionmaker(class_=TenantSession, autocommit=False, autoflush=False)
 Base = declarative_base()
 
 
 def get_db():
     """
     Dependency para obter sessão de BD.
-    O schema é automaticamente selecionado baseado no tenant atual (via ContextVar).
+    O schema é automaticamente selecionado baseado no tenant atual (via ContextVar):
+    a sessão usa o pool do tenant, cujas conexões já têm o search_path correto.
     """
     db = SessionLocal()
     try:
-        # Se temos um tenant definido, garantir que o search_path está correto
-        schema = current_tenant_schema.get()
-        print(f"[GET_DB] Schema from ContextVar: {schema}")
-        if schema and DATABASE_URL:  # Só para PostgreSQL
-            db.execute(text(f'SET search_path TO "{schema}", public'))
-            print(f"[GET_DB] Set search_path to: {schema}")
         yield db
     finally:
         db.close()
@@ -88,6 +403,99 @@ def get_tenant_schema() -> Optional[str]:
     return current_tenant_schema.get()
 
 
+def tenant_session(schema: Optional[str]) -> Session:
+    """
+    Abre uma sessão no pool do schema indicado sem alterar o ContextVar do
+    chamador (workers em background que percorrem vários tenants).
+    """
+    token = current_tenant_schema.set(schema)
+    try:
+        return SessionLocal()
+    finally:
+        current_tenant_schema.reset(token)
+
+
+def schema_session(connection, schema: Optional[str]) -> Session:
+    """
+    Sessão sobre uma conexão já aberta (normalmente do engine default) com as
+    tabelas ORM qualificadas com `schema` (schema_translate_map).
+
+    Para workers em background que varrem todos os tenants a cada passagem:
+    usar tenant_session() nesse varrimento promoveria e descartaria pools no
+    LRU do TenantEngineRegistry, fechando os pools quentes dos pedidos. Com
+    uma única conexão cross-schema o varrimento não toca nos pools; abre-se
+    tenant_session() apenas para os tenants com trabalho. SQL text() não é
+    traduzido (usar construções ORM/Core).
+    """
+    token = current_tenant_schema.set(schema)
+    try:
+        if schema and schema != DEFAULT_SCHEMA:
+            connection = connection.execution_options(schema_translate_map={None: schema})
+        return SessionLocal(bind=connection)
+    finally:
+        current_tenant_schema.reset(token)
+
+
+def scan_schemas(
+    schemas: Iterable[Optional[str]],
+    work: Callable[[Session, Optional[str]], Any],
+    bind=None,
+    tag: str = "DATABASE",
+) -> Dict[Optional[str], Any]:
+    """
+    Corre work(db, schema) para cada schema, com sessões schema_session()
+    sobre uma única conexão de `bind` (default: engine default), e devolve
+    {schema: resultado} dos resultados não vazios.
+
+    Varrimento partilhado dos workers em background (portais, rollups,
+    lembretes): o que não for confirmado por `work` é revertido, e um erro
+    num schema é registado sem interromper os restantes.
+    """
+    results: Dict[Optional[str], Any] = {}
+    with (bind or engine).connect() as connection:
+        for schema in schemas:
+            db = schema_session(connection, schema)
+            try:
+                result = work(db, schema)
+                if result:
+                    results[schema] = result
+            except Exception as e:
+                db.rollback()
+                print(f"[{tag}] Erro no varrimento de {schema or 'default'}: {e}")
+            finally:
+                db.close()
+                if connection.in_transaction():
+                    connection.rollback()
+    return results
+
+
+def list_tenant_schemas(with_table: Optional[str] = None) -> List[Optional[str]]:
+    """
+    Lista os schemas tenant_* existentes, opcionalmente apenas os que já têm
+    a tabela `with_table`. Em SQLite (dev) há uma única BD: devolve [None].
+    """
+    if not DATABASE_URL:
+        return [None]
+    with engine.connect() as conn:
+        if with_table:
+            result = conn.execute(
+                text(
+                    "SELECT table_schema FROM information_schema.tables "
+                    "WHERE table_schema LIKE 'tenant\\_%' AND table_name = :table "
+                    "ORDER BY table_schema"
+                ),
+                {"table": with_table},
+            )
+        else:
+            result = conn.execute(
+                text(
+                    "SELECT schema_name FROM information_schema.schemata "
+                    "WHERE schema_name LIKE 'tenant\\_%' ORDER BY schema_name"
+                )
+            )
+        return [row[0] for row in result]
+
+
 def create_tenant_schema(db: Session, schema_name: str) -> bool:
     """
     Cria um novo schema para um tenant.
@@ -130,7 +538,7 @@ def copy_tables_to_schema(db: Session, schema_name: str) -> dict:
     
     try:
         # Listar tabelas do schema public (exceto as de plataforma)
-        platform_tables = ['tenants', 'super_admins', 'platform_settings', 'alembic_version']
+        platform_tables = ['tenants', 'super_admins', 'platform_settings', 'tenant_stats_snapshots', 'alembic_version']
         
         result = db.execute(text("""
             SELECT table_name 
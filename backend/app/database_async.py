@@ -0,0 +1,179 @@
+"""
+Camada de base de dados assíncrona (AsyncSession + asyncpg / aiosqlite).
+
+Paralela a app/database.py: usa o mesmo ContextVar current_tenant_schema e a
+mesma dimensão de pools por plano, mas sem ocupar threads do threadpool do
+anyio enquanto se espera pelo PostgreSQL. Usada pelos endpoints de leitura
+mais frequentes (listagens/detalhes mobile e listagem pública de imóveis).
+
+Em PostgreSQL cada schema de tenant tem o seu engine com o search_path
+definido nos server_settings da conexão (sem SET por request).
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from app.database import (
+    DATABASE_URL,
+    DEFAULT_SCHEMA,
+    SQLALCHEMY_DATABASE_URL,
+    TENANT_POOL_DEFAULT_PLAN,
+    TENANT_POOL_MAX_CONNECTIONS,
+    TENANT_POOL_MAX_TENANTS,
+    TENANT_POOL_PLANS,
+    budget_pool_size,
+    current_tenant_schema,
+    evict_lru,
+    idle_pools_over_budget,
+    tenant_engines,
+)
+
+
+def to_async_url(url: str) -> str:
+    """Converte um URL síncrono no equivalente com driver assíncrono"""
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = to_async_url(SQLALCHEMY_DATABASE_URL)
+
+
+class AsyncTenantEngineRegistry:
+    """
+    Versão assíncrona do TenantEngineRegistry (com o mesmo orçamento de
+    conexões abertas, separado do registry sync).
+    Os engines são criados sob pedido (não abre conexões no import).
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        is_postgres: bool,
+        max_tenants: int,
+        max_connections: int = TENANT_POOL_MAX_CONNECTIONS,
+    ):
+        self.database_url = database_url
+        self.is_postgres = is_postgres
+        self.max_tenants = max_tenants
+        self.max_connections = max_connections
+        self._default_engine: Optional[AsyncEngine] = None
+        self._engines: "OrderedDict[str, AsyncEngine]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending_disposals: set = set()
+
+    def _create_engine(self, schema: Optional[str]) -> AsyncEngine:
+        if not self.is_postgres:
+            return create_async_engine(self.database_url, echo=False)
+
+        if schema:
+            pool_size, max_overflow = self._pool_size(schema)
+            search_path = f'"{schema}", public'
+        else:
+            pool_size, max_overflow = 5, 10
+            search_path = DEFAULT_SCHEMA
+        return create_async_engine(
+            self.database_url,
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            connect_args={"server_settings": {"search_path": search_path}},
+            echo=False,
+        )
+
+    def _pool_size(self, schema: str):
+        return budget_pool_size(
+            *TENANT_POOL_PLANS.get(tenant_engines.plan_for(schema), TENANT_POOL_PLANS[TENANT_POOL_DEFAULT_PLAN]),
+            self.max_connections,
+        )
+
+    def get_engine(self, schema: Optional[str]) -> AsyncEngine:
+        """Devolve o engine assíncrono do schema (criando-o se necessário)"""
+        if not self.is_postgres or not schema or schema == DEFAULT_SCHEMA:
+            with self._lock:
+                if self._default_engine is None:
+                    self._default_engine = self._create_engine(None)
+                return self._default_engine
+
+        with self._lock:
+            tenant_engine = self._engines.get(schema)
+            if tenant_engine is not None:
+                self._engines.move_to_end(schema)
+                return tenant_engine
+
+            tenant_engine = self._create_engine(schema)
+            event.listen(tenant_engine.sync_engine, "connect", lambda dbapi_conn, record: self._shrink_idle(schema))
+            self._engines[schema] = tenant_engine
+            evicted = evict_lru(self._engines, self.max_tenants)
+
+        for old_engine in evicted:
+            self._dispose_later(old_engine)
+        return tenant_engine
+
+    def _shrink_idle(self, schema: str):
+        """Nova conexão no pool de `schema`: fecha conexões livres de outros pools se exceder o orçamento"""
+        with self._lock:
+            engines = list(self._engines.items())
+        pools = OrderedDict((name, tenant_engine.sync_engine.pool) for name, tenant_engine in engines)
+        shrink = set(idle_pools_over_budget(pools, self.max_connections, keep=schema))
+        for name, tenant_engine in engines:
+            if name in shrink:
+                self._dispose_later(tenant_engine)
+
+    def _dispose_later(self, old_engine: AsyncEngine):
+        """Fecha um engine descartado sem bloquear quem pediu o novo"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            old_engine.sync_engine.dispose(close=False)
+            return
+        task = loop.create_task(old_engine.dispose())
+        self._pending_disposals.add(task)
+        task.add_done_callback(self._pending_disposals.discard)
+
+    async def dispose(self):
+        """Fecha todos os pools (shutdown)"""
+        with self._lock:
+            engines = list(self._engines.values())
+            if self._default_engine is not None:
+                engines.append(self._default_engine)
+            self._engines.clear()
+            self._default_engine = None
+        for old_engine in engines:
+            await old_engine.dispose()
+
+
+async_tenant_engines = AsyncTenantEngineRegistry(
+    ASYNC_DATABASE_URL,
+    is_postgres=bool(DATABASE_URL),
+    max_tenants=TENANT_POOL_MAX_TENANTS,
+)
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Cria uma AsyncSession ligada ao pool do tenant atual"""
+    return AsyncSession(
+        bind=async_tenant_engines.get_engine(current_tenant_schema.get()),
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Dependency para obter sessão assíncrona de BD.
+    O schema é selecionado pelo tenant atual (via ContextVar), tal como get_db().
+    """
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,227 @@
+"""
+Analytics de leads (conversão, funil, performance por agente, estatísticas).
+
+Cada relatório é uma única query agregada (GROUP BY origem/estado/agente
+com agregados condicionais e a média de updated_at - created_at calculada
+na BD), em vez de um COUNT por origem/estado ou de carregar as leads de
+cada agente para Python.
+
+Estados e origens são comparados em minúsculas: a BD tem valores antigos
+em maiúsculas ("NEW") e novos em minúsculas (LeadStatus.NEW = "new").
+
+Os resultados ficam numa cache por tenant (TTL curto), invalidada em
+commits de leads/agentes; use_cache=False força o cálculo.
+
+Configuração via ENV:
+    LEAD_ANALYTICS_CACHE_TTL    segundos em cache por relatório (default: 60)
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Hashable
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.agents.models import Agent
+from app.core.cache import TenantCache, track_model_changes
+from app.database import get_tenant_schema
+from app.leads.models import Lead, LeadSource, LeadStatus
+
+LEAD_ANALYTICS_CACHE_TTL = float(os.getenv("LEAD_ANALYTICS_CACHE_TTL", "60"))
+
+analytics_cache = TenantCache("lead_analytics", ttl=LEAD_ANALYTICS_CACHE_TTL, topics=("leads", "agents"))
+track_model_changes(Lead, "leads")
+track_model_changes(Agent, "agents")
+
+# Ordem dos estágios do funil (LOST fica de fora do drop-off)
+FUNNEL_ORDER = [
+    LeadStatus.NEW,
+    LeadStatus.CONTACTED,
+    LeadStatus.QUALIFIED,
+    LeadStatus.PROPOSAL_SENT,
+    LeadStatus.VISIT_SCHEDULED,
+    LeadStatus.NEGOTIATION,
+    LeadStatus.CONVERTED,
+]
+
+_status = func.lower(Lead.status)
+_source = func.lower(Lead.source)
+
+
+def _cached(db: Session, key: Hashable, compute: Callable[[], Any], use_cache: bool) -> Any:
+    if not use_cache:
+        return compute()
+    return analytics_cache.get_or_set(key, compute, getattr(db, "tenant_schema", get_tenant_schema()))
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _hours_between(db: Session, start, end):
+    """end - start em horas, na BD"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.extract("epoch", end - start) / 3600.0
+    return (func.julianday(end) - func.julianday(start)) * 24.0
+
+
+def _rate(part: int, total: int) -> float:
+    return (part / total * 100) if total > 0 else 0
+
+
+def _cutoff(days: int) -> datetime:
+    return datetime.utcnow() - timedelta(days=days)
+
+
+# =====================================================
+# RELATÓRIOS
+# =====================================================
+
+def compute_conversion_analytics(db: Session, days: int = 30) -> dict:
+    """Conversão total e por origem + tempo médio até conversão, num GROUP BY source."""
+    converted = _status == LeadStatus.CONVERTED.value
+    rows = db.execute(
+        select(
+            _source.label("source"),
+            func.count(Lead.id).label("total"),
+            _count_if(converted).label("converted"),
+            func.sum(case((converted, _hours_between(db, Lead.created_at, Lead.updated_at)))).label("hours_sum"),
+            _count_if(converted & Lead.updated_at.isnot(None)).label("hours_count"),
+        )
+        .where(Lead.created_at >= _cutoff(days))
+        .group_by(_source)
+    ).all()
+
+    total_leads = sum(row.total for row in rows)
+    converted_leads = sum(row.converted for row in rows)
+    hours_sum = sum(float(row.hours_sum or 0) for row in rows)
+    hours_count = sum(row.hours_count for row in rows)
+    by_source = {row.source: row for row in rows}
+
+    conversion_by_source = {}
+    for source in LeadSource:
+        row = by_source.get(source.value)
+        source_total = row.total if row else 0
+        source_converted = row.converted if row else 0
+        conversion_by_source[source.value] = {
+            "total": source_total,
+            "converted": source_converted,
+            "rate": _rate(source_converted, source_total),
+        }
+
+    return {
+        "period_days": days,
+        "total_leads": total_leads,
+        "converted_leads": converted_leads,
+        "conversion_rate": round(_rate(converted_leads, total_leads), 2),
+        "conversion_by_source": conversion_by_source,
+        "avg_hours_to_conversion": round(hours_sum / hours_count, 1) if hours_count else 0,
+    }
+
+
+def compute_agent_performance(db: Session, days: int = 30) -> dict:
+    """Performance por agente num GROUP BY agente (só agentes com leads no período)."""
+    responded = _status != LeadStatus.NEW.value
+    rows = db.execute(
+        select(
+            Agent.id.label("agent_id"),
+            Agent.name.label("agent_name"),
+            func.count(Lead.id).label("total"),
+            _count_if(_status == LeadStatus.CONVERTED.value).label("converted"),
+            _count_if(_status == LeadStatus.LOST.value).label("lost"),
+            func.avg(case((responded, _hours_between(db, Lead.created_at, Lead.updated_at)))).label("avg_response"),
+        )
+        .join(Agent, Agent.id == Lead.assigned_agent_id)
+        .where(Lead.created_at >= _cutoff(days))
+        .group_by(Agent.id, Agent.name)
+        .order_by(Agent.id)
+    ).all()
+
+    performance = [
+        {
+            "agent_id": row.agent_id,
+            "agent_name": row.agent_name,
+            "total_leads": row.total,
+            "active_leads": row.total - row.converted - row.lost,
+            "converted_leads": row.converted,
+            "lost_leads": row.lost,
+            "conversion_rate": round(_rate(row.converted, row.total), 2),
+            "avg_response_hours": round(float(row.avg_response or 0), 1),
+        }
+        for row in rows
+    ]
+    # Ordenar por taxa de conversão
+    performance.sort(key=lambda x: x["conversion_rate"], reverse=True)
+
+    return {"period_days": days, "agents": performance}
+
+
+def compute_funnel_analytics(db: Session, days: int = 30) -> dict:
+    """Funil por estado num GROUP BY status, com drop-off entre estágios."""
+    counts = dict(db.execute(
+        select(_status, func.count(Lead.id))
+        .where(Lead.created_at >= _cutoff(days))
+        .group_by(_status)
+    ).all())
+    funnel = {status.value: counts.get(status.value, 0) for status in LeadStatus}
+    total = sum(funnel.values())
+
+    funnel_percentages = {
+        status: {"count": count, "percentage": round(_rate(count, total), 1)}
+        for status, count in funnel.items()
+    }
+
+    dropoff = {}
+    for current, next_status in zip(FUNNEL_ORDER, FUNNEL_ORDER[1:]):
+        current_count = funnel[current.value]
+        next_count = funnel[next_status.value]
+        retention = _rate(next_count, current_count)
+        dropoff[f"{current.value}_to_{next_status.value}"] = {
+            "retention_rate": round(retention, 1),
+            "drop_off_rate": round(100 - retention, 1),
+            "dropped": current_count - next_count,
+        }
+
+    return {
+        "period_days": days,
+        "total_leads": total,
+        "funnel": funnel_percentages,
+        "dropoff_analysis": dropoff,
+    }
+
+
+def compute_lead_stats(db: Session) -> dict:
+    """Total, por estado e novas hoje num GROUP BY status."""
+    today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    rows = db.execute(
+        select(
+            _status.label("status"),
+            func.count(Lead.id).label("count"),
+            _count_if((Lead.created_at >= today_start) & (Lead.created_at < today_start + timedelta(days=1))).label("today"),
+        ).group_by(_status)
+    ).all()
+    return {
+        "total": sum(row.count for row in rows),
+        "by_status": {row.status: row.count for row in rows if row.status},
+        "new_today": sum(row.today for row in rows),
+    }
+
+
+# =====================================================
+# API COM CACHE
+# =====================================================
+
+def conversion_analytics(db: Session, days: int = 30, use_cache: bool = True) -> dict:
+    return _cached(db, ("conversion", days), lambda: compute_conversion_analytics(db, days), use_cache)
+
+
+def agent_performance(db: Session, days: int = 30, use_cache: bool = True) -> dict:
+    return _cached(db, ("agent_performance", days), lambda: compute_agent_performance(db, days), use_cache)
+
+
+def funnel_analytics(db: Session, days: int = 30, use_cache: bool = True) -> dict:
+    return _cached(db, ("funnel", days), lambda: compute_funnel_analytics(db, days), use_cache)
+
+
+def lead_stats(db: Session, use_cache: bool = True) -> dict:
+    return _cached(db, ("stats",), lambda: compute_lead_stats(db), use_cache)
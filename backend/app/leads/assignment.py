@@ -0,0 +1,296 @@
+"""
+Atribuição de leads a agentes (serviço único para todas as rotas).
+
+Estratégias:
+    manual        todas para um agente
+    round_robin   rotação pela lista de agentes do pool; o contador em
+                  lead_distribution_counters avança de uma vez pelo lote
+                  inteiro (UPDATE ... RETURNING, numa transação curta e
+                  própria): pedidos concorrentes recebem posições distintas
+                  sem esperar pelo commit uns dos outros
+    least_busy    menor número de leads ativas (new/contacted/qualified)
+    workload      menor número total de leads
+
+As cargas saem de um único GROUP BY; o lote é gravado com um único UPDATE
+(CASE id WHEN ... THEN agente) por cada 1000 leads. Em PostgreSQL as leads
+candidatas são reservadas com FOR UPDATE SKIP LOCKED e, com
+only_unassigned, o UPDATE só toca leads ainda sem agente: duas
+distribuições em simultâneo nunca atribuem a mesma lead duas vezes.
+
+O UPDATE em massa não passa pelo flush do ORM; os efeitos que os eventos
+fariam são aplicados aqui, na mesma transação: tombstones de reatribuição
+(sync mobile), contadores do dashboard mobile, dias dos rollups e
+invalidação das caches de leads no commit.
+
+Pools de agentes (lista ordenada, em cache por tenant até mudar um agente):
+    all           todos os agentes
+    distribution  todos exceto a conta da agência
+    sales         agentes de venda (sem agência nem arrendamento) - website
+
+Configuração via ENV:
+    LEAD_ASSIGNMENT_POOL_CACHE_TTL  segundos em cache da lista de agentes (default: 60)
+"""
+import heapq
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.agents.models import Agent
+from app.core.cache import TenantCache, touch_on_commit, track_model_changes
+from app.database import get_tenant_schema
+from app.leads.models import Lead, LeadStatus
+from app.mobile.dashboard import bump_agent_versions
+from app.mobile.sync import record_reassignments
+from app.models.website_client import LeadDistributionCounter
+from app.reports.rollups import mark_dirty
+
+LEAD_ASSIGNMENT_POOL_CACHE_TTL = float(os.getenv("LEAD_ASSIGNMENT_POOL_CACHE_TTL", "60"))
+
+# Contas excluídas das distribuições automáticas
+AGENCY_AGENT_NAME = "Imóveis Mais Leiria"
+RENTAL_AGENT_EMAIL = "arrendamentosleiria@imoveismais.pt"
+
+ACTIVE_LEAD_STATUSES = (LeadStatus.NEW.value, LeadStatus.CONTACTED.value, LeadStatus.QUALIFIED.value)
+
+STRATEGIES = ("manual", "round_robin", "least_busy", "workload")
+
+UPDATE_CHUNK_SIZE = 1000
+
+pool_cache = TenantCache("lead_assignment_pools", ttl=LEAD_ASSIGNMENT_POOL_CACHE_TTL, topics=("agents",))
+track_model_changes(Agent, "agents")
+
+
+# =====================================================
+# AGENTES E CARGAS
+# =====================================================
+
+def _pool_query(pool: str):
+    if pool == "all":
+        return select(Agent.id).order_by(Agent.id)
+    if pool == "distribution":
+        return select(Agent.id).where(Agent.name != AGENCY_AGENT_NAME).order_by(Agent.id)
+    if pool == "sales":
+        return (
+            select(Agent.id)
+            .where(Agent.name != AGENCY_AGENT_NAME, Agent.email != RENTAL_AGENT_EMAIL)
+            .order_by(Agent.name)
+        )
+    raise ValueError(f"Pool de agentes desconhecido: {pool}")
+
+
+def agent_pool(db: Session, pool: str = "all") -> List[int]:
+    """Ids dos agentes do pool, pela ordem da rotação."""
+    query = _pool_query(pool)
+    return pool_cache.get_or_set(
+        ("pool", pool),
+        lambda: list(db.execute(query).scalars()),
+        getattr(db, "tenant_schema", get_tenant_schema()),
+    )
+
+
+def agent_loads(db: Session, agent_ids: Sequence[int], active_only: bool = True) -> Dict[int, int]:
+    """Leads por agente (só ativas, ou todas) num único GROUP BY; agentes sem leads a 0."""
+    loads = {agent_id: 0 for agent_id in agent_ids}
+    if not loads:
+        return loads
+    query = (
+        select(Lead.assigned_agent_id, func.count(Lead.id))
+        .where(Lead.assigned_agent_id.in_(list(loads)))
+        .group_by(Lead.assigned_agent_id)
+    )
+    if active_only:
+        query = query.where(func.lower(Lead.status).in_(ACTIVE_LEAD_STATUSES))
+    loads.update(dict(db.execute(query).all()))
+    return loads
+
+
+def advance_round_robin(db: Session, counter_type: str, size: int, steps: int = 1) -> int:
+    """
+    Avança o contador `counter_type` `steps` posições (módulo `size`) e devolve
+    o índice da primeira posição reservada. Transação própria e curta: o lock
+    da linha do contador não fica preso até ao commit do pedido.
+    """
+    if size <= 0 or steps <= 0:
+        raise ValueError("size e steps têm de ser positivos")
+    table = LeadDistributionCounter.__table__
+    now = datetime.utcnow()
+    advance = (
+        table.update()
+        .where(table.c.counter_type == counter_type)
+        .values(last_agent_index=(func.coalesce(table.c.last_agent_index, 0) + steps) % size, updated_at=now)
+    )
+    with db.get_bind().begin() as conn:
+        if conn.dialect.update_returning:
+            advance = advance.returning(table.c.last_agent_index)
+            last = conn.execute(advance).scalar()
+            if last is None:
+                _create_counter(conn, counter_type, size)
+                last = conn.execute(advance).scalar()
+        else:
+            if not conn.execute(advance).rowcount:
+                _create_counter(conn, counter_type, size)
+                conn.execute(advance)
+            last = conn.execute(
+                select(table.c.last_agent_index).where(table.c.counter_type == counter_type)
+            ).scalar()
+    return (last - steps + 1) % size
+
+
+def _create_counter(conn, counter_type: str, size: int) -> None:
+    """Cria o contador (a primeira posição fica no índice 0); ignora se outro pedido já o criou."""
+    table = LeadDistributionCounter.__table__
+    # last_agent_index = size - 1: o avanço seguinte começa no índice 0
+    values = {"counter_type": counter_type, "last_agent_index": size - 1, "updated_at": datetime.utcnow()}
+    dialect = conn.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        conn.execute(insert(table).values(values).on_conflict_do_nothing(index_elements=[table.c.counter_type]))
+    else:
+        conn.execute(table.insert().values(values))
+
+
+def _balanced(agent_ids: Sequence[int], loads: Dict[int, int], count: int) -> List[int]:
+    """Um agente por lead, sempre o de menor carga (empate: ordem do pool)."""
+    heap = [(loads.get(agent_id, 0), order, agent_id) for order, agent_id in enumerate(agent_ids)]
+    heapq.heapify(heap)
+    chosen = []
+    for _ in range(count):
+        load, order, agent_id = heapq.heappop(heap)
+        chosen.append(agent_id)
+        heapq.heappush(heap, (load + 1, order, agent_id))
+    return chosen
+
+
+# =====================================================
+# ATRIBUIÇÃO
+# =====================================================
+
+def _candidates(db: Session, lead_ids: Optional[Iterable[int]], only_unassigned: bool) -> list:
+    """(id, agente atual, created_at) das leads a atribuir, reservadas em PostgreSQL."""
+    query = select(Lead.id, Lead.assigned_agent_id, Lead.created_at).order_by(Lead.id)
+    if lead_ids is not None:
+        query = query.where(Lead.id.in_(list(lead_ids)))
+    if only_unassigned:
+        query = query.where(Lead.assigned_agent_id.is_(None))
+    if db.get_bind().dialect.name == "postgresql":
+        # Leads reservadas por outra distribuição em curso ficam para ela
+        query = query.with_for_update(skip_locked=True)
+    return db.execute(query).all()
+
+
+def _apply(db: Session, assignments: Dict[int, int], rows: list, only_unassigned: bool) -> List[int]:
+    """UPDATE em massa + efeitos dos eventos do ORM; devolve os ids efetivamente atribuídos."""
+    table = Lead.__table__
+    conn = db.connection()
+    now = datetime.utcnow()
+    ids = sorted(assignments)
+    updated = set()
+    for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+        chunk = ids[start:start + UPDATE_CHUNK_SIZE]
+        stmt = (
+            table.update()
+            .where(table.c.id.in_(chunk))
+            .values(
+                assigned_agent_id=case({lead_id: assignments[lead_id] for lead_id in chunk}, value=table.c.id),
+                updated_at=now,
+            )
+        )
+        if only_unassigned:
+            stmt = stmt.where(table.c.assigned_agent_id.is_(None))
+        if conn.dialect.update_returning:
+            updated.update(conn.execute(stmt.returning(table.c.id)).scalars())
+        else:
+            conn.execute(stmt)
+            updated.update(chunk)
+
+    changed = [row for row in rows if row.id in updated and row.assigned_agent_id != assignments[row.id]]
+    if changed:
+        record_reassignments(conn, "leads", [(row.id, row.assigned_agent_id) for row in changed])
+        bump_agent_versions(conn, [row.assigned_agent_id for row in changed] + [assignments[row.id] for row in changed])
+        mark_dirty(conn, [("leads", row.created_at.date()) for row in changed if row.created_at])
+        touch_on_commit(db, "leads")
+    return sorted(updated)
+
+
+def pending_lead_ids(db: Session, lead_ids: Optional[Iterable[int]] = None) -> List[int]:
+    """Ids das leads sem agente (opcionalmente só entre `lead_ids`), por id."""
+    query = select(Lead.id).where(Lead.assigned_agent_id.is_(None)).order_by(Lead.id)
+    if lead_ids is not None:
+        query = query.where(Lead.id.in_(list(lead_ids)))
+    return list(db.execute(query).scalars())
+
+
+def apply_assignments(db: Session, assignments: Dict[int, int], only_unassigned: bool = False) -> List[int]:
+    """Grava um plano lead -> agente já calculado (sem commit); devolve os ids atribuídos."""
+    if not assignments:
+        return []
+    rows = _candidates(db, assignments, only_unassigned)
+    plan = {row.id: assignments[row.id] for row in rows}
+    return _apply(db, plan, rows, only_unassigned) if plan else []
+
+
+def assign_leads(
+    db: Session,
+    lead_ids: Optional[Iterable[int]],
+    strategy: str = "round_robin",
+    target_agent_id: Optional[int] = None,
+    pool: str = "all",
+    only_unassigned: bool = False,
+    counter_type: Optional[str] = None,
+) -> dict:
+    """
+    Atribui as leads `lead_ids` (None: todas as sem agente, com only_unassigned)
+    segundo `strategy`, sem commit. Devolve distributed, assignments
+    {agente: n}, agents_count e, nas estratégias por carga, agent_loads
+    (cargas antes da distribuição).
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    if strategy == "manual" and not target_agent_id:
+        raise ValueError("target_agent_id required for manual strategy")
+    if lead_ids is None and not only_unassigned:
+        raise ValueError("lead_ids required unless only_unassigned")
+
+    if strategy == "manual":
+        agent_ids = [target_agent_id]
+    else:
+        agent_ids = agent_pool(db, pool)
+        if not agent_ids:
+            raise ValueError("No active agents found")
+
+    rows = _candidates(db, lead_ids, only_unassigned)
+    result = {"distributed": 0, "strategy": strategy, "agents_count": len(agent_ids), "assignments": {}}
+    if not rows:
+        return result
+
+    if strategy == "manual":
+        chosen = [target_agent_id] * len(rows)
+    elif strategy == "round_robin":
+        first = advance_round_robin(db, counter_type or f"leads:{pool}", len(agent_ids), steps=len(rows))
+        chosen = [agent_ids[(first + offset) % len(agent_ids)] for offset in range(len(rows))]
+    else:
+        loads = agent_loads(db, agent_ids, active_only=strategy == "least_busy")
+        result["agent_loads"] = loads
+        chosen = _balanced(agent_ids, loads, len(rows))
+
+    plan = {row.id: agent_id for row, agent_id in zip(rows, chosen)}
+    assigned = _apply(db, plan, rows, only_unassigned)
+    counts: Dict[int, int] = {}
+    for lead_id in assigned:
+        counts[plan[lead_id]] = counts.get(plan[lead_id], 0) + 1
+    result.update(distributed=len(assigned), assignments=counts)
+    return result
+
+
+def next_agent(db: Session, counter_type: str, pool: str = "sales") -> Optional[int]:
+    """Próximo agente da rotação `counter_type` (uma posição), ou None sem agentes."""
+    agent_ids = agent_pool(db, pool)
+    if not agent_ids:
+        return None
+    return agent_ids[advance_round_robin(db, counter_type, len(agent_ids))]
@@ -1,6 +1,6 @@
 from enum import Enum as PyEnum
-from sqlalchemy import Column, Integer, String, Date, Enum, ForeignKey, Text, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, Enum, ForeignKey, Text, DateTime, Index, text
+from sqlalchemy.orm import column_property, relationship
 from app.database import Base
 from datetime import datetime
 
@@ -29,6 +29,17 @@ class LeadSource(str, PyEnum):
 
 class Lead(Base):
     __tablename__ = "leads"
+    __table_args__ = (
+        # Listagens paginadas por cursor (mais recentes primeiro), globais e por agente;
+        # mesma expressão que LEADS_KEYSET (created_at NULL ordenado como 1970-01-01)
+        Index("ix_leads_created_nn_id", text("coalesce(created_at, '1970-01-01 00:00:00.000000')"), "id"),
+        Index(
+            "ix_leads_agent_created_nn_id",
+            "assigned_agent_id", text("coalesce(created_at, '1970-01-01 00:00:00.000000')"), "id",
+        ),
+        # Sync incremental mobile (updated_at, id) por agente
+        Index("ix_leads_agent_updated_id", "assigned_agent_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -43,7 +54,8 @@ class Lead(Base):
     
     # Status e atribuição
     status = Column(String, default="NEW")  # NEW, CONTACTED, QUALIFIED, etc.
-    assigned_agent_id = Column(Integer, ForeignKey("agents.id"), nullable=True)
+    # active_history: o dono anterior fica no histórico mesmo com o objeto expirado (dashboard mobile, sync)
+    assigned_agent_id = column_property(Column(Integer, ForeignKey("agents.id"), nullable=True), active_history=True)
     
     # Propriedade que gerou a lead (do site montra)
     property_id = Column(Integer, ForeignKey("properties.id"), nullable=True)
@@ -52,7 +64,8 @@ class Lead(Base):
     action_type = Column(String, nullable=True)  # "info_request", "visit_request", "contact"
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # active_history: ao mudar a data de um objeto expirado o dia anterior é carregado (rollups dos relatórios)
+    created_at = column_property(Column(DateTime, default=datetime.utcnow), active_history=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
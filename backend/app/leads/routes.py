@@ -4,14 +4,20 @@ from typing import Optional
 from . import services, schemas
 from app.database import get_db
 from app.security import require_staff
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.responses import FastJSONResponse, RowSerializer
 
 router = APIRouter(prefix="/leads", tags=["leads"])
 
+# Listagem: ORM -> dict direto (sem validação por objeto do response_model)
+LEAD_SERIALIZER = RowSerializer(schemas.LeadOut)
+
 
 @router.get("/", response_model=list[schemas.LeadOut])
 def list_leads(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     source: Optional[str] = None,
     assigned_agent_id: Optional[int] = None,
@@ -24,16 +30,20 @@ def list_leads(
     - source: WEBSITE, PHONE, EMAIL, MANUAL, etc
     - assigned_agent_id: Filtrar por agente
     - property_id: Filtrar por propriedade
+    - cursor: valor do header X-Next-Cursor da página anterior
     """
-    return services.get_leads(
+    leads, next_cursor = services.get_leads_page(
         db,
         skip=skip,
         limit=limit,
         status=status,
         source=source,
         assigned_agent_id=assigned_agent_id,
-        property_id=property_id
+        property_id=property_id,
+        cursor=cursor,
     )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse(LEAD_SERIALIZER.many(leads), headers=headers)
 
 
 @router.get("/stats", response_model=dict)
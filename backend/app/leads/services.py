@@ -1,23 +1,36 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from typing import Optional
-from .models import Lead
+from .models import Lead, LeadSource, LeadStatus
+from . import analytics, assignment
 from .schemas import LeadCreate, LeadUpdate, LeadCreateFromWebsite
 from app.properties.models import Property
 from app.agents.models import Agent
-from datetime import datetime, timedelta
+from datetime import datetime
+from app.core.pagination import Keyset, KeysetColumn, NULL_DATETIME
 
 
-def get_leads(
+# Mais recentes primeiro; id desempata leads criadas no mesmo instante.
+# created_at aceita NULL: essas leads ficam no fim (índices ix_leads_*created_nn_id)
+LEADS_KEYSET = Keyset(
+    KeysetColumn(Lead.created_at, descending=True, null_as=NULL_DATETIME),
+    KeysetColumn(Lead.id, descending=True),
+)
+
+
+def get_leads_page(
     db: Session,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = None,
     source: Optional[str] = None,
     assigned_agent_id: Optional[int] = None,
-    property_id: Optional[int] = None
+    property_id: Optional[int] = None,
+    cursor: Optional[str] = None,
 ):
-    """Buscar leads com filtros opcionais"""
+    """
+    Buscar leads com filtros opcionais.
+    Devolve (leads, cursor da próxima página); com `skip` usa OFFSET (legado).
+    """
     query = db.query(Lead)
     
     if status:
@@ -29,25 +42,19 @@ def get_leads(
     if property_id:
         query = query.filter(Lead.property_id == property_id)
     
-    return query.order_by(Lead.created_at.desc()).offset(skip).limit(limit).all()
+    if skip and not cursor:
+        return query.order_by(*LEADS_KEYSET.order_by()).offset(skip).limit(limit).all(), None
+    return LEADS_KEYSET.page(LEADS_KEYSET.apply(query, cursor, limit).all(), limit)
+
+
+def get_leads(db: Session, skip: int = 0, limit: int = 100, **filters):
+    """Buscar leads com filtros opcionais"""
+    return get_leads_page(db, skip=skip, limit=limit, **filters)[0]
 
 
 def get_lead_stats(db: Session):
     """Estatísticas de leads por status"""
-    stats = db.query(
-        Lead.status,
-        func.count(Lead.id).label('count')
-    ).group_by(Lead.status).all()
-    
-    total = db.query(Lead).count()
-    
-    return {
-        "total": total,
-        "by_status": {status.value: count for status, count in stats},
-        "new_today": db.query(Lead).filter(
-            func.date(Lead.created_at) == datetime.utcnow().date()
-        ).count()
-    }
+    return analytics.lead_stats(db)
 
 
 def get_lead(db: Session, lead_id: int):
@@ -135,19 +142,14 @@ def distribute_leads(
     target_agent_id: Optional[int] = None
 ):
     """
-    Distribuir múltiplas leads entre agentes.
+    Distribuir múltiplas leads entre agentes (app/leads/assignment.py).
     
     Estratégias:
-    - round_robin: Distribui igualmente entre agentes ativos
-    - least_busy: Atribui ao agente com menos leads ativas
+    - round_robin: Distribui igualmente entre agentes, continuando a rotação anterior
+    - least_busy: Atribui sempre ao agente com menos leads ativas
     - manual: Atribui todas ao target_agent_id
     """
-    
-    # Buscar leads
-    leads = db.query(Lead).filter(Lead.id.in_(lead_ids)).all()
-    if not leads:
-        return {"distributed": 0, "errors": ["No leads found"]}
-    
+    agent = None
     if strategy == "manual":
         if not target_agent_id:
             return {"distributed": 0, "errors": ["target_agent_id required for manual strategy"]}
@@ -156,73 +158,38 @@ def distribute_leads(
         agent = db.query(Agent).filter(Agent.id == target_agent_id).first()
         if not agent:
             return {"distributed": 0, "errors": [f"Agent {target_agent_id} not found"]}
-        
-        # Atribuir todas ao agente especificado
-        for lead in leads:
-            lead.assigned_agent_id = target_agent_id
-            lead.updated_at = datetime.utcnow()
-        
-        db.commit()
+    
+    try:
+        result = assignment.assign_leads(db, lead_ids, strategy, target_agent_id=target_agent_id)
+    except ValueError as e:
+        db.rollback()
+        return {"distributed": 0, "errors": [str(e)]}
+    if not result["distributed"]:
+        db.rollback()
+        return {"distributed": 0, "errors": ["No leads found"]}
+    db.commit()
+    
+    if strategy == "manual":
         return {
-            "distributed": len(leads),
+            "distributed": result["distributed"],
             "strategy": "manual",
             "assigned_to": {
                 "agent_id": target_agent_id,
                 "agent_name": agent.name,
-                "count": len(leads)
+                "count": result["distributed"]
             }
         }
-    
-    # Buscar agentes ativos (que possuem propriedades ou leads)
-    active_agents = db.query(Agent).filter(Agent.id.isnot(None)).all()
-    
-    if not active_agents:
-        return {"distributed": 0, "errors": ["No active agents found"]}
-    
     if strategy == "round_robin":
-        # Distribuir igualmente
-        distributed = 0
-        for i, lead in enumerate(leads):
-            agent = active_agents[i % len(active_agents)]
-            lead.assigned_agent_id = agent.id
-            lead.updated_at = datetime.utcnow()
-            distributed += 1
-        
-        db.commit()
         return {
-            "distributed": distributed,
+            "distributed": result["distributed"],
             "strategy": "round_robin",
-            "agents_count": len(active_agents)
+            "agents_count": result["agents_count"]
         }
-    
-    elif strategy == "least_busy":
-        # Atribuir ao agente com menos leads ativas
-        agent_loads = {}
-        for agent in active_agents:
-            count = db.query(Lead).filter(
-                Lead.assigned_agent_id == agent.id,
-                Lead.status.in_([LeadStatus.NEW, LeadStatus.CONTACTED, LeadStatus.QUALIFIED])
-            ).count()
-            agent_loads[agent.id] = count
-        
-        # Ordenar agentes por carga (menor primeiro)
-        sorted_agents = sorted(active_agents, key=lambda a: agent_loads.get(a.id, 0))
-        
-        distributed = 0
-        for i, lead in enumerate(leads):
-            agent = sorted_agents[i % len(sorted_agents)]
-            lead.assigned_agent_id = agent.id
-            lead.updated_at = datetime.utcnow()
-            distributed += 1
-        
-        db.commit()
-        return {
-            "distributed": distributed,
-            "strategy": "least_busy",
-            "agent_loads": {a.id: agent_loads.get(a.id, 0) for a in sorted_agents}
-        }
-    
-    return {"distributed": 0, "errors": [f"Unknown strategy: {strategy}"]}
+    return {
+        "distributed": result["distributed"],
+        "strategy": "least_busy",
+        "agent_loads": result["agent_loads"]
+    }
 
 
 def delete_lead(db: Session, lead_id: int):
@@ -237,171 +204,18 @@ def get_conversion_analytics(db: Session, days: int = 30):
     """
     Analytics de conversão de leads.
     """
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Total de leads no período
-    total_leads = db.query(Lead).filter(Lead.created_at >= cutoff_date).count()
-    
-    # Leads convertidas
-    converted_leads = db.query(Lead).filter(
-        Lead.created_at >= cutoff_date,
-        Lead.status == LeadStatus.CONVERTED
-    ).count()
-    
-    # Taxa de conversão
-    conversion_rate = (converted_leads / total_leads * 100) if total_leads > 0 else 0
-    
-    # Conversão por origem
-    conversion_by_source = {}
-    for source in LeadSource:
-        source_total = db.query(Lead).filter(
-            Lead.created_at >= cutoff_date,
-            Lead.source == source
-        ).count()
-        
-        source_converted = db.query(Lead).filter(
-            Lead.created_at >= cutoff_date,
-            Lead.source == source,
-            Lead.status == LeadStatus.CONVERTED
-        ).count()
-        
-        conversion_by_source[source.value] = {
-            "total": source_total,
-            "converted": source_converted,
-            "rate": (source_converted / source_total * 100) if source_total > 0 else 0
-        }
-    
-    # Tempo médio até conversão (em horas)
-    converted = db.query(Lead).filter(
-        Lead.created_at >= cutoff_date,
-        Lead.status == LeadStatus.CONVERTED
-    ).all()
-    
-    avg_time_to_conversion = 0
-    if converted:
-        times = [(lead.updated_at - lead.created_at).total_seconds() / 3600 for lead in converted]
-        avg_time_to_conversion = sum(times) / len(times)
-    
-    return {
-        "period_days": days,
-        "total_leads": total_leads,
-        "converted_leads": converted_leads,
-        "conversion_rate": round(conversion_rate, 2),
-        "conversion_by_source": conversion_by_source,
-        "avg_hours_to_conversion": round(avg_time_to_conversion, 1)
-    }
+    return analytics.conversion_analytics(db, days)
 
 
 def get_agent_performance(db: Session, days: int = 30):
     """
     Performance de agentes com leads.
     """
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    
-    agents = db.query(Agent).all()
-    performance = []
-    
-    for agent in agents:
-        # Leads atribuídas ao agente no período
-        agent_leads = db.query(Lead).filter(
-            Lead.assigned_agent_id == agent.id,
-            Lead.created_at >= cutoff_date
-        ).all()
-        
-        if not agent_leads:
-            continue
-        
-        total = len(agent_leads)
-        converted = sum(1 for lead in agent_leads if lead.status == LeadStatus.CONVERTED)
-        lost = sum(1 for lead in agent_leads if lead.status == LeadStatus.LOST)
-        active = total - converted - lost
-        
-        # Taxa de conversão
-        conversion_rate = (converted / total * 100) if total > 0 else 0
-        
-        # Tempo médio de resposta (NEW → CONTACTED)
-        contacted_leads = [l for l in agent_leads if l.status not in [LeadStatus.NEW]]
-        avg_response_time = 0
-        if contacted_leads:
-            times = [(lead.updated_at - lead.created_at).total_seconds() / 3600 for lead in contacted_leads]
-            avg_response_time = sum(times) / len(times)
-        
-        performance.append({
-            "agent_id": agent.id,
-            "agent_name": agent.name,
-            "total_leads": total,
-            "active_leads": active,
-            "converted_leads": converted,
-            "lost_leads": lost,
-            "conversion_rate": round(conversion_rate, 2),
-            "avg_response_hours": round(avg_response_time, 1)
-        })
-    
-    # Ordenar por taxa de conversão
-    performance.sort(key=lambda x: x["conversion_rate"], reverse=True)
-    
-    return {
-        "period_days": days,
-        "agents": performance
-    }
+    return analytics.agent_performance(db, days)
 
 
 def get_funnel_analytics(db: Session, days: int = 30):
     """
     Funil de vendas completo.
     """
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Contar leads em cada status
-    funnel = {}
-    for status in LeadStatus:
-        count = db.query(Lead).filter(
-            Lead.created_at >= cutoff_date,
-            Lead.status == status
-        ).count()
-        funnel[status.value] = count
-    
-    # Total de leads
-    total = sum(funnel.values())
-    
-    # Percentagens de cada estágio
-    funnel_percentages = {}
-    for status, count in funnel.items():
-        funnel_percentages[status] = {
-            "count": count,
-            "percentage": round((count / total * 100) if total > 0 else 0, 1)
-        }
-    
-    # Calcular drop-off entre estágios
-    dropoff = {}
-    status_order = [
-        LeadStatus.NEW,
-        LeadStatus.CONTACTED,
-        LeadStatus.QUALIFIED,
-        LeadStatus.PROPOSAL_SENT,
-        LeadStatus.VISIT_SCHEDULED,
-        LeadStatus.NEGOTIATION,
-        LeadStatus.CONVERTED
-    ]
-    
-    for i in range(len(status_order) - 1):
-        current = status_order[i]
-        next_status = status_order[i + 1]
-        
-        current_count = funnel[current.value]
-        next_count = funnel[next_status.value]
-        
-        retention = (next_count / current_count * 100) if current_count > 0 else 0
-        
-        dropoff[f"{current.value}_to_{next_status.value}"] = {
-            "retention_rate": round(retention, 1),
-            "drop_off_rate": round(100 - retention, 1),
-            "dropped": current_count - next_count
-        }
-    
-    return {
-        "period_days": days,
-        "total_leads": total,
-        "funnel": funnel_percentages,
-        "dropoff_analysis": dropoff
-    }
+    return analytics.funnel_analytics(db, days)
@@ -19,3 +19,221 @@ def test_create_lead():
     data = response.json()
     assert data["name"] == "João Silva"
     assert data["status"] == "new"
+
+
+def test_get_leads_cursor_pagination_walks_all_pages():
+    from datetime import datetime
+    from app.database import Base, SessionLocal, engine
+    from app.leads import services
+    from app.leads.models import Lead
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    source = f"cursor-test-{datetime.utcnow().timestamp()}"
+    same_instant = datetime(2026, 1, 1, 12, 0, 0)
+    leads = [Lead(name=f"Lead {i}", source=source, created_at=same_instant) for i in range(5)]
+    db.add_all(leads)
+    db.commit()
+    try:
+        seen, cursor = [], None
+        while True:
+            page, cursor = services.get_leads_page(db, limit=2, source=source, cursor=cursor)
+            seen.extend(lead.id for lead in page)
+            if not cursor:
+                break
+        # Empates em created_at resolvidos por id: sem repetidos nem perdidos
+        assert seen == sorted((lead.id for lead in leads), reverse=True)
+    finally:
+        for lead in leads:
+            db.delete(lead)
+        db.commit()
+        db.close()
+
+
+
+def test_leads_cursor_pagination_continues_past_null_created_at(isolated_db):
+    from datetime import datetime
+    from sqlalchemy import update
+    from app.leads import services
+    from app.leads.models import Lead
+
+    db = isolated_db
+    leads = [Lead(name=f"Lead {i}", created_at=datetime(2026, 1, 1 + i)) for i in range(3)]
+    undated = [Lead(name=f"Sem data {i}") for i in range(3)]
+    db.add_all(leads + undated)
+    db.commit()
+    db.execute(update(Lead).where(Lead.id.in_([lead.id for lead in undated])).values(created_at=None))
+    db.commit()
+
+    # limit=4: a primeira página termina na primeira lead sem data
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = services.get_leads_page(db, limit=4, cursor=cursor)
+        seen.extend(lead.id for lead in page)
+        pages += 1
+        if not cursor:
+            break
+    assert pages == 2
+    assert seen == [lead.id for lead in reversed(leads)] + sorted((lead.id for lead in undated), reverse=True)
+
+def test_list_leads_fast_json_matches_schema_and_compresses():
+    """[user-020] GET /leads/ rápido = response_model; comprime acima do mínimo."""
+    from datetime import datetime
+    from app.database import Base, SessionLocal, engine
+    from app.leads import schemas
+    from app.leads.models import Lead
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    source = f"fastjson-test-{datetime.utcnow().timestamp()}"
+    leads = [
+        Lead(name=f"Lead Rápida {i}", email=f"lead{i}@example.com", source=source,
+             message="Interessado no T2 " * 20, created_at=datetime(2026, 1, 1, 12, 0, i, 123456))
+        for i in range(5)
+    ]
+    db.add_all(leads)
+    db.commit()
+    try:
+        # Mesmo JSON que o caminho normal (response_model + jsonable_encoder)
+        expected = [
+            schemas.LeadOut.model_validate(lead).model_dump(mode="json")
+            for lead in sorted(leads, key=lambda lead: lead.id, reverse=True)
+        ]
+        response = client.get(f"/leads/?source={source}", headers={"Accept-Encoding": "identity"})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.json() == expected
+
+        compressed = client.get(f"/leads/?source={source}", headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["content-encoding"] in ("gzip", "br")
+        assert "Accept-Encoding" in compressed.headers["vary"]
+        assert compressed.json() == expected
+
+        # Abaixo do tamanho mínimo não comprime
+        empty = client.get("/leads/?source=sem-resultados", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in empty.headers and empty.json() == []
+    finally:
+        for lead in leads:
+            db.delete(lead)
+        db.commit()
+        db.close()
+
+
+def test_lead_analytics_grouped_queries_and_cache(isolated_db):
+    from datetime import datetime, timedelta
+    from app.agents.models import Agent
+    from app.leads import analytics
+    from app.leads.models import Lead
+
+    db = isolated_db
+    now = datetime.utcnow()
+    ana = Agent(name="Ana", email="ana.analytics@example.com")
+    rui = Agent(name="Rui", email="rui.analytics@example.com")
+    db.add_all([ana, rui])
+    db.flush()
+
+    def lead(agent, status, source, hours, age_days=1):
+        created = now - timedelta(days=age_days)
+        return Lead(name=f"{status}-{source}", assigned_agent_id=agent.id if agent else None, status=status,
+                    source=source, created_at=created, updated_at=created + timedelta(hours=hours))
+
+    db.add_all([
+        lead(ana, "converted", "website", 10),
+        lead(ana, "CONVERTED", "Website", 20),   # valores antigos em maiúsculas
+        lead(ana, "NEW", "phone", 0),
+        lead(rui, "lost", "phone", 4),
+        lead(rui, "contacted", "email", 2),
+        lead(None, "new", "website", 0),
+        lead(ana, "converted", "website", 99, age_days=60),  # fora do período
+    ])
+    db.commit()
+    conversion = analytics.compute_conversion_analytics(db, days=30)
+    assert conversion["total_leads"] == 6 and conversion["converted_leads"] == 2
+    assert conversion["conversion_by_source"]["website"] == {"total": 3, "converted": 2, "rate": 2 / 3 * 100}
+    assert conversion["conversion_by_source"]["referral"]["total"] == 0
+    assert conversion["avg_hours_to_conversion"] == 15.0
+
+    funnel = analytics.compute_funnel_analytics(db, days=30)
+    assert funnel["total_leads"] == 6
+    assert funnel["funnel"]["new"]["count"] == 2 and funnel["funnel"]["converted"]["count"] == 2
+    assert funnel["dropoff_analysis"]["new_to_contacted"]["dropped"] == 1
+
+    agents = analytics.compute_agent_performance(db, days=30)["agents"]
+    assert [a["agent_name"] for a in agents] == ["Ana", "Rui"]
+    assert agents[0]["total_leads"] == 3 and agents[0]["converted_leads"] == 2 and agents[0]["active_leads"] == 1
+    assert agents[0]["avg_response_hours"] == 15.0
+    assert agents[1]["lost_leads"] == 1 and agents[1]["avg_response_hours"] == 3.0
+
+    stats = analytics.compute_lead_stats(db)
+    assert stats["total"] == 7 and stats["by_status"]["converted"] == 3
+
+    # Cache por tenant, invalidada por commits de leads
+    analytics.analytics_cache.clear()
+    assert analytics.funnel_analytics(db, days=30)["total_leads"] == 6
+    db.add(lead(rui, "qualified", "email", 1))
+    db.commit()
+    assert analytics.funnel_analytics(db, days=30)["total_leads"] == 7
+
+
+def test_assign_leads_bulk_strategies_and_atomic_round_robin(isolated_db):
+    from sqlalchemy import select
+    from app.agents.models import Agent
+    from app.leads import assignment
+    from app.leads.models import Lead
+    from app.models.sync_tombstone import SyncTombstone
+    from app.models.website_client import LeadDistributionCounter
+
+    db = isolated_db
+    ana = Agent(name="Ana", email="ana.assign@example.com")
+    rui = Agent(name="Rui", email="rui.assign@example.com")
+    eva = Agent(name="Eva", email="eva.assign@example.com")
+    db.add_all([ana, rui, eva])
+    db.flush()
+    agents = [ana.id, rui.id, eva.id]
+    # Carga ativa: Ana 2, Rui 0 (a lead 'converted' não conta), Eva 1
+    db.add_all([
+        Lead(name="a1", status="new", assigned_agent_id=ana.id),
+        Lead(name="a2", status="CONTACTED", assigned_agent_id=ana.id),
+        Lead(name="r1", status="converted", assigned_agent_id=rui.id),
+        Lead(name="e1", status="qualified", assigned_agent_id=eva.id),
+    ])
+    pending = [Lead(name=f"p{i}", status="new") for i in range(7)]
+    db.add_all(pending)
+    db.commit()
+    pending_ids = [lead.id for lead in pending]
+    assignment.pool_cache.clear()
+
+    def owners(ids):
+        return dict(db.execute(select(Lead.id, Lead.assigned_agent_id).where(Lead.id.in_(ids))).all())
+
+    assert assignment.agent_loads(db, agents) == {ana.id: 2, rui.id: 0, eva.id: 1}
+
+    # least_busy: enche primeiro os agentes com menos leads ativas
+    result = assignment.assign_leads(db, pending_ids[:3], "least_busy")
+    db.commit()
+    assert result["distributed"] == 3 and result["agent_loads"] == {ana.id: 2, rui.id: 0, eva.id: 1}
+    assert sorted(owners(pending_ids[:3]).values()) == sorted([rui.id, rui.id, eva.id])
+
+    # round_robin: o contador continua entre lotes (e entre pedidos)
+    first = assignment.assign_leads(db, pending_ids[3:5], "round_robin", counter_type="test")
+    second = assignment.assign_leads(db, pending_ids[5:], "round_robin", counter_type="test")
+    db.commit()
+    current = owners(pending_ids[3:])
+    assert [current[lead_id] for lead_id in pending_ids[3:]] == [ana.id, rui.id, eva.id, ana.id]
+    assert first["assignments"] == {ana.id: 1, rui.id: 1} and second["distributed"] == 2
+    counter = db.execute(select(LeadDistributionCounter).where(LeadDistributionCounter.counter_type == "test")).scalar_one()
+    assert counter.last_agent_index == 0
+    assert assignment.advance_round_robin(db, "test", 3, steps=2) == 1
+
+    # only_unassigned: leads já atribuídas não são tocadas
+    assert assignment.assign_leads(db, pending_ids, "workload", only_unassigned=True)["distributed"] == 0
+
+    # Reatribuição manual em massa gera tombstones para o agente anterior
+    moved = assignment.assign_leads(db, pending_ids[:2], "manual", target_agent_id=ana.id)
+    db.commit()
+    assert moved["distributed"] == 2 and set(owners(pending_ids[:2]).values()) == {ana.id}
+    tombstones = db.execute(select(SyncTombstone.entity_id, SyncTombstone.agent_id, SyncTombstone.reason)).all()
+    assert sorted(tombstones) == sorted((lead_id, rui.id, "reassigned") for lead_id in pending_ids[:2])
+
+    with pytest.raises(ValueError):
+        assignment.assign_leads(db, pending_ids, "fastest")
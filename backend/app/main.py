@@ -16,6 +16,7 @@ from app.assistant.routes import router as assistant_router
 from app.notifications.routes import router as notifications_router
 from app.billing.routes import router as billing_router
 from app.reports.routes import router as reports_router
+from app.search.routes import router as search_router
 from app.users.routes import router as users_router
 from app.mobile.routes import router as mobile_router
 
@@ -55,7 +56,8 @@ except Exception as extranet_import_error:
 from app.portals.routes import router as portals_router
 
 # Multi-tenant middleware
-from app.middleware.tenant import TenantMiddleware
+from app.middleware.tenant import TenantMiddleware, preload_domain_cache
+from app.middleware.compression import CompressionMiddleware
 
 # Debug endpoint to check database connection
 from fastapi import APIRouter, Depends
@@ -183,10 +185,47 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ [LIFESPAN] Erro ao verificar tabelas: {e}")
     
+    # Pré-carregar mapa domínio→tenant (evita queries no primeiro request de cada host)
+    preload_domain_cache()
+    
+    # Worker de sincronização com portais (todos os tenants)
+    from app.portals.worker import portal_sync_worker, PORTAL_WORKER_ENABLED
+    if PORTAL_WORKER_ENABLED:
+        portal_sync_worker.start()
+    
+    # EventBus entre workers/réplicas (LISTEN/NOTIFY em PostgreSQL)
+    from app.core.events import event_bus
+    await event_bus.start_transport()
+    
+    # Lembretes de visitas e tarefas (todos os tenants, heap em memória)
+    from app.core.scheduler import reminder_scheduler, REMINDER_SCHEDULER_ENABLED
+    if REMINDER_SCHEDULER_ENABLED:
+        reminder_scheduler.start()
+    
+    # Rollups diários dos relatórios (dias marcados no flush + catch-up periódico)
+    from app.reports.rollups import rollup_worker, ROLLUP_WORKER_ENABLED
+    if ROLLUP_WORKER_ENABLED:
+        rollup_worker.start()
+    
+    # Estatísticas da plataforma (snapshot periódico de todos os tenants)
+    from app.platform.stats import platform_stats_collector, PLATFORM_STATS_ENABLED
+    if PLATFORM_STATS_ENABLED:
+        platform_stats_collector.start()
+    
     yield
     
     # Shutdown
     print("🔴 [LIFESPAN] Aplicação encerrando...")
+    
+    await portal_sync_worker.stop()
+    await reminder_scheduler.stop()
+    await rollup_worker.stop()
+    await platform_stats_collector.stop()
+    await event_bus.close()
+    
+    # Terminar pool de processamento de imagens (se foi criado)
+    from app.properties.image_jobs import shutdown_image_pool
+    shutdown_image_pool()
 
 
 app = FastAPI(
@@ -285,6 +324,11 @@ app.add_middleware(
 # e configura o schema do PostgreSQL para a requisição
 app.add_middleware(TenantMiddleware)
 
+# =====================================================
+# COMPRESSÃO DE RESPOSTAS (brotli/gzip acima de RESPONSE_COMPRESSION_MIN_SIZE)
+# =====================================================
+app.add_middleware(CompressionMiddleware)
+
 # Extranet/Partners/Share routers (feature-guarded inside)
 if extranet_admin_router is not None:
     app.include_router(extranet_admin_router)
@@ -309,26 +353,13 @@ def get_public_branding(request: Request, db: Session = Depends(get_db)):
     PÚBLICO - Não requer autenticação.
     Usado pelos frontends (web, backoffice) para exibir logo, nome e cores do tema.
     Respeita o X-Tenant-Slug header para multi-tenant.
+    
+    Servido da cache de configuração do tenant (app/core/tenant_config.py),
+    com ETag: If-None-Match igual devolve 304.
     """
-    from app.platform.models import Tenant
-    from sqlalchemy import text, create_engine as sa_create_engine
-    import os
-    
-    # Defaults do tema escuro
-    defaults = {
-        "agency_name": "CRM Plus",
-        "agency_slogan": "O seu negócio, simplificado",
-        "agency_logo_url": None,
-        "primary_color": "#E10600",
-        "secondary_color": "#C5C5C5",
-        "background_color": "#0B0B0D",
-        "background_secondary": "#1A1A1F",
-        "text_color": "#FFFFFF",
-        "text_muted": "#9CA3AF",
-        "border_color": "#2A2A2E",
-        "accent_color": "#E10600",
-        "sector": "real_estate"
-    }
+    from app.core import tenant_config
+    
+    defaults = tenant_config.encode_payload(tenant_config.DEFAULT_BRANDING)
     
     # Obter tenant do header
     tenant_slug = request.headers.get("X-Tenant-Slug")
@@ -336,69 +367,18 @@ def get_public_branding(request: Request, db: Session = Depends(get_db)):
     # Se não tem tenant slug, retornar defaults (CRM Plus)
     if not tenant_slug:
         print(f"[BRANDING] No X-Tenant-Slug header, returning CRM Plus defaults")
-        return defaults
+        return tenant_config.conditional_response(request, *defaults)
     
-    # Verificar se tenant existe (usando DB normal para lookup)
-    tenant = db.query(Tenant).filter(Tenant.slug == tenant_slug).first()
+    tenant = tenant_config.tenant_record(db, tenant_slug)
     if not tenant:
         print(f"[BRANDING] Tenant '{tenant_slug}' not found in database, returning defaults")
-        return defaults
+        return tenant_config.conditional_response(request, *defaults)
     
-    if not tenant.schema_name:
+    if not tenant["schema_name"]:
         print(f"[BRANDING] Tenant '{tenant_slug}' has no schema_name, returning defaults")
-        return defaults
+        return tenant_config.conditional_response(request, *defaults)
     
-    try:
-        # Criar engine completamente isolado sem event listeners
-        db_url = os.environ.get("DATABASE_URL", "")
-        if db_url.startswith("postgres://"):
-            db_url = db_url.replace("postgres://", "postgresql://", 1)
-        
-        isolated_engine = sa_create_engine(db_url, pool_pre_ping=True)
-        
-        with isolated_engine.connect() as conn:
-            # Definir search_path nesta conexão isolada
-            conn.execute(text(f'SET search_path TO "{tenant.schema_name}", public'))
-            print(f"[BRANDING] Using schema {tenant.schema_name} for tenant {tenant_slug}")
-            
-            # Buscar settings directamente com SQL para evitar problemas de ORM
-            result = conn.execute(text("""
-                SELECT agency_name, agency_slogan, agency_logo_url, 
-                       primary_color, secondary_color, background_color,
-                       background_secondary, text_color, text_muted,
-                       border_color, accent_color
-                FROM crm_settings 
-                LIMIT 1
-            """))
-            row = result.first()
-            
-            if not row:
-                print(f"[BRANDING] No CRMSettings in schema {tenant.schema_name}, returning defaults")
-                isolated_engine.dispose()
-                return defaults
-            
-            print(f"[BRANDING] Found settings for {tenant_slug}: {row[0]}")
-            
-            result_data = {
-                "agency_name": row[0] or defaults["agency_name"],
-                "agency_slogan": row[1] or defaults["agency_slogan"],
-                "agency_logo_url": row[2],
-                "primary_color": row[3] or defaults["primary_color"],
-                "secondary_color": row[4] or defaults["secondary_color"],
-                "background_color": row[5] or defaults["background_color"],
-                "background_secondary": row[6] or defaults["background_secondary"],
-                "text_color": row[7] or defaults["text_color"],
-                "text_muted": row[8] or defaults["text_muted"],
-                "border_color": row[9] or defaults["border_color"],
-                "accent_color": row[10] or defaults["accent_color"],
-                "sector": tenant.sector or "real_estate"
-            }
-            
-        isolated_engine.dispose()
-        return result_data
-    except Exception as e:
-        print(f"[BRANDING] Error fetching settings: {e}")
-        return defaults
+    return tenant_config.conditional_response(request, *tenant_config.public_branding(tenant))
 
 
 @app.get("/api/v1/tenant/config")
@@ -411,8 +391,9 @@ def get_tenant_config(
     
     PÚBLICO - Não requer autenticação.
     Usado pelos frontends para adaptar UI ao sector do tenant.
+    Servido da cache de configuração do tenant, com ETag.
     """
-    from app.platform.models import Tenant
+    from app.core import tenant_config
     
     # Tentar obter tenant do middleware ou header
     tenant_slug = getattr(request.state, 'tenant_slug', None)
@@ -444,27 +425,30 @@ def get_tenant_config(
     if not tenant_slug:
         return default_config
     
-    try:
-        tenant = db.query(Tenant).filter(Tenant.slug == tenant_slug).first()
+    def build():
+        tenant = tenant_config.tenant_record(db, tenant_slug)
         if not tenant:
             return default_config
-        
         return {
-            "id": tenant.id,
-            "slug": tenant.slug,
-            "name": tenant.name,
-            "sector": tenant.sector or "real_estate",
-            "plan": tenant.plan or "basic",
-            "primary_color": tenant.primary_color or "#E10600",
-            "secondary_color": tenant.secondary_color or "#C5C5C5",
-            "logo_url": tenant.logo_url,
-            "features": tenant.features or [],
-            "max_agents": tenant.max_agents or 10,
-            "max_properties": tenant.max_properties or 100,
+            "id": tenant["id"],
+            "slug": tenant["slug"],
+            "name": tenant["name"],
+            "sector": tenant["sector"] or "real_estate",
+            "plan": tenant["plan"] or "basic",
+            "primary_color": tenant["primary_color"] or "#E10600",
+            "secondary_color": tenant["secondary_color"] or "#C5C5C5",
+            "logo_url": tenant["logo_url"],
+            "features": tenant["features"] or [],
+            "max_agents": tenant["max_agents"] or 10,
+            "max_properties": tenant["max_properties"] or 100,
         }
+    
+    try:
+        body, etag = tenant_config.cached_payload(("config_v1", tenant_slug), build)
     except Exception as e:
         print(f"[TENANT CONFIG] Error: {e}")
         return default_config
+    return tenant_config.conditional_response(request, body, etag)
 
 
 app.include_router(leads_router)
@@ -622,26 +606,31 @@ async def websocket_endpoint(
         await websocket.close(code=1008, reason="Token inválido")
         return
     
-    # Conectar ao manager
-    await connection_manager.connect(websocket, agent_id)
+    # Conexões indexadas por (tenant, agente): o tenant vem do token
+    tenant_slug = payload.get("tenant_slug")
+    tenant_schema = f"tenant_{tenant_slug.lower()}" if tenant_slug else None
+    
+    # Conectar ao manager (envios passam todos pela fila da conexão)
+    connection = await connection_manager.connect(websocket, agent_id, tenant_schema)
     
     try:
         # Loop para manter conexão aberta
         while True:
             # Receber mensagens do cliente (ping/pong para keep-alive)
             data = await websocket.receive_text()
+            connection.touch()
             
             # Echo back (confirma que está online)
             if data == "ping":
-                await websocket.send_json({"type": "pong", "timestamp": datetime.utcnow().isoformat()})
+                connection.send({"type": "pong", "timestamp": datetime.utcnow().isoformat()})
     
     except WebSocketDisconnect:
-        connection_manager.disconnect(websocket, agent_id)
+        connection_manager.disconnect(websocket, agent_id, tenant_schema)
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
         logger.error(f"WebSocket error: {str(e)}")
-        connection_manager.disconnect(websocket, agent_id)
+        connection_manager.disconnect(websocket, agent_id, tenant_schema)
 
 
 # =====================================================
@@ -659,6 +648,7 @@ app.include_router(assistant_router)
 app.include_router(notifications_router)
 app.include_router(billing_router)
 app.include_router(reports_router)
+app.include_router(search_router)
 app.include_router(mobile_router)
 app.include_router(users_router)
 
@@ -0,0 +1,766 @@
+"""
+Motor de matching lead/cliente ↔ imóvel (Match Plus).
+
+Os imóveis disponíveis de um tenant são carregados em colunas NumPy
+compactas (preço, tipologia, quartos, área, concelho, freguesia, tipo,
+negócio, lat/long) e cada perfil de procura — lead ativa (derivada do imóvel
+que a gerou) ou cliente comprador com `preferencias` — é pontuado contra
+todos os imóveis em passagens vetorizadas por blocos de perfis. O top-K de
+cada perfil é gravado em lead_property_matches de uma vez (DELETE + INSERT
+em massa).
+
+Incremental: commits que alteram Property/Lead/Client marcam o tenant; a
+alteração é aplicada em background apenas aos perfis afetados (uma linha ou
+uma coluna da matriz de scores), sem voltar a varrer tudo; alterar um imóvel
+re-perfila também as leads geradas por ele.
+
+Chaves aceites em Client.preferencias (PT ou EN):
+    preco_min / budget_min, preco_max / budget_max
+    tipologia / typologies (str ou lista, ex: "T2"), quartos_min / bedrooms_min
+    area_min, concelhos / preferred_locations, freguesias
+    tipo_imovel / property_types, tipo_negocio / business_type
+    latitude, longitude, raio_km
+
+Configuração via ENV:
+    MATCH_PLUS_TOP_K        matches guardados por perfil (default: 20)
+    MATCH_PLUS_MIN_SCORE    score mínimo para guardar (default: 0.5)
+    MATCH_PLUS_STATE_TTL    segundos até recarregar o estado em memória (default: 900)
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import DEFAULT_SCHEMA, get_tenant_schema, tenant_session
+from app.leads.models import Lead
+from app.match_plus.models import LeadPropertyMatch
+from app.models.client import Client
+from app.properties.models import Property
+
+MATCH_TOP_K = int(os.getenv("MATCH_PLUS_TOP_K", "20"))
+MATCH_MIN_SCORE = float(os.getenv("MATCH_PLUS_MIN_SCORE", "0.5"))
+MATCH_STATE_TTL = float(os.getenv("MATCH_PLUS_STATE_TTL", "900"))
+MATCH_MAX_TENANTS = 16
+
+# Limite de elementos (perfis × imóveis) por bloco de scoring
+SCORE_CHUNK_ELEMENTS = 4_000_000
+# Valores multi (concelhos, tipologias...) guardados por perfil
+MAX_CODES = 8
+
+INACTIVE_LEAD_STATUSES = {"converted", "lost"}
+BUYER_CLIENT_TYPES = {"comprador", "investidor", "arrendatario", "lead"}
+
+WEIGHTS = {
+    "price": 0.35,
+    "location": 0.25,
+    "rooms": 0.20,
+    "area": 0.10,
+    "type": 0.10,
+}
+PRICE_TOLERANCE_UP = 0.15     # acima do máximo: score cai a 0 em +15% (e é excluído)
+PRICE_TOLERANCE_DOWN = 0.30   # abaixo do mínimo: score cai a 0 em -30%
+LEAD_PRICE_BAND = 0.20        # leads: ±20% do preço do imóvel de origem
+DEFAULT_RADIUS_KM = 10.0
+EARTH_RADIUS_KM = 6371.0
+
+ProfileKey = Tuple[str, int]  # ("lead" | "client", id)
+
+
+def _norm(value) -> str:
+    return str(value).strip().lower() if value not in (None, "") else ""
+
+
+def _bedrooms_from_typology(typology: Optional[str]) -> Optional[int]:
+    """'T3' -> 3, 'T2+1' -> 2"""
+    text = _norm(typology)
+    if len(text) >= 2 and text[0] == "t" and text[1].isdigit():
+        digits = ""
+        for ch in text[1:]:
+            if not ch.isdigit():
+                break
+            digits += ch
+        return int(digits)
+    return None
+
+
+def _as_list(value) -> list:
+    if value in (None, "", []):
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [v for v in value if v not in (None, "")]
+    return [value]
+
+
+def _float_or_nan(value) -> float:
+    try:
+        return float(value) if value not in (None, "") else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class Vocabulary:
+    """Codifica strings normalizadas em inteiros (0 = desconhecido)."""
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value) -> int:
+        text = _norm(value)
+        if not text:
+            return 0
+        if text not in self._codes:
+            self._codes[text] = len(self._codes) + 1
+        return self._codes[text]
+
+    def codes(self, values: Iterable, width: int = MAX_CODES) -> List[int]:
+        out = [self.code(v) for v in values][:width]
+        out = [c for c in out if c]
+        return out + [-1] * (width - len(out))
+
+
+class PropertyMatrix:
+    """Colunas NumPy dos imóveis disponíveis (linhas removidas ficam com alive=False)."""
+
+    COLUMNS = (
+        ("price", np.float32), ("typology", np.int32), ("bedrooms", np.float32),
+        ("area", np.float32), ("municipality", np.int32), ("parish", np.int32),
+        ("ptype", np.int32), ("business", np.int32), ("lat", np.float32), ("lon", np.float32),
+    )
+
+    def __init__(self, vocab: Vocabulary):
+        self.vocab = vocab
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        self.row_of: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _encode(self, prop) -> dict:
+        bedrooms = prop.bedrooms if prop.bedrooms is not None else _bedrooms_from_typology(prop.typology)
+        lat, lon = _float_or_nan(prop.latitude), _float_or_nan(prop.longitude)
+        return {
+            "price": _float_or_nan(prop.price),
+            "typology": self.vocab.code(prop.typology),
+            "bedrooms": _float_or_nan(bedrooms),
+            "area": _float_or_nan(prop.usable_area),
+            "municipality": self.vocab.code(prop.municipality),
+            "parish": self.vocab.code(prop.parish),
+            "ptype": self.vocab.code(prop.property_type),
+            "business": self.vocab.code(prop.business_type),
+            "lat": math.radians(lat) if not math.isnan(lat) else math.nan,
+            "lon": math.radians(lon) if not math.isnan(lon) else math.nan,
+        }
+
+    def load(self, rows: list) -> None:
+        encoded = [self._encode(row) for row in rows]
+        self.ids = np.array([row.id for row in rows], dtype=np.int64)
+        self.alive = np.ones(len(rows), dtype=bool)
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.array([e[name] for e in encoded], dtype=dtype))
+        self.row_of = {int(pid): i for i, pid in enumerate(self.ids)}
+
+    def upsert(self, prop) -> int:
+        values = self._encode(prop)
+        row = self.row_of.get(prop.id)
+        if row is None:
+            row = len(self.ids)
+            self.ids = np.append(self.ids, np.int64(prop.id))
+            self.alive = np.append(self.alive, True)
+            for name, dtype in self.COLUMNS:
+                setattr(self, name, np.append(getattr(self, name), np.array([values[name]], dtype=dtype)))
+            self.row_of[prop.id] = row
+        else:
+            self.alive[row] = True
+            for name, _ in self.COLUMNS:
+                getattr(self, name)[row] = values[name]
+        return row
+
+    def view(self, cols: np.ndarray) -> "PropertyMatrix":
+        """Matriz só com as linhas `cols` (para pontuar poucos imóveis contra todos os perfis)."""
+        sub = PropertyMatrix(self.vocab)
+        sub.ids = self.ids[cols]
+        sub.alive = self.alive[cols]
+        for name, _ in self.COLUMNS:
+            setattr(sub, name, getattr(self, name)[cols])
+        sub.row_of = {int(pid): i for i, pid in enumerate(sub.ids)}
+        return sub
+
+    def remove(self, property_id: int) -> bool:
+        row = self.row_of.get(property_id)
+        if row is None or not self.alive[row]:
+            return False
+        self.alive[row] = False
+        return True
+
+
+class ProfileMatrix:
+    """Perfis de procura (leads ativas e clientes compradores) em colunas NumPy."""
+
+    def __init__(self, vocab: Vocabulary):
+        self.vocab = vocab
+        self.keys: List[ProfileKey] = []
+        self.row_of: Dict[ProfileKey, int] = {}
+        self.price_min = np.zeros(0, dtype=np.float32)
+        self.price_max = np.zeros(0, dtype=np.float32)
+        self.bedrooms_min = np.zeros(0, dtype=np.float32)
+        self.area_min = np.zeros(0, dtype=np.float32)
+        self.lat = np.zeros(0, dtype=np.float32)
+        self.lon = np.zeros(0, dtype=np.float32)
+        self.radius = np.zeros(0, dtype=np.float32)
+        self.business = np.zeros(0, dtype=np.int32)
+        self.exclude = np.zeros(0, dtype=np.int64)
+        self.typologies = np.zeros((0, MAX_CODES), dtype=np.int32)
+        self.municipalities = np.zeros((0, MAX_CODES), dtype=np.int32)
+        self.parishes = np.zeros((0, MAX_CODES), dtype=np.int32)
+        self.ptypes = np.zeros((0, MAX_CODES), dtype=np.int32)
+
+    SCALARS = ("price_min", "price_max", "bedrooms_min", "area_min", "lat", "lon", "radius", "business", "exclude")
+    SETS = ("typologies", "municipalities", "parishes", "ptypes")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def set_profile(self, key: ProfileKey, profile: Optional[dict]) -> Optional[int]:
+        """Insere/atualiza um perfil (None remove). Devolve a linha ou None."""
+        row = self.row_of.get(key)
+        if profile is None:
+            if row is not None:
+                self._clear(row)
+            return None
+        encoded = {
+            "price_min": _float_or_nan(profile.get("price_min")),
+            "price_max": _float_or_nan(profile.get("price_max")),
+            "bedrooms_min": _float_or_nan(profile.get("bedrooms_min")),
+            "area_min": _float_or_nan(profile.get("area_min")),
+            "lat": _float_or_nan(profile.get("lat")),
+            "lon": _float_or_nan(profile.get("lon")),
+            "radius": _float_or_nan(profile.get("radius_km")),
+            "business": self.vocab.code(profile.get("business_type")),
+            "exclude": int(profile.get("exclude_property_id") or 0),
+            "typologies": self.vocab.codes(profile.get("typologies", [])),
+            "municipalities": self.vocab.codes(profile.get("municipalities", [])),
+            "parishes": self.vocab.codes(profile.get("parishes", [])),
+            "ptypes": self.vocab.codes(profile.get("property_types", [])),
+        }
+        for coord in ("lat", "lon"):
+            if not math.isnan(encoded[coord]):
+                encoded[coord] = math.radians(encoded[coord])
+        if row is None:
+            row = len(self.keys)
+            self.keys.append(key)
+            self.row_of[key] = row
+            for name in self.SCALARS:
+                arr = getattr(self, name)
+                setattr(self, name, np.append(arr, np.array([encoded[name]], dtype=arr.dtype)))
+            for name in self.SETS:
+                arr = getattr(self, name)
+                setattr(self, name, np.vstack([arr, np.array([encoded[name]], dtype=arr.dtype)]))
+        else:
+            for name in self.SCALARS + self.SETS:
+                getattr(self, name)[row] = encoded[name]
+        return row
+
+    def _clear(self, row: int) -> None:
+        # Perfil removido: sem critérios => score 0 em tudo (a linha é reutilizável)
+        for name in ("price_min", "price_max", "bedrooms_min", "area_min", "lat", "lon", "radius"):
+            getattr(self, name)[row] = np.nan
+        self.business[row] = 0
+        self.exclude[row] = -1
+        for name in self.SETS:
+            getattr(self, name)[row] = -1
+
+
+def _member(values: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """(N,) × (P, M) -> (P, N): valor do imóvel pertence ao conjunto do perfil."""
+    out = np.zeros((codes.shape[0], values.shape[0]), dtype=bool)
+    for slot in range(codes.shape[1]):
+        out |= codes[:, slot:slot + 1] == values[None, :]
+    return out
+
+
+def score_block(props: PropertyMatrix, profiles: ProfileMatrix, rows: np.ndarray) -> np.ndarray:
+    """
+    Scores (len(rows), N) em [0, 1] para os perfis `rows` contra todos os imóveis.
+
+    Cada componente só conta se o perfil tiver esse critério; o score final é
+    a média ponderada dos componentes presentes. Negócio diferente, preço
+    acima do máximo + tolerância ou imóvel removido/excluído dão 0.
+    """
+    n_props = len(props)
+    score = np.zeros((len(rows), n_props), dtype=np.float32)
+    weight = np.zeros((len(rows), 1), dtype=np.float32)
+    if n_props == 0 or len(rows) == 0:
+        return score
+
+    price = props.price[None, :]
+    p_min = profiles.price_min[rows][:, None]
+    p_max = profiles.price_max[rows][:, None]
+    valid = props.alive[None, :] & (props.ids[None, :] != profiles.exclude[rows][:, None])
+
+    # --- Preço ---
+    has_price = ~(np.isnan(p_min) & np.isnan(p_max))
+    hi = np.where(np.isnan(p_max), np.inf, p_max)
+    lo = np.where(np.isnan(p_min), 0.0, p_min)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s_above = 1.0 - (price - hi) / (hi * PRICE_TOLERANCE_UP)
+        s_below = 1.0 - (lo - price) / (lo * PRICE_TOLERANCE_DOWN)
+    s_price = np.where(price > hi, s_above, np.where(price < lo, s_below, 1.0))
+    s_price = np.clip(np.nan_to_num(s_price, nan=0.0), 0.0, 1.0)
+    score += WEIGHTS["price"] * s_price * has_price
+    weight += WEIGHTS["price"] * has_price
+    valid &= ~(price > hi * (1.0 + PRICE_TOLERANCE_UP))
+
+    # --- Localização: concelho/freguesia ou distância ao ponto de interesse ---
+    municipalities = profiles.municipalities[rows]
+    parishes = profiles.parishes[rows]
+    p_lat = profiles.lat[rows][:, None]
+    p_lon = profiles.lon[rows][:, None]
+    has_area_codes = (municipalities[:, :1] > 0) | (parishes[:, :1] > 0)
+    has_point = ~np.isnan(p_lat) & ~np.isnan(p_lon)
+    has_location = has_area_codes | has_point
+    # Concelho certo vale 1.0, ou 0.8 se o perfil também pedir freguesias e esta não bate
+    in_municipality = _member(props.municipality, municipalities)
+    in_parish = _member(props.parish, parishes)
+    has_parishes = parishes[:, :1] > 0
+    s_location = np.where(in_parish, 1.0, np.where(in_municipality, np.where(has_parishes, 0.8, 1.0), 0.0))
+    if has_point.any():
+        radius = np.where(np.isnan(profiles.radius[rows]), DEFAULT_RADIUS_KM, profiles.radius[rows])[:, None]
+        d_lat = props.lat[None, :] - p_lat
+        d_lon = props.lon[None, :] - p_lon
+        a = np.sin(d_lat / 2) ** 2 + np.cos(p_lat) * np.cos(props.lat[None, :]) * np.sin(d_lon / 2) ** 2
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        s_distance = np.nan_to_num(np.exp(-distance / radius), nan=0.0)
+        s_location = np.maximum(s_location, np.where(has_point, s_distance, 0.0))
+    score += WEIGHTS["location"] * s_location * has_location
+    weight += WEIGHTS["location"] * has_location
+
+    # --- Tipologia / quartos ---
+    typologies = profiles.typologies[rows]
+    bedrooms_min = profiles.bedrooms_min[rows][:, None]
+    has_typology = typologies[:, :1] > 0
+    has_bedrooms = ~np.isnan(bedrooms_min)
+    has_rooms = has_typology | has_bedrooms
+    s_rooms = _member(props.typology, typologies).astype(np.float32)
+    with np.errstate(invalid="ignore"):
+        shortfall = np.clip(bedrooms_min - props.bedrooms[None, :], 0.0, None)
+    s_bedrooms = np.nan_to_num(1.0 - 0.5 * shortfall, nan=0.0)
+    s_rooms = np.where(has_bedrooms, np.maximum(s_rooms, np.clip(s_bedrooms, 0.0, 1.0)), s_rooms)
+    score += WEIGHTS["rooms"] * s_rooms * has_rooms
+    weight += WEIGHTS["rooms"] * has_rooms
+
+    # --- Área útil ---
+    area_min = profiles.area_min[rows][:, None]
+    has_area = ~np.isnan(area_min) & (np.nan_to_num(area_min) > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s_area = np.clip(props.area[None, :] / area_min, 0.0, 1.0)
+    score += WEIGHTS["area"] * np.nan_to_num(s_area, nan=0.0) * has_area
+    weight += WEIGHTS["area"] * has_area
+
+    # --- Tipo de imóvel ---
+    ptypes = profiles.ptypes[rows]
+    has_type = ptypes[:, :1] > 0
+    score += WEIGHTS["type"] * _member(props.ptype, ptypes) * has_type
+    weight += WEIGHTS["type"] * has_type
+
+    # --- Negócio (venda/arrendamento): filtro ---
+    business = profiles.business[rows][:, None]
+    valid &= (business == 0) | (props.business[None, :] == 0) | (props.business[None, :] == business)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        final = np.where(weight > 0, score / weight, 0.0)
+    return np.where(valid, final, 0.0).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int, min_score: float) -> List[List[Tuple[int, float]]]:
+    """Índices (coluna, score) dos k melhores por linha, ordenados, acima de min_score."""
+    if scores.shape[1] == 0:
+        return [[] for _ in range(scores.shape[0])]
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    idx = np.take_along_axis(part, order, axis=1)
+    vals = np.take_along_axis(part_scores, order, axis=1)
+    result = []
+    for row_idx, row_vals in zip(idx, vals):
+        keep = row_vals >= min_score
+        result.append(list(zip(row_idx[keep].tolist(), row_vals[keep].tolist())))
+    return result
+
+
+# =====================================================
+# PERFIS A PARTIR DA BD
+# =====================================================
+
+def lead_profile(lead: Lead, origin: Optional[Property]) -> Optional[dict]:
+    """Lead ativa: procura imóveis semelhantes ao que a gerou."""
+    if _norm(lead.status) in INACTIVE_LEAD_STATUSES or origin is None:
+        return None
+    price = _float_or_nan(origin.price)
+    bedrooms = origin.bedrooms if origin.bedrooms is not None else _bedrooms_from_typology(origin.typology)
+    return {
+        "price_min": price * (1 - LEAD_PRICE_BAND) if not math.isnan(price) else None,
+        "price_max": price * (1 + LEAD_PRICE_BAND) if not math.isnan(price) else None,
+        "typologies": _as_list(origin.typology),
+        "bedrooms_min": bedrooms,
+        "municipalities": _as_list(origin.municipality),
+        "parishes": _as_list(origin.parish),
+        "property_types": _as_list(origin.property_type),
+        "business_type": origin.business_type,
+        "lat": origin.latitude,
+        "lon": origin.longitude,
+        "exclude_property_id": origin.id,
+    }
+
+
+def client_profile(client: Client) -> Optional[dict]:
+    """Cliente comprador/investidor/arrendatário com preferências definidas."""
+    prefs = client.preferencias or {}
+    if not client.is_active or not prefs or _norm(client.client_type) not in BUYER_CLIENT_TYPES:
+        return None
+
+    def pick(*names):
+        for name in names:
+            if prefs.get(name) not in (None, "", []):
+                return prefs[name]
+        return None
+
+    profile = {
+        "price_min": pick("preco_min", "budget_min"),
+        "price_max": pick("preco_max", "budget_max"),
+        "typologies": _as_list(pick("tipologia", "tipologias", "typologies", "typology")),
+        "bedrooms_min": pick("quartos_min", "bedrooms_min", "bedrooms"),
+        "area_min": pick("area_min"),
+        "municipalities": _as_list(pick("concelhos", "concelho", "preferred_locations", "locations")),
+        "parishes": _as_list(pick("freguesias", "freguesia")),
+        "property_types": _as_list(pick("tipo_imovel", "tipos_imovel", "property_types", "property_type")),
+        "business_type": pick("tipo_negocio", "business_type"),
+        "lat": pick("latitude", "lat"),
+        "lon": pick("longitude", "lon", "lng"),
+        "radius_km": pick("raio_km", "radius_km"),
+    }
+    if not any(v not in (None, []) for k, v in profile.items() if k != "business_type"):
+        return None
+    return profile
+
+
+def _available_properties_query():
+    return select(Property).where(func.upper(Property.status) == "AVAILABLE")
+
+
+def _is_available(prop: Optional[Property]) -> bool:
+    return prop is not None and _norm(prop.status) == "available"
+
+
+# =====================================================
+# ESTADO POR TENANT
+# =====================================================
+
+class TenantMatchState:
+    """Matrizes + top-K atual de um tenant (protegido por lock)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.vocab = Vocabulary()
+        self.props = PropertyMatrix(self.vocab)
+        self.profiles = ProfileMatrix(self.vocab)
+        self.topk: Dict[ProfileKey, List[Tuple[int, float]]] = {}
+        # Perfil de uma lead deriva do imóvel que a gerou: origem -> leads
+        self.lead_origin: Dict[int, int] = {}
+        self.leads_by_origin: Dict[int, set] = {}
+        self.loaded_at = 0.0
+
+    @property
+    def fresh(self) -> bool:
+        return self.loaded_at > 0 and time.monotonic() - self.loaded_at < MATCH_STATE_TTL
+
+    # --- scoring ---
+
+    def _score_rows(self, rows: List[int]) -> Dict[ProfileKey, List[Tuple[int, float]]]:
+        results: Dict[ProfileKey, List[Tuple[int, float]]] = {}
+        if not rows:
+            return results
+        chunk = max(1, SCORE_CHUNK_ELEMENTS // max(1, len(self.props)))
+        for start in range(0, len(rows), chunk):
+            block = np.array(rows[start:start + chunk], dtype=np.int64)
+            scores = score_block(self.props, self.profiles, block)
+            for row, matches in zip(block.tolist(), top_k(scores, MATCH_TOP_K, MATCH_MIN_SCORE)):
+                results[self.profiles.keys[row]] = [
+                    (int(self.props.ids[col]), round(float(score), 4)) for col, score in matches
+                ]
+        return results
+
+    def load(self, db: Session) -> Dict[ProfileKey, List[Tuple[int, float]]]:
+        """Carrega imóveis e perfis do tenant e calcula o top-K de todos."""
+        self.vocab = Vocabulary()
+        self.props = PropertyMatrix(self.vocab)
+        self.profiles = ProfileMatrix(self.vocab)
+        self.lead_origin = {}
+        self.leads_by_origin = {}
+
+        self.props.load(db.execute(_available_properties_query()).scalars().all())
+
+        leads = db.execute(
+            select(Lead).where(Lead.property_id.isnot(None), func.lower(Lead.status).notin_(INACTIVE_LEAD_STATUSES))
+        ).scalars().all()
+        origin_ids = {lead.property_id for lead in leads}
+        origins = {
+            p.id: p for p in db.execute(select(Property).where(Property.id.in_(origin_ids))).scalars()
+        } if origin_ids else {}
+        for lead in leads:
+            origin = origins.get(lead.property_id)
+            self.profiles.set_profile(("lead", lead.id), lead_profile(lead, origin))
+            self._track_lead(lead.id, origin.id if origin is not None else None)
+
+        for client in db.execute(select(Client).where(Client.is_active == True)).scalars():
+            self.profiles.set_profile(("client", client.id), client_profile(client))
+
+        self.topk = self._score_rows(list(range(len(self.profiles))))
+        self.loaded_at = time.monotonic()
+        return self.topk
+
+    def rescore_profiles(self, keys: Iterable[ProfileKey]) -> Dict[ProfileKey, List[Tuple[int, float]]]:
+        rows = [self.profiles.row_of[key] for key in keys if key in self.profiles.row_of]
+        results = self._score_rows(rows)
+        self.topk.update(results)
+        return results
+
+    def property_changed(self, property_id: int, prop: Optional[Property]) -> Dict[ProfileKey, List[Tuple[int, float]]]:
+        """
+        Aplica a alteração de um imóvel: uma coluna de scores contra todos os
+        perfis. Perfis que tinham o imóvel no top-K são re-pontuados por
+        completo (o K+1º é desconhecido); os restantes só entram se o novo
+        score bater o pior do seu top-K.
+        """
+        holders = {key for key, matches in self.topk.items() if any(pid == property_id for pid, _ in matches)}
+
+        if _is_available(prop):
+            col = self.props.upsert(prop)
+        else:
+            self.props.remove(property_id)
+            return self.rescore_profiles(holders)
+
+        changed = self.rescore_profiles(holders)
+        if not len(self.profiles):
+            return changed
+
+        # Só a coluna do imóvel alterado: O(perfis), não O(perfis × imóveis)
+        column = score_block(self.props.view(np.array([col])), self.profiles, np.arange(len(self.profiles)))[:, 0]
+        for row in np.nonzero(column >= MATCH_MIN_SCORE)[0].tolist():
+            key = self.profiles.keys[row]
+            if key in holders:
+                continue
+            current = self.topk.get(key, [])
+            new_score = round(float(column[row]), 4)
+            if len(current) < MATCH_TOP_K or new_score > current[-1][1]:
+                merged = sorted(current + [(property_id, new_score)], key=lambda m: -m[1])[:MATCH_TOP_K]
+                self.topk[key] = merged
+                changed[key] = merged
+        return changed
+
+    def profile_changed(self, key: ProfileKey, profile: Optional[dict]) -> Dict[ProfileKey, List[Tuple[int, float]]]:
+        self.profiles.set_profile(key, profile)
+        if profile is None:
+            self.topk[key] = []
+            return {key: []}
+        return self.rescore_profiles([key])
+
+    def _track_lead(self, lead_id: int, origin_id: Optional[int]) -> None:
+        previous = self.lead_origin.pop(lead_id, None)
+        if previous is not None:
+            self.leads_by_origin.get(previous, set()).discard(lead_id)
+        if origin_id is not None:
+            self.lead_origin[lead_id] = origin_id
+            self.leads_by_origin.setdefault(origin_id, set()).add(lead_id)
+
+    def lead_changed(self, lead_id: int, lead: Optional[Lead], origin: Optional[Property]) -> Dict[ProfileKey, List[Tuple[int, float]]]:
+        profile = lead_profile(lead, origin) if lead is not None else None
+        self._track_lead(lead_id, origin.id if profile is not None else None)
+        return self.profile_changed(("lead", lead_id), profile)
+
+    def apply(self, db: Session, changes: Iterable[Tuple[str, int]]) -> Dict[ProfileKey, List[Tuple[int, float]]]:
+        """
+        Aplica alterações (kind, id) lidas de `db`. Alterar um imóvel também
+        re-perfila as leads geradas por ele (preço/tipologia/local da origem).
+        """
+        results: Dict[ProfileKey, List[Tuple[int, float]]] = {}
+        for kind, obj_id in sorted(changes):
+            if kind == "property":
+                prop = db.get(Property, obj_id)
+                results.update(self.property_changed(obj_id, prop))
+                for lead_id in sorted(self.leads_by_origin.get(obj_id, ())):
+                    results.update(self.lead_changed(lead_id, db.get(Lead, lead_id), prop))
+            elif kind == "lead":
+                lead = db.get(Lead, obj_id)
+                origin = db.get(Property, lead.property_id) if lead is not None and lead.property_id else None
+                results.update(self.lead_changed(obj_id, lead, origin))
+            elif kind == "client":
+                client = db.get(Client, obj_id)
+                results.update(self.profile_changed(("client", obj_id), client_profile(client) if client else None))
+        return results
+
+
+# =====================================================
+# PERSISTÊNCIA
+# =====================================================
+
+def write_matches(db: Session, results: Dict[ProfileKey, List[Tuple[int, float]]], full: bool = False) -> int:
+    """
+    Substitui os matches calculados dos perfis indicados (DELETE + INSERT em
+    massa). full=True apaga primeiro todos os matches calculados do tenant.
+    Só toca em linhas com computed=True: matches criados via CRUD ficam.
+    """
+    now = datetime.utcnow()
+    computed = LeadPropertyMatch.computed.is_(True)
+    if full:
+        db.execute(delete(LeadPropertyMatch).where(computed))
+    else:
+        lead_ids = [pid for kind, pid in results if kind == "lead"]
+        client_ids = [pid for kind, pid in results if kind == "client"]
+        for start in range(0, len(lead_ids), 1000):
+            db.execute(delete(LeadPropertyMatch).where(
+                computed, LeadPropertyMatch.lead_id.in_(lead_ids[start:start + 1000])
+            ))
+        for start in range(0, len(client_ids), 1000):
+            db.execute(delete(LeadPropertyMatch).where(
+                computed, LeadPropertyMatch.client_id.in_(client_ids[start:start + 1000])
+            ))
+
+    rows = [
+        {
+            "lead_id": pid if kind == "lead" else None,
+            "client_id": pid if kind == "client" else None,
+            "property_id": property_id,
+            "score": score,
+            "created_at": now,
+            "computed": True,
+        }
+        for (kind, pid), matches in results.items()
+        for property_id, score in matches
+    ]
+    if rows:
+        db.execute(insert(LeadPropertyMatch), rows)
+    db.commit()
+    return len(rows)
+
+
+# =====================================================
+# REGISTO DE TENANTS + ATUALIZAÇÃO INCREMENTAL
+# =====================================================
+
+def _schema_key(schema: Optional[str]) -> Optional[str]:
+    return None if schema in (None, DEFAULT_SCHEMA) else schema
+
+
+class MatchEngine:
+    """Estados por tenant (LRU) e aplicação das alterações em background."""
+
+    def __init__(self, max_tenants: int = MATCH_MAX_TENANTS):
+        self.max_tenants = max_tenants
+        self._states: "OrderedDict[Optional[str], TenantMatchState]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Um único thread: alterações de um tenant aplicadas por ordem
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="match-plus")
+
+    def _state(self, schema: Optional[str], create: bool = True) -> Optional[TenantMatchState]:
+        key = _schema_key(schema)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None and create:
+                state = self._states[key] = TenantMatchState()
+                while len(self._states) > self.max_tenants:
+                    self._states.popitem(last=False)
+            elif state is not None:
+                self._states.move_to_end(key)
+            return state
+
+    def recompute(self, db: Session, schema: Optional[str] = None) -> dict:
+        """Recalcula todos os perfis do tenant e regrava os matches."""
+        schema = get_tenant_schema() if schema is None else schema
+        state = self._state(schema)
+        started = time.perf_counter()
+        with state.lock:
+            results = state.load(db)
+            written = write_matches(db, results, full=True)
+        return {
+            "properties": int(state.props.alive.sum()),
+            "profiles": len(results),
+            "matches": written,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def ensure_loaded(self, db: Session, schema: Optional[str] = None) -> None:
+        """Garante estado em memória recente (recalcula por completo se não houver)."""
+        schema = get_tenant_schema() if schema is None else schema
+        state = self._state(schema)
+        if not state.fresh:
+            self.recompute(db, schema)
+
+    def apply_changes(self, schema: Optional[str], changes: set) -> int:
+        """Aplica alterações (kind, id) a um tenant com estado carregado."""
+        state = self._state(schema, create=False)
+        if state is None or not state.fresh:
+            return 0
+        db = tenant_session(schema)
+        try:
+            with state.lock:
+                results = state.apply(db, changes)
+                if results:
+                    write_matches(db, results)
+                return len(results)
+        except Exception as e:
+            db.rollback()
+            print(f"[MatchPlus] Erro na atualização incremental ({schema}): {e}")
+            return 0
+        finally:
+            db.close()
+
+    def schedule(self, schema: Optional[str], changes: set) -> None:
+        if self._state(schema, create=False) is None:
+            return
+        self._executor.submit(self.apply_changes, schema, changes)
+
+
+match_engine = MatchEngine()
+
+
+# --- Eventos do ORM: marcar alterações e agendar após commit ---
+
+_KINDS = {Property: "property", Lead: "lead", Client: "client"}
+
+
+def _mark(mapper, connection, target) -> None:
+    from sqlalchemy.orm import object_session
+
+    session = object_session(target)
+    kind = _KINDS.get(mapper.class_)
+    if session is not None and kind and target.id is not None:
+        session.info.setdefault("match_plus_changes", set()).add((kind, target.id))
+
+
+for _model in _KINDS:
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _mark)
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_match_updates(session: Session) -> None:
+    changes = session.info.pop("match_plus_changes", None)
+    if changes:
+        match_engine.schedule(getattr(session, "tenant_schema", get_tenant_schema()), changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_match_updates(session: Session) -> None:
+    session.info.pop("match_plus_changes", None)
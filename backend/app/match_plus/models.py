@@ -1,16 +1,26 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Index, Boolean, false
 from sqlalchemy.orm import relationship
 from app.database import Base
 
 
 class LeadPropertyMatch(Base):
     __tablename__ = "lead_property_matches"
+    __table_args__ = (
+        Index("ix_lead_property_matches_lead_score", "lead_id", "score"),
+        Index("ix_lead_property_matches_client_score", "client_id", "score"),
+        Index("ix_lead_property_matches_property", "property_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    lead_id = Column(Integer, ForeignKey("leads.id"))
-    property_id = Column(Integer, ForeignKey("properties.id"))
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), nullable=True)
+    # Matches calculados para clientes compradores (preferencias); lead_id fica NULL
+    client_id = Column(Integer, ForeignKey("clients.id", ondelete="CASCADE"), nullable=True)
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"))
     score = Column(Float, nullable=False)  # score de correspondência
     created_at = Column(DateTime, nullable=False)
+    # Linhas gravadas pelo motor (engine.write_matches); as criadas via CRUD nunca são apagadas por ele
+    computed = Column(Boolean, nullable=False, default=False, server_default=false())
 
     lead = relationship("Lead")
+    client = relationship("Client")
     property = relationship("Property")
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from . import services, schemas
+from .engine import match_engine
 from app.database import get_db
+from app.security import require_staff
 
 router = APIRouter(prefix="/match-plus", tags=["match_plus"])
 
@@ -11,6 +13,30 @@ def list_matches(skip: int = 0, limit: int = 100, db: Session = Depends(get_db))
     return services.get_matches(db, skip=skip, limit=limit)
 
 
+@router.post("/recompute", response_model=schemas.MatchRecomputeOut)
+def recompute_matches(db: Session = Depends(get_db), user=Depends(require_staff)):
+    """Recalcula todos os matches do tenant (leads ativas + clientes compradores)."""
+    return match_engine.recompute(db)
+
+
+@router.get("/leads/{lead_id}", response_model=list[schemas.LeadPropertyMatchOut])
+def get_lead_matches(lead_id: int, limit: int = 20, db: Session = Depends(get_db), user=Depends(require_staff)):
+    match_engine.ensure_loaded(db)
+    return services.get_matches_for_lead(db, lead_id, limit=limit)
+
+
+@router.get("/clients/{client_id}", response_model=list[schemas.LeadPropertyMatchOut])
+def get_client_matches(client_id: int, limit: int = 20, db: Session = Depends(get_db), user=Depends(require_staff)):
+    match_engine.ensure_loaded(db)
+    return services.get_matches_for_client(db, client_id, limit=limit)
+
+
+@router.get("/properties/{property_id}", response_model=list[schemas.LeadPropertyMatchOut])
+def get_property_matches(property_id: int, limit: int = 50, db: Session = Depends(get_db), user=Depends(require_staff)):
+    match_engine.ensure_loaded(db)
+    return services.get_matches_for_property(db, property_id, limit=limit)
+
+
 @router.get("/{match_id}", response_model=schemas.LeadPropertyMatchOut)
 def get_match(match_id: int, db: Session = Depends(get_db)):
     match = services.get_match(db, match_id)
@@ -4,7 +4,8 @@ from datetime import datetime
 
 
 class LeadPropertyMatchBase(BaseModel):
-    lead_id: int
+    lead_id: Optional[int] = None
+    client_id: Optional[int] = None
     property_id: int
     score: float
     created_at: datetime
@@ -18,3 +19,10 @@ class LeadPropertyMatchOut(LeadPropertyMatchBase):
     id: int
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class MatchRecomputeOut(BaseModel):
+    properties: int
+    profiles: int
+    matches: int
+    elapsed_ms: float
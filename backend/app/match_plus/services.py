@@ -31,3 +31,34 @@ def delete_match(db: Session, match_id: int):
         db.delete(db_match)
         db.commit()
     return db_match
+
+
+def get_matches_for_lead(db: Session, lead_id: int, limit: int = 20):
+    return (
+        db.query(LeadPropertyMatch)
+        .filter(LeadPropertyMatch.lead_id == lead_id)
+        .order_by(LeadPropertyMatch.score.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def get_matches_for_client(db: Session, client_id: int, limit: int = 20):
+    return (
+        db.query(LeadPropertyMatch)
+        .filter(LeadPropertyMatch.client_id == client_id)
+        .order_by(LeadPropertyMatch.score.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def get_matches_for_property(db: Session, property_id: int, limit: int = 50):
+    """Leads/clientes interessados num imóvel (matches calculados)."""
+    return (
+        db.query(LeadPropertyMatch)
+        .filter(LeadPropertyMatch.property_id == property_id)
+        .order_by(LeadPropertyMatch.score.desc())
+        .limit(limit)
+        .all()
+    )
@@ -19,3 +19,120 @@ def test_create_match():
     assert response.status_code == 201
     data = response.json()
     assert data["score"] == 0.85
+
+
+def test_engine_scores_and_ranks_properties():
+    from types import SimpleNamespace
+    import numpy as np
+    from app.match_plus.engine import PropertyMatrix, ProfileMatrix, Vocabulary, score_block, top_k
+
+    def prop(id, price, typology, municipality, business="venda"):
+        return SimpleNamespace(
+            id=id, price=price, typology=typology, bedrooms=None, usable_area=90,
+            municipality=municipality, parish=None, property_type="Apartamento",
+            business_type=business, latitude=None, longitude=None,
+        )
+
+    vocab = Vocabulary()
+    props = PropertyMatrix(vocab)
+    props.load([
+        prop(1, 250000, "T2", "Lisboa"),
+        prop(2, 400000, "T2", "Lisboa"),            # muito acima do orçamento
+        prop(3, 240000, "T1", "Porto"),
+        prop(4, 250000, "T2", "Lisboa", "arrendamento"),
+    ])
+    profiles = ProfileMatrix(vocab)
+    profiles.set_profile(("client", 7), {
+        "price_max": 260000, "typologies": ["t2"], "municipalities": ["lisboa"], "business_type": "Venda",
+    })
+
+    scores = score_block(props, profiles, np.array([0]))
+    assert scores[0, 0] == 1.0
+    assert scores[0, 1] == 0.0 and scores[0, 3] == 0.0
+    assert 0.0 < scores[0, 2] < scores[0, 0]
+    assert [col for col, _ in top_k(scores, 2, 0.3)[0]] == [0, 2]
+
+
+def test_property_change_scores_one_column_and_reprofiles_origin_leads(isolated_db):
+    from app.leads.models import Lead
+    from app.match_plus.engine import TenantMatchState
+    from app.properties.models import Property
+
+    db = isolated_db
+
+    def prop(reference, price, municipality="Lisboa"):
+        return Property(reference=reference, title=reference, price=price, typology="T2", municipality=municipality,
+                        property_type="Apartamento", business_type="venda", status="available")
+
+    origin, cheap, pricey = prop("ORIG", 200000), prop("CHEAP", 210000), prop("PRICEY", 500000)
+    db.add_all([origin, cheap, pricey])
+    db.flush()
+    lead = Lead(name="Interessada", property_id=origin.id, status="new")
+    db.add(lead)
+    db.commit()
+
+    state = TenantMatchState()
+    state.load(db)
+    key = ("lead", lead.id)
+    assert [pid for pid, _ in state.topk[key]] == [cheap.id]
+
+    # Novo imóvel: só a sua coluna é pontuada e entra no top-K da lead
+    similar = prop("SIMILAR", 205000)
+    db.add(similar)
+    db.commit()
+    changed = state.apply(db, {("property", similar.id)})
+    assert {pid for pid, _ in changed[key]} == {cheap.id, similar.id}
+    before = dict(changed[key])
+
+    # O imóvel de origem sobe de preço: o perfil da lead passa a procurar ~500k
+    origin.price = 480000
+    db.commit()
+    changed = state.apply(db, {("property", origin.id)})
+    after = dict(changed[key])
+    assert changed[key][0] == (pricey.id, 1.0)
+    assert after[cheap.id] < before[cheap.id]
+    assert state.lead_origin[lead.id] == origin.id
+
+    # Origem indisponível/apagada: a lead deixa de ter perfil
+    db.delete(origin)
+    db.commit()
+    assert state.apply(db, {("property", origin.id)})[key] == []
+    assert origin.id not in state.leads_by_origin or not state.leads_by_origin[origin.id]
+
+
+def test_write_matches_keeps_crud_rows_and_cascades_deletes(isolated_db):
+    from datetime import datetime
+    from sqlalchemy import text
+    from app.leads.models import Lead
+    from app.leads.services import delete_lead
+    from app.match_plus.engine import write_matches
+    from app.match_plus.models import LeadPropertyMatch
+    from app.match_plus.schemas import LeadPropertyMatchCreate
+    from app.match_plus.services import create_match
+    from app.properties.models import Property
+
+    db = isolated_db
+    # SQLite só aplica ON DELETE CASCADE com foreign_keys ativo (fora de transação)
+    db.execute(text("PRAGMA foreign_keys=ON"))
+
+    props = [Property(reference=f"P{i}", title=f"P{i}", price=100000, status="available") for i in range(3)]
+    lead, other = Lead(name="Lead"), Lead(name="Outra")
+    db.add_all(props + [lead, other])
+    db.commit()
+
+    manual = create_match(db, LeadPropertyMatchCreate(
+        lead_id=lead.id, property_id=props[0].id, score=0.9, created_at=datetime.utcnow()
+    ))
+    write_matches(db, {("lead", lead.id): [(props[1].id, 0.8)], ("lead", other.id): [(props[2].id, 0.7)]}, full=True)
+    write_matches(db, {("lead", lead.id): [(props[2].id, 0.6)]})
+    write_matches(db, {("lead", other.id): [(props[1].id, 0.5)]}, full=True)
+
+    rows = {(m.lead_id, m.property_id, m.computed) for m in db.query(LeadPropertyMatch)}
+    assert rows == {(lead.id, props[0].id, False), (other.id, props[1].id, True)}
+    assert db.get(LeadPropertyMatch, manual.id) is not None
+
+    # Apagar imóvel/lead com matches não falha: as FKs apagam em cascata
+    db.delete(props[1])
+    db.commit()
+    delete_lead(db, lead.id)
+    assert db.query(LeadPropertyMatch).count() == 0
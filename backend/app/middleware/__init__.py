@@ -1,11 +1,12 @@
 """
 Middlewares da aplicação
 """
-from app.middleware.tenant import TenantMiddleware, get_current_tenant, require_tenant, clear_domain_cache
+from app.middleware.tenant import TenantMiddleware, get_current_tenant, require_tenant, clear_domain_cache, preload_domain_cache
 
 __all__ = [
     'TenantMiddleware',
     'get_current_tenant', 
     'require_tenant',
-    'clear_domain_cache'
+    'clear_domain_cache',
+    'preload_domain_cache'
 ]
@@ -11,17 +11,19 @@ Define o schema correto na BD para cada request.
 
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 from sqlalchemy.orm import Session
-from typing import Optional
-import re
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+import os
+import threading
+import time
 
-from app.database import get_db, set_tenant_schema, DEFAULT_SCHEMA
+from app.database import SessionLocal, set_tenant_schema, DEFAULT_SCHEMA
 
 
-# Cache de domínios -> tenant slug (para evitar queries repetidas)
-_domain_cache: dict[str, str] = {}
-
 # Rotas que não precisam de tenant (públicas/plataforma)
 PUBLIC_ROUTES = [
     "/health",
@@ -34,6 +36,12 @@ PUBLIC_ROUTES = [
     "/emergency/",     # Emergency protegido por chave
 ]
 
+# Configuração do cache de resolução de tenants
+TENANT_CACHE_TTL = int(os.environ.get("TENANT_CACHE_TTL", "300"))  # Entradas positivas (segundos)
+TENANT_CACHE_NEGATIVE_TTL = int(os.environ.get("TENANT_CACHE_NEGATIVE_TTL", "60"))  # Hosts desconhecidos
+TENANT_CACHE_MAX_ENTRIES = int(os.environ.get("TENANT_CACHE_MAX_ENTRIES", "10000"))
+TENANT_DOMAIN_MAP_TTL = int(os.environ.get("TENANT_DOMAIN_MAP_TTL", "300"))  # Recarregar mapa domínio→slug
+
 
 def is_public_route(path: str) -> bool:
     """Verifica se a rota é pública (não requer tenant)"""
@@ -43,110 +51,220 @@ def is_public_route(path: str) -> bool:
     return False
 
 
-def resolve_tenant_from_domain(host: str, db: Session) -> Optional[str]:
+class TenantDomainCache:
+    """
+    Cache de resolução host → tenant slug.
+
+    - Entradas positivas e negativas (hosts desconhecidos) com TTL próprio,
+      limitadas por LRU para que hosts aleatórios (bots) não cresçam a memória.
+    - Mapa domínio → slug e conjunto de slugs ativos carregados de uma só vez
+      (no arranque e depois de cada invalidação/expiração), pelo que um miss
+      não precisa de ir à BD.
+    """
+
+    def __init__(self, ttl: int, negative_ttl: int, max_entries: int, map_ttl: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.map_ttl = map_ttl
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._domains: Dict[str, str] = {}
+        self._slugs: Set[str] = set()
+        self._map_loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> Tuple[bool, Optional[str]]:
+        """Devolve (hit, slug). slug None com hit=True é uma entrada negativa."""
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None:
+                return False, None
+            slug, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[host]
+                return False, None
+            self._entries.move_to_end(host)
+            return True, slug
+
+    def put(self, host: str, slug: Optional[str]):
+        ttl = self.ttl if slug else self.negative_ttl
+        with self._lock:
+            self._entries[host] = (slug, time.monotonic() + ttl)
+            self._entries.move_to_end(host)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def map_is_fresh(self) -> bool:
+        loaded_at = self._map_loaded_at
+        return loaded_at is not None and (time.monotonic() - loaded_at) < self.map_ttl
+
+    def load_map(self, db: Session):
+        """Carrega todos os domínios e slugs de tenants ativos numa única query"""
+        from app.platform.models import Tenant
+
+        rows = db.query(
+            Tenant.slug, Tenant.primary_domain, Tenant.backoffice_domain, Tenant.api_subdomain
+        ).filter(Tenant.is_active == True).all()  # noqa: E712
+
+        domains: Dict[str, str] = {}
+        slugs: Set[str] = set()
+        for slug, primary_domain, backoffice_domain, api_subdomain in rows:
+            slugs.add(slug.lower())
+            for domain in (primary_domain, backoffice_domain, api_subdomain):
+                if domain:
+                    domains[domain.lower()] = slug
+
+        with self._lock:
+            self._domains = domains
+            self._slugs = slugs
+            self._map_loaded_at = time.monotonic()
+            # Entradas antigas podem contradizer o novo mapa
+            self._entries.clear()
+
+    def lookup_map(self, host: str) -> Optional[str]:
+        """Resolve o host a partir do mapa pré-carregado"""
+        slug = self._domains.get(host)
+        if slug:
+            return slug
+        # Tentar extrair subdomínio (ex: imoveismais.backoffice.vercel.app)
+        parts = host.split(".")
+        if len(parts) >= 3 and parts[0] in self._slugs:
+            return parts[0]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._domains = {}
+            self._slugs = set()
+            self._map_loaded_at = None
+
+
+# Cache de domínios -> tenant slug (para evitar queries repetidas)
+_domain_cache = TenantDomainCache(
+    ttl=TENANT_CACHE_TTL,
+    negative_ttl=TENANT_CACHE_NEGATIVE_TTL,
+    max_entries=TENANT_CACHE_MAX_ENTRIES,
+    map_ttl=TENANT_DOMAIN_MAP_TTL,
+)
+
+
+def resolve_tenant_from_domain(host: str, db: Optional[Session] = None) -> Optional[str]:
     """
     Resolve o slug do tenant a partir do domínio.
-    Procura na tabela tenants por primary_domain ou backoffice_domain.
+    Procura no mapa de domínios (primary_domain, backoffice_domain, api_subdomain)
+    e, em alternativa, trata o primeiro label do host como slug.
     """
     # Remover porta se existir
     host = host.split(":")[0].lower()
     
-    # Verificar cache
-    if host in _domain_cache:
-        return _domain_cache[host]
+    # Verificar cache (inclui entradas negativas)
+    hit, slug = _domain_cache.get(host)
+    if hit:
+        return slug
+    
+    if not _domain_cache.map_is_fresh():
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            _domain_cache.load_map(db)
+        except Exception as e:
+            # Erro transitório de BD: não guardar entrada negativa
+            print(f"[TENANT] Erro ao carregar mapa de domínios para '{host}': {e}")
+            return None
+        finally:
+            if own_session:
+                db.close()
     
+    slug = _domain_cache.lookup_map(host)
+    _domain_cache.put(host, slug)
+    return slug
+
+
+def preload_domain_cache(db: Optional[Session] = None):
+    """Pré-carrega o mapa domínio→slug (chamado no arranque da aplicação)"""
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
     try:
-        from app.platform.models import Tenant
-        
-        tenant = db.query(Tenant).filter(
-            (Tenant.primary_domain == host) | 
-            (Tenant.backoffice_domain == host) |
-            (Tenant.api_subdomain == host)
-        ).first()
-        
-        if tenant and tenant.is_active:
-            _domain_cache[host] = tenant.slug
-            return tenant.slug
-        
-        # Tentar extrair subdomínio (ex: imoveismais.backoffice.vercel.app)
-        parts = host.split(".")
-        if len(parts) >= 3:
-            potential_slug = parts[0].lower()
-            # Verificar se este slug existe
-            tenant = db.query(Tenant).filter(Tenant.slug == potential_slug).first()
-            if tenant and tenant.is_active:
-                _domain_cache[host] = tenant.slug
-                return tenant.slug
-        
-        return None
+        _domain_cache.load_map(db)
+        print(f"[TENANT] Mapa de domínios pré-carregado ({len(_domain_cache._domains)} domínios)")
     except Exception as e:
-        print(f"[TENANT] Erro ao resolver tenant para '{host}': {e}")
-        return None
+        print(f"[TENANT] Não foi possível pré-carregar domínios: {e}")
+    finally:
+        if own_session:
+            db.close()
 
 
 def clear_domain_cache():
     """Limpa o cache de domínios (usar após atualizar tenants)"""
-    global _domain_cache
-    _domain_cache = {}
+    _domain_cache.clear()
 
 
-class TenantMiddleware(BaseHTTPMiddleware):
+class TenantMiddleware:
     """
-    Middleware que resolve o tenant para cada request e define o schema da BD.
+    Middleware ASGI que resolve o tenant para cada request e define o schema da BD.
+
+    Implementado como middleware ASGI puro (sem BaseHTTPMiddleware) para não
+    criar uma task extra nem envolver o body de cada request.
     """
     
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # CORS preflight must bypass tenant resolution
-        if request.method == "OPTIONS":
-            return await call_next(request)
-
-        path = request.url.path
-        tenant_slug = request.headers.get("X-Tenant-Slug")
-
+        if scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        
+        path = scope["path"]
+        headers = Headers(scope=scope)
+        state = scope.setdefault("state", {})
+        tenant_slug = headers.get("X-Tenant-Slug")
+        
         # If tenant header is explicitly provided, always honor it,
         # even for public routes like /admin/setup/.
         if tenant_slug:
             schema_name = f"tenant_{tenant_slug.lower()}"
             set_tenant_schema(schema_name)
-            request.state.tenant_slug = tenant_slug
-            request.state.tenant_schema = schema_name
-            return await call_next(request)
+            state["tenant_slug"] = tenant_slug
+            state["tenant_schema"] = schema_name
+            await self.app(scope, receive, send)
+            return
         
         # Rotas públicas não precisam de tenant
         if is_public_route(path):
             set_tenant_schema(DEFAULT_SCHEMA)
-            return await call_next(request)
-        
-        # Tentar resolver tenant
-        tenant_slug = None
+            await self.app(scope, receive, send)
+            return
         
-        # Debug logging para auth routes
-        if "/auth/" in path:
-            print(f"[TENANT DEBUG] Path: {path}")
-            print(f"[TENANT DEBUG] X-Tenant-Slug header: {tenant_slug}")
-            print(f"[TENANT DEBUG] Host header: {request.headers.get('Host', 'N/A')}")
+        # Resolver tenant pelo domínio do request
+        host = headers.get("Host", "")
+        if host:
+            hit, tenant_slug = _domain_cache.get(host.split(":")[0].lower())
+            if not hit:
+                # Miss: resolver fora do event loop (pode ir à BD)
+                tenant_slug = await run_in_threadpool(resolve_tenant_from_domain, host)
         
-        # 2. Domínio do request
-        if not tenant_slug:
-            host = request.headers.get("Host", "")
-            if host:
-                # Criar sessão temporária para query
-                db = next(get_db())
-                try:
-                    tenant_slug = resolve_tenant_from_domain(host, db)
-                finally:
-                    db.close()
-        
-        # 3. Default para 'public' se não encontrado (backwards compatible)
+        # Default para 'public' se não encontrado (backwards compatible)
         if not tenant_slug:
             # Em produção, não permitir fallback para public para evitar cross-tenant
-            try:
-                enforce_tenant_or_fail(request)
-            except HTTPException as e:
-                return JSONResponse({"detail": e.detail}, status_code=e.status_code)
+            if _tenant_required():
+                response = JSONResponse(
+                    {"detail": "Tenant obrigatório em produção. Inclua X-Tenant-Slug ou use o domínio do tenant."},
+                    status_code=400,
+                )
+                await response(scope, receive, send)
+                return
             # Em dev, manter compat mas logar
             print(f"[TENANT WARN] No tenant resolved, falling back to public (dev mode)")
-
+        
         # Definir schema
         if tenant_slug:
             # Schema do tenant usa o formato tenant_{slug}
@@ -155,28 +273,16 @@ class TenantMiddleware(BaseHTTPMiddleware):
             schema_name = f"tenant_{tenant_slug.lower()}"
             set_tenant_schema(schema_name)
             
-            # Debug logging para auth routes
-            if "/auth/" in path:
-                print(f"[TENANT DEBUG] Setting schema to: {schema_name}")
-                from app.database import current_tenant_schema
-                print(f"[TENANT DEBUG] ContextVar after set: {current_tenant_schema.get()}")
-            
             # Adicionar tenant ao request state para uso nos endpoints
-            request.state.tenant_slug = tenant_slug
-            request.state.tenant_schema = schema_name
+            state["tenant_slug"] = tenant_slug
+            state["tenant_schema"] = schema_name
         else:
             # Sem tenant (apenas dev), usar schema public
             set_tenant_schema(DEFAULT_SCHEMA)
-            
-            # Debug logging para auth routes
-            if "/auth/" in path:
-                print(f"[TENANT DEBUG] No tenant found, using default schema: {DEFAULT_SCHEMA}")
-            
-            request.state.tenant_slug = None
-            request.state.tenant_schema = DEFAULT_SCHEMA
+            state["tenant_slug"] = None
+            state["tenant_schema"] = DEFAULT_SCHEMA
         
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
 
 
 def get_current_tenant(request: Request) -> Optional[str]:
@@ -208,10 +314,14 @@ def enforce_tenant_or_fail(request: Request):
     tenant = get_current_tenant(request)
     if tenant:
         return tenant
-    import os
-    if os.environ.get("RAILWAY_ENVIRONMENT") or os.environ.get("VERCEL"):
+    if _tenant_required():
         raise HTTPException(
             status_code=400,
             detail="Tenant obrigatório em produção. Inclua X-Tenant-Slug ou use o domínio do tenant."
         )
     return None
+
+
+def _tenant_required() -> bool:
+    """Em produção (Railway/Vercel) um tenant é obrigatório"""
+    return bool(os.environ.get("RAILWAY_ENVIRONMENT") or os.environ.get("VERCEL"))
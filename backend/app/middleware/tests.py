@@ -0,0 +1,151 @@
+import asyncio
+
+from sqlalchemy import event
+
+
+def test_tenant_resolution_matches_database_caches_negatives_and_sets_schema(isolated_db, monkeypatch):
+    """[user-003] Mapa pré-carregado = query direta por host; entradas negativas; middleware ASGI."""
+    from app.database import get_tenant_schema
+    from app.middleware import tenant as tenant_middleware
+    from app.platform.models import Tenant
+
+    db = isolated_db
+    db.add_all([
+        Tenant(slug="acme", name="Acme", primary_domain="acme.pt", backoffice_domain="bo.acme.pt", is_active=True),
+        Tenant(slug="beta", name="Beta", is_active=True),
+        Tenant(slug="gone", name="Gone", primary_domain="gone.pt", is_active=False),
+    ])
+    db.commit()
+    monkeypatch.setattr(tenant_middleware, "_domain_cache", tenant_middleware.TenantDomainCache(
+        ttl=300, negative_ttl=60, max_entries=100, map_ttl=300,
+    ))
+    monkeypatch.delenv("RAILWAY_ENVIRONMENT", raising=False)
+    monkeypatch.delenv("VERCEL", raising=False)
+
+    def direct_lookup(host):
+        """Resolução antiga: uma query por request."""
+        host = host.split(":")[0].lower()
+        for tenant in db.query(Tenant).filter(Tenant.is_active == True):  # noqa: E712
+            if host in (tenant.primary_domain, tenant.backoffice_domain, tenant.api_subdomain):
+                return tenant.slug
+        first = host.split(".")
+        if len(first) >= 3 and db.query(Tenant).filter(Tenant.slug == first[0], Tenant.is_active == True).first():  # noqa: E712
+            return first[0]
+        return None
+
+    hosts = ["acme.pt", "BO.acme.pt:443", "beta.backoffice.vercel.app", "gone.pt", "unknown.example.com", "localhost"]
+    expected = {host: direct_lookup(host) for host in hosts}
+    assert expected["acme.pt"] == expected["BO.acme.pt:443"] == "acme"
+    assert expected["beta.backoffice.vercel.app"] == "beta" and expected["gone.pt"] is None
+
+    queries = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: queries.append(args[2]))
+    assert {host: tenant_middleware.resolve_tenant_from_domain(host, db) for host in hosts} == expected
+    # Um único carregamento do mapa; depois, incluindo hosts desconhecidos, tudo vem da cache
+    assert len(queries) == 1
+    assert tenant_middleware._domain_cache.get("unknown.example.com") == (True, None)
+    assert {host: tenant_middleware.resolve_tenant_from_domain(host, db) for host in hosts} == expected
+    assert len(queries) == 1
+
+    # Após alterar tenants a cache só muda com clear_domain_cache (como na rota da plataforma)
+    db.query(Tenant).filter(Tenant.slug == "acme").update({"primary_domain": "acme.com"})
+    db.commit()
+    assert tenant_middleware.resolve_tenant_from_domain("acme.com", db) is None
+    tenant_middleware.clear_domain_cache()
+    assert tenant_middleware.resolve_tenant_from_domain("acme.com", db) == "acme"
+
+    async def run(path, headers):
+        seen = {}
+
+        async def inner(scope, receive, send):
+            seen.update(scope.get("state", {}), schema=get_tenant_schema())
+
+        scope = {"type": "http", "method": "GET", "path": path,
+                 "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+        await tenant_middleware.TenantMiddleware(inner)(scope, None, None)
+        return seen
+
+    assert asyncio.run(run("/properties/", {"Host": "acme.com"}))["schema"] == "tenant_acme"
+    assert asyncio.run(run("/properties/", {"Host": "acme.com", "X-Tenant-Slug": "Beta"}))["tenant_schema"] == "tenant_beta"
+    assert asyncio.run(run("/health", {"Host": "acme.com"}))["schema"] == "public"
+    dev = asyncio.run(run("/properties/", {"Host": "unknown.example.com"}))
+    assert dev["tenant_slug"] is None and dev["schema"] == "public"
+
+
+def _run_compression(app, accept_encoding, minimum_size=100):
+    """Executa o CompressionMiddleware sobre `app` e devolve (headers, corpo)."""
+    from starlette.datastructures import Headers
+    from app.middleware.compression import CompressionMiddleware
+
+    messages = []
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()  # cliente ligado até ao fim da resposta
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else [],
+    }
+    asyncio.run(CompressionMiddleware(app, minimum_size=minimum_size)(scope, receive, send))
+    start = messages[0]
+    assert start["type"] == "http.response.start"
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return Headers(raw=start["headers"]), body
+
+
+def test_compression_negotiates_encoding_and_round_trips_bodies(monkeypatch):
+    """[user-020] gzip/br pelo Accept-Encoding, streaming, e passthrough de respostas pequenas/binárias/já codificadas."""
+    import gzip
+    from starlette.responses import JSONResponse, Response, StreamingResponse
+    from app.middleware import compression
+
+    assert compression.choose_encoding("") is None
+    assert compression.choose_encoding("identity") is None
+    assert compression.choose_encoding("gzip;q=0, deflate") is None
+    assert compression.choose_encoding("gzip, deflate") == "gzip"
+    assert compression.choose_encoding("br;q=1.0, gzip;q=0.5") == ("br" if compression.BROTLI_AVAILABLE else "gzip")
+
+    payload = [{"id": i, "title": f"Apartamento T{i % 4} em Leiria"} for i in range(50)]
+    reference = JSONResponse(payload).body
+
+    headers, body = _run_compression(JSONResponse(payload), "gzip")
+    assert headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in headers["vary"]
+    assert int(headers["content-length"]) == len(body) < len(reference)
+    assert gzip.decompress(body) == reference
+
+    # Sem Accept-Encoding: bytes iguais ao caminho sem middleware
+    headers, body = _run_compression(JSONResponse(payload), None)
+    assert "content-encoding" not in headers and body == reference
+
+    # Abaixo do mínimo, tipos binários e respostas já codificadas passam intactos
+    headers, body = _run_compression(JSONResponse({"ok": True}), "gzip")
+    assert "content-encoding" not in headers and body == b'{"ok":true}'
+    headers, body = _run_compression(Response(b"\x89PNG" * 100, media_type="image/png"), "gzip")
+    assert "content-encoding" not in headers and body == b"\x89PNG" * 100
+    already = gzip.compress(reference)
+    headers, body = _run_compression(
+        Response(already, media_type="application/json", headers={"Content-Encoding": "gzip"}), "gzip",
+    )
+    assert body == already
+
+    # Streaming: comprime bloco a bloco e o resultado descomprime para o original
+    chunks = [f'{{"line":{i},"text":"linha de exportação {i}"}}\n'.encode() for i in range(200)]
+
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    headers, body = _run_compression(StreamingResponse(stream(), media_type="application/x-ndjson"), "gzip")
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    assert gzip.decompress(body) == b"".join(chunks)
+
+    monkeypatch.setattr(compression, "RESPONSE_COMPRESSION_ENABLED", False)
+    headers, body = _run_compression(JSONResponse(payload), "gzip")
+    assert "content-encoding" not in headers and body == reference
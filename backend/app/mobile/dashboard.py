@@ -0,0 +1,274 @@
+"""
+Dashboard da app mobile: estatísticas e atividade recente por agente.
+
+Cada agente tem um contador de alterações (agent_change_counters),
+incrementado uma vez por transação (before_commit) se algum flush escreveu
+(ORM) um imóvel, pré-angariação, lead ou tarefa dele (dono atual e, em
+reatribuições, o anterior). O ETag
+das respostas deriva de (tenant, agente, contador, dia UTC): a app envia
+If-None-Match e recebe 304 ao custo de uma leitura por PK, seja qual for
+o worker que atende o pedido.
+
+Quando o ETag muda, as estatísticas saem de uma única query agregada
+(intervalos sobre due_date, servidos pelo índice (assigned_agent_id,
+due_date)) e a atividade recente de um único UNION ALL. O resultado fica
+em cache local por (agente, contador, dia) para os restantes dispositivos
+do mesmo agente.
+
+UPDATE/DELETE em massa e SQL raw não passam pelo flush: quem os fizer deve
+chamar bump_agent_versions() na mesma transação.
+
+Configuração via ENV:
+    MOBILE_DASHBOARD_CACHE_TTL      segundos em cache local por versão (default: 300)
+"""
+import hashlib
+import os
+from datetime import date, datetime, time, timedelta
+from itertools import chain
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import Float, String, cast, event, func, inspect, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from app.calendar.models import Task, TaskPriority, TaskStatus
+from app.core.cache import TenantCache
+from app.database import get_tenant_schema
+from app.leads.models import Lead
+from app.models.agent_change_counter import AgentChangeCounter
+from app.models.pre_angariacao import PreAngariacao
+from app.properties.models import Property
+
+MOBILE_DASHBOARD_CACHE_TTL = float(os.getenv("MOBILE_DASHBOARD_CACHE_TTL", "300"))
+
+# Pré-angariações que já não contam como ativas
+PRE_ANGARIACAO_CLOSED = ("cancelado", "activado")
+
+# Itens por entidade na atividade recente
+RECENT_ACTIVITY_SIZE = 5
+
+dashboard_cache = TenantCache("mobile_dashboard", ttl=MOBILE_DASHBOARD_CACHE_TTL)
+
+# Modelos que contam para o dashboard -> atributo com o agente dono
+OWNER_ATTRIBUTES = {
+    Property: "agent_id",
+    PreAngariacao: "agent_id",
+    Lead: "assigned_agent_id",
+    Task: "assigned_agent_id",
+}
+
+
+# =====================================================
+# VERSÃO / ETAG
+# =====================================================
+
+def _session_schema(db: Session) -> Optional[str]:
+    return getattr(db, "tenant_schema", get_tenant_schema())
+
+
+def agent_version(db: Session, agent_id: int) -> int:
+    """Contador de alterações do agente (0 se nunca houve escritas)."""
+    version = db.execute(
+        select(AgentChangeCounter.version).where(AgentChangeCounter.agent_id == agent_id)
+    ).scalar()
+    return version or 0
+
+
+def dashboard_etag(db: Session, agent_id: int, kind: str, today: Optional[date] = None) -> Tuple[str, int]:
+    """(ETag, versão) da vista `kind` do dashboard do agente."""
+    version = agent_version(db, agent_id)
+    day = (today or datetime.utcnow().date()).isoformat()
+    raw = f"{_session_schema(db)}:{agent_id}:{version}:{day}:{kind}"
+    return f'"{kind}-{hashlib.sha1(raw.encode()).hexdigest()[:20]}"', version
+
+
+def bump_agent_versions(connection, agent_ids: Iterable[int]) -> None:
+    """Incrementa o contador dos agentes (upsert numa só instrução)."""
+    agent_ids = sorted({agent_id for agent_id in agent_ids if agent_id is not None})
+    if not agent_ids:
+        return
+    table = AgentChangeCounter.__table__
+    now = datetime.utcnow()
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values([{"agent_id": a, "version": 1, "updated_at": now} for a in agent_ids])
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.agent_id],
+            set_={"version": table.c.version + 1, "updated_at": now},
+        ))
+        return
+    for agent_id in agent_ids:
+        updated = connection.execute(
+            table.update().where(table.c.agent_id == agent_id)
+            .values(version=table.c.version + 1, updated_at=now)
+        )
+        if not updated.rowcount:
+            connection.execute(table.insert().values(agent_id=agent_id, version=1, updated_at=now))
+
+
+def _changed_agents(session: Session) -> set:
+    agent_ids = set()
+    modified = (obj for obj in session.dirty if session.is_modified(obj, include_collections=False))
+    for obj in chain(session.new, session.deleted, modified):
+        attribute = OWNER_ATTRIBUTES.get(type(obj))
+        if attribute is None:
+            continue
+        state = inspect(obj)
+        # Dono atual e, se mudou neste flush, o anterior
+        agent_ids.update(state.attrs[attribute].history.deleted)
+        agent_ids.add(state.dict.get(attribute))
+    agent_ids.discard(None)
+    return agent_ids
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_on_flush(session: Session, flush_context) -> None:
+    # Em after_flush new/dirty/deleted e o histórico ainda refletem o flush.
+    # O dono anterior está no histórico graças ao active_history dos atributos
+    # de OWNER_ATTRIBUTES (column_property nos modelos).
+    agent_ids = _changed_agents(session)
+    if agent_ids:
+        session.info.setdefault("dashboard_agents", set()).update(agent_ids)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_before_commit(session: Session) -> None:
+    # Um só upsert por transação, com os agentes de todos os flushes. O flush
+    # final do commit corre depois deste evento: faz-se aqui para o incluir.
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    agent_ids = session.info.pop("dashboard_agents", None)
+    if agent_ids:
+        bump_agent_versions(session.connection(), agent_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop("dashboard_agents", None)
+
+
+# =====================================================
+# ESTATÍSTICAS
+# =====================================================
+
+def _count(model, *conditions):
+    return select(func.count()).select_from(model).where(*conditions).scalar_subquery()
+
+
+def compute_dashboard_stats(db: Session, agent_id: Optional[int], now: Optional[datetime] = None) -> dict:
+    """Contagens do dashboard numa única ida à BD."""
+    today_start = datetime.combine((now or datetime.utcnow()).date(), time.min)
+    tomorrow_start = today_start + timedelta(days=1)
+    active_pre = PreAngariacao.status.notin_(PRE_ANGARIACAO_CLOSED)
+
+    if not agent_id:
+        # Sem agente: só pré-angariações (todas as ativas), o resto a zero
+        pre_angariacoes = db.execute(select(_count(PreAngariacao, active_pre))).scalar() or 0
+        return {
+            "properties": 0, "pre_angariacoes": pre_angariacoes, "leads": 0,
+            "tasks_pending": 0, "tasks_today": 0, "events_future": 0, "agent_id": agent_id,
+        }
+
+    own_task = Task.assigned_agent_id == agent_id
+    row = db.execute(select(
+        _count(Property, Property.agent_id == agent_id).label("properties"),
+        _count(PreAngariacao, PreAngariacao.agent_id == agent_id, active_pre).label("pre_angariacoes"),
+        _count(Lead, Lead.assigned_agent_id == agent_id).label("leads"),
+        _count(Task, own_task).label("tasks_pending"),
+        _count(Task, own_task, Task.due_date >= today_start, Task.due_date < tomorrow_start).label("tasks_today"),
+        _count(Task, own_task, Task.due_date >= tomorrow_start).label("events_future"),
+    )).one()
+    return {**{key: value or 0 for key, value in row._mapping.items()}, "agent_id": agent_id}
+
+
+def dashboard_stats(db: Session, agent_id: int, version: int, today: Optional[date] = None) -> dict:
+    """Estatísticas do agente na versão `version` (cache local por versão e dia)."""
+    today = today or datetime.utcnow().date()
+    return dashboard_cache.get_or_set(
+        ("stats", agent_id, version, today),
+        lambda: compute_dashboard_stats(db, agent_id, datetime.combine(today, time.min)),
+        _session_schema(db),
+    )
+
+
+# =====================================================
+# ATIVIDADE RECENTE
+# =====================================================
+
+def _latest(query, model, owner_column, size: int):
+    """Últimas `size` linhas do agente por created_at (subquery de um ramo do UNION)."""
+    return (
+        query.where(owner_column).order_by(model.created_at.desc(), model.id.desc()).limit(size).subquery()
+    )
+
+
+def _enum_value(enum_cls, raw):
+    """Valores de SQLEnum lidos como texto (nome do membro) -> membro do enum."""
+    if raw is None:
+        return None
+    try:
+        return enum_cls[raw]
+    except KeyError:
+        try:
+            return enum_cls(raw)
+        except ValueError:
+            return raw
+
+
+def compute_recent_activity(db: Session, agent_id: int, size: int = RECENT_ACTIVITY_SIZE) -> dict:
+    """Últimos imóveis, leads e tarefas do agente num único UNION ALL."""
+    no_text = cast(null(), String)
+    no_date = cast(null(), Property.created_at.type)
+
+    def branch(kind, model, owner, title, detail, phone, price, status, priority, due_date):
+        query = select(
+            literal(kind, String).label("kind"), model.id.label("id"),
+            title.label("title"), detail.label("detail"), phone.label("phone"),
+            price.label("price"), status.label("status"), priority.label("priority"),
+            model.created_at.label("created_at"), due_date.label("due_date"),
+        )
+        return select(_latest(query, model, owner, size))
+
+    union = union_all(
+        branch("property", Property, Property.agent_id == agent_id, Property.reference, Property.location,
+               no_text, Property.price, Property.status, no_text, no_date),
+        branch("lead", Lead, Lead.assigned_agent_id == agent_id, Lead.name, Lead.email,
+               Lead.phone, cast(null(), Float), Lead.status, no_text, no_date),
+        branch("task", Task, Task.assigned_agent_id == agent_id, Task.title, no_text,
+               no_text, cast(null(), Float), cast(Task.status, String), cast(Task.priority, String), Task.due_date),
+    ).subquery()
+    rows = db.execute(
+        select(union).order_by(union.c.kind, union.c.created_at.desc(), union.c.id.desc())
+    ).all()
+
+    result = {"recent_properties": [], "recent_leads": [], "recent_tasks": []}
+    for row in rows:
+        if row.kind == "property":
+            result["recent_properties"].append({
+                "id": row.id, "reference": row.title, "location": row.detail,
+                "price": row.price, "status": row.status, "created_at": row.created_at,
+            })
+        elif row.kind == "lead":
+            result["recent_leads"].append({
+                "id": row.id, "name": row.title, "email": row.detail, "phone": row.phone,
+                "status": row.status, "created_at": row.created_at,
+            })
+        else:
+            result["recent_tasks"].append({
+                "id": row.id, "title": row.title, "due_date": row.due_date,
+                "status": _enum_value(TaskStatus, row.status),
+                "priority": _enum_value(TaskPriority, row.priority),
+            })
+    return result
+
+
+def recent_activity(db: Session, agent_id: int, version: int, size: int = RECENT_ACTIVITY_SIZE) -> dict:
+    """Atividade recente do agente na versão `version` (cache local por versão e tamanho)."""
+    return dashboard_cache.get_or_set(
+        ("activity", agent_id, version, size),
+        lambda: compute_recent_activity(db, agent_id, size=size),
+        _session_schema(db),
+    )
@@ -2,22 +2,25 @@
 Rotas API para aplicação móvel - Agentes Editores
 Endpoints otimizados para app mobile com permissões completas de agente
 """
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Query, Request, Response
 from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, desc, func
+from sqlalchemy import or_, and_, desc, func, select
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
 import math
 
 from app.database import get_db
-from app.security import get_current_user, get_effective_agent_id
+from app.database_async import get_async_db
+from app.security import get_current_user, get_current_user_async, get_effective_agent_id
 from app.users.models import User, UserRole
 
 # Importar modelos e schemas
 from app.properties.models import Property, PropertyStatus
 from app.properties import schemas as property_schemas
-from app.properties.routes import apply_watermark_to_property, apply_watermark_to_properties
+from app.properties.routes import apply_watermark_to_property, apply_watermark_to_properties, PROPERTY_SERIALIZER
+from app.properties import geo
 from app.agents.models import Agent
 from app.agents import schemas as agent_schemas
 from app.leads.models import Lead, LeadStatus, LeadSource  # ✅ Adicionar LeadSource
@@ -30,8 +33,15 @@ from app.models.event import Event
 from app.models.pre_angariacao import PreAngariacao
 from app.schemas import event as event_schemas
 from app.schemas import site_preferences as site_prefs_schemas
+from app.schemas import mobile_sync as sync_schemas
+from app.mobile import sync as mobile_sync
+from app.mobile import dashboard as mobile_dashboard
 from app.models.agent_site_preferences import AgentSitePreferences
 from app.core.storage import storage
+from app.core.cache import etag_matches
+from app.core.responses import FastJSONResponse
+from app.core.pagination import Keyset, KeysetColumn, NEXT_CURSOR_HEADER
+from app.leads.services import LEADS_KEYSET
 import calendar as cal_module
 import logging
 
@@ -39,6 +49,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/mobile", tags=["Mobile App"])
 
+# Visitas por data agendada (mais próximas primeiro), id desempata
+VISITS_KEYSET = Keyset(KeysetColumn(Visit.scheduled_date), KeysetColumn(Visit.id))
+
 # Version para debug de deploy
 MOBILE_API_VERSION = "2025-01-01-v18-persist-site-preferences"
 
@@ -145,8 +158,13 @@ def change_own_password(
     """
     from app.users.services import verify_password, hash_password
     
+    # current_user (Principal) não tem a password nem está ligado a esta sessão
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Utilizador não encontrado")
+    
     # Verificar password atual
-    if not verify_password(data.current_password, current_user.hashed_password):
+    if not verify_password(data.current_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Password atual incorreta")
     
     # Validar nova password
@@ -154,7 +172,7 @@ def change_own_password(
         raise HTTPException(status_code=400, detail="Nova password deve ter pelo menos 6 caracteres")
     
     # Atualizar password
-    current_user.hashed_password = hash_password(data.new_password)
+    user.hashed_password = hash_password(data.new_password)
     db.commit()
     
     logger.info(f"✅ Password alterada com sucesso para user {current_user.email}")
@@ -240,12 +258,52 @@ def change_assistant_password(
     return {"message": f"Password de {assistant.full_name} alterada com sucesso"}
 
 
+# =====================================================
+# SYNC INCREMENTAL (offline-first)
+# =====================================================
+
+@router.post("/sync", response_model=sync_schemas.SyncResponse)
+def sync_mobile_data(
+    request: Request,
+    body: sync_schemas.SyncRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Alterações desde a última sincronização, para várias entidades numa resposta
+    
+    - watermarks: {entidade: watermark devolvido na resposta anterior}; sem
+      watermark (ou expirado) a entidade vem completa com reset=true
+    - Por entidade: upserts (linhas criadas/alteradas), deleted (ids apagados
+      ou reatribuídos a outro agente), watermark, has_more
+    - Aplicar deleted antes de upserts e repetir enquanto has_more=true
+    
+    IMPORTANTE: Assistentes sincronizam os dados do agente responsável
+    """
+    effective_agent_id = get_effective_agent_id(request, db)
+    if not effective_agent_id:
+        raise HTTPException(status_code=403, detail="Utilizador não tem agente associado")
+    
+    is_assistant = current_user.role == UserRole.ASSISTANT.value
+    try:
+        return mobile_sync.sync_entities(
+            db,
+            effective_agent_id,
+            body.watermarks,
+            entities=body.entities,
+            limit=body.limit,
+            shared_scope=not (is_assistant or body.my_properties),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # =====================================================
 # PROPERTIES - CRUD COMPLETO
 # =====================================================
 
 @router.get("/properties", response_model=List[property_schemas.PropertyOut])
-def list_mobile_properties(
+async def list_mobile_properties(
     request: Request,
     skip: int = 0,
     limit: int = 500,
@@ -256,8 +314,8 @@ def list_mobile_properties(
     property_type: Optional[str] = None,
     search: Optional[str] = None,
     my_properties: bool = False,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar propriedades para app mobile
@@ -269,13 +327,13 @@ def list_mobile_properties(
     IMPORTANTE: Usa agent_id do token JWT para suportar assistentes
     """
     # Usar agent_id do token (suporta assistentes)
-    effective_agent_id = get_effective_agent_id(request, db)
+    effective_agent_id = get_effective_agent_id(request)
     
     # per_page é alias para limit
     if per_page is not None:
         limit = per_page
     
-    query = db.query(Property)
+    query = select(Property)
     
     # ASSISTENTES: Sempre filtrar pelo agente responsável
     # AGENTES: Filtrar apenas se my_properties=true
@@ -285,24 +343,24 @@ def list_mobile_properties(
         # Assistentes SEMPRE vêem apenas propriedades do agente responsável
         if not effective_agent_id:
             return []
-        query = query.filter(Property.agent_id == effective_agent_id)
+        query = query.where(Property.agent_id == effective_agent_id)
     elif my_properties:
         # Agentes só filtram se pedirem explicitamente
         if not effective_agent_id:
             return []
-        query = query.filter(Property.agent_id == effective_agent_id)
+        query = query.where(Property.agent_id == effective_agent_id)
     
     # Filtros
     if status:
-        query = query.filter(Property.status == status)
+        query = query.where(Property.status == status)
     if business_type:
-        query = query.filter(Property.business_type == business_type)
+        query = query.where(Property.business_type == business_type)
     if property_type:
-        query = query.filter(Property.property_type == property_type)
+        query = query.where(Property.property_type == property_type)
     
     # Busca por texto
     if search:
-        query = query.filter(
+        query = query.where(
             or_(
                 Property.reference.ilike(f"%{search}%"),
                 Property.location.ilike(f"%{search}%"),
@@ -319,17 +377,54 @@ def list_mobile_properties(
     else:  # recent (default)
         query = query.order_by(desc(Property.created_at))
     
-    return query.offset(skip).limit(limit).all()
+    result = await db.execute(query.offset(skip).limit(limit))
+    return FastJSONResponse(PROPERTY_SERIALIZER.many(result.scalars().all()))
 
 
-@router.get("/properties/{property_id}", response_model=property_schemas.PropertyOut)
-def get_mobile_property(
-    property_id: int,
+@router.get("/properties/nearby")
+def list_nearby_properties(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, le=200),
+    limit: int = Query(20, ge=1, le=200),
+    business_type: Optional[str] = None,
+    property_type: Optional[str] = None,
+    my_properties: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
+):
+    """
+    Imóveis perto da posição do agente, ordenados por distância.
+    - Com radius_km: todos dentro do raio (até limit)
+    - Sem radius_km: os `limit` mais próximos (até 50km)
+    Mesmas regras de list_mobile_properties (assistentes só vêem o agente responsável).
+    """
+    effective_agent_id = get_effective_agent_id(request)
+    agent_ids = None
+    if current_user.role == UserRole.ASSISTANT.value or my_properties:
+        if not effective_agent_id:
+            return {"total": 0, "properties": []}
+        agent_ids = [effective_agent_id]
+    
+    filters = geo.GeoFilters(agent_ids=agent_ids, business_type=business_type, property_type=property_type)
+    index = geo.get_geo_index(db)
+    if radius_km:
+        hits = geo.search_radius(index, lat, lon, radius_km * 1000, filters, limit=limit)
+    else:
+        hits = geo.search_nearest(index, lat, lon, limit, filters)
+    return {"total": len(hits), "properties": geo.load_markers(db, hits)}
+
+
+@router.get("/properties/{property_id}", response_model=property_schemas.PropertyOut)
+async def get_mobile_property(
+    property_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter detalhes de uma propriedade"""
-    property = db.query(Property).filter(Property.id == property_id).first()
+    result = await db.execute(select(Property).where(Property.id == property_id))
+    property = result.scalars().first()
     if not property:
         raise HTTPException(status_code=404, detail="Propriedade não encontrada")
     return property
@@ -578,14 +673,16 @@ def get_cloudinary_upload_config(current_user: User = Depends(get_current_user))
 # =====================================================
 
 @router.get("/leads", response_model=List[lead_schemas.LeadOut])
-def list_mobile_leads(
+async def list_mobile_leads(
     request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 500,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     my_leads: bool = True,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar leads para app mobile
@@ -596,21 +693,22 @@ def list_mobile_leads(
     Args:
         status: Status único ou múltiplos separados por vírgula
                 Exemplos: "new" ou "contacted,qualified,negotiation"
+        cursor: header X-Next-Cursor da página anterior (sem skip)
     """
     # Usar agent_id do token (suporta assistentes)
-    effective_agent_id = get_effective_agent_id(request, db)
+    effective_agent_id = get_effective_agent_id(request)
     is_assistant = current_user.role == UserRole.ASSISTANT.value
     
-    query = db.query(Lead)
+    query = select(Lead)
     
     # Assistentes SEMPRE vêem apenas leads do agente responsável
     # Agentes filtram se my_leads=true
     if is_assistant:
         if not effective_agent_id:
             return []
-        query = query.filter(Lead.assigned_agent_id == effective_agent_id)
+        query = query.where(Lead.assigned_agent_id == effective_agent_id)
     elif my_leads and effective_agent_id:
-        query = query.filter(Lead.assigned_agent_id == effective_agent_id)
+        query = query.where(Lead.assigned_agent_id == effective_agent_id)
     
     # Filtro por status (suportar múltiplos valores)
     if status:
@@ -624,18 +722,23 @@ def list_mobile_leads(
                 status_enums = [LeadStatus(s) for s in status_list]
                 # Usar in_() para lista ou comparação direta para único
                 if len(status_enums) == 1:
-                    query = query.filter(Lead.status == status_enums[0])
+                    query = query.where(Lead.status == status_enums[0])
                 else:
-                    query = query.filter(Lead.status.in_(status_enums))
+                    query = query.where(Lead.status.in_(status_enums))
             except ValueError:
                 # Status inválido - retornar lista vazia
                 return []
     
-    # Ordenar por mais recentes/urgentes
-    query = query.order_by(desc(Lead.created_at))
-    
     try:
-        return query.offset(skip).limit(limit).all()
+        # Mais recentes primeiro (cursor por created_at, id; skip = OFFSET legado)
+        if skip and not cursor:
+            query = query.order_by(*LEADS_KEYSET.order_by()).offset(skip).limit(limit)
+            return (await db.execute(query)).scalars().all()
+        result = await db.execute(LEADS_KEYSET.apply(query, cursor, limit))
+        leads, next_cursor = LEADS_KEYSET.page(result.scalars().all(), limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return leads
     except Exception as e:
         # Log do erro real
         import traceback
@@ -644,13 +747,14 @@ def list_mobile_leads(
 
 
 @router.get("/leads/{lead_id}", response_model=lead_schemas.LeadOut)
-def get_mobile_lead(
+async def get_mobile_lead(
     lead_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter detalhes de um lead"""
-    lead = db.query(Lead).filter(Lead.id == lead_id).first()
+    result = await db.execute(select(Lead).where(Lead.id == lead_id))
+    lead = result.scalars().first()
     if not lead:
         raise HTTPException(status_code=404, detail="Lead não encontrado")
     
@@ -1010,181 +1114,61 @@ def delete_task_mobile(
 @router.get("/dashboard/stats")
 def get_mobile_dashboard_stats(
     request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Estatísticas do dashboard para app mobile
-    Dados resumidos do agente - v2 simplificado
-    
+    Dados resumidos do agente numa única query agregada
+
     IMPORTANTE: Usa agent_id do token JWT (não da base de dados)
     Isto permite que assistentes vejam dados do agente para quem trabalham
+
+    Responde com ETag (contador de alterações do agente + dia): com
+    If-None-Match igual devolve 304 sem recalcular.
     """
     # Usar agent_id do token (suporta assistentes)
     effective_agent_id = get_effective_agent_id(request, db)
-    
-    # DEBUG: Log para verificar o agent_id
-    print(f"[STATS] User: {current_user.email}, Role: {current_user.role}, effective_agent_id: {effective_agent_id}")
-    
-    # Valores default
-    properties_count = 0
-    pre_angariacoes_count = 0
-    leads_count = 0
-    tasks_pending = 0
-    tasks_today = 0
-    tasks_future = 0
-    
-    try:
-        # Contar propriedades - SEMPRE FILTRAR POR AGENT_ID
-        if effective_agent_id:
-            properties_count = db.query(Property).filter(
-                Property.agent_id == effective_agent_id
-            ).count()
-            print(f"[STATS] Properties count for agent {effective_agent_id}: {properties_count}")
-        else:
-            # Se não tem agent_id, retornar 0 em vez de todas
-            properties_count = 0
-            print(f"[STATS] No agent_id, returning 0 properties")
-    except Exception as e:
-        print(f"[STATS] Error counting properties: {e}")
-    
-    try:
-        # Contar pré-angariações activas (excluir canceladas e activadas)
-        if effective_agent_id:
-            pre_angariacoes_count = db.query(PreAngariacao).filter(
-                PreAngariacao.agent_id == effective_agent_id,
-                PreAngariacao.status.notin_(['cancelado', 'activado'])
-            ).count()
-        else:
-            pre_angariacoes_count = db.query(PreAngariacao).filter(
-                PreAngariacao.status.notin_(['cancelado', 'activado'])
-            ).count()
-    except Exception as e:
-        print(f"[STATS] Error counting pre_angariacoes: {e}")
-    
-    try:
-        # Contar leads ativos
-        if effective_agent_id:
-            leads_count = db.query(Lead).filter(
-                Lead.assigned_agent_id == effective_agent_id
-            ).count()
-    except Exception as e:
-        print(f"[STATS] Error counting leads: {e}")
-    
-    try:
-        # Contar tarefas pendentes
-        if effective_agent_id:
-            tasks_pending = db.query(Task).filter(
-                Task.assigned_agent_id == effective_agent_id
-            ).count()
-    except Exception as e:
-        print(f"[STATS] Error counting tasks: {e}")
-    
-    try:
-        # Contar tarefas de hoje
-        if effective_agent_id:
-            today = datetime.utcnow().date()
-            tasks_today = db.query(Task).filter(
-                and_(
-                    Task.assigned_agent_id == effective_agent_id,
-                    func.date(Task.due_date) == today
-                )
-            ).count()
-    except Exception as e:
-        print(f"[STATS] Error counting today tasks: {e}")
-    
-    try:
-        # Contar tarefas futuras (após hoje)
-        if effective_agent_id:
-            today = datetime.utcnow().date()
-            tasks_future = db.query(Task).filter(
-                and_(
-                    Task.assigned_agent_id == effective_agent_id,
-                    func.date(Task.due_date) > today
-                )
-            ).count()
-    except Exception as e:
-        print(f"[STATS] Error counting future tasks: {e}")
-    
-    return {
-        "properties": properties_count,
-        "pre_angariacoes": pre_angariacoes_count,
-        "leads": leads_count,
-        "tasks_pending": tasks_pending,
-        "tasks_today": tasks_today,
-        "events_future": tasks_future,
-        "agent_id": effective_agent_id,
-    }
+    if not effective_agent_id:
+        return mobile_dashboard.compute_dashboard_stats(db, None)
+
+    today = datetime.utcnow().date()
+    etag, version = mobile_dashboard.dashboard_etag(db, effective_agent_id, "stats", today)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return mobile_dashboard.dashboard_stats(db, effective_agent_id, version, today)
 
 
 @router.get("/dashboard/recent-activity")
 def get_mobile_recent_activity(
     request: Request,
-    limit: int = 20,
+    response: Response,
+    limit: int = Query(mobile_dashboard.RECENT_ACTIVITY_SIZE, ge=1, le=50),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Atividade recente do agente
-    Últimas propriedades, leads e tarefas
-    
+    Últimas `limit` propriedades, leads e tarefas (um único UNION ALL)
+
     IMPORTANTE: Usa agent_id do token JWT para suportar assistentes
+    Mesmo esquema de ETag/304 das estatísticas.
     """
     # Usar agent_id do token (suporta assistentes)
     effective_agent_id = get_effective_agent_id(request, db)
     
     if not effective_agent_id:
         return {"recent_properties": [], "recent_leads": [], "recent_tasks": []}
-    
-    # Últimas propriedades
-    recent_properties = db.query(Property).filter(
-        Property.agent_id == effective_agent_id
-    ).order_by(desc(Property.created_at)).limit(5).all()
-    
-    # Últimos leads
-    recent_leads = db.query(Lead).filter(
-        Lead.assigned_agent_id == effective_agent_id
-    ).order_by(desc(Lead.created_at)).limit(5).all()
-    
-    # Últimas tarefas
-    recent_tasks = db.query(Task).filter(
-        Task.assigned_agent_id == effective_agent_id
-    ).order_by(desc(Task.created_at)).limit(5).all()
-    
-    return {
-        "recent_properties": [
-            {
-                "id": p.id,
-                "reference": p.reference,
-                "location": p.location,
-                "price": p.price,
-                "status": p.status,
-                "created_at": p.created_at,
-            }
-            for p in recent_properties
-        ],
-        "recent_leads": [
-            {
-                "id": l.id,
-                "name": l.name,
-                "email": l.email,
-                "phone": l.phone,
-                "status": l.status,
-                "created_at": l.created_at,
-            }
-            for l in recent_leads
-        ],
-        "recent_tasks": [
-            {
-                "id": t.id,
-                "title": t.title,
-                "due_date": t.due_date,
-                "status": t.status,
-                "priority": t.priority,
-            }
-            for t in recent_tasks
-        ]
-    }
+
+    etag, version = mobile_dashboard.dashboard_etag(db, effective_agent_id, f"activity{limit}")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return mobile_dashboard.recent_activity(db, effective_agent_id, version, size=limit)
 
 
 # =====================================================
@@ -1192,61 +1176,65 @@ def get_mobile_recent_activity(
 # =====================================================
 
 @router.get("/visits", response_model=visit_schemas.VisitListResponse)
-def list_mobile_visits(
+async def list_mobile_visits(
     request: Request,
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior (em vez de page)"),
     status: Optional[str] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
     property_id: Optional[int] = None,
     lead_id: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Listar visitas do agente com filtros e paginação
     
     IMPORTANTE: Usa agent_id do token JWT para suportar assistentes
     """
-    effective_agent_id = get_effective_agent_id(request, db)
+    effective_agent_id = get_effective_agent_id(request)
     if not effective_agent_id:
         raise HTTPException(status_code=403, detail="Utilizador não tem agente associado")
     
     # Query base - apenas visitas do agente
-    query = db.query(Visit).filter(Visit.agent_id == effective_agent_id)
+    query = select(Visit).where(Visit.agent_id == effective_agent_id)
     
     # Aplicar filtros
     if status:
-        query = query.filter(Visit.status == status)
+        query = query.where(Visit.status == status)
     if date_from:
-        query = query.filter(Visit.scheduled_date >= date_from)
+        query = query.where(Visit.scheduled_date >= date_from)
     if date_to:
-        query = query.filter(Visit.scheduled_date <= date_to)
+        query = query.where(Visit.scheduled_date <= date_to)
     if property_id:
-        query = query.filter(Visit.property_id == property_id)
+        query = query.where(Visit.property_id == property_id)
     if lead_id:
-        query = query.filter(Visit.lead_id == lead_id)
+        query = query.where(Visit.lead_id == lead_id)
     
     # Total de resultados
-    total = query.count()
+    total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar() or 0
     
     # Calcular paginação
     pages = math.ceil(total / per_page) if total > 0 else 1
-    skip = (page - 1) * per_page
-    
-    # Ordenar por data agendada (mais próximas primeiro)
-    query = query.order_by(Visit.scheduled_date.asc())
     
-    # Aplicar paginação
-    visits = query.offset(skip).limit(per_page).all()
+    # Ordenar por data agendada (mais próximas primeiro); cursor evita OFFSET em páginas fundas
+    if page > 1 and not cursor:
+        skip = (page - 1) * per_page
+        query = query.order_by(*VISITS_KEYSET.order_by()).offset(skip).limit(per_page)
+        visits, next_cursor = (await db.execute(query)).scalars().all(), None
+    else:
+        result = await db.execute(VISITS_KEYSET.apply(query, cursor, per_page))
+        visits, next_cursor = VISITS_KEYSET.page(result.scalars().all(), per_page)
     
     return visit_schemas.VisitListResponse(
         visits=visits,
         total=total,
         page=page,
         per_page=per_page,
-        pages=pages
+        pages=pages,
+        next_cursor=next_cursor,
     )
 
 
@@ -1366,14 +1354,14 @@ def get_upcoming_visits_mobile(
 
 
 @router.get("/visits/{visit_id}", response_model=visit_schemas.VisitOut)
-def get_mobile_visit(
+async def get_mobile_visit(
     visit_id: int,
-    detail: bool = Query(True, description="Incluir dados de property/lead/agent"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter detalhes de uma visita específica"""
-    visit = db.query(Visit).filter(Visit.id == visit_id).first()
+    result = await db.execute(select(Visit).where(Visit.id == visit_id))
+    visit = result.scalars().first()
     
     if not visit:
         raise HTTPException(status_code=404, detail="Visita não encontrada")
@@ -1615,21 +1603,10 @@ def visit_check_in_mobile(
     # Calcular distância da propriedade (se tiver coordenadas)
     distance_meters = None
     if visit.property and visit.property.latitude and visit.property.longitude:
-        # Fórmula Haversine simplificada
-        from math import radians, sin, cos, sqrt, atan2
-        
-        R = 6371000  # Raio da Terra em metros
-        lat1 = radians(visit.property.latitude)
-        lon1 = radians(visit.property.longitude)
-        lat2 = radians(checkin_data.latitude)
-        lon2 = radians(checkin_data.longitude)
-        
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        distance_meters = R * c
+        distance_meters = geo.haversine_m(
+            visit.property.latitude, visit.property.longitude,
+            checkin_data.latitude, checkin_data.longitude,
+        )
         
         # Alerta se distância > 500m
         if distance_meters > 500:
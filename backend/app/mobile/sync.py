@@ -0,0 +1,268 @@
+"""
+Sincronização incremental da app mobile (change feed por watermark).
+
+Para cada entidade a app envia o watermark devolvido na sincronização
+anterior e recebe só as linhas criadas/alteradas desde então (ordem
+(updated_at, id), servida pelos índices *_agent_updated_id) e os ids
+apagados ou reatribuídos a outro agente (tombstones). Sem watermark, ou
+com um watermark mais antigo que a retenção dos tombstones, a resposta é
+um snapshot completo com reset=true (a app limpa a cache local dessa
+entidade antes de aplicar).
+
+A app deve aplicar `deleted` antes de `upserts` e repetir enquanto
+has_more=true. Linhas alteradas nos últimos MOBILE_SYNC_SETTLE_SECONDS
+ficam para a sincronização seguinte (transações ainda por fazer commit
+com updated_at anterior não são saltadas).
+
+Os tombstones são escritos na mesma transação pelos eventos do ORM;
+DELETE em massa / SQL raw não geram tombstones.
+
+Configuração via ENV:
+    MOBILE_SYNC_MAX_LIMIT           máximo de linhas por entidade por pedido (default: 1000)
+    MOBILE_SYNC_SETTLE_SECONDS      atraso de segurança do watermark (default: 2)
+    MOBILE_SYNC_TOMBSTONE_DAYS      retenção dos tombstones (default: 30)
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.calendar.models import Task
+from app.calendar.schemas import TaskOut
+from app.core.pagination import Keyset, KeysetColumn, decode_cursor, encode_cursor
+from app.database import get_tenant_schema
+from app.leads.models import Lead
+from app.leads.schemas import LeadOut
+from app.models.event import Event
+from app.models.sync_tombstone import SyncTombstone
+from app.models.visit import Visit
+from app.properties.models import Property
+from app.properties.schemas import PropertyOut
+from app.schemas.event import EventOut
+from app.schemas.visit import VisitOut
+
+MOBILE_SYNC_MAX_LIMIT = int(os.getenv("MOBILE_SYNC_MAX_LIMIT", "1000"))
+MOBILE_SYNC_SETTLE_SECONDS = float(os.getenv("MOBILE_SYNC_SETTLE_SECONDS", "2"))
+MOBILE_SYNC_TOMBSTONE_DAYS = float(os.getenv("MOBILE_SYNC_TOMBSTONE_DAYS", "30"))
+
+# Limpeza de tombstones expirados: no máximo uma vez por hora por tenant
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class SyncEntity:
+    """Modelo sincronizável: coluna do agente dono, schema de saída e visibilidade."""
+
+    def __init__(self, name: str, model, owner_column, schema, shared: bool = False):
+        self.name = name
+        self.model = model
+        self.owner_column = owner_column
+        self.schema = schema
+        # shared: agentes vêem todas as linhas do tenant (assistentes só as do agente)
+        self.shared = shared
+        self.keyset = Keyset(KeysetColumn(model.updated_at), KeysetColumn(model.id))
+
+
+SYNC_ENTITIES: Dict[str, SyncEntity] = {
+    entity.name: entity
+    for entity in (
+        SyncEntity("properties", Property, Property.agent_id, PropertyOut, shared=True),
+        SyncEntity("leads", Lead, Lead.assigned_agent_id, LeadOut),
+        SyncEntity("tasks", Task, Task.assigned_agent_id, TaskOut),
+        SyncEntity("visits", Visit, Visit.agent_id, VisitOut),
+        SyncEntity("events", Event, Event.agent_id, EventOut),
+    )
+}
+
+TOMBSTONE_KEYSET = Keyset(KeysetColumn(SyncTombstone.deleted_at), KeysetColumn(SyncTombstone.id))
+
+# Watermark: [updated_at, id, deleted_at, tombstone_id, emitido_em]
+WATERMARK_SIZE = 5
+
+
+def encode_watermark(values: List[Any]) -> str:
+    return encode_cursor(values)
+
+
+def decode_watermark(watermark: Optional[str]) -> Optional[List[Any]]:
+    return decode_cursor(watermark, WATERMARK_SIZE) if watermark else None
+
+
+def _serialize(entity: SyncEntity, obj) -> dict:
+    return entity.schema.model_validate(obj).model_dump(mode="json")
+
+
+def sync_entity(
+    db: Session,
+    entity: SyncEntity,
+    agent_id: int,
+    watermark: Optional[str],
+    limit: int,
+    scope_all: bool,
+    now: Optional[datetime] = None,
+) -> dict:
+    """Delta de uma entidade desde `watermark` para o agente."""
+    now = now or datetime.utcnow()
+    settled = now - timedelta(seconds=MOBILE_SYNC_SETTLE_SECONDS)
+    values = decode_watermark(watermark)
+    row_cursor = tomb_cursor = None
+    reset = values is None
+    if values is not None:
+        row_ts, row_id, tomb_ts, tomb_id, issued_at = values
+        anchor = tomb_ts or issued_at
+        if anchor is None or anchor < now - timedelta(days=MOBILE_SYNC_TOMBSTONE_DAYS):
+            # Tombstones desde o watermark podem já ter sido apagados: snapshot completo
+            reset = True
+        else:
+            row_cursor = [row_ts, row_id] if row_ts is not None else None
+            tomb_cursor = [tomb_ts, tomb_id] if tomb_ts is not None else None
+    if reset:
+        row_ts = row_id = None
+        # Snapshot: tombstones anteriores não interessam
+        tomb_ts, tomb_id = settled, 0
+
+    model = entity.model
+    query = select(model).where(model.updated_at.isnot(None), model.updated_at <= settled)
+    if not scope_all:
+        query = query.where(entity.owner_column == agent_id)
+    if row_cursor is not None:
+        query = query.where(entity.keyset.after(row_cursor))
+    rows = db.execute(query.order_by(*entity.keyset.order_by()).limit(limit + 1)).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        row_ts, row_id = rows[-1].updated_at, rows[-1].id
+
+    deleted: List[int] = []
+    if not reset:
+        tombs = select(SyncTombstone).where(SyncTombstone.entity == entity.name, SyncTombstone.deleted_at <= settled)
+        if scope_all:
+            tombs = tombs.where(SyncTombstone.reason == "deleted")
+        else:
+            tombs = tombs.where(SyncTombstone.agent_id == agent_id)
+        if tomb_cursor is not None:
+            tombs = tombs.where(TOMBSTONE_KEYSET.after(tomb_cursor))
+        tombstones = db.execute(tombs.order_by(*TOMBSTONE_KEYSET.order_by()).limit(limit + 1)).scalars().all()
+        has_more = has_more or len(tombstones) > limit
+        tombstones = tombstones[:limit]
+        if tombstones:
+            tomb_ts, tomb_id = tombstones[-1].deleted_at, tombstones[-1].id
+        deleted = sorted({t.entity_id for t in tombstones})
+
+    return {
+        "upserts": [_serialize(entity, obj) for obj in rows],
+        "deleted": deleted,
+        "watermark": encode_watermark([row_ts, row_id, tomb_ts, tomb_id, now]),
+        "has_more": has_more,
+        "reset": reset,
+    }
+
+
+def sync_entities(
+    db: Session,
+    agent_id: int,
+    watermarks: Dict[str, Optional[str]],
+    entities: Optional[List[str]] = None,
+    limit: int = 200,
+    shared_scope: bool = True,
+) -> dict:
+    """
+    Delta de várias entidades numa resposta.
+
+    shared_scope=False restringe também as entidades partilhadas (imóveis)
+    às do agente (assistentes / "só os meus").
+    """
+    names = entities or list(SYNC_ENTITIES)
+    unknown = [name for name in names if name not in SYNC_ENTITIES]
+    if unknown:
+        raise ValueError(f"Entidades desconhecidas: {', '.join(unknown)}")
+    limit = max(1, min(limit, MOBILE_SYNC_MAX_LIMIT))
+    now = datetime.utcnow()
+    _maybe_purge(db, now)
+    result = {}
+    for name in names:
+        entity = SYNC_ENTITIES[name]
+        result[name] = sync_entity(
+            db, entity, agent_id, watermarks.get(name), limit,
+            scope_all=entity.shared and shared_scope, now=now,
+        )
+    return {"server_time": now.isoformat(), "entities": result}
+
+
+_last_purge: Dict[Optional[str], float] = {}
+_purge_lock = threading.Lock()
+
+
+def purge_tombstones(db: Session, now: Optional[datetime] = None) -> int:
+    """Apaga tombstones mais antigos que a retenção."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=MOBILE_SYNC_TOMBSTONE_DAYS)
+    deleted = db.query(SyncTombstone).filter(SyncTombstone.deleted_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def _maybe_purge(db: Session, now: datetime) -> None:
+    schema = getattr(db, "tenant_schema", get_tenant_schema())
+    with _purge_lock:
+        if time.monotonic() - _last_purge.get(schema, -PURGE_INTERVAL_SECONDS) < PURGE_INTERVAL_SECONDS:
+            return
+        _last_purge[schema] = time.monotonic()
+    try:
+        purged = purge_tombstones(db, now)
+        if purged:
+            print(f"[MobileSync] {purged} tombstones expirados removidos ({schema})")
+    except Exception as e:
+        db.rollback()
+        print(f"[MobileSync] Erro ao limpar tombstones: {e}")
+
+
+# --- Eventos do ORM: tombstones na mesma transação do DELETE / reatribuição ---
+
+_BY_MODEL = {entity.model: entity for entity in SYNC_ENTITIES.values()}
+
+
+def _insert_tombstone(connection, entity: SyncEntity, entity_id: int, agent_id: Optional[int], reason: str) -> None:
+    connection.execute(
+        SyncTombstone.__table__.insert().values(
+            entity=entity.name, entity_id=entity_id, agent_id=agent_id,
+            reason=reason, deleted_at=datetime.utcnow(),
+        )
+    )
+
+
+def record_reassignments(connection, entity_name: str, changes: List[Tuple[int, Optional[int]]]) -> None:
+    """
+    Tombstones "reassigned" para (id, agente anterior) alterados fora do ORM
+    (UPDATE em massa), numa só instrução, na transação do UPDATE.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {"entity": entity_name, "entity_id": entity_id, "agent_id": previous,
+         "reason": "reassigned", "deleted_at": now}
+        for entity_id, previous in changes if previous is not None
+    ]
+    if rows:
+        connection.execute(SyncTombstone.__table__.insert(), rows)
+
+
+def _after_delete(mapper, connection, target) -> None:
+    entity = _BY_MODEL[mapper.class_]
+    _insert_tombstone(connection, entity, target.id, getattr(target, entity.owner_column.key), "deleted")
+
+
+def _after_update(mapper, connection, target) -> None:
+    entity = _BY_MODEL[mapper.class_]
+    history = inspect(target).attrs[entity.owner_column.key].history
+    if not history.has_changes():
+        return
+    for previous in history.deleted:
+        if previous is not None:
+            _insert_tombstone(connection, entity, target.id, previous, "reassigned")
+
+
+for _model in _BY_MODEL:
+    event.listen(_model, "after_delete", _after_delete)
+    event.listen(_model, "after_update", _after_update)
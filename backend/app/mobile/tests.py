@@ -0,0 +1,205 @@
+def test_mobile_sync_returns_only_changes_and_tombstones(monkeypatch):
+    from app.database import Base, SessionLocal, engine
+    from app.leads.models import Lead
+    from app.mobile import sync
+
+    monkeypatch.setattr(sync, "MOBILE_SYNC_SETTLE_SECONDS", 0)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    agent_id, other_agent_id = 990001, 990002
+    first = Lead(name="Ana Sync", assigned_agent_id=agent_id)
+    second = Lead(name="Bruno Sync", assigned_agent_id=agent_id)
+    db.add_all([first, second])
+    db.commit()
+
+    def delta(watermark):
+        return sync.sync_entities(db, agent_id, {"leads": watermark}, entities=["leads"])["entities"]["leads"]
+
+    try:
+        snapshot = delta(None)
+        assert snapshot["reset"] is True
+        assert {row["id"] for row in snapshot["upserts"]} == {first.id, second.id}
+
+        # Alteração + delete: só a linha alterada e o tombstone
+        first.name = "Ana Sync Editada"
+        db.delete(second)
+        db.commit()
+        changes = delta(snapshot["watermark"])
+        assert changes["reset"] is False
+        assert [row["name"] for row in changes["upserts"]] == ["Ana Sync Editada"]
+        assert changes["deleted"] == [second.id]
+
+        # Reatribuída a outro agente: sai da cache deste agente
+        first.assigned_agent_id = other_agent_id
+        db.commit()
+        moved = delta(changes["watermark"])
+        assert moved["upserts"] == [] and moved["deleted"] == [first.id]
+
+        idle = delta(moved["watermark"])
+        assert idle["upserts"] == [] and idle["deleted"] == [] and idle["has_more"] is False
+    finally:
+        db.delete(first)
+        db.commit()
+        db.close()
+
+
+def test_mobile_dashboard_etag_follows_agent_changes():
+    from datetime import datetime, time, timedelta
+    from app.calendar.models import Task, TaskStatus
+    from app.database import Base, SessionLocal, engine
+    from app.leads.models import Lead
+    from app.mobile import dashboard
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    agent_id, other_agent_id = 990011, 990012
+    today = datetime.utcnow().date()
+    midnight = datetime.combine(today, time.min)
+    lead = Lead(name="Dash Lead", assigned_agent_id=agent_id)
+    tasks = [
+        Task(title="Hoje cedo", due_date=midnight, assigned_agent_id=agent_id),
+        Task(title="Hoje tarde", due_date=midnight + timedelta(hours=23, minutes=59), assigned_agent_id=agent_id),
+        Task(title="Amanhã", due_date=midnight + timedelta(days=1), assigned_agent_id=agent_id),
+        Task(title="Ontem", due_date=midnight - timedelta(seconds=1), assigned_agent_id=agent_id),
+    ]
+    db.add_all([lead, *tasks])
+    db.commit()
+
+    try:
+        etag, version = dashboard.dashboard_etag(db, agent_id, "stats", today)
+        assert version > 0
+        stats = dashboard.dashboard_stats(db, agent_id, version, today)
+        assert stats["leads"] == 1 and stats["tasks_pending"] == 4
+        assert stats["tasks_today"] == 2 and stats["events_future"] == 1
+
+        # Sem escritas: mesmo ETag (304 na rota)
+        assert dashboard.dashboard_etag(db, agent_id, "stats", today)[0] == etag
+        assert dashboard.dashboard_etag(db, agent_id, "stats", today + timedelta(days=1))[0] != etag
+
+        activity = dashboard.compute_recent_activity(db, agent_id)
+        assert [item["name"] for item in activity["recent_leads"]] == ["Dash Lead"]
+        assert len(activity["recent_tasks"]) == 4
+        assert all(item["status"] is TaskStatus.PENDING for item in activity["recent_tasks"])
+
+        # Reatribuição muda o ETag dos dois agentes
+        other_etag, _ = dashboard.dashboard_etag(db, other_agent_id, "stats", today)
+        lead.assigned_agent_id = other_agent_id
+        db.commit()
+        new_etag, new_version = dashboard.dashboard_etag(db, agent_id, "stats", today)
+        assert new_etag != etag
+        assert dashboard.dashboard_etag(db, other_agent_id, "stats", today)[0] != other_etag
+        assert dashboard.dashboard_stats(db, agent_id, new_version, today)["leads"] == 0
+
+        # Vários flushes na mesma transação: um só incremento no commit
+        tasks[0].title = "Hoje cedo (1)"
+        db.flush()
+        tasks[1].title = "Hoje tarde (1)"
+        db.flush()
+        assert dashboard.agent_version(db, agent_id) == new_version
+        db.commit()
+        assert dashboard.agent_version(db, agent_id) == new_version + 1
+
+        # O tamanho da atividade recente faz parte da chave da cache
+        version = new_version + 1
+        assert len(dashboard.recent_activity(db, agent_id, version, size=2)["recent_tasks"]) == 2
+        assert len(dashboard.recent_activity(db, agent_id, version)["recent_tasks"]) == 4
+    finally:
+        for obj in (lead, *tasks):
+            db.delete(obj)
+        db.commit()
+        db.close()
+
+
+def test_async_read_paths_match_sync_queries(tmp_path, monkeypatch):
+    """[user-002] AsyncSession (aiosqlite) devolve o mesmo que as queries sync: imóveis, visita, utilizador do token."""
+    import asyncio
+    from datetime import datetime
+    import pytest
+    from fastapi import HTTPException
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+    from starlette.requests import Request
+    import app.main  # noqa: F401  regista todos os modelos
+    from app import database_async, security
+    from app.database import Base
+    from app.mobile.routes import get_mobile_visit
+    from app.models.visit import Visit
+    from app.properties import services
+    from app.properties.models import Property, PropertyStatus
+    from app.users.models import User, UserRole
+
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    registry = database_async.AsyncTenantEngineRegistry(database_async.to_async_url(url), is_postgres=False, max_tenants=5)
+    async_engine = registry.get_engine("tenant_acme")
+    assert registry.get_engine(None) is async_engine  # SQLite: um só engine
+    monkeypatch.setattr(database_async, "AsyncSessionLocal", lambda: AsyncSession(bind=async_engine, expire_on_commit=False))
+    monkeypatch.setattr(security, "_cached_user", lambda payload: None)
+
+    db = Session(bind=sync_engine)
+    statuses = [PropertyStatus.AVAILABLE.value, PropertyStatus.RESERVED.value, PropertyStatus.CANCELLED.value]
+    db.add_all([
+        Property(reference=f"ASYNC-{i}", title=f"Apartamento {i}", price=100000 + i, agent_id=i % 2 + 1,
+                 status=statuses[i % 3], is_published=i % 2, location="Leiria" if i % 4 else "Marinha Grande")
+        for i in range(12)
+    ])
+    agent = User(email="agente@acme.pt", hashed_password="x", full_name="Agente", role=UserRole.AGENT.value, agent_id=1)
+    other = User(email="outro@acme.pt", hashed_password="x", full_name="Outro", role=UserRole.AGENT.value, agent_id=2)
+    db.add_all([agent, other])
+    db.flush()
+    visit = Visit(property_id=1, agent_id=1, scheduled_date=datetime(2026, 5, 4, 10, 0))
+    db.add(visit)
+    db.commit()
+
+    filter_sets = [
+        {},
+        {"skip": 3, "limit": 4},
+        {"search": "marinha"},
+        {"agent_id": 2, "hide_cancelled": True},
+        {"agent_ids": [1, 2], "is_published": 1},
+        {"status": PropertyStatus.RESERVED.value},
+    ]
+
+    def columns(obj):
+        return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+    async def compare():
+        async with AsyncSession(bind=async_engine, expire_on_commit=False) as session:
+            for filters in filter_sets:
+                expected = [columns(p) for p in services.get_properties(db, **filters)]
+                got = [columns(p) for p in await services.get_properties_async(session, **filters)]
+                assert got == expected and expected, filters
+            assert columns(await services.get_property_async(session, 5)) == columns(services.get_property(db, 5))
+            assert await services.get_property_async(session, 999) is None
+
+            shown = await get_mobile_visit(visit.id, current_user=agent, db=session)
+            assert columns(shown) == columns(db.get(Visit, visit.id))
+            with pytest.raises(HTTPException) as denied:
+                await get_mobile_visit(visit.id, current_user=other, db=session)
+            assert denied.value.status_code == 403
+            with pytest.raises(HTTPException) as missing:
+                await get_mobile_visit(999, current_user=agent, db=session)
+            assert missing.value.status_code == 404
+
+        # Utilizador do token: mesmo registo que a dependency sync
+        token = security.create_access_token(agent.id, agent.email, agent.role, agent_id=1, tenant_slug="acme")
+        request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                           "headers": [(b"authorization", f"Bearer {token}".encode())]})
+        request.state.tenant_slug = "acme"
+        async_user = await security.get_current_user_async(request)
+        sync_user = security.get_current_user(request, db=db)
+        assert (async_user.id, async_user.email, async_user.agent_id) == (sync_user.id, sync_user.email, sync_user.agent_id)
+        assert (await security.get_optional_user_async(request)).id == agent.id
+        request.state.tenant_slug = "beta"
+        with pytest.raises(HTTPException) as cross_tenant:
+            await security.get_current_user_async(request)
+        assert cross_tenant.value.status_code == 403
+        await registry.dispose()
+
+    try:
+        asyncio.run(compare())
+    finally:
+        db.close()
+        sync_engine.dispose()
@@ -15,5 +15,8 @@ from app.models.crm_settings import CRMSettings  # Configurações globais CRM (
 from app.models.client import Client  # Base de dados de clientes por agente
 from app.models.opportunity import Opportunity  # Pipeline de oportunidades
 from app.models.proposal import Proposal  # Propostas de negócio
+from app.models.sync_tombstone import SyncTombstone  # Deletes para sync incremental mobile
+from app.models.agent_change_counter import AgentChangeCounter  # ETag do dashboard mobile
+from app.models.report_rollup import DailyRollup, RollupDirtyDay  # Rollups diários dos relatórios
 
-__all__ = ["Agent", "Property", "Lead", "Task", "Visit", "Event", "FirstImpression", "DraftProperty", "IngestionFile", "AgentSitePreferences", "PreAngariacao", "ContratoMediacaoImobiliaria", "CRMSettings", "Client", "Opportunity", "Proposal"]
+__all__ = ["Agent", "Property", "Lead", "Task", "Visit", "Event", "FirstImpression", "DraftProperty", "IngestionFile", "AgentSitePreferences", "PreAngariacao", "ContratoMediacaoImobiliaria", "CRMSettings", "Client", "Opportunity", "Proposal", "SyncTombstone", "AgentChangeCounter", "DailyRollup", "RollupDirtyDay"]
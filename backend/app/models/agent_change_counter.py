@@ -0,0 +1,22 @@
+"""
+Contador de alterações por agente (ETag do dashboard mobile)
+
+Uma linha por agente, incrementada na mesma transação (no flush) sempre que
+um imóvel, pré-angariação, lead ou tarefa do agente é criado, alterado ou
+apagado (app/mobile/dashboard.py). Sem FK para agents: o contador de um
+agente apagado é inofensivo e não deve bloquear o DELETE.
+"""
+from sqlalchemy import Column, Integer, BigInteger, DateTime
+from datetime import datetime
+from app.database import Base
+
+
+class AgentChangeCounter(Base):
+    __tablename__ = "agent_change_counters"
+
+    agent_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AgentChangeCounter(agent_id={self.agent_id}, version={self.version})>"
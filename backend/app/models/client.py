@@ -2,7 +2,7 @@
 Modelo SQLAlchemy para Cliente
 Base de dados de clientes por agente com sincronização para agência
 """
-from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Boolean, Enum, DECIMAL
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Boolean, Enum, DECIMAL, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSON
@@ -56,6 +56,10 @@ class Client(Base):
     """
     
     __tablename__ = "clients"
+    __table_args__ = (
+        # Listagens paginadas por cursor: (nome, id) por agente
+        Index("ix_clients_agent_nome_id", "agent_id", "nome", "id"),
+    )
     
     # === IDs & Relationships ===
     id = Column(Integer, primary_key=True, index=True)
@@ -3,7 +3,7 @@ Modelo SQLAlchemy para Escrituras
 Agendamento de escrituras com dados para faturação
 """
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Numeric, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -29,7 +29,8 @@ class Escritura(Base):
     client_id = Column(Integer, ForeignKey("clients.id", ondelete="SET NULL"), nullable=True)
     
     # === Data e Local ===
-    data_escritura = Column(DateTime(timezone=True), nullable=False, index=True)
+    # active_history: ao mudar a data de um objeto expirado o dia anterior é carregado (rollups dos relatórios)
+    data_escritura = column_property(Column(DateTime(timezone=True), nullable=False, index=True), active_history=True)
     hora_escritura = Column(String(10), nullable=True)  # "10:30"
     local_escritura = Column(String(500), nullable=True)  # Nome do cartório/notário
     morada_cartorio = Column(String(500), nullable=True)
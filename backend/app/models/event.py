@@ -3,7 +3,7 @@ Modelo para Events (Agenda Universal)
 Suporta visitas, reuniões, tarefas, eventos pessoais, etc
 """
 
-from sqlalchemy import Column, Integer, String, Text, DECIMAL, DateTime, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, Text, DECIMAL, DateTime, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -57,6 +57,8 @@ class Event(Base):
             "status IN ('scheduled', 'completed', 'cancelled', 'no_show')",
             name='check_status'
         ),
+        # Sync incremental mobile (updated_at, id) por agente
+        Index("ix_events_agent_updated_id", "agent_id", "updated_at", "id"),
     )
     
     def __repr__(self):
@@ -4,7 +4,7 @@ Pasta virtual que agrega todo o processo de angariação de um imóvel
 """
 import builtins
 from sqlalchemy import Column, Integer, String, Text, DECIMAL, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSON
 from app.database import Base
@@ -39,7 +39,10 @@ class PreAngariacao(Base):
     
     # === IDs & Relationships ===
     id = Column(Integer, primary_key=True, index=True)
-    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False, index=True)
+    # active_history: o dono anterior fica no histórico mesmo com o objeto expirado (dashboard mobile, sync)
+    agent_id = column_property(
+        Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False, index=True), active_history=True
+    )
     first_impression_id = Column(Integer, ForeignKey("first_impressions.id", ondelete="SET NULL"), nullable=True, index=True)
     property_id = Column(Integer, ForeignKey("properties.id", ondelete="SET NULL"), nullable=True, index=True)  # Quando convertido
     
@@ -3,7 +3,7 @@ Modelo SQLAlchemy para Proposta
 Representa uma proposta formal de compra/venda/arrendamento
 """
 from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Numeric, Boolean, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSON
 from app.database import Base
@@ -106,7 +106,10 @@ class Proposal(Base):
     custom_fields = Column(JSON, default=dict)
     
     # === Timestamps ===
-    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # active_history: ao mudar a data de um objeto expirado o dia anterior é carregado (rollups dos relatórios)
+    created_at = column_property(
+        Column(DateTime, server_default=func.now(), nullable=False, index=True), active_history=True
+    )
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
     sent_at = Column(DateTime, nullable=True)
     responded_at = Column(DateTime, nullable=True)
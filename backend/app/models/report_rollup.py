@@ -0,0 +1,50 @@
+"""
+Rollups diários para relatórios (app/reports/rollups.py)
+
+daily_rollups: uma linha por (métrica, dia, dimensões) com a contagem e,
+nas métricas com valor (propostas, escrituras), a soma. As dimensões são
+texto ('' = sem valor) para todas as métricas partilharem a mesma tabela.
+
+rollup_dirty_days: dias por recalcular, marcados no commit das escritas ORM
+e consumidos pelo worker de rollups. Só de acréscimo (uma linha por
+transação e dia, sem chave única): escritores concorrentes nunca disputam a
+mesma linha; o worker apaga apenas as marcas que leu antes de recalcular.
+"""
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, Index
+from datetime import datetime
+from app.database import Base
+
+
+class DailyRollup(Base):
+    __tablename__ = "daily_rollups"
+    __table_args__ = (
+        Index("ux_daily_rollups_metric_day_dims", "metric", "day", "dim1", "dim2", "dim3", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    metric = Column(String(30), nullable=False)
+    day = Column(Date, nullable=False)
+    dim1 = Column(String(255), nullable=False, default="")
+    dim2 = Column(String(255), nullable=False, default="")
+    dim3 = Column(String(255), nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Numeric(16, 2), nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DailyRollup({self.metric} {self.day} {self.dim1}/{self.dim2}/{self.dim3}: {self.count})>"
+
+
+class RollupDirtyDay(Base):
+    __tablename__ = "rollup_dirty_days"
+    __table_args__ = (
+        Index("ix_rollup_dirty_days_day_metric", "day", "metric"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    metric = Column(String(30), nullable=False)
+    day = Column(Date, nullable=False)
+    marked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RollupDirtyDay({self.metric} {self.day})>"
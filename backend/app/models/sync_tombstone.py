@@ -0,0 +1,28 @@
+"""
+Tombstones para a sincronização incremental da app mobile (POST /mobile/sync)
+
+Um registo por linha apagada (reason="deleted") ou que deixou de pertencer
+a um agente (reason="reassigned", agent_id = dono anterior), escrito na
+mesma transação pelos eventos do ORM em app/mobile/sync.py.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+from app.database import Base
+
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        # Delta por entidade: (entity, deleted_at, id) > watermark
+        Index("ix_sync_tombstones_entity_deleted_id", "entity", "deleted_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(30), nullable=False)  # properties, leads, tasks, visits, events
+    entity_id = Column(Integer, nullable=False)
+    agent_id = Column(Integer, nullable=True)  # Dono da linha no momento (ou dono anterior)
+    reason = Column(String(20), nullable=False, default="deleted")  # deleted | reassigned
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SyncTombstone(entity={self.entity}, entity_id={self.entity_id}, reason={self.reason})>"
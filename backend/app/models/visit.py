@@ -3,8 +3,8 @@ Model para sistema de visitas a propriedades
 Gestão completa de agendamentos, check-in/out com GPS, e feedback
 """
 from enum import Enum as PyEnum
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean, Index, text
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 from app.database import Base
 
@@ -39,6 +39,17 @@ class Visit(Base):
     - Histórico completo de interações
     """
     __tablename__ = "visits"
+    __table_args__ = (
+        # Listagem mobile paginada por cursor (agente, data agendada, id)
+        Index("ix_visits_agent_scheduled_id", "agent_id", "scheduled_date", "id"),
+        # Lembretes pendentes (app/core/scheduler.py): só visitas ainda sem lembrete
+        Index(
+            "ix_visits_reminder_due", "scheduled_date",
+            postgresql_where=text("reminder_sent = false"), sqlite_where=text("reminder_sent = 0"),
+        ),
+        # Sync incremental mobile (updated_at, id) por agente
+        Index("ix_visits_agent_updated_id", "agent_id", "updated_at", "id"),
+    )
 
     # Primary Key
     id = Column(Integer, primary_key=True, index=True)
@@ -49,7 +60,8 @@ class Visit(Base):
     agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False, index=True)
     
     # Agendamento
-    scheduled_date = Column(DateTime, nullable=False, index=True)
+    # active_history: ao mudar a data de um objeto expirado o dia anterior é carregado (rollups dos relatórios)
+    scheduled_date = column_property(Column(DateTime, nullable=False, index=True), active_history=True)
     duration_minutes = Column(Integer, default=30)
     
     # Status
@@ -19,3 +19,247 @@ def test_create_notification():
     assert response.status_code == 201
     data = response.json()
     assert data["message"] == "Nova mensagem para agente."
+
+
+def test_event_bus_queues_do_not_block_publisher_and_fan_out_across_buses():
+    import asyncio
+    from app.core.events import EventBus, InMemoryHub, InMemoryTransport
+
+    async def scenario():
+        hub = InMemoryHub()
+        worker_a, worker_b = EventBus(), EventBus()
+        await worker_a.start_transport(InMemoryTransport(hub))
+        await worker_b.start_transport(InMemoryTransport(hub))
+        release = asyncio.Event()
+        slow_seen, remote_seen = [], []
+
+        async def slow_handler(event):
+            await release.wait()
+            slow_seen.append(event.data["n"])
+
+        worker_a.subscribe("ping", slow_handler, max_queue=2, policy="drop_oldest")
+        worker_b.subscribe("ping", lambda event: remote_seen.append((event.data["n"], event.tenant_schema)))
+
+        # Handler bloqueado no evento 0: publish volta logo e a fila fica limitada a 2
+        await worker_a.publish("ping", {"n": 0}, tenant_schema="tenant_x")
+        await asyncio.sleep(0.01)
+        for n in range(1, 5):
+            await asyncio.wait_for(worker_a.publish("ping", {"n": n}, tenant_schema="tenant_x"), timeout=0.5)
+        release.set()
+        await worker_a.drain()
+        await worker_b.drain()
+
+        stats = worker_a.metrics()["subscribers"][0]
+        assert stats["dropped"] == 2
+        assert slow_seen == [0, 3, 4]
+        # Todos os eventos chegam ao outro "processo", com o tenant de origem
+        assert remote_seen == [(n, "tenant_x") for n in range(5)]
+        await worker_a.close()
+        await worker_b.close()
+
+    asyncio.run(scenario())
+
+
+def test_postgres_transport_sends_notify_in_background_on_its_own_connection():
+    import asyncio
+    import json
+    from app.core.events import EventBus, EventTransport, PostgresNotifyTransport
+
+    with pytest.raises(TypeError):
+        EventTransport()
+
+    class FakeConnection:
+        def __init__(self, gate):
+            self.gate = gate
+            self.busy = False
+            self.listening = False
+            self.notified = []
+
+        async def add_listener(self, channel, callback):
+            self.listening = True
+
+        async def _op(self):
+            if self.busy:
+                raise RuntimeError("another operation is in progress")
+            self.busy = True
+            try:
+                await self.gate.wait()
+            finally:
+                self.busy = False
+
+        async def execute(self, query, *args):
+            await self._op()
+
+        async def executemany(self, query, args):
+            await self._op()
+            self.notified.extend(payload for _channel, payload in args)
+
+        def is_closed(self):
+            return False
+
+        async def close(self):
+            pass
+
+    class FakeTransport(PostgresNotifyTransport):
+        def __init__(self, gate):
+            super().__init__("postgresql://fake/db", outbox_size=3)
+            self.gate = gate
+            self.connections = []
+
+        async def _connect(self):
+            self.connections.append(FakeConnection(self.gate))
+            return self.connections[-1]
+
+    async def scenario():
+        gate = asyncio.Event()
+        transport = FakeTransport(gate)
+        bus = EventBus()
+        await bus.start_transport(transport)
+        await asyncio.sleep(0.01)
+
+        # NOTIFY preso no PostgreSQL: publish não espera e a fila é limitada
+        for n in range(5):
+            await asyncio.wait_for(bus.publish("ping", {"n": n}, tenant_schema=None), timeout=0.1)
+        await asyncio.sleep(0.01)
+        gate.set()
+        await transport.flush()
+        await asyncio.sleep(0.01)
+
+        listen, sender = transport.connections
+        assert listen.listening and not sender.listening
+        sent = [json.loads(payload)["data"]["n"] for payload in sender.notified]
+        assert sent == [0, 1, 2, 3]
+        assert bus.metrics()["transport_stats"] == {"sent": 4, "dropped": 1}
+        assert bus.stats["remote_errors"] == 1
+        await bus.close()
+
+    asyncio.run(scenario())
+
+def test_connection_manager_tenant_keys_slow_clients_and_reaping():
+    import asyncio
+    from app.core.websocket import ConnectionManager
+
+    class FakeSocket:
+        def __init__(self, delay=0.0):
+            self.delay = delay
+            self.frames = []
+            self.closed_with = None
+
+        async def accept(self):
+            pass
+
+        async def send_text(self, frame):
+            await asyncio.sleep(self.delay)
+            self.frames.append(frame)
+
+        async def close(self, code=1000):
+            self.closed_with = code
+
+    async def scenario():
+        manager = ConnectionManager(max_queue=3)
+        fast_a, fast_b, slow = FakeSocket(), FakeSocket(), FakeSocket(delay=10)
+        other_tenant = FakeSocket()
+        await manager.connect(fast_a, 7, "tenant_a")
+        await manager.connect(fast_b, 7, "tenant_a")
+        await manager.connect(slow, 7, "tenant_a")
+        await manager.connect(other_tenant, 7, "tenant_b")
+        await asyncio.sleep(0.01)
+
+        for n in range(5):
+            assert await manager.send_to_agent(7, {"type": "ping", "n": n}, "tenant_a") == 3
+            await asyncio.sleep(0.005)
+
+        # Cliente lento não atrasa os outros; mesma string partilhada
+        assert len(fast_a.frames) == len(fast_b.frames) == 6
+        assert fast_a.frames[-1] is fast_b.frames[-1]
+        # O mesmo agent_id noutro tenant não recebe nada além do "connected"
+        assert len(other_tenant.frames) == 1
+        metrics = manager.metrics()
+        assert metrics["connections"] == 4 and metrics["dropped"] >= 1
+
+        # Conexão sem sinais de vida é fechada pelo reaper
+        for connections in manager.active_connections.values():
+            for connection in connections.values():
+                if connection.websocket is not fast_a:
+                    connection.touch()
+                else:
+                    connection.last_seen -= 3600
+        assert await manager.reap() == 1
+        assert fast_a.closed_with == 1001
+        assert manager.connection_count() == 3
+        for connections in list(manager.active_connections.values()):
+            for connection in list(connections.values()):
+                await manager.close_connection(connection)
+
+    asyncio.run(scenario())
+
+
+def test_connection_manager_overflow_fan_out_and_heartbeat_activity():
+    import asyncio
+    import json
+    from app.core.websocket import ConnectionManager
+
+    class FakeSocket:
+        def __init__(self):
+            self.frames = []
+            self.gate = asyncio.Event()
+            self.gate.set()
+            self.closed_with = None
+
+        async def accept(self):
+            pass
+
+        async def send_text(self, frame):
+            await self.gate.wait()
+            self.frames.append(json.loads(frame))
+
+        async def close(self, code=1000):
+            self.closed_with = code
+
+    async def scenario():
+        manager = ConnectionManager(max_queue=2)
+        phone, tablet, stuck = FakeSocket(), FakeSocket(), FakeSocket()
+        same_agent_other_tenant, other_agent = FakeSocket(), FakeSocket()
+        for socket, agent_id, tenant in (
+            (phone, 7, "tenant_a"), (tablet, 7, "tenant_a"), (stuck, 8, "tenant_a"),
+            (same_agent_other_tenant, 7, "tenant_b"), (other_agent, 9, "tenant_a"),
+        ):
+            await manager.connect(socket, agent_id, tenant)
+        await asyncio.sleep(0.01)
+
+        # Fan-out por (tenant, agente): todos os dispositivos do agente 7 em tenant_a e mais nenhum
+        assert await manager.send_to_agent(7, {"type": "new_lead", "n": 1}, "tenant_a") == 2
+        assert await manager.broadcast({"type": "notice"}, "tenant_b") == 1
+        await asyncio.sleep(0.01)
+        assert [f["type"] for f in phone.frames] == [f["type"] for f in tablet.frames] == ["connected", "new_lead"]
+        assert [f["type"] for f in same_agent_other_tenant.frames] == ["connected", "notice"]
+        assert [f["type"] for f in other_agent.frames] == ["connected"]
+
+        # Fila cheia (socket parado): descarta as mais antigas e guarda as últimas max_queue
+        stuck.gate.clear()
+        for n in range(5):
+            await manager.send_to_agent(8, {"type": "ping", "n": n}, "tenant_a")
+        await asyncio.sleep(0.01)
+        stuck.gate.set()
+        await asyncio.sleep(0.01)
+        assert [f.get("n") for f in stuck.frames] == [None, 3, 4]
+        assert manager.metrics()["dropped"] == 3
+
+        # Sem mensagens do cliente: heartbeats entregues mantêm a conexão viva;
+        # heartbeats presos num socket que não escoa deixam-na ser fechada
+        connections = {c.websocket: c for conns in manager.active_connections.values() for c in conns.values()}
+        for connection in connections.values():
+            connection.last_seen -= 60
+        stuck.gate.clear()
+        assert await manager.reap() == 0
+        await asyncio.sleep(0.01)
+        assert phone.frames[-1]["type"] == "heartbeat"
+        later = connections[phone].last_seen + 60
+        assert await manager.reap(now=later) == 1
+        assert stuck.closed_with == 1001 and manager.connection_count() == 4
+
+        for conns in list(manager.active_connections.values()):
+            for connection in list(conns.values()):
+                await manager.close_connection(connection)
+
+    asyncio.run(scenario())
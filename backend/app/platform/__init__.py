@@ -7,7 +7,7 @@ Este módulo gere:
 - Configurações globais da plataforma
 """
 
-from app.platform.models import Tenant, SuperAdmin, PlatformSettings
+from app.platform.models import Tenant, SuperAdmin, PlatformSettings, TenantStatsSnapshot
 from app.platform.routes import router as platform_router
 
-__all__ = ["Tenant", "SuperAdmin", "PlatformSettings", "platform_router"]
+__all__ = ["Tenant", "SuperAdmin", "PlatformSettings", "TenantStatsSnapshot", "platform_router"]
@@ -4,7 +4,7 @@ Platform Models - Tenant Registry & Super Admin
 Modelos para gestão multi-tenant da plataforma CRM Plus.
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Text, JSON
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -228,3 +228,27 @@ class EmailVerification(Base):
     
     def __repr__(self):
         return f"<EmailVerification {self.email} ({'verified' if self.is_verified else 'pending'})>"
+
+
+class TenantStatsSnapshot(Base):
+    """
+    Última contagem de dados por schema de tenant (app/platform/stats.py).
+
+    Escrita pelo coletor em background; o dashboard de super-admin e as
+    estatísticas por tenant leem daqui em vez de contar em cada pedido.
+    `estimated` indica que pelo menos uma contagem veio de pg_class.reltuples.
+    """
+    __tablename__ = "tenant_stats_snapshots"
+    
+    schema_name = Column(String(100), primary_key=True)  # ex: 'tenant_imoveismais'
+    
+    agents_count = Column(BigInteger, nullable=False, default=0)
+    properties_count = Column(BigInteger, nullable=False, default=0)
+    leads_count = Column(BigInteger, nullable=False, default=0)
+    users_count = Column(BigInteger, nullable=False, default=0)
+    estimated = Column(Boolean, nullable=False, default=False)
+    
+    collected_at = Column(DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f"<TenantStatsSnapshot {self.schema_name} @ {self.collected_at}>"
@@ -10,16 +10,18 @@ Endpoints para:
 
 from fastapi import APIRouter, Depends, HTTPException, status, Header
 from sqlalchemy.orm import Session
-from sqlalchemy import text, func
+from sqlalchemy import text, func, case
 from typing import List
 from datetime import datetime, timedelta
 import jwt
 import bcrypt
 import os
 
-from app.database import get_db, create_tenant_schema, copy_tables_to_schema
+from app.database import get_db, create_tenant_schema, copy_tables_to_schema, tenant_engines
+from app.middleware.tenant import clear_domain_cache
 from app.platform.models import Tenant, SuperAdmin, PlatformSettings
 from app.platform import schemas
+from app.platform import stats as platform_stats
 
 router = APIRouter(prefix="/platform", tags=["platform"])
 
@@ -678,6 +680,9 @@ async def create_tenant(
     db.commit()
     db.refresh(tenant)
     
+    # Novos domínios podem estar em cache como desconhecidos
+    clear_domain_cache()
+    
     # Provisionar schema (síncrono mas com tracking de estado)
     provision_result = provision_tenant_schema_internal(db, tenant)
     
@@ -782,6 +787,13 @@ async def update_tenant(
     db.commit()
     db.refresh(tenant)
     
+    # Domínios/estado podem ter mudado
+    clear_domain_cache()
+    
+    # Redimensionar o pool de conexões do tenant se o plano mudou
+    if "plan" in update_data and tenant.schema_name:
+        tenant_engines.set_plan(tenant.schema_name, tenant.plan)
+    
     return tenant
 
 
@@ -812,18 +824,21 @@ async def delete_tenant(
             try:
                 db.execute(text(f'DROP SCHEMA IF EXISTS "{schema_name}" CASCADE'))
                 db.commit()
+                tenant_engines.dispose(schema_name)
             except Exception as e:
                 print(f"[DELETE TENANT] Warning: Could not drop schema {schema_name}: {e}")
         
         # Eliminar registo do tenant
         db.delete(tenant)
         db.commit()
+        clear_domain_cache()
         
         return {"message": f"Tenant '{tenant_slug}' eliminado permanentemente", "deleted": True}
     else:
         # Soft delete - apenas desactivar
         tenant.is_active = False
         db.commit()
+        clear_domain_cache()
         
         return {"message": f"Tenant '{tenant_slug}' desactivado", "deleted": False}
 
@@ -841,6 +856,7 @@ async def activate_tenant(
     
     tenant.is_active = True
     db.commit()
+    clear_domain_cache()
     
     return {"message": f"Tenant '{tenant.slug}' activado"}
 
@@ -872,36 +888,39 @@ def get_platform_dashboard(db: Session = Depends(get_db)):
     """
     ensure_platform_tables(db)
     
-    # Contar tenants
-    total_tenants = db.query(Tenant).count()
-    active_tenants = db.query(Tenant).filter(Tenant.is_active == True).count()
-    trial_tenants = db.query(Tenant).filter(Tenant.is_trial == True).count()
-    
-    # Tenants por plano
+    # Contar tenants (total, activos, trial e por plano num só GROUP BY)
     plans = db.query(
-        Tenant.plan, 
-        func.count(Tenant.id)
+        Tenant.plan,
+        func.count(Tenant.id),
+        func.sum(case((Tenant.is_active == True, 1), else_=0)),
+        func.sum(case((Tenant.is_trial == True, 1), else_=0)),
     ).group_by(Tenant.plan).all()
-    tenants_by_plan = {plan: count for plan, count in plans}
+    tenants_by_plan = {plan: count for plan, count, _active, _trial in plans}
+    total_tenants = sum(count for _plan, count, _active, _trial in plans)
+    active_tenants = sum(active or 0 for _plan, _count, active, _trial in plans)
+    trial_tenants = sum(trial or 0 for _plan, _count, _active, trial in plans)
     
-    # Métricas globais (da BD actual)
+    # Métricas globais: último snapshot do coletor (todos os tenants)
+    totals = None
     try:
-        total_agents = db.execute(text("SELECT COUNT(*) FROM agents")).scalar() or 0
-        total_properties = db.execute(text("SELECT COUNT(*) FROM properties")).scalar() or 0
-        total_leads = db.execute(text("SELECT COUNT(*) FROM leads")).scalar() or 0
-    except:
-        total_agents = 0
-        total_properties = 0
-        total_leads = 0
+        totals = platform_stats.snapshot_totals(db)
+        if totals is None:
+            # Ainda sem snapshot (primeiro arranque): zeros e recolha pedida ao coletor
+            platform_stats.platform_stats_collector.notify()
+    except Exception as e:
+        print(f"[STATS] Erro ao ler snapshot: {e}")
+        db.rollback()
+    totals = totals or {}
     
     return schemas.PlatformDashboard(
         total_tenants=total_tenants,
         active_tenants=active_tenants,
         trial_tenants=trial_tenants,
-        total_agents=total_agents,
-        total_properties=total_properties,
-        total_leads=total_leads,
-        tenants_by_plan=tenants_by_plan
+        total_agents=totals.get("total_agents", 0),
+        total_properties=totals.get("total_properties", 0),
+        total_leads=totals.get("total_leads", 0),
+        tenants_by_plan=tenants_by_plan,
+        stats_collected_at=totals.get("stats_collected_at"),
     )
 
 
@@ -910,37 +929,38 @@ def get_tenant_stats(tenant_id: int, db: Session = Depends(get_db)):
     """
     Estatísticas de um tenant específico.
     
-    Nota: Na fase actual (single-DB), mostra dados globais.
-    Na fase multi-DB, irá mostrar dados do tenant.
+    Lidas do snapshot do coletor de estatísticas; um tenant ainda sem
+    snapshot devolve zeros (collected_at nulo) e pede uma recolha ao coletor.
     """
     tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant não encontrado")
-        schema_name = tenant.schema_name or f"tenant_{tenant.slug}"
-        agents_count = properties_count = leads_count = users_count = 0
+    
+    schema_name = tenant.schema_name or f"tenant_{tenant.slug}"
+    snapshot = platform_stats.tenant_snapshot(db, schema_name)
+    
+    return schemas.TenantStats(
+        tenant_id=tenant.id,
+        tenant_slug=tenant.slug,
+        tenant_name=tenant.name,
+        agents_count=snapshot["agents_count"],
+        properties_count=snapshot["properties_count"],
+        leads_count=snapshot["leads_count"],
+        users_count=snapshot["users_count"],
+        estimated=snapshot["estimated"],
+        collected_at=snapshot["collected_at"],
+    )
 
-        try:
-            # Isolar search_path no schema do tenant para contar dados certos
-            db.execute(text(f'SET search_path TO "{schema_name}", public'))
-            agents_count = db.execute(text("SELECT COUNT(*) FROM agents")).scalar() or 0
-            properties_count = db.execute(text("SELECT COUNT(*) FROM properties")).scalar() or 0
-            leads_count = db.execute(text("SELECT COUNT(*) FROM leads")).scalar() or 0
-            users_count = db.execute(text("SELECT COUNT(*) FROM users")).scalar() or 0
-        except Exception as e:
-            print(f"[STATS] Erro ao contar dados em {schema_name}: {e}")
-        finally:
-            # Restaurar search_path
-            db.execute(text('SET search_path TO public'))
 
-        return schemas.TenantStats(
-            tenant_id=tenant.id,
-            tenant_slug=tenant.slug,
-            tenant_name=tenant.name,
-            agents_count=agents_count,
-            properties_count=properties_count,
-            leads_count=leads_count,
-            users_count=users_count
-        )
+@router.post("/stats/refresh", status_code=202)
+async def refresh_platform_stats(current_admin: SuperAdmin = Depends(get_current_super_admin)):
+    """Pede ao coletor uma nova recolha de estatísticas de todos os tenants - PROTEGIDO"""
+    from app.platform.stats import platform_stats_collector
+    
+    if not platform_stats_collector.running:
+        raise HTTPException(status_code=503, detail="Coletor de estatísticas desligado")
+    platform_stats_collector.notify()
+    return {"status": "scheduled"}
 
 
 @router.get("/tenants/{tenant_id}/users")
@@ -1119,6 +1139,7 @@ async def provision_new_tenant(
         primary_color=request.primary_color,
         custom_terminology=request.custom_terminology,
     )
+    clear_domain_cache()
     
     # Converter para schema de resposta
     tenant_data = None
@@ -1345,6 +1366,7 @@ async def verify_email_and_create_tenant(
         logo_url=verification_logo_url,
         primary_color=verification_primary_color,
     )
+    clear_domain_cache()
     
     if not result.get("success"):
         raise HTTPException(
@@ -122,6 +122,8 @@ class TenantStats(BaseModel):
     properties_count: int
     leads_count: int
     users_count: int
+    estimated: bool = False  # alguma contagem veio de estimativas do PostgreSQL
+    collected_at: Optional[datetime] = None  # momento do snapshot
 
 
 # ===========================================
@@ -220,6 +222,7 @@ class PlatformDashboard(BaseModel):
     total_leads: int
     tenants_by_plan: Dict[str, int]
     tenants_by_sector: Dict[str, int] = {}
+    stats_collected_at: Optional[datetime] = None  # snapshot mais antigo usado nos totais
 
 
 # ===========================================
@@ -0,0 +1,359 @@
+"""
+Coletor de estatísticas da plataforma (contagens por tenant).
+
+Em vez de contar agentes/imóveis/leads/utilizadores em cada pedido do
+dashboard de super-admin (e de mudar o search_path da sessão para cada
+tenant), um coletor em background:
+
+    1. lista os schemas tenant_* e as tabelas contadas que cada um tem
+       (information_schema) e as estimativas de pg_class.reltuples
+    2. conta por blocos de PLATFORM_STATS_CHUNK_SIZE schemas, cada bloco num
+       único SELECT ... UNION ALL com subqueries COUNT(*) qualificadas pelo
+       schema; tabelas com mais de PLATFORM_STATS_ESTIMATE_THRESHOLD linhas
+       estimadas usam a estimativa (evita seq scans em tabelas enormes)
+    3. corre no máximo PLATFORM_STATS_CONCURRENCY blocos em paralelo, cada
+       um na sua conexão e com statement_timeout
+    4. grava o resultado em tenant_stats_snapshots (public) num upsert
+
+Schemas ainda sem nenhuma tabela contada ficam com uma linha a zeros, e uma
+recolha sem nenhum tenant grava uma linha vazia para o schema default: o
+snapshot existe sempre depois da primeira recolha.
+
+O dashboard e /platform/tenants/{id}/stats só leem o snapshot. Sem snapshot
+(primeiro arranque, tenant acabado de criar) devolvem zeros e pedem uma
+recolha ao coletor (notify), sem contar no pedido.
+
+Em SQLite (dev) há uma única BD: o snapshot tem uma linha 'public'.
+
+Configuração via ENV:
+    PLATFORM_STATS_ENABLED                 "false" para desligar o coletor (default: true)
+    PLATFORM_STATS_INTERVAL                segundos entre recolhas (default: 300)
+    PLATFORM_STATS_CHUNK_SIZE              schemas por query UNION ALL (default: 50)
+    PLATFORM_STATS_CONCURRENCY             blocos contados em paralelo (default: 4)
+    PLATFORM_STATS_ESTIMATE_THRESHOLD      linhas estimadas a partir das quais usa reltuples (default: 1000000)
+    PLATFORM_STATS_STATEMENT_TIMEOUT_MS    timeout de cada bloco em PostgreSQL (default: 60000)
+"""
+import asyncio
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import DEFAULT_SCHEMA, engine as default_engine
+from app.platform.models import TenantStatsSnapshot
+
+PLATFORM_STATS_ENABLED = os.getenv("PLATFORM_STATS_ENABLED", "true").lower() not in ("0", "false", "no")
+PLATFORM_STATS_INTERVAL = float(os.getenv("PLATFORM_STATS_INTERVAL", "300"))
+PLATFORM_STATS_CHUNK_SIZE = int(os.getenv("PLATFORM_STATS_CHUNK_SIZE", "50"))
+PLATFORM_STATS_CONCURRENCY = int(os.getenv("PLATFORM_STATS_CONCURRENCY", "4"))
+PLATFORM_STATS_ESTIMATE_THRESHOLD = int(os.getenv("PLATFORM_STATS_ESTIMATE_THRESHOLD", "1000000"))
+PLATFORM_STATS_STATEMENT_TIMEOUT_MS = int(os.getenv("PLATFORM_STATS_STATEMENT_TIMEOUT_MS", "60000"))
+
+# Campo do snapshot -> tabela contada em cada schema
+COUNTED_TABLES = {
+    "agents_count": "agents",
+    "properties_count": "properties",
+    "leads_count": "leads",
+    "users_count": "users",
+}
+
+EMPTY_COUNTS = {field: 0 for field in COUNTED_TABLES}
+
+
+class CollectionPlan:
+    """Schemas a contar, tabelas existentes em cada um e estimativas a usar."""
+
+    def __init__(self, tables: Dict[Optional[str], set], estimates: Dict[Tuple[Optional[str], str], int]):
+        self.tables = tables
+        self.estimates = estimates
+
+    @property
+    def schemas(self) -> List[Optional[str]]:
+        return sorted(self.tables, key=lambda schema: schema or "")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _snapshot_key(schema: Optional[str]) -> str:
+    return schema or DEFAULT_SCHEMA
+
+
+def plan_collection(conn: Connection, schemas: Optional[Iterable[str]] = None) -> CollectionPlan:
+    """Tabelas contadas existentes por schema (todos os tenant_* ou só `schemas`) e estimativas grandes."""
+    counted = list(COUNTED_TABLES.values())
+    if conn.dialect.name != "postgresql":
+        return CollectionPlan({None: set(inspect(conn).get_table_names()) & set(counted)}, {})
+
+    params = {f"t{i}": table for i, table in enumerate(counted)}
+    tables_in = ", ".join(f":t{i}" for i in range(len(counted)))
+    if schemas is None:
+        schema_filter = "LIKE 'tenant\\_%'"
+    else:
+        schemas = list(schemas)
+        if not schemas:
+            return CollectionPlan({}, {})
+        params.update({f"s{i}": schema for i, schema in enumerate(schemas)})
+        schema_filter = "IN (" + ", ".join(f":s{i}" for i in range(len(schemas))) + ")"
+
+    # LEFT JOIN: schemas ainda sem tabelas contadas também entram (linha a zeros)
+    tables: Dict[Optional[str], set] = {}
+    for schema, table in conn.execute(text(
+        "SELECT s.schema_name, t.table_name FROM information_schema.schemata s "
+        "LEFT JOIN information_schema.tables t "
+        f"ON t.table_schema = s.schema_name AND t.table_name IN ({tables_in}) "
+        f"WHERE s.schema_name {schema_filter}"
+    ), params):
+        tables.setdefault(schema, set())
+        if table:
+            tables[schema].add(table)
+
+    estimates = {}
+    # reltuples: -1 (nunca analisada) ou abaixo do limiar -> COUNT(*) exato
+    for schema, table, reltuples in conn.execute(text(
+        "SELECT n.nspname, c.relname, c.reltuples::bigint FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        f"WHERE n.nspname {schema_filter} AND c.relname IN ({tables_in}) AND c.relkind IN ('r', 'p') "
+        "AND c.reltuples >= :threshold"
+    ), {**params, "threshold": PLATFORM_STATS_ESTIMATE_THRESHOLD}):
+        estimates[(schema, table)] = int(reltuples)
+    return CollectionPlan(tables, estimates)
+
+
+def count_chunk(conn: Connection, schemas: List[Optional[str]], plan: CollectionPlan) -> List[dict]:
+    """Contagens de vários schemas num único SELECT ... UNION ALL."""
+    if not schemas:
+        return []
+    selects, params = [], {}
+    for i, schema in enumerate(schemas):
+        params[f"s{i}"] = _snapshot_key(schema)
+        prefix = f"{_quote(schema)}." if schema else ""
+        columns = [f"CAST(:s{i} AS VARCHAR(100)) AS schema_name"]
+        for field, table in COUNTED_TABLES.items():
+            if table in plan.tables.get(schema, ()) and (schema, table) not in plan.estimates:
+                columns.append(f"(SELECT COUNT(*) FROM {prefix}{_quote(table)}) AS {field}")
+            else:
+                # Tabela inexistente ou estimada: valor preenchido abaixo
+                columns.append(f"0 AS {field}")
+        selects.append("SELECT " + ", ".join(columns))
+
+    by_key = {_snapshot_key(schema): schema for schema in schemas}
+    rows = []
+    for row in conn.execute(text(" UNION ALL ".join(selects)), params).mappings():
+        schema = by_key[row["schema_name"]]
+        counts = {field: int(row[field] or 0) for field in COUNTED_TABLES}
+        estimated = False
+        for field, table in COUNTED_TABLES.items():
+            if (schema, table) in plan.estimates:
+                counts[field] = plan.estimates[(schema, table)]
+                estimated = True
+        rows.append({"schema_name": row["schema_name"], **counts, "estimated": estimated})
+    return rows
+
+
+def _count_chunk_on(engine: Engine, schemas: List[Optional[str]], plan: CollectionPlan) -> List[dict]:
+    """count_chunk numa conexão própria (threadpool), com statement_timeout em PostgreSQL."""
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql" and PLATFORM_STATS_STATEMENT_TIMEOUT_MS > 0:
+            conn.execute(text(f"SET LOCAL statement_timeout = {int(PLATFORM_STATS_STATEMENT_TIMEOUT_MS)}"))
+        return count_chunk(conn, schemas, plan)
+
+
+def _chunks(schemas: List[Optional[str]], size: int) -> List[List[Optional[str]]]:
+    size = max(1, size)
+    return [schemas[i:i + size] for i in range(0, len(schemas), size)]
+
+
+def store_snapshot(conn: Connection, rows: List[dict], collected_at: datetime, prune: bool = False) -> None:
+    """
+    Grava as contagens (upsert por schema); prune remove schemas que já não
+    existem. Uma recolha completa sem nenhum schema grava uma linha vazia
+    para o schema default, para o snapshot não ficar por fazer.
+    """
+    table = TenantStatsSnapshot.__table__
+    if prune and not rows:
+        rows = [{"schema_name": DEFAULT_SCHEMA, **EMPTY_COUNTS, "estimated": False}]
+    values = [{**row, "collected_at": collected_at} for row in rows]
+    dialect = conn.dialect.name
+    if values and dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(values)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.schema_name],
+            set_={column: stmt.excluded[column] for column in (*COUNTED_TABLES, "estimated", "collected_at")},
+        ))
+    elif values:
+        conn.execute(delete(table).where(table.c.schema_name.in_([row["schema_name"] for row in values])))
+        conn.execute(table.insert(), values)
+    if prune:
+        conn.execute(delete(table).where(table.c.schema_name.notin_([row["schema_name"] for row in values])))
+
+
+def collect(engine: Engine = default_engine, schemas: Optional[Iterable[str]] = None) -> List[dict]:
+    """Recolha síncrona (sequencial): todos os tenants ou só `schemas`. Grava e devolve as linhas."""
+    collected_at = datetime.now(timezone.utc)
+    with engine.connect() as conn:
+        plan = plan_collection(conn, schemas)
+    rows = []
+    for chunk in _chunks(plan.schemas, PLATFORM_STATS_CHUNK_SIZE):
+        rows.extend(_count_chunk_on(engine, chunk, plan))
+    with engine.begin() as conn:
+        store_snapshot(conn, rows, collected_at, prune=schemas is None)
+    return rows
+
+
+# =====================================================
+# LEITURA DO SNAPSHOT
+# =====================================================
+
+def snapshot_totals(db: Session) -> Optional[dict]:
+    """Somas de todos os tenants no último snapshot (None se ainda não há snapshot)."""
+    row = db.execute(select(
+        func.count(TenantStatsSnapshot.schema_name).label("tenants"),
+        *(func.coalesce(func.sum(getattr(TenantStatsSnapshot, field)), 0).label(field) for field in COUNTED_TABLES),
+        func.min(TenantStatsSnapshot.collected_at).label("collected_at"),
+    )).one()
+    if not row.tenants:
+        return None
+    return {
+        "total_agents": int(row.agents_count),
+        "total_properties": int(row.properties_count),
+        "total_leads": int(row.leads_count),
+        "total_users": int(row.users_count),
+        "stats_collected_at": row.collected_at,
+    }
+
+
+def tenant_snapshot(db: Session, schema_name: str, notify_missing: bool = True) -> dict:
+    """Contagens de um schema a partir do snapshot (zeros, e pede uma recolha, se ainda não existe)."""
+    if db.get_bind().dialect.name != "postgresql":
+        schema_name = DEFAULT_SCHEMA  # SQLite: uma única BD para todos
+    snapshot = db.get(TenantStatsSnapshot, schema_name)
+    if snapshot is None:
+        if notify_missing:
+            platform_stats_collector.notify()
+        return {**EMPTY_COUNTS, "estimated": False, "collected_at": None}
+    return {
+        **{field: getattr(snapshot, field) for field in COUNTED_TABLES},
+        "estimated": snapshot.estimated,
+        "collected_at": snapshot.collected_at,
+    }
+
+
+# =====================================================
+# COLETOR EM BACKGROUND
+# =====================================================
+
+class PlatformStatsCollector:
+    """Recolha periódica das contagens de todos os tenants."""
+
+    def __init__(
+        self,
+        engine: Engine = default_engine,
+        interval: float = PLATFORM_STATS_INTERVAL,
+        chunk_size: int = PLATFORM_STATS_CHUNK_SIZE,
+        concurrency: int = PLATFORM_STATS_CONCURRENCY,
+    ):
+        self.engine = engine
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.concurrency = max(1, concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.last_duration: Optional[float] = None
+        self.stats = defaultdict(int)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        print(f"[PlatformStats] Iniciado (intervalo {self.interval}s)")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        print("[PlatformStats] Parado")
+
+    def notify(self) -> None:
+        """Pede uma recolha já (pode ser chamado de threads do threadpool)."""
+        if self._loop is not None and self._wake is not None and self.running:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[PlatformStats] Erro na recolha: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def run_once(self) -> int:
+        """Uma recolha de todos os tenants; devolve o número de schemas gravados."""
+        started = time.monotonic()
+        collected_at = datetime.now(timezone.utc)
+        self.stats["runs"] += 1
+
+        def plan() -> CollectionPlan:
+            with self.engine.connect() as conn:
+                return plan_collection(conn)
+
+        collection = await run_in_threadpool(plan)
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def per_chunk(chunk: List[Optional[str]]) -> List[dict]:
+            async with slots:
+                return await run_in_threadpool(_count_chunk_on, self.engine, chunk, collection)
+
+        chunks = _chunks(collection.schemas, self.chunk_size)
+        results = await asyncio.gather(*(per_chunk(chunk) for chunk in chunks), return_exceptions=True)
+        rows, failed = [], 0
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"[PlatformStats] Erro no bloco {chunk[0]}..{chunk[-1]}: {result}")
+            else:
+                rows.extend(result)
+
+        def save() -> None:
+            with self.engine.begin() as conn:
+                # Com blocos falhados mantém-se o snapshot anterior desses schemas
+                store_snapshot(conn, rows, collected_at, prune=not failed)
+
+        await run_in_threadpool(save)
+        self.last_duration = time.monotonic() - started
+        self.stats["schemas"] = len(rows)
+        self.stats["failed_chunks"] += failed
+        return len(rows)
+
+
+# Singleton global
+platform_stats_collector = PlatformStatsCollector()
@@ -0,0 +1,82 @@
+def test_platform_stats_plan_count_store_and_placeholders(isolated_db, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import select
+    from app.agents.models import Agent
+    from app.leads.models import Lead
+    from app.platform import stats
+    from app.platform.models import TenantStatsSnapshot
+
+    db = isolated_db
+    engine = db.get_bind()
+    db.add_all([Agent(name="Ana", email="ana.stats@example.com"), Lead(name="L1"), Lead(name="L2")])
+    db.commit()
+    zeros = {"agents_count": 0, "properties_count": 0, "leads_count": 0, "users_count": 0}
+
+    with engine.connect() as conn:
+        plan = stats.plan_collection(conn)
+        assert plan.schemas == [None] and plan.tables[None] == set(stats.COUNTED_TABLES.values())
+        rows = stats.count_chunk(conn, plan.schemas, plan)
+        assert rows == [{"schema_name": stats.DEFAULT_SCHEMA, **zeros, "agents_count": 1, "leads_count": 2,
+                         "estimated": False}]
+        # Tabelas grandes usam a estimativa; schema sem tabelas contadas fica a zeros
+        estimated = stats.count_chunk(conn, [None], stats.CollectionPlan({None: {"leads"}}, {(None, "leads"): 5_000_000}))
+        assert estimated[0]["leads_count"] == 5_000_000 and estimated[0]["estimated"]
+        empty = stats.count_chunk(conn, [None], stats.CollectionPlan({None: set()}, {}))
+        assert empty == [{"schema_name": stats.DEFAULT_SCHEMA, **zeros, "estimated": False}]
+
+    # Sem snapshot: zeros e recolha pedida ao coletor, sem contar no pedido
+    notified = []
+    monkeypatch.setattr(stats.platform_stats_collector, "notify", lambda: notified.append(True))
+    assert stats.snapshot_totals(db) is None
+    assert stats.tenant_snapshot(db, "tenant_novo") == {**zeros, "estimated": False, "collected_at": None}
+    assert notified == [True]
+
+    collected_at = datetime.now(timezone.utc)
+    gone = {"schema_name": "tenant_gone", **zeros, "estimated": False}
+    with engine.begin() as conn:
+        stats.store_snapshot(conn, rows + [gone], collected_at)
+    with engine.begin() as conn:
+        stats.store_snapshot(conn, rows, collected_at + timedelta(minutes=5), prune=True)
+    snapshot = db.execute(select(TenantStatsSnapshot.schema_name, TenantStatsSnapshot.leads_count)).all()
+    assert snapshot == [(stats.DEFAULT_SCHEMA, 2)]
+    assert stats.snapshot_totals(db)["total_leads"] == 2
+
+    # Recolha completa sem nenhum schema: linha vazia, o snapshot deixa de estar em falta
+    with engine.begin() as conn:
+        stats.store_snapshot(conn, [], collected_at, prune=True)
+    db.expire_all()
+    assert stats.tenant_snapshot(db, "tenant_x")["leads_count"] == 0
+    assert stats.snapshot_totals(db) is not None and notified == [True]
+
+
+def test_platform_stats_collector_keeps_snapshot_when_a_chunk_fails(isolated_db, monkeypatch):
+    import asyncio
+    from datetime import datetime, timezone
+    from sqlalchemy import select
+    from app.platform import stats
+    from app.platform.models import TenantStatsSnapshot
+
+    db = isolated_db
+    engine = db.get_bind()
+    zeros = {"agents_count": 0, "properties_count": 0, "leads_count": 0, "users_count": 0}
+    with engine.begin() as conn:
+        stats.store_snapshot(conn, [{"schema_name": "tenant_gone", **zeros, "estimated": False}],
+                             datetime.now(timezone.utc))
+    collector = stats.PlatformStatsCollector(engine=engine)
+
+    def failing(*args):
+        raise RuntimeError("statement timeout")
+
+    def schemas():
+        return sorted(db.execute(select(TenantStatsSnapshot.schema_name)).scalars())
+
+    # Bloco falhado: nada é removido (o snapshot anterior desses schemas mantém-se)
+    with monkeypatch.context() as patch:
+        patch.setattr(stats, "_count_chunk_on", failing)
+        assert asyncio.run(collector.run_once()) == 0
+    assert schemas() == ["tenant_gone"] and collector.stats["failed_chunks"] == 1
+
+    # Recolha completa: grava os schemas atuais e remove os que já não existem
+    assert asyncio.run(collector.run_once()) == 1
+    db.expire_all()
+    assert schemas() == [stats.DEFAULT_SCHEMA]
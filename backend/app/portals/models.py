@@ -3,6 +3,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     String,
@@ -33,6 +34,8 @@ class PortalListing(Base):
     __tablename__ = "portal_listings"
     __table_args__ = (
         UniqueConstraint("property_id", "provider", name="uq_portal_listings_property_provider"),
+        # Feeds XML: listings publicados por provider, ordenados por updated_at
+        Index("ix_portal_listings_feed", "provider", "status", "updated_at"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -50,6 +53,10 @@ class PortalListing(Base):
 
 class PortalSyncJob(Base):
     __tablename__ = "portal_sync_jobs"
+    __table_args__ = (
+        # Listagem paginada por cursor (mais recentes primeiro)
+        Index("ix_portal_sync_jobs_created_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -1,9 +1,14 @@
+from email.utils import format_datetime, parsedate_to_datetime
+
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
+from app.core.cache import etag_matches
+from app.core.pagination import NEXT_CURSOR_HEADER
 from app.database import DEFAULT_SCHEMA, get_db, get_tenant_schema
 from app.portals import schemas, services
+from app.portals.worker import portal_sync_worker
 from app.security import require_staff
 from app.users.models import User
 
@@ -130,6 +135,8 @@ def queue_property_sync(
         action=payload.action,
         created_by_user_id=current_user.id,
     )
+    # Processar em segundos em vez de esperar pela próxima passagem do worker
+    portal_sync_worker.notify()
     return schemas.QueueSyncResponse(
         queued_jobs=len(jobs),
         jobs=[schemas.PortalSyncJobOut.model_validate(job) for job in jobs],
@@ -138,13 +145,18 @@ def queue_property_sync(
 
 @router.get("/jobs", response_model=list[schemas.PortalSyncJobOut])
 def list_sync_jobs(
+    response: Response,
     status: str | None = Query(default=None),
     limit: int = Query(default=100, ge=1, le=500),
+    cursor: str | None = Query(default=None, description="Header X-Next-Cursor da página anterior"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_staff),
 ):
     _ensure_portal_management_access(current_user)
-    return services.list_jobs(db, status=status, limit=limit)
+    jobs, next_cursor = services.list_jobs_page(db, status=status, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return jobs
 
 
 @router.post("/jobs/run-pending", response_model=schemas.RunJobsResponse)
@@ -174,8 +186,26 @@ def run_single_job(job_id: int, db: Session = Depends(get_db), current_user: Use
     return schemas.PortalSyncJobOut.model_validate(job)
 
 
+def _not_modified_since(if_modified_since: str | None, modified_at) -> bool:
+    """True se `modified_at` não é posterior ao If-Modified-Since (resolução de segundos)."""
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return modified_at.replace(microsecond=0) <= since
+
+
 @router.get("/feeds/{provider}.xml")
-def get_provider_feed(provider: str, token: str = Query(...), db: Session = Depends(get_db)):
+def get_provider_feed(
+    provider: str,
+    request: Request,
+    token: str = Query(...),
+    db: Session = Depends(get_db),
+):
     schema = get_tenant_schema()
     if not schema or schema == DEFAULT_SCHEMA:
         raise HTTPException(status_code=400, detail="Tenant context is required for portal feed")
@@ -189,5 +219,20 @@ def get_provider_feed(provider: str, token: str = Query(...), db: Session = Depe
     if not account.feed_token or token != account.feed_token:
         raise HTTPException(status_code=403, detail="Invalid feed token")
 
-    xml_data = services.build_feed_xml(db, provider)
-    return Response(content=xml_data, media_type="application/xml")
+    # Feed servido da cache por tenant/provider; 304 se o crawler já tem esta versão
+    # (If-None-Match tem precedência; crawlers que só enviam If-Modified-Since
+    # são comparados com a última alteração dos listings publicados)
+    feed = services.get_feed(db, provider)
+    etag = f'"{feed.etag}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(feed.modified_at, usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif _not_modified_since(request.headers.get("if-modified-since"), feed.modified_at):
+        return Response(status_code=304, headers=headers)
+    return Response(content=feed.body, media_type="application/xml", headers=headers)
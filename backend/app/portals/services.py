@@ -1,11 +1,19 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from secrets import token_urlsafe
 from xml.etree import ElementTree as ET
 
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.orm import Session
 
+from app.core.pagination import Keyset, KeysetColumn
+from app.database import get_tenant_schema
+
 from app.portals.models import PortalAccount, PortalListing, PortalSyncJob
 from app.properties.models import Property
 
@@ -18,6 +26,16 @@ PROVIDER_LABELS = {
 
 SUPPORTED_PROVIDERS = tuple(PROVIDER_LABELS.keys())
 
+# Jobs de sincronização: lease e retry com backoff exponencial
+JOB_LEASE_TIMEOUT = int(os.getenv("PORTAL_JOB_LEASE_TIMEOUT", "600"))  # 'running' há mais que isto => worker morreu
+JOB_MAX_ATTEMPTS = int(os.getenv("PORTAL_JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_BASE = int(os.getenv("PORTAL_JOB_BACKOFF_BASE", "30"))
+JOB_BACKOFF_MAX = int(os.getenv("PORTAL_JOB_BACKOFF_MAX", "3600"))
+
+# Feeds XML em cache (ver PortalFeedCache)
+FEED_CACHE_MAX_FEEDS = int(os.getenv("PORTAL_FEED_CACHE_MAX_FEEDS", "64"))
+FEED_FETCH_BATCH = 500
+
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
@@ -189,14 +207,16 @@ def _get_or_create_listing(db: Session, property_id: int, provider: str) -> Port
     return listing
 
 
-def process_job(db: Session, job: PortalSyncJob) -> PortalSyncJob:
-    now = _now()
+def _start_attempt(job: PortalSyncJob, now: datetime) -> None:
+    """Marca o job como running e conta a tentativa (antes de correr: um crash também conta)."""
     job.status = "running"
     job.started_at = now
     job.attempt_count = (job.attempt_count or 0) + 1
     job.updated_at = now
-    db.flush()
 
+
+def process_job(db: Session, job: PortalSyncJob) -> PortalSyncJob:
+    """Executa um job já iniciado (lease_pending_jobs ou run_single_job contam a tentativa)."""
     account = get_account_by_provider(db, job.provider)
     listing = _get_or_create_listing(db, job.property_id, job.provider)
     property_obj = get_property_or_none(db, job.property_id)
@@ -277,17 +297,83 @@ def process_job(db: Session, job: PortalSyncJob) -> PortalSyncJob:
     return job
 
 
-def run_pending_jobs(db: Session, limit: int = 50) -> list[PortalSyncJob]:
+def lease_pending_jobs(db: Session, limit: int = 50) -> list[PortalSyncJob]:
+    """
+    Reserva jobs prontos a correr (pending com scheduled_at vencido, ou
+    running abandonados há mais de JOB_LEASE_TIMEOUT) e marca-os como running.
+
+    A tentativa é contada aqui: um job que mata o worker ou fica pendurado
+    além do lease gasta uma tentativa em cada reclamação e, esgotadas as
+    JOB_MAX_ATTEMPTS, fica failed em vez de ser reservado para sempre.
+
+    FOR UPDATE SKIP LOCKED: workers/réplicas concorrentes nunca reservam o
+    mesmo job nem esperam uns pelos outros (ignorado em SQLite).
+    """
+    now = _now()
     jobs = (
         db.query(PortalSyncJob)
-        .filter(PortalSyncJob.status == "pending")
+        .filter(
+            or_(
+                and_(PortalSyncJob.status == "pending", PortalSyncJob.scheduled_at <= now),
+                and_(
+                    PortalSyncJob.status == "running",
+                    PortalSyncJob.started_at < now - timedelta(seconds=JOB_LEASE_TIMEOUT),
+                ),
+            )
+        )
         .order_by(PortalSyncJob.scheduled_at.asc(), PortalSyncJob.id.asc())
         .limit(limit)
+        .with_for_update(skip_locked=True)
         .all()
     )
+    leased = []
+    for job in jobs:
+        if job.status == "running":
+            job.last_error = "Lease expirado (worker terminou ou excedeu o timeout)"
+            if (job.attempt_count or 0) >= JOB_MAX_ATTEMPTS:
+                job.status = "failed"
+                job.completed_at = now
+                job.updated_at = now
+                continue
+        _start_attempt(job, now)
+        leased.append(job)
+    db.commit()
+    return leased
+
+
+def retry_backoff_seconds(attempt_count: int) -> int:
+    return min(JOB_BACKOFF_BASE * (2 ** max(attempt_count - 1, 0)), JOB_BACKOFF_MAX)
+
+
+def schedule_retry(db: Session, job: PortalSyncJob, error: str) -> PortalSyncJob:
+    """
+    Regista uma falha inesperada (exceção) de um job: volta a pending com
+    backoff exponencial, ou failed ao fim de JOB_MAX_ATTEMPTS tentativas.
+    Chamar após rollback (a tentativa já foi contada e gravada ao iniciar o job).
+    """
+    now = _now()
+    job.last_error = error[:1000]
+    job.updated_at = now
+    if job.attempt_count >= JOB_MAX_ATTEMPTS:
+        job.status = "failed"
+        job.completed_at = now
+    else:
+        job.status = "pending"
+        job.scheduled_at = now + timedelta(seconds=retry_backoff_seconds(job.attempt_count))
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def run_pending_jobs(db: Session, limit: int = 50) -> list[PortalSyncJob]:
+    jobs = lease_pending_jobs(db, limit=limit)
     processed: list[PortalSyncJob] = []
     for job in jobs:
-        processed.append(process_job(db, job))
+        try:
+            processed.append(process_job(db, job))
+        except Exception as e:
+            db.rollback()
+            processed.append(schedule_retry(db, job, str(e)))
     return processed
 
 
@@ -295,60 +381,226 @@ def run_single_job(db: Session, job_id: int) -> PortalSyncJob | None:
     job = db.query(PortalSyncJob).filter(PortalSyncJob.id == job_id).first()
     if not job:
         return None
+    _start_attempt(job, _now())
+    db.commit()
     return process_job(db, job)
 
 
-def list_jobs(db: Session, status: str | None = None, limit: int = 100) -> list[PortalSyncJob]:
-    query = db.query(PortalSyncJob).order_by(PortalSyncJob.created_at.desc(), PortalSyncJob.id.desc())
+JOBS_KEYSET = Keyset(
+    KeysetColumn(PortalSyncJob.created_at, descending=True),
+    KeysetColumn(PortalSyncJob.id, descending=True),
+)
+
+
+def list_jobs_page(
+    db: Session, status: str | None = None, limit: int = 100, cursor: str | None = None
+) -> tuple[list[PortalSyncJob], str | None]:
+    """(jobs, cursor da próxima página) — mais recentes primeiro"""
+    query = db.query(PortalSyncJob)
     if status:
         query = query.filter(PortalSyncJob.status == status)
-    return query.limit(limit).all()
+    return JOBS_KEYSET.page(JOBS_KEYSET.apply(query, cursor, limit).all(), limit)
+
+
+def list_jobs(db: Session, status: str | None = None, limit: int = 100) -> list[PortalSyncJob]:
+    return list_jobs_page(db, status=status, limit=limit)[0]
 
 
 def _as_text(value) -> str:
     return "" if value is None else str(value)
 
 
-def build_feed_xml(db: Session, provider: str) -> str:
-    root = ET.Element("crmplus_feed")
-    ET.SubElement(root, "provider").text = provider
-    ET.SubElement(root, "generated_at").text = _now().isoformat()
+def _render_feed_item(listing: PortalListing, prop: Property) -> str:
+    item = ET.Element("property")
+    ET.SubElement(item, "id").text = _as_text(prop.id)
+    ET.SubElement(item, "reference").text = _as_text(prop.reference)
+    ET.SubElement(item, "external_listing_id").text = _as_text(listing.external_listing_id)
+    ET.SubElement(item, "title").text = _as_text(prop.title)
+    ET.SubElement(item, "business_type").text = _as_text(prop.business_type)
+    ET.SubElement(item, "property_type").text = _as_text(prop.property_type)
+    ET.SubElement(item, "typology").text = _as_text(prop.typology)
+    ET.SubElement(item, "description").text = _as_text(prop.description)
+    ET.SubElement(item, "price").text = _as_text(prop.price)
+    ET.SubElement(item, "usable_area").text = _as_text(prop.usable_area)
+    ET.SubElement(item, "land_area").text = _as_text(prop.land_area)
+    ET.SubElement(item, "location").text = _as_text(prop.location)
+    ET.SubElement(item, "municipality").text = _as_text(prop.municipality)
+    ET.SubElement(item, "parish").text = _as_text(prop.parish)
+    ET.SubElement(item, "condition").text = _as_text(prop.condition)
+    ET.SubElement(item, "energy_certificate").text = _as_text(prop.energy_certificate)
+    ET.SubElement(item, "status").text = _as_text(prop.status)
+    ET.SubElement(item, "published_at").text = _as_text(listing.published_at)
+
+    images_el = ET.SubElement(item, "images")
+    for image_url in (prop.images or []):
+        ET.SubElement(images_el, "image").text = _as_text(image_url)
+
+    return ET.tostring(item, encoding="unicode")
+
+
+def _published_filter(provider: str) -> tuple:
+    return (
+        PortalListing.provider == provider,
+        PortalListing.status == "published",
+    )
 
-    listings = (
-        db.query(PortalListing, Property)
+
+def _iter_feed_rows(db: Session, provider: str, listing_ids: list[int] | None = None):
+    """
+    Percorre (listing, property) publicados com cursor server-side
+    (yield_per => stream_results no Postgres), sem carregar tudo em memória.
+    """
+    stmt = (
+        select(PortalListing, Property)
         .join(Property, Property.id == PortalListing.property_id)
-        .filter(
-            PortalListing.provider == provider,
-            PortalListing.status == "published",
-        )
-        .order_by(PortalListing.updated_at.desc(), PortalListing.id.desc())
-        .all()
+        .where(*_published_filter(provider))
+        .execution_options(yield_per=FEED_FETCH_BATCH)
     )
+    if listing_ids is None:
+        yield from db.execute(stmt).tuples()
+        return
+    for start in range(0, len(listing_ids), FEED_FETCH_BATCH):
+        chunk = listing_ids[start:start + FEED_FETCH_BATCH]
+        yield from db.execute(stmt.where(PortalListing.id.in_(chunk))).tuples()
+
+
+class FeedSnapshot:
+    """
+    Feed renderizado (bytes UTF-8), o ETag correspondente e modified_at: o
+    último updated_at dos listings/imóveis publicados (igual em todas as
+    réplicas, ao contrário de generated_at), usado no Last-Modified.
+    """
+
+    __slots__ = ("etag", "body", "generated_at", "modified_at")
+
+    def __init__(self, etag: str, body: bytes, generated_at: datetime, modified_at: datetime | None = None):
+        self.etag = etag
+        self.body = body
+        self.generated_at = generated_at
+        self.modified_at = modified_at or generated_at
+
+
+class _FeedState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # listing_id -> (listing.updated_at, property.updated_at) do fragmento em cache
+        self.stamps: dict[int, tuple] = {}
+        self.fragments: dict[int, str] = {}
+        self.snapshot: FeedSnapshot | None = None
+
+
+class PortalFeedCache:
+    """
+    Feeds XML renderizados por (tenant schema, provider), com LRU no número de feeds.
+
+    Cada feed guarda um fragmento XML por listing; numa alteração só são
+    re-renderizados os listings cujo updated_at (listing ou imóvel) mudou.
+    """
+
+    def __init__(self, max_feeds: int):
+        self.max_feeds = max_feeds
+        self._feeds: OrderedDict[tuple, _FeedState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def state(self, schema: str | None, provider: str) -> _FeedState:
+        key = (schema, provider)
+        with self._lock:
+            state = self._feeds.get(key)
+            if state is None:
+                state = self._feeds[key] = _FeedState()
+                while len(self._feeds) > self.max_feeds:
+                    self._feeds.popitem(last=False)
+            else:
+                self._feeds.move_to_end(key)
+            return state
+
+    def invalidate(self, schema: str | None = None, provider: str | None = None) -> None:
+        with self._lock:
+            for key in list(self._feeds):
+                if (schema is None or key[0] == schema) and (provider is None or key[1] == provider):
+                    del self._feeds[key]
+
+
+feed_cache = PortalFeedCache(FEED_CACHE_MAX_FEEDS)
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _feed_version(db: Session, provider: str) -> tuple[str, datetime | None]:
+    """
+    ETag barato: um único agregado sobre os listings publicados. Qualquer
+    publicação/remoção muda count/soma de ids e qualquer edição avança um dos max(updated_at).
+    Devolve também o maior desses updated_at (marca de modificação do feed).
+    """
+    row = db.execute(
+        select(
+            func.count(PortalListing.id),
+            func.coalesce(func.sum(PortalListing.id), 0),
+            func.max(PortalListing.updated_at),
+            func.max(Property.updated_at),
+        )
+        .join(Property, Property.id == PortalListing.property_id)
+        .where(*_published_filter(provider))
+    ).one()
+    digest = hashlib.sha1(f"{provider}|{row[0]}|{row[1]}|{row[2]}|{row[3]}".encode())
+    stamps = [stamp for stamp in (_as_utc(row[2]), _as_utc(row[3])) if stamp is not None]
+    return digest.hexdigest(), max(stamps) if stamps else None
+
+
+def get_feed(db: Session, provider: str) -> FeedSnapshot:
+    """
+    Devolve o feed do tenant atual, reconstruindo apenas o que mudou desde
+    a última versão em cache.
+    """
+    etag, modified_at = _feed_version(db, provider)
+    state = feed_cache.state(get_tenant_schema(), provider)
+    if state.snapshot is not None and state.snapshot.etag == etag:
+        return state.snapshot
+
+    with state.lock:
+        if state.snapshot is not None and state.snapshot.etag == etag:
+            return state.snapshot
+
+        rows = db.execute(
+            select(PortalListing.id, PortalListing.updated_at, Property.updated_at)
+            .join(Property, Property.id == PortalListing.property_id)
+            .where(*_published_filter(provider))
+            .order_by(PortalListing.updated_at.desc(), PortalListing.id.desc())
+        ).all()
+        order = [row[0] for row in rows]
+        stamps = {row[0]: (row[1], row[2]) for row in rows}
+
+        if not state.fragments:
+            # Primeira construção: um único varrimento em streaming
+            fragments = {
+                listing.id: _render_feed_item(listing, prop)
+                for listing, prop in _iter_feed_rows(db, provider)
+                if listing.id in stamps
+            }
+        else:
+            fragments = {lid: state.fragments[lid] for lid in order if lid in state.fragments}
+            changed = [lid for lid in order if lid not in fragments or state.stamps.get(lid) != stamps[lid]]
+            for listing, prop in _iter_feed_rows(db, provider, changed):
+                fragments[listing.id] = _render_feed_item(listing, prop)
+
+        generated_at = _now()
+        items = "".join(fragments[lid] for lid in order if lid in fragments)
+        properties_xml = f"<properties>{items}</properties>" if items else "<properties />"
+        header = ET.Element("crmplus_feed")
+        ET.SubElement(header, "provider").text = provider
+        ET.SubElement(header, "generated_at").text = generated_at.isoformat()
+        head = ET.tostring(header, encoding="unicode").removesuffix("</crmplus_feed>")
+        body = f"<?xml version='1.0' encoding='utf-8'?>\n{head}{properties_xml}</crmplus_feed>"
+
+        state.fragments = fragments
+        state.stamps = {lid: stamps[lid] for lid in fragments}
+        state.snapshot = FeedSnapshot(etag, body.encode("utf-8"), generated_at, modified_at)
+        return state.snapshot
+
 
-    items_el = ET.SubElement(root, "properties")
-    for listing, prop in listings:
-        item = ET.SubElement(items_el, "property")
-        ET.SubElement(item, "id").text = _as_text(prop.id)
-        ET.SubElement(item, "reference").text = _as_text(prop.reference)
-        ET.SubElement(item, "external_listing_id").text = _as_text(listing.external_listing_id)
-        ET.SubElement(item, "title").text = _as_text(prop.title)
-        ET.SubElement(item, "business_type").text = _as_text(prop.business_type)
-        ET.SubElement(item, "property_type").text = _as_text(prop.property_type)
-        ET.SubElement(item, "typology").text = _as_text(prop.typology)
-        ET.SubElement(item, "description").text = _as_text(prop.description)
-        ET.SubElement(item, "price").text = _as_text(prop.price)
-        ET.SubElement(item, "usable_area").text = _as_text(prop.usable_area)
-        ET.SubElement(item, "land_area").text = _as_text(prop.land_area)
-        ET.SubElement(item, "location").text = _as_text(prop.location)
-        ET.SubElement(item, "municipality").text = _as_text(prop.municipality)
-        ET.SubElement(item, "parish").text = _as_text(prop.parish)
-        ET.SubElement(item, "condition").text = _as_text(prop.condition)
-        ET.SubElement(item, "energy_certificate").text = _as_text(prop.energy_certificate)
-        ET.SubElement(item, "status").text = _as_text(prop.status)
-        ET.SubElement(item, "published_at").text = _as_text(listing.published_at)
-
-        images_el = ET.SubElement(item, "images")
-        for image_url in (prop.images or []):
-            ET.SubElement(images_el, "image").text = _as_text(image_url)
-
-    return ET.tostring(root, encoding="utf-8", xml_declaration=True).decode("utf-8")
+def build_feed_xml(db: Session, provider: str) -> str:
+    return get_feed(db, provider).body.decode("utf-8")
@@ -0,0 +1,41 @@
+def test_lease_counts_attempts_reclaims_stale_jobs_and_fails_exhausted(isolated_db):
+    from datetime import datetime, timedelta
+    from app.portals import services, worker
+    from app.portals.models import PortalSyncJob
+
+    db = isolated_db
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=services.JOB_LEASE_TIMEOUT + 60)
+
+    def job(status, attempts=0, scheduled=now - timedelta(minutes=1), started=None):
+        return PortalSyncJob(property_id=1, provider="idealista", action="publish", status=status,
+                             attempt_count=attempts, scheduled_at=scheduled, started_at=started, created_at=now)
+
+    due = job("pending")
+    future = job("pending", scheduled=now + timedelta(hours=1))
+    abandoned = job("running", attempts=1, started=stale)
+    exhausted = job("running", attempts=services.JOB_MAX_ATTEMPTS, started=stale)
+    in_flight = job("running", attempts=1, started=now)
+    db.add_all([due, future, abandoned, exhausted, in_flight])
+    db.commit()
+
+    leased = services.lease_pending_jobs(db, limit=10)
+    assert {j.id for j in leased} == {due.id, abandoned.id}
+    assert due.status == "running" and due.attempt_count == 1
+    # Reclamado após o lease expirar: gasta mais uma tentativa
+    assert abandoned.attempt_count == 2 and "Lease expirado" in abandoned.last_error
+    # Última tentativa perdida num lease expirado: failed, não volta a ser reservado
+    assert exhausted.status == "failed" and exhausted.completed_at is not None
+    assert future.status == "pending" and in_flight.attempt_count == 1
+    assert services.lease_pending_jobs(db, limit=10) == []
+
+    # Falha inesperada: a tentativa já foi contada no lease (sem dupla contagem)
+    retried = services.schedule_retry(db, due, "boom")
+    assert retried.status == "pending" and retried.attempt_count == 1
+
+    # Varrimento cross-schema do worker (SQLite: um único schema)
+    retried.scheduled_at = now - timedelta(seconds=1)
+    db.commit()
+    assert worker.lease_jobs([None], limit=10, bind=db.get_bind()) == {None: [(due.id, "idealista")]}
+    db.expire_all()
+    assert db.get(PortalSyncJob, due.id).attempt_count == 2
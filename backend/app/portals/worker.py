@@ -0,0 +1,170 @@
+"""
+Worker de sincronização com portais (Idealista, Imovirtual, OLX, Casa Sapo).
+
+Corre no event loop da aplicação (arrancado no lifespan de app/main.py):
+a cada PORTAL_WORKER_INTERVAL segundos, ou logo que um job é colocado em
+fila (notify), percorre todos os schemas tenant_*, reserva jobs com
+services.lease_pending_jobs (SKIP LOCKED, seguro com várias réplicas) e
+processa-os em paralelo com limite por provider.
+
+A reserva corre numa única conexão do engine default, com as tabelas
+qualificadas por schema (database.scan_schemas): varrer todos os tenants
+a cada passagem não toca no LRU de pools por tenant. Só os tenants com jobs
+reservados abrem uma sessão no seu pool para os processar.
+
+Configuração via ENV:
+    PORTAL_WORKER_ENABLED               "false" para desligar (default: true)
+    PORTAL_WORKER_INTERVAL              segundos entre passagens (default: 5)
+    PORTAL_WORKER_BATCH_SIZE            jobs reservados por tenant por passagem (default: 50)
+    PORTAL_WORKER_PROVIDER_CONCURRENCY  jobs simultâneos por provider (default: 2)
+    PORTAL_WORKER_TENANT_CONCURRENCY    tenants processados em paralelo (default: 4)
+"""
+import asyncio
+import os
+from collections import defaultdict
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.database import list_tenant_schemas, scan_schemas, tenant_session
+from app.portals import services
+from app.portals.models import PortalSyncJob
+
+PORTAL_WORKER_ENABLED = os.getenv("PORTAL_WORKER_ENABLED", "true").lower() not in ("0", "false", "no")
+PORTAL_WORKER_INTERVAL = float(os.getenv("PORTAL_WORKER_INTERVAL", "5"))
+PORTAL_WORKER_BATCH_SIZE = int(os.getenv("PORTAL_WORKER_BATCH_SIZE", "50"))
+PORTAL_WORKER_PROVIDER_CONCURRENCY = int(os.getenv("PORTAL_WORKER_PROVIDER_CONCURRENCY", "2"))
+PORTAL_WORKER_TENANT_CONCURRENCY = int(os.getenv("PORTAL_WORKER_TENANT_CONCURRENCY", "4"))
+
+
+def lease_jobs(schemas: list[Optional[str]], limit: int, bind=None) -> dict[Optional[str], list[tuple[int, str]]]:
+    """Reserva jobs de todos os schemas numa só conexão; devolve {schema: [(job_id, provider)]} dos que têm jobs."""
+    def lease(db, schema):
+        return [(job.id, job.provider) for job in services.lease_pending_jobs(db, limit=limit)]
+
+    return scan_schemas(schemas, lease, bind=bind, tag="PortalWorker")
+
+
+def _process(schema: Optional[str], job_id: int) -> str:
+    """Processa um job reservado numa sessão própria; devolve o estado final."""
+    db = tenant_session(schema)
+    try:
+        job = db.get(PortalSyncJob, job_id)
+        if job is None:
+            return "missing"
+        try:
+            return services.process_job(db, job).status
+        except Exception as e:
+            db.rollback()
+            job = db.get(PortalSyncJob, job_id)
+            if job is None:
+                return "missing"
+            print(f"[PortalWorker] Job {job_id} ({schema}) falhou: {e}")
+            return "retry" if services.schedule_retry(db, job, str(e)).status == "pending" else "failed"
+    finally:
+        db.close()
+
+
+class PortalSyncWorker:
+    """Loop de processamento de PortalSyncJob para todos os tenants."""
+
+    def __init__(
+        self,
+        interval: float = PORTAL_WORKER_INTERVAL,
+        batch_size: int = PORTAL_WORKER_BATCH_SIZE,
+        provider_concurrency: int = PORTAL_WORKER_PROVIDER_CONCURRENCY,
+        tenant_concurrency: int = PORTAL_WORKER_TENANT_CONCURRENCY,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.provider_concurrency = max(1, provider_concurrency)
+        self.tenant_concurrency = max(1, tenant_concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._provider_slots: dict[str, asyncio.Semaphore] = {}
+        self.stats = defaultdict(int)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._provider_slots = {}
+        self._task = self._loop.create_task(self._run())
+        print(f"[PortalWorker] Iniciado (intervalo {self.interval}s)")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        print("[PortalWorker] Parado")
+
+    def notify(self) -> None:
+        """Acorda o worker já (pode ser chamado de threads do threadpool)."""
+        if self._loop is not None and self._wake is not None and self.running:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[PortalWorker] Erro na passagem: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def run_once(self) -> int:
+        """Uma passagem por todos os tenants; devolve o número de jobs processados."""
+        self.stats["runs"] += 1
+        schemas = await run_in_threadpool(list_tenant_schemas, "portal_sync_jobs")
+        leased = await run_in_threadpool(lease_jobs, schemas, self.batch_size)
+        tenant_slots = asyncio.Semaphore(self.tenant_concurrency)
+
+        async def per_tenant(schema: Optional[str], jobs: list[tuple[int, str]]) -> int:
+            async with tenant_slots:
+                return await self._process_tenant(schema, jobs)
+
+        results = await asyncio.gather(
+            *(per_tenant(schema, jobs) for schema, jobs in leased.items()), return_exceptions=True
+        )
+        processed = 0
+        for schema, result in zip(leased, results):
+            if isinstance(result, Exception):
+                print(f"[PortalWorker] Erro no tenant {schema}: {result}")
+            else:
+                processed += result
+        return processed
+
+    def _slots_for(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._provider_slots:
+            self._provider_slots[provider] = asyncio.Semaphore(self.provider_concurrency)
+        return self._provider_slots[provider]
+
+    async def _process_tenant(self, schema: Optional[str], leased: list[tuple[int, str]]) -> int:
+        async def handle(job_id: int, provider: str) -> None:
+            async with self._slots_for(provider):
+                status = await run_in_threadpool(_process, schema, job_id)
+            self.stats[status] += 1
+
+        await asyncio.gather(*(handle(job_id, provider) for job_id, provider in leased))
+        self.stats["processed"] += len(leased)
+        return len(leased)
+
+
+# Singleton global
+portal_sync_worker = PortalSyncWorker()
@@ -0,0 +1,329 @@
+"""
+Pesquisa geográfica de imóveis (raio, bounding box, N mais próximos) e
+clustering para mapas.
+
+Os imóveis com coordenadas de cada tenant são carregados num índice em
+grelha em memória (células de GEO_GRID_CELL_DEG graus, pontos ordenados por
+célula em arrays NumPy). As pesquisas só visitam as células que intersetam
+a área pedida e a distância exata é calculada com Haversine vetorizado.
+O índice fica numa TenantCache invalidada em cada commit que altere
+imóveis (mesmo tópico "properties" do dashboard), com TTL como rede de
+segurança para escritas fora do ORM.
+
+Configuração via ENV:
+    GEO_GRID_CELL_DEG     tamanho da célula da grelha em graus (default: 0.05 ≈ 5km)
+    GEO_INDEX_TTL         segundos até reconstruir o índice (default: 300)
+    GEO_MAX_RESULTS       máximo de imóveis devolvidos por pesquisa (default: 500)
+    GEO_CLUSTER_CELL_PX   tamanho do cluster em píxeis de mapa (default: 60)
+"""
+import math
+import os
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.cache import TenantCache, track_model_changes
+from app.properties.models import Property, PropertyStatus
+
+GEO_GRID_CELL_DEG = float(os.getenv("GEO_GRID_CELL_DEG", "0.05"))
+GEO_INDEX_TTL = float(os.getenv("GEO_INDEX_TTL", "300"))
+GEO_MAX_RESULTS = int(os.getenv("GEO_MAX_RESULTS", "500"))
+GEO_CLUSTER_CELL_PX = int(os.getenv("GEO_CLUSTER_CELL_PX", "60"))
+GEO_MAX_CLUSTERS = 2000
+
+EARTH_RADIUS_M = 6371000.0
+
+geo_index_cache = TenantCache("geo_index", ttl=GEO_INDEX_TTL, max_entries=64, topics=("properties",))
+track_model_changes(Property, "properties")
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distância em metros entre dois pontos (graus decimais)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _haversine_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(lons - lon)
+    a = np.sin(d_phi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) que contém o círculo."""
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    d_lon = min(180.0, math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)))
+    return lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon
+
+
+class GeoIndex:
+    """Índice em grelha dos imóveis com coordenadas de um tenant."""
+
+    def __init__(self, rows: Iterable[tuple], cell_deg: float = GEO_GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        rows = [r for r in rows if r[1] is not None and r[2] is not None]
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        lats = np.array([r[1] for r in rows], dtype=np.float64)
+        lons = np.array([r[2] for r in rows], dtype=np.float64)
+        cy = np.floor(lats / cell_deg).astype(np.int64)
+        cx = np.floor(lons / cell_deg).astype(np.int64)
+        order = np.lexsort((cx, cy))
+
+        self.ids = ids[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.status = np.array([(r[3] or "").upper() for r in rows], dtype=object)[order]
+        self.published = np.array([bool(r[4]) for r in rows], dtype=bool)[order]
+        self.agent_ids = np.array([r[5] or 0 for r in rows], dtype=np.int64)[order]
+        self.business = np.array([(r[6] or "").lower() for r in rows], dtype=object)[order]
+        self.ptype = np.array([(r[7] or "").lower() for r in rows], dtype=object)[order]
+        self.prices = np.array([r[8] or 0.0 for r in rows], dtype=np.float64)[order]
+
+        # célula -> (início, fim) no array ordenado
+        self.cells = {}
+        cy, cx = cy[order], cx[order]
+        if len(self.ids):
+            boundaries = np.flatnonzero((np.diff(cy) != 0) | (np.diff(cx) != 0)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(self.ids)]))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                self.cells[(int(cy[start]), int(cx[start]))] = (start, end)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, db: Session) -> "GeoIndex":
+        rows = db.execute(
+            select(
+                Property.id, Property.latitude, Property.longitude, Property.status,
+                Property.is_published, Property.agent_id, Property.business_type,
+                Property.property_type, Property.price,
+            ).where(Property.latitude.isnot(None), Property.longitude.isnot(None))
+        ).all()
+        index = cls(rows)
+        print(f"[Geo] Índice construído: {len(index)} imóveis em {len(index.cells)} células")
+        return index
+
+    def candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Posições dos pontos dentro da bounding box (só visita as células intersetadas)."""
+        y0, y1 = math.floor(min_lat / self.cell_deg), math.floor(max_lat / self.cell_deg)
+        x0, x1 = math.floor(min_lon / self.cell_deg), math.floor(max_lon / self.cell_deg)
+        if (y1 - y0 + 1) * (x1 - x0 + 1) > len(self.cells):
+            # Área grande (zoom baixo): mais barato percorrer as células ocupadas
+            slices = [
+                self.cells[key] for key in self.cells
+                if y0 <= key[0] <= y1 and x0 <= key[1] <= x1
+            ]
+        else:
+            slices = [
+                self.cells[(y, x)]
+                for y in range(y0, y1 + 1)
+                for x in range(x0, x1 + 1)
+                if (y, x) in self.cells
+            ]
+        if not slices:
+            return np.zeros(0, dtype=np.int64)
+        positions = np.concatenate([np.arange(start, end) for start, end in slices])
+        lats, lons = self.lats[positions], self.lons[positions]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        return positions[inside]
+
+
+class GeoFilters:
+    """Visibilidade/filtros aplicados aos pontos do índice."""
+
+    def __init__(
+        self,
+        published_only: bool = False,
+        hide_cancelled: bool = False,
+        agent_ids: Optional[List[int]] = None,
+        status: Optional[str] = None,
+        business_type: Optional[str] = None,
+        property_type: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+    ):
+        self.published_only = published_only
+        self.hide_cancelled = hide_cancelled
+        self.agent_ids = agent_ids
+        self.status = status
+        self.business_type = business_type
+        self.property_type = property_type
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def mask(self, index: GeoIndex, positions: np.ndarray) -> np.ndarray:
+        keep = np.ones(len(positions), dtype=bool)
+        if self.published_only:
+            keep &= index.published[positions]
+        if self.hide_cancelled:
+            keep &= index.status[positions] != PropertyStatus.CANCELLED.value
+        if self.agent_ids is not None:
+            keep &= np.isin(index.agent_ids[positions], np.array(self.agent_ids, dtype=np.int64))
+        if self.status:
+            keep &= index.status[positions] == self.status.upper()
+        if self.business_type:
+            keep &= index.business[positions] == self.business_type.lower()
+        if self.property_type:
+            keep &= index.ptype[positions] == self.property_type.lower()
+        if self.min_price is not None:
+            keep &= index.prices[positions] >= self.min_price
+        if self.max_price is not None:
+            keep &= index.prices[positions] <= self.max_price
+        return keep
+
+
+def get_geo_index(db: Session) -> GeoIndex:
+    """Índice do tenant atual (construído no primeiro pedido, invalidado em escritas)."""
+    return geo_index_cache.get_or_set("index", lambda: GeoIndex.build(db))
+
+
+# =====================================================
+# PESQUISAS
+# =====================================================
+
+def search_radius(
+    index: GeoIndex, lat: float, lon: float, radius_m: float,
+    filters: Optional[GeoFilters] = None, limit: int = GEO_MAX_RESULTS,
+) -> List[Tuple[int, float]]:
+    """[(property_id, distância_m)] dentro do raio, do mais próximo para o mais longe."""
+    positions = index.candidates(*bounding_box(lat, lon, radius_m))
+    if filters is not None and len(positions):
+        positions = positions[filters.mask(index, positions)]
+    distances = _haversine_many(lat, lon, index.lats[positions], index.lons[positions])
+    inside = distances <= radius_m
+    positions, distances = positions[inside], distances[inside]
+    order = np.argsort(distances, kind="stable")[:max(0, min(limit, GEO_MAX_RESULTS))]
+    return [(int(index.ids[p]), round(float(d), 1)) for p, d in zip(positions[order], distances[order])]
+
+
+def search_nearest(
+    index: GeoIndex, lat: float, lon: float, n: int = 20,
+    filters: Optional[GeoFilters] = None, max_radius_m: float = 50000.0,
+) -> List[Tuple[int, float]]:
+    """
+    N imóveis mais próximos (até max_radius_m). Começa por um raio pequeno e
+    duplica-o até ter N resultados, para não percorrer o índice inteiro.
+    """
+    n = max(0, min(n, GEO_MAX_RESULTS))
+    radius = min(max_radius_m, 1000.0)
+    while True:
+        found = search_radius(index, lat, lon, radius, filters, limit=n)
+        if len(found) >= n or radius >= max_radius_m:
+            return found
+        radius = min(max_radius_m, radius * 2)
+
+
+def search_bbox(
+    index: GeoIndex, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+    filters: Optional[GeoFilters] = None,
+) -> np.ndarray:
+    """Posições (no índice) dos imóveis visíveis dentro da viewport."""
+    positions = index.candidates(min_lat, min_lon, max_lat, max_lon)
+    if filters is not None and len(positions):
+        positions = positions[filters.mask(index, positions)]
+    return positions
+
+
+def cluster_cell_deg(zoom: int) -> float:
+    """Tamanho (graus) de um cluster num nível de zoom de tiles web (256px)."""
+    zoom = max(0, min(int(zoom), 22))
+    return 360.0 / (2 ** zoom) * GEO_CLUSTER_CELL_PX / 256.0
+
+
+def cluster_points(index: GeoIndex, positions: np.ndarray, zoom: int) -> List[dict]:
+    """
+    Agrupa os pontos numa grelha dependente do zoom. Clusters com um único
+    imóvel devolvem o property_id; os restantes o centróide, contagem e
+    bounds (para o cliente fazer zoom ao clicar).
+    """
+    if not len(positions):
+        return []
+    cell = cluster_cell_deg(zoom)
+    lats, lons = index.lats[positions], index.lons[positions]
+    keys = np.stack([np.floor(lats / cell), np.floor(lons / cell)], axis=1)
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    n_clusters = len(counts)
+
+    sum_lat = np.bincount(inverse, weights=lats, minlength=n_clusters)
+    sum_lon = np.bincount(inverse, weights=lons, minlength=n_clusters)
+    min_lat = np.full(n_clusters, np.inf)
+    max_lat = np.full(n_clusters, -np.inf)
+    min_lon = np.full(n_clusters, np.inf)
+    max_lon = np.full(n_clusters, -np.inf)
+    np.minimum.at(min_lat, inverse, lats)
+    np.maximum.at(max_lat, inverse, lats)
+    np.minimum.at(min_lon, inverse, lons)
+    np.maximum.at(max_lon, inverse, lons)
+    # Um representante por cluster (para clusters de 1 ponto)
+    first = np.full(n_clusters, -1, dtype=np.int64)
+    first[inverse[::-1]] = positions[::-1]
+
+    clusters = []
+    for c in np.argsort(-counts, kind="stable")[:GEO_MAX_CLUSTERS].tolist():
+        count = int(counts[c])
+        item = {
+            "latitude": round(float(sum_lat[c] / count), 6),
+            "longitude": round(float(sum_lon[c] / count), 6),
+            "count": count,
+        }
+        if count == 1:
+            item["property_id"] = int(index.ids[first[c]])
+        else:
+            item["bounds"] = [
+                round(float(min_lat[c]), 6), round(float(min_lon[c]), 6),
+                round(float(max_lat[c]), 6), round(float(max_lon[c]), 6),
+            ]
+        clusters.append(item)
+    return clusters
+
+
+def load_markers(db: Session, hits: List[Tuple[int, Optional[float]]]) -> List[dict]:
+    """Dados leves de cada imóvel para marcadores/listas de mapa, pela ordem de `hits`."""
+    if not hits:
+        return []
+    rows = db.execute(
+        select(
+            Property.id, Property.reference, Property.title, Property.price, Property.typology,
+            Property.business_type, Property.property_type, Property.status, Property.municipality,
+            Property.bedrooms, Property.usable_area, Property.latitude, Property.longitude,
+            Property.images,
+        ).where(Property.id.in_([pid for pid, _ in hits]))
+    ).all()
+    by_id = {row.id: row for row in rows}
+    markers = []
+    for pid, distance in hits:
+        row = by_id.get(pid)
+        if row is None:
+            continue
+        item = {
+            "id": row.id,
+            "reference": row.reference,
+            "title": row.title,
+            "price": row.price,
+            "typology": row.typology,
+            "business_type": row.business_type,
+            "property_type": row.property_type,
+            "status": row.status,
+            "municipality": row.municipality,
+            "bedrooms": row.bedrooms,
+            "usable_area": row.usable_area,
+            "latitude": row.latitude,
+            "longitude": row.longitude,
+            "thumbnail": (row.images or [None])[0],
+        }
+        if distance is not None:
+            item["distance_m"] = distance
+        markers.append(item)
+    return markers
@@ -0,0 +1,359 @@
+"""
+Jobs de upload de imagens de imóveis.
+
+O request só valida e lê os ficheiros; decode/resize/watermark/encode corre
+num ProcessPoolExecutor limitado (CPU-bound, fora do event loop) e as
+variantes são enviadas para o storage em paralelo. O progresso fica
+disponível por polling (GET /properties/upload-jobs/{job_id}) e é publicado
+no event bus como "image_job_progress" (WebSocket do agente).
+
+O estado de cada job é gravado na tabela property_image_jobs do tenant (ao
+criar, a cada ficheiro processado e no fim), pelo que o polling funciona em
+qualquer worker/réplica. As URLs novas são acrescentadas ao imóvel com a
+linha bloqueada (SELECT ... FOR UPDATE): uploads concorrentes não se perdem.
+
+Configuração via ENV:
+    IMAGE_PROCESS_WORKERS     processos do pool (default: min(4, CPUs))
+    IMAGE_UPLOAD_CONCURRENCY  uploads simultâneos para o storage por job (default: 6)
+    IMAGE_JOB_RETENTION       segundos que um job terminado fica consultável (default: 3600)
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.events import event_bus
+from app.core.storage import storage
+from app.database import get_tenant_schema, tenant_session
+from app.properties import services, schemas
+from app.properties.images import IMAGE_SIZES, render_variants
+from app.properties.models import Property, PropertyImageJob
+
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_UPLOAD_CONCURRENCY = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY", "6"))
+IMAGE_JOB_RETENTION = int(os.getenv("IMAGE_JOB_RETENTION", "3600"))
+
+MAX_IMAGES_PER_PROPERTY = 30
+
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class ImageJob:
+    """Estado de um job de upload (uma ou mais imagens de um imóvel)."""
+
+    def __init__(
+        self,
+        property_id: int,
+        filenames: List[str],
+        agent_id: Optional[int] = None,
+        watermark_tenant: str = "default",
+    ):
+        self.id = uuid.uuid4().hex
+        self.property_id = property_id
+        self.agent_id = agent_id
+        self.tenant_schema = get_tenant_schema()
+        # Chave do tenant no cache de tiles de watermark dos workers
+        self.watermark_tenant = watermark_tenant
+        self.filenames = filenames
+        self.status = JOB_QUEUED
+        self.processed = 0
+        # URL 'large' de cada ficheiro, na ordem do upload (None se falhou)
+        self.results: List[Optional[str]] = [None] * len(filenames)
+        self.errors: List[str] = []
+        self.images: List[str] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def uploaded(self) -> int:
+        return sum(1 for url in self.results if url)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def values(self) -> dict:
+        """Colunas de PropertyImageJob que mudam durante o job."""
+        return {
+            "status": self.status,
+            "processed": self.processed,
+            "results": list(self.results),
+            "errors": list(self.errors),
+            "total_images": len(self.images) if self.done else None,
+            "finished_at": datetime.utcfromtimestamp(self.finished_at) if self.finished_at else None,
+        }
+
+    def to_dict(self) -> dict:
+        return job_status(self.id, self.property_id, len(self.filenames), self.values())
+
+
+def job_status(job_id: str, property_id: int, total: int, values: dict) -> dict:
+    """Resposta de polling / evento de progresso (igual a partir da memória ou da BD)."""
+    results = values.get("results") or []
+    return {
+        "job_id": job_id,
+        "property_id": property_id,
+        "status": values["status"],
+        "total": total,
+        "processed": values["processed"],
+        "uploaded": sum(1 for url in results if url),
+        "urls": [url for url in results if url],
+        "errors": list(values.get("errors") or []),
+        "total_images": values.get("total_images"),
+    }
+
+
+# =====================================================
+# POOL DE PROCESSOS
+# =====================================================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Pool de processos partilhado (criado no primeiro upload)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: os workers só importam app.properties.images (PIL), não a app
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, IMAGE_PROCESS_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _reset_image_pool(broken: ProcessPoolExecutor) -> None:
+    """Descarta um pool partido (worker morto, p.ex. OOM) para o próximo job recriar."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_image_pool() -> None:
+    """Termina o pool (lifespan shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# =====================================================
+# REGISTO DE JOBS
+# =====================================================
+
+_background_tasks: set = set()
+
+
+def _insert_job(job: ImageJob) -> None:
+    """Grava o job novo e apaga os terminados há mais de IMAGE_JOB_RETENTION."""
+    db = tenant_session(job.tenant_schema)
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=IMAGE_JOB_RETENTION)
+        db.execute(delete(PropertyImageJob).where(PropertyImageJob.finished_at < cutoff))
+        db.add(PropertyImageJob(
+            id=job.id,
+            property_id=job.property_id,
+            agent_id=job.agent_id,
+            total=len(job.filenames),
+            created_at=datetime.utcfromtimestamp(job.created_at),
+            **job.values(),
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _save_job(job: ImageJob) -> None:
+    """Atualiza o estado gravado (nunca recua: ignora gravações mais antigas que cheguem depois)."""
+    db = tenant_session(job.tenant_schema)
+    try:
+        db.execute(
+            update(PropertyImageJob)
+            .where(PropertyImageJob.id == job.id, PropertyImageJob.processed <= job.processed)
+            .values(**job.values())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def create_job(
+    property_id: int,
+    filenames: List[str],
+    agent_id: Optional[int] = None,
+    watermark_tenant: str = "default",
+    errors: Optional[List[str]] = None,
+) -> ImageJob:
+    job = ImageJob(property_id, filenames, agent_id, watermark_tenant)
+    job.errors.extend(errors or [])
+    await run_in_threadpool(_insert_job, job)
+    return job
+
+
+def get_job(db: Session, job_id: str) -> Optional[dict]:
+    """Estado do job no tenant da sessão (None se não existir ou já expirou)."""
+    row = db.get(PropertyImageJob, job_id)
+    if row is None:
+        return None
+    values = {column: getattr(row, column) for column in ("status", "processed", "results", "errors", "total_images")}
+    return job_status(row.id, row.property_id, row.total, values)
+
+
+# =====================================================
+# EXECUÇÃO
+# =====================================================
+
+def _sanitize_base_name(filename: str) -> str:
+    base_name = os.path.splitext(filename or "imagem")[0]
+    return "".join(c for c in base_name if c.isalnum() or c in "._- ")[:50]
+
+
+def _append_property_images(schema: Optional[str], property_id: int, new_urls: List[str]) -> List[str]:
+    """Acrescenta as URLs ao imóvel com a linha bloqueada (uploads concorrentes esperam e acrescentam a seguir)."""
+    db = tenant_session(schema)
+    try:
+        property_obj = db.query(Property).filter(Property.id == property_id).with_for_update().first()
+        if not property_obj:
+            raise ValueError("Property not found")
+        urls = (list(property_obj.images or []) + new_urls)[:MAX_IMAGES_PER_PROPERTY]
+        services.update_property(db, property_id, schemas.PropertyUpdate(images=urls))
+        return urls
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _persist(job: ImageJob) -> None:
+    try:
+        await run_in_threadpool(_save_job, job)
+    except Exception as e:
+        print(f"[ImageJobs] Erro ao gravar estado do job {job.id}: {e}")
+
+
+async def _publish_progress(job: ImageJob) -> None:
+    if not job.agent_id:
+        return
+    try:
+        await event_bus.publish("image_job_progress", job.to_dict(), agent_id=job.agent_id)
+    except Exception as e:
+        print(f"[ImageJobs] Erro ao publicar progresso do job {job.id}: {e}")
+
+
+async def _process_file(
+    job: ImageJob,
+    index: int,
+    content: bytes,
+    watermark: Optional[Tuple[dict, bytes]],
+    upload_slots: asyncio.Semaphore,
+) -> None:
+    filename = job.filenames[index]
+    settings, watermark_bytes = watermark if watermark else (None, None)
+    loop = asyncio.get_running_loop()
+    pool = get_image_pool()
+
+    try:
+        try:
+            variants = await loop.run_in_executor(
+                pool, render_variants, content, watermark_bytes, settings, job.watermark_tenant
+            )
+        except BrokenProcessPool:
+            _reset_image_pool(pool)
+            raise
+
+        base_name = _sanitize_base_name(filename)
+        folder = f"properties/{job.property_id}"
+
+        async def _upload(size_name: str) -> str:
+            data, ext = variants[size_name]
+            async with upload_slots:
+                return await storage.upload_file(
+                    file=BytesIO(data),
+                    folder=folder,
+                    filename=f"{base_name}_{size_name}{ext}",
+                    public=True,
+                )
+
+        size_names = list(IMAGE_SIZES)
+        urls = await asyncio.gather(*(_upload(size_name) for size_name in size_names))
+        # Apenas a versão 'large' entra no array principal (compatibilidade)
+        job.results[index] = urls[size_names.index("large")]
+    except Exception as e:
+        print(f"[ImageJobs] Erro ao processar {filename}: {e}")
+        job.errors.append(f"{filename}: {str(e)[:100]}")
+    finally:
+        job.processed += 1
+        await _persist(job)
+        await _publish_progress(job)
+
+
+async def run_job(
+    job: ImageJob,
+    contents: List[bytes],
+    watermark: Optional[Tuple[dict, bytes]] = None,
+) -> ImageJob:
+    """
+    Processa todas as imagens do job e grava as URLs no imóvel.
+
+    Args:
+        job: Job criado (e gravado) por create_job (filenames na mesma ordem de contents)
+        contents: Bytes originais de cada ficheiro
+        watermark: (settings, bytes do logo) de get_watermark_asset, resolvido no request
+    """
+    job.status = JOB_PROCESSING
+    await _persist(job)
+    upload_slots = asyncio.Semaphore(max(1, IMAGE_UPLOAD_CONCURRENCY))
+
+    await asyncio.gather(*(
+        _process_file(job, index, content, watermark, upload_slots)
+        for index, content in enumerate(contents)
+    ))
+
+    new_urls = [url for url in job.results if url]
+    try:
+        if new_urls:
+            job.images = await run_in_threadpool(
+                _append_property_images, job.tenant_schema, job.property_id, new_urls
+            )
+        job.status = JOB_COMPLETED if new_urls or not contents else JOB_FAILED
+    except Exception as e:
+        print(f"[ImageJobs] Erro ao guardar imagens do job {job.id}: {e}")
+        job.errors.append(f"Erro ao guardar imagens: {str(e)[:100]}")
+        job.status = JOB_FAILED
+
+    job.finished_at = time.time()
+    await _persist(job)
+    await _publish_progress(job)
+    return job
+
+
+def submit_job(
+    job: ImageJob,
+    contents: List[bytes],
+    watermark: Optional[Tuple[dict, bytes]] = None,
+) -> ImageJob:
+    """Agenda run_job em background (herda o contexto do tenant do request)."""
+    task = asyncio.create_task(run_job(job, contents, watermark))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return job
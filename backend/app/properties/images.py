@@ -0,0 +1,332 @@
+"""
+Processamento de imagens de imóveis (resize, watermark, encode).
+
+Funções puras sem acesso à base de dados: recebem bytes e settings já
+resolvidos, para poderem correr num processo do pool de imagens
+(ver app/properties/image_jobs.py). Este módulo só deve importar PIL.
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from PIL import Image
+
+# Configurações de otimização de imagens
+IMAGE_SIZES = {
+    "thumbnail": (300, 300),      # Miniaturas para listagens
+    "medium": (800, 800),          # Visualização em cards
+    "large": (1920, 1920),         # Visualização detalhada
+}
+IMAGE_QUALITY = 85  # Qualidade JPEG/WebP (0-100)
+
+# Tamanhos que levam marca d'água (thumbnails ficam limpos)
+WATERMARKED_SIZES = ("medium", "large")
+
+WATERMARK_MARGIN = 20
+
+# Último logo decodificado neste processo: (sha1 dos bytes, Image RGBA)
+_decoded_watermark: Optional[tuple] = None
+
+# Tiles de watermark são cacheados por largura arredondada a este passo
+WATERMARK_WIDTH_BUCKET = int(os.getenv("WATERMARK_WIDTH_BUCKET", "32"))
+# Memória máxima (bytes RGBA) dos tiles em cache, por processo
+WATERMARK_TILE_CACHE_BYTES = int(os.getenv("WATERMARK_TILE_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Converte RGBA/LA/P para RGB com fundo branco (para WebP/JPEG sem alpha)."""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return background
+    if img.mode != 'RGB':
+        # CMYK, L, I;16... (fotos de scanner/câmara)
+        return img.convert('RGB')
+    return img
+
+
+def _watermark_position(position_name: str, img_size: tuple, wm_size: tuple) -> tuple:
+    """Calcula o canto superior esquerdo do watermark para a posição configurada."""
+    img_width, img_height = img_size
+    wm_width, wm_height = wm_size
+    margin = WATERMARK_MARGIN
+
+    if position_name == "bottom-left":
+        return (margin, img_height - wm_height - margin)
+    if position_name == "top-right":
+        return (img_width - wm_width - margin, margin)
+    if position_name == "top-left":
+        return (margin, margin)
+    if position_name == "center":
+        return ((img_width - wm_width) // 2, (img_height - wm_height) // 2)
+    # bottom-right (default)
+    return (img_width - wm_width - margin, img_height - wm_height - margin)
+
+
+def compose_watermark(img: Image.Image, watermark: Image.Image, settings: dict) -> Image.Image:
+    """
+    Aplica o watermark (RGBA original do tenant) sobre a imagem.
+
+    Args:
+        img: Imagem PIL já redimensionada
+        watermark: Logo RGBA (não é modificado)
+        settings: {"opacity", "scale", "position"} de get_watermark_settings
+
+    Returns:
+        Imagem RGB com marca d'água
+    """
+    tile = scale_watermark(watermark, settings, img.size[0])
+    if tile is None:
+        return img
+    return paste_watermark(_to_rgb(img).copy(), tile, settings["position"])
+
+
+def decode_watermark(watermark_bytes: Optional[bytes]) -> Optional[Image.Image]:
+    """
+    Abre os bytes do logo como RGBA (None se não houver ou forem inválidos).
+    Guarda o último logo decodificado no processo: o mesmo tenant envia o
+    mesmo logo em todas as imagens de um job.
+    """
+    global _decoded_watermark
+    if not watermark_bytes:
+        return None
+    digest = hashlib.sha1(watermark_bytes).digest()
+    if _decoded_watermark is not None and _decoded_watermark[0] == digest:
+        return _decoded_watermark[1]
+    try:
+        watermark = Image.open(io.BytesIO(watermark_bytes)).convert("RGBA")
+    except Exception as e:
+        print(f"[Watermark] Logo inválido: {e}")
+        return None
+    _decoded_watermark = (digest, watermark)
+    return watermark
+
+
+def scale_watermark(watermark: Image.Image, settings: dict, target_width: int) -> Optional[Image.Image]:
+    """
+    Tile do watermark pronto a colar: redimensionado para a largura da
+    imagem destino e com a opacidade já aplicada ao canal alpha.
+    """
+    wm_width = int(target_width * settings["scale"])
+    wm_height = int(wm_width / (watermark.size[0] / watermark.size[1]))
+    if wm_width <= 0 or wm_height <= 0:
+        return None
+
+    tile = watermark.resize((wm_width, wm_height), Image.Resampling.LANCZOS)
+    opacity = settings["opacity"]
+    tile.putalpha(tile.getchannel("A").point(lambda a: int(a * opacity)))
+    return tile
+
+
+class WatermarkTileCache:
+    """
+    Cache LRU de tiles de watermark prontos a colar (redimensionados e com
+    opacidade aplicada), limitado pela memória ocupada pelos píxeis.
+
+    Chave: (tenant, fingerprint das settings + logo, largura do bucket).
+    Alterar logo/opacidade/escala muda o fingerprint, pelo que tiles antigos
+    nunca são servidos mesmo nos workers que não recebem a invalidação;
+    ficam apenas a ocupar espaço até serem evictados.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._tiles: "OrderedDict[tuple, Image.Image]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size_of(tile: Image.Image) -> int:
+        return tile.size[0] * tile.size[1] * 4
+
+    def get(self, key: tuple) -> Optional[Image.Image]:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, key: tuple, tile: Image.Image) -> None:
+        size = self._size_of(tile)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._tiles.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._size_of(previous)
+            self._tiles[key] = tile
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self._bytes -= self._size_of(evicted)
+
+    def invalidate(self, tenant: Optional[str] = None) -> None:
+        """Remove os tiles de um tenant (ou todos)."""
+        with self._lock:
+            if tenant is None:
+                self._tiles.clear()
+                self._bytes = 0
+                return
+            for key in [k for k in self._tiles if k[0] == tenant]:
+                self._bytes -= self._size_of(self._tiles.pop(key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._tiles),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+watermark_tiles = WatermarkTileCache(WATERMARK_TILE_CACHE_BYTES)
+
+
+def watermark_fingerprint(watermark_bytes: bytes, settings: dict) -> str:
+    """Hash do logo + parâmetros que alteram o tile (a posição não altera)."""
+    digest = hashlib.sha1(watermark_bytes)
+    digest.update(f"|{settings['opacity']}|{settings['scale']}".encode())
+    return digest.hexdigest()
+
+
+def get_watermark_tile(
+    watermark_bytes: bytes,
+    settings: dict,
+    target_width: int,
+    tenant: str = "default",
+    fingerprint: Optional[str] = None,
+) -> Optional[Image.Image]:
+    """
+    Tile de watermark para uma imagem com `target_width` de largura,
+    servido de watermark_tiles ou gerado (e guardado) numa miss.
+    """
+    bucket = max(WATERMARK_WIDTH_BUCKET, round(target_width / WATERMARK_WIDTH_BUCKET) * WATERMARK_WIDTH_BUCKET)
+    key = (tenant, fingerprint or watermark_fingerprint(watermark_bytes, settings), bucket)
+
+    tile = watermark_tiles.get(key)
+    if tile is not None:
+        return tile
+
+    watermark = decode_watermark(watermark_bytes)
+    if watermark is None:
+        return None
+    tile = scale_watermark(watermark, settings, bucket)
+    if tile is not None:
+        watermark_tiles.put(key, tile)
+    return tile
+
+
+def paste_watermark(img: Image.Image, tile: Image.Image, position_name: str) -> Image.Image:
+    """
+    Cola um tile (RGBA, opacidade já aplicada) sobre a imagem RGB.
+    Equivale ao alpha_composite + flatten de compose_watermark, sem criar
+    camadas do tamanho da imagem.
+    """
+    img.paste(tile, _watermark_position(position_name, img.size, tile.size), mask=tile)
+    return img
+
+
+def optimize_image_bytes(
+    image_bytes: bytes,
+    size_name: str = "large",
+    watermark: Optional[Image.Image] = None,
+    settings: Optional[dict] = None,
+) -> tuple[bytes, str]:
+    """
+    Gera uma única variante (ver render_variants para todas de uma vez).
+
+    Returns:
+        Tuple com (bytes otimizados, extensão do arquivo)
+    """
+    img = _to_rgb(Image.open(io.BytesIO(image_bytes)))
+
+    max_width, max_height = IMAGE_SIZES.get(size_name, IMAGE_SIZES["large"])
+    img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+
+    if size_name in WATERMARKED_SIZES and watermark is not None and settings:
+        try:
+            img = compose_watermark(img, watermark, settings)
+        except Exception as e:
+            print(f"Aviso: Não foi possível aplicar marca d'água: {e}")
+
+    return _encode(img), '.webp'
+
+
+def _encode(img: Image.Image) -> bytes:
+    output = io.BytesIO()
+    img.save(output, format='WebP', quality=IMAGE_QUALITY, method=6)
+    return output.getvalue()
+
+
+def _fit(size: tuple, box: tuple) -> tuple:
+    """Dimensões de `size` reduzidas proporcionalmente para caber em `box` (nunca amplia)."""
+    width, height = size
+    ratio = min(box[0] / width, box[1] / height, 1.0)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def render_variants(
+    image_bytes: bytes,
+    watermark_bytes: Optional[bytes] = None,
+    settings: Optional[dict] = None,
+    tenant: str = "default",
+) -> dict[str, tuple[bytes, str]]:
+    """
+    Gera todas as variantes (IMAGE_SIZES) de uma imagem original numa passagem.
+
+    - Decodifica o original uma vez; em JPEG usa draft() (shrink-on-load
+      por DCT) para não descomprimir píxeis que o resize ia deitar fora.
+    - Cada tamanho é derivado do anterior (large → medium → thumbnail),
+      sempre a partir da versão sem watermark.
+    - O watermark vem de watermark_tiles (um tile por tenant/settings/largura)
+      e é colado com máscara.
+    - Os encodes WebP correm em paralelo (o encoder liberta o GIL).
+
+    Ponto de entrada dos workers do pool de processos: argumentos e
+    resultado são apenas bytes/dicts (picklable).
+
+    Returns:
+        { size_name: (bytes, extensão) }
+    """
+    fingerprint = watermark_fingerprint(watermark_bytes, settings) if watermark_bytes and settings else None
+
+    img = Image.open(io.BytesIO(image_bytes))
+    order = sorted(IMAGE_SIZES, key=lambda name: IMAGE_SIZES[name][0] * IMAGE_SIZES[name][1], reverse=True)
+
+    if img.format == "JPEG":
+        img.draft("RGB", _fit(img.size, IMAGE_SIZES[order[0]]))
+    img = _to_rgb(img)
+
+    frames = {}
+    current = img
+    for size_name in order:
+        target = _fit(current.size, IMAGE_SIZES[size_name])
+        if target != current.size:
+            current = current.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        frame = current
+        if size_name in WATERMARKED_SIZES and fingerprint is not None:
+            try:
+                tile = get_watermark_tile(watermark_bytes, settings, frame.size[0], tenant, fingerprint)
+                if tile is not None:
+                    frame = paste_watermark(frame.copy(), tile, settings["position"])
+            except Exception as e:
+                print(f"Aviso: Não foi possível aplicar marca d'água: {e}")
+        frames[size_name] = frame
+
+    with ThreadPoolExecutor(max_workers=len(frames)) as encoders:
+        encoded = dict(zip(frames, encoders.map(_encode, frames.values())))
+
+    return {size_name: (encoded[size_name], '.webp') for size_name in IMAGE_SIZES}
@@ -1,8 +1,9 @@
 from enum import Enum as PyEnum
 from typing import TYPE_CHECKING
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, Text
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, Text, Index, JSON
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from app.database import Base
 
 if TYPE_CHECKING:
@@ -18,6 +19,15 @@ class PropertyStatus(str, PyEnum):
 
 class Property(Base):
     __tablename__ = "properties"
+    __table_args__ = (
+        # Sync incremental mobile: alterações desde o watermark (updated_at, id)
+        Index("ix_properties_updated_id", "updated_at", "id"),
+        Index("ix_properties_agent_updated_id", "agent_id", "updated_at", "id"),
+        # Dashboard mobile: últimos imóveis do agente
+        Index("ix_properties_agent_created_id", "agent_id", "created_at", "id"),
+        # Rollups diários dos relatórios: recálculo de um dia por intervalo
+        Index("ix_properties_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     reference = Column(String, nullable=False, unique=True, index=True)
@@ -36,7 +46,8 @@ class Property(Base):
     condition = Column(String, nullable=True)
     energy_certificate = Column(String, nullable=True)
     status = Column(String, default=PropertyStatus.AVAILABLE.value)
-    agent_id = Column(Integer, ForeignKey("agents.id"))
+    # active_history: o dono anterior fica no histórico mesmo com o objeto expirado (dashboard mobile, sync)
+    agent_id = column_property(Column(Integer, ForeignKey("agents.id")), active_history=True)
     images = Column(JSONB, nullable=True)
     
     # Campos novos para site montra
@@ -49,8 +60,9 @@ class Property(Base):
     parking_spaces = Column(Integer, nullable=True)  # lugares de estacionamento
     video_url = Column(String(500), nullable=True)  # URL do vídeo promocional
     
-    created_at = Column(DateTime)
-    updated_at = Column(DateTime)
+    # active_history: ao mudar a data de um objeto expirado o dia anterior é carregado (rollups dos relatórios)
+    created_at = column_property(Column(DateTime), active_history=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     agent = relationship("Agent", back_populates="properties")
@@ -59,3 +71,23 @@ class Property(Base):
     first_impressions = relationship("FirstImpression", back_populates="property")
     # tasks = relationship("Task", back_populates="property", foreign_keys="Task.property_id")  # TEMPORARIAMENTE COMENTADO - Task model não está importado
 
+
+class PropertyImageJob(Base):
+    """Estado de um job de upload de imagens (app/properties/image_jobs.py), visível a todos os workers."""
+    __tablename__ = "property_image_jobs"
+    __table_args__ = (
+        # Limpeza dos jobs terminados há mais de IMAGE_JOB_RETENTION
+        Index("ix_property_image_jobs_finished_at", "finished_at"),
+    )
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), nullable=False, index=True)
+    agent_id = Column(Integer, nullable=True)
+    status = Column(String(20), nullable=False)  # queued/processing/completed/failed
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    results = Column(JSON, nullable=True)  # URL 'large' de cada ficheiro (None se falhou)
+    errors = Column(JSON, nullable=True)
+    total_images = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
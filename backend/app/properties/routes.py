@@ -1,21 +1,37 @@
 import os
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Response
 from fastapi.responses import JSONResponse
-from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from PIL import Image
 import io
 import requests
 from . import services, schemas
 from app.database import get_db, get_tenant_schema, DEFAULT_SCHEMA, DATABASE_URL
+from app.database_async import get_async_db
 from app.properties.models import PropertyStatus, Property
 from app.core.storage import storage  # Storage abstraction layer
+from app.core.pagination import NEXT_CURSOR_HEADER
 from app.core.cloudinary_watermark import (
     apply_watermark_to_images,
-    get_watermark_settings_for_response
+    get_watermark_settings_for_response,
+    make_images_watermarker,
 )
-from app.security import require_staff, get_current_user, get_optional_user
+from app.core.responses import FastJSONResponse, RowSerializer
+from app.security import require_staff, get_current_user, get_optional_user, get_optional_user_async
+from app.properties.images import (
+    IMAGE_SIZES,
+    IMAGE_QUALITY,
+    _to_rgb,
+    get_watermark_tile,
+    optimize_image_bytes,
+    paste_watermark,
+    watermark_tiles,
+)
+from app.properties import image_jobs, geo
 from app.users.models import User, UserRole
 
 router = APIRouter(prefix="/properties", tags=["properties"])
@@ -23,16 +39,8 @@ router = APIRouter(prefix="/properties", tags=["properties"])
 MAX_UPLOAD_BYTES = 20 * 1024 * 1024  # 20MB por imagem
 ALLOWED_MIME_PREFIX = "image/"
 
-# Configurações de otimização de imagens
-IMAGE_SIZES = {
-    "thumbnail": (300, 300),      # Miniaturas para listagens
-    "medium": (800, 800),          # Visualização em cards
-    "large": (1920, 1920),         # Visualização detalhada
-}
-IMAGE_QUALITY = 85  # Qualidade JPEG/WebP (0-100)
-
 # Cache para watermark POR TENANT (isolamento multi-tenant)
-# Estrutura: { "tenant_slug": {"image": Image, "url": str, "timestamp": float}, ... }
+# Estrutura: { "tenant_slug": {"image": Image, "bytes": bytes, "url": str, "timestamp": float}, ... }
 # Cada tenant tem o seu próprio cache de watermark para evitar cross-tenant leaks
 _watermark_cache: dict[str, dict] = {}
 _WATERMARK_CACHE_TTL = 3600  # 1 hora - tempo máximo antes de recarregar
@@ -59,12 +67,12 @@ def _get_tenant_cache() -> dict:
     key = _get_cache_key()
     
     if key not in _watermark_cache:
-        _watermark_cache[key] = {"image": None, "url": None, "timestamp": 0}
+        _watermark_cache[key] = {"image": None, "bytes": None, "url": None, "timestamp": 0}
     
     # Verificar TTL - invalidar cache expirado
     cache = _watermark_cache[key]
     if cache["timestamp"] > 0 and (time.time() - cache["timestamp"]) > _WATERMARK_CACHE_TTL:
-        _watermark_cache[key] = {"image": None, "url": None, "timestamp": 0}
+        _watermark_cache[key] = {"image": None, "bytes": None, "url": None, "timestamp": 0}
     
     return _watermark_cache[key]
 
@@ -78,8 +86,9 @@ def invalidate_watermark_cache(tenant_slug: str = None):
         tenant_slug: Slug do tenant (opcional, usa atual se não fornecido)
     """
     key = tenant_slug if tenant_slug else _get_cache_key()
+    watermark_tiles.invalidate(key)
     if key in _watermark_cache:
-        _watermark_cache[key] = {"image": None, "url": None, "timestamp": 0}
+        _watermark_cache[key] = {"image": None, "bytes": None, "url": None, "timestamp": 0}
         print(f"[Watermark] Cache invalidado para tenant: {key}")
 
 
@@ -140,10 +149,42 @@ def apply_watermark_to_properties(properties: List[Property], db: Session) -> Li
     # Obter settings de watermark uma vez só
     watermark_settings = get_watermark_settings_for_response(db)
     
+    return _apply_watermark_settings(properties, watermark_settings)
+
+
+async def apply_watermark_to_properties_async(properties: List[Property], db: AsyncSession) -> List[Property]:
+    """
+    Versão assíncrona de apply_watermark_to_properties.
+    As settings são lidas com a mesma função síncrona via AsyncSession.run_sync.
+    """
+    if not properties:
+        return properties
+    
+    watermark_settings = await db.run_sync(get_watermark_settings_for_response)
+    
+    return _apply_watermark_settings(properties, watermark_settings)
+
+
+# Listagens: ORM -> dict direto (sem validação por objeto do response_model)
+PROPERTY_SERIALIZER = RowSerializer(schemas.PropertyOut)
+
+
+async def serialize_properties_async(properties: List[Property], db: AsyncSession) -> List[dict]:
+    """
+    Propriedades como dicts (campos de PropertyOut) com watermark nas imagens.
+    Não altera os objetos ORM (as URLs com watermark nunca chegam à sessão).
+    """
+    if not properties:
+        return []
+    watermark_settings = await db.run_sync(get_watermark_settings_for_response)
+    return PROPERTY_SERIALIZER.many(properties, images=make_images_watermarker(watermark_settings))
+
+
+def _apply_watermark_settings(properties: List[Property], watermark_settings: Optional[dict]) -> List[Property]:
+    """Aplica as settings de watermark (já obtidas) a cada propriedade"""
     if not watermark_settings:
         return properties
     
-    # Aplicar a cada propriedade
     for prop in properties:
         if prop.images:
             prop.images = apply_watermark_to_images(
@@ -185,6 +226,7 @@ def load_watermark_from_url(url: str) -> Optional[Image.Image]:
     """
     Carrega imagem de watermark a partir de URL (Cloudinary).
     Usa cache POR TENANT para evitar downloads repetidos e garantir isolamento.
+    A imagem devolvida é partilhada: não modificar (usar get_watermark_tile).
     """
     import time
     
@@ -193,7 +235,7 @@ def load_watermark_from_url(url: str) -> Optional[Image.Image]:
     
     # Verificar cache - URL igual e imagem em cache
     if cache["url"] == url and cache["image"] is not None:
-        return cache["image"].copy()
+        return cache["image"]
     
     try:
         tenant_key = _get_cache_key()
@@ -206,15 +248,42 @@ def load_watermark_from_url(url: str) -> Optional[Image.Image]:
         # Atualizar cache do tenant
         cache["url"] = url
         cache["image"] = watermark
+        cache["bytes"] = response.content
         cache["timestamp"] = time.time()
         
-        return watermark.copy()
+        return watermark
         
     except Exception as e:
         print(f"[Watermark] Erro ao carregar de URL: {e}")
         return None
 
 
+def load_watermark_bytes(url: str) -> Optional[bytes]:
+    """
+    Devolve os bytes originais do logo (mesmo cache por tenant de
+    load_watermark_from_url), para enviar aos workers de imagens.
+    """
+    if load_watermark_from_url(url) is None:
+        return None
+    return _get_tenant_cache()["bytes"]
+
+
+def get_watermark_asset(db: Session) -> Optional[tuple[dict, bytes]]:
+    """
+    Resolve settings + bytes do watermark do tenant atual uma única vez.
+
+    Returns:
+        (settings, bytes do logo) ou None se watermark desativado/indisponível
+    """
+    settings = get_watermark_settings(db)
+    if settings is None:
+        return None
+    watermark_bytes = load_watermark_bytes(settings["url"])
+    if watermark_bytes is None:
+        return None
+    return settings, watermark_bytes
+
+
 def apply_watermark(img: Image.Image, db: Session = None) -> Image.Image:
     """
     Aplica marca d'água com logo da agência na imagem.
@@ -238,59 +307,17 @@ def apply_watermark(img: Image.Image, db: Session = None) -> Image.Image:
             print("[Watermark] Watermark desativado ou não configurado")
             return img
         
-        # Carregar watermark de URL
-        watermark = load_watermark_from_url(settings["url"])
-        if watermark is None:
+        # Carregar watermark de URL e obter tile já escalado/com opacidade
+        watermark_bytes = load_watermark_bytes(settings["url"])
+        if watermark_bytes is None:
             return img
         
-        # Calcular tamanho proporcional do watermark
-        img_width, img_height = img.size
-        wm_scale = settings["scale"]  # Ex: 0.15 = 15%
-        wm_width = int(img_width * wm_scale)
-        wm_ratio = watermark.size[0] / watermark.size[1]
-        wm_height = int(wm_width / wm_ratio)
-        
-        # Redimensionar watermark
-        watermark = watermark.resize((wm_width, wm_height), Image.Resampling.LANCZOS)
-        
-        # Ajustar opacidade
-        opacity = settings["opacity"]  # Ex: 0.6 = 60%
-        alpha = watermark.split()[3]
-        alpha = Image.eval(alpha, lambda a: int(a * opacity))
-        watermark.putalpha(alpha)
-        
-        # Criar camada para watermark
-        layer = Image.new('RGBA', img.size, (0, 0, 0, 0))
-        
-        # Calcular posição baseado na configuração
-        margin = 20
-        position_name = settings["position"]
-        
-        if position_name == "bottom-right":
-            position = (img_width - wm_width - margin, img_height - wm_height - margin)
-        elif position_name == "bottom-left":
-            position = (margin, img_height - wm_height - margin)
-        elif position_name == "top-right":
-            position = (img_width - wm_width - margin, margin)
-        elif position_name == "top-left":
-            position = (margin, margin)
-        elif position_name == "center":
-            position = ((img_width - wm_width) // 2, (img_height - wm_height) // 2)
-        else:
-            position = (img_width - wm_width - margin, img_height - wm_height - margin)
-        
-        layer.paste(watermark, position)
-        
-        # Converter imagem para RGBA e aplicar watermark
-        img_rgba = img.convert('RGBA')
-        img_with_wm = Image.alpha_composite(img_rgba, layer)
-        
-        # Converter de volta para RGB
-        final = Image.new('RGB', img_with_wm.size, (255, 255, 255))
-        final.paste(img_with_wm, mask=img_with_wm.split()[3])
+        tile = get_watermark_tile(watermark_bytes, settings, img.size[0], _get_cache_key())
+        if tile is None:
+            return img
         
-        print(f"[Watermark] Aplicado com sucesso (opacity={opacity}, scale={wm_scale}, pos={position_name})")
-        return final
+        # Transparências sobre branco, como no pipeline de variantes (images.py)
+        return paste_watermark(_to_rgb(img).copy(), tile, settings["position"])
         
     except Exception as e:
         # Se houver erro, retornar imagem original sem watermark
@@ -311,34 +338,12 @@ def optimize_image(image_bytes: bytes, filename: str, size_name: str = "large",
     Returns:
         Tuple com (bytes otimizados, extensão do arquivo)
     """
-    # Abrir imagem
-    img = Image.open(io.BytesIO(image_bytes))
-    
-    # Converter RGBA para RGB se necessário (para JPEG)
-    if img.mode in ('RGBA', 'LA', 'P'):
-        background = Image.new('RGB', img.size, (255, 255, 255))
-        if img.mode == 'P':
-            img = img.convert('RGBA')
-        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-        img = background
-    
-    # Obter dimensões máximas
-    max_width, max_height = IMAGE_SIZES.get(size_name, IMAGE_SIZES["large"])
-    
-    # Redimensionar mantendo proporção
-    img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-    
-    # Aplicar marca d'água (exceto em thumbnails muito pequenos)
-    if size_name in ["medium", "large"]:
-        img = apply_watermark(img, db=db)
-    
-    # Salvar otimizado em memória
-    output = io.BytesIO()
-    
-    # Usar WebP para melhor compressão (suportado por todos browsers modernos)
-    img.save(output, format='WebP', quality=IMAGE_QUALITY, method=6)
-    
-    return output.getvalue(), '.webp'
+    watermark, settings = None, None
+    if db is not None:
+        settings = get_watermark_settings(db)
+        if settings is not None:
+            watermark = load_watermark_from_url(settings["url"])
+    return optimize_image_bytes(image_bytes, size_name, watermark, settings)
 
 
 def optimize_video(input_path: str, output_path: str) -> tuple[bool, str, float]:
@@ -414,26 +419,28 @@ def optimize_video(input_path: str, output_path: str) -> tuple[bool, str, float]
 
 
 @router.get("/", response_model=list[schemas.PropertyOut])
-def list_properties(
+async def list_properties(
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = None,
     search: str | None = None,
     status: str | None = None,
     is_published: int | None = None,
     agent_id: int | None = None,
-    current_user: User | None = Depends(get_optional_user),
-    db: Session = Depends(get_db),
+    current_user: User | None = Depends(get_optional_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Listar propriedades.
     
+    Paginação: sem `search` nem `skip`, usa cursor — passar o header
+    X-Next-Cursor da resposta como `cursor` para obter a página seguinte.
+    
     Comportamento por tipo de acesso:
     - Sem autenticação (site público): apenas imóveis publicados (is_published=1)
     - Agent autenticado: imóveis da sua equipa (ou só os seus se não tiver equipa)
     - Admin/Staff/Leader: todos os imóveis
     """
-    from app.agents.models import Agent
-    
     # Perfis com permissão total
     privileged_roles = {UserRole.ADMIN.value, "staff", "leader", UserRole.COORDINATOR.value}
     
@@ -453,21 +460,18 @@ def list_properties(
         if not current_user.agent_id:
             raise HTTPException(status_code=403, detail="Utilizador não tem agente associado")
         
-        # Buscar o agente para saber a equipa
-        agent = db.query(Agent).filter(Agent.id == current_user.agent_id).first()
+        # Buscar a equipa do agente
+        team_agent_ids = await _get_team_agent_ids(db, current_user.agent_id)
         
-        if agent and agent.team_id:
-            # Buscar todos os agentes da mesma equipa
-            team_agents = db.query(Agent).filter(Agent.team_id == agent.team_id).all()
-            team_agent_ids = [a.id for a in team_agents]
-        else:
+        if not team_agent_ids:
             # Sem equipa - só vê os seus imóveis
             agent_id = current_user.agent_id
     
-    properties = services.get_properties(
+    properties, next_cursor = await services.get_properties_page_async(
         db,
         skip=skip,
         limit=limit,
+        cursor=cursor,
         search=search,
         status=status,
         is_published=is_published,
@@ -475,16 +479,127 @@ def list_properties(
         agent_ids=team_agent_ids,
         hide_cancelled=hide_cancelled,
     )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
     
     # Aplicar watermark dinamicamente às imagens (isolado por tenant)
-    return apply_watermark_to_properties(properties, db)
+    return FastJSONResponse(await serialize_properties_async(properties, db), headers=headers)
+
+
+# =====================================================
+# PESQUISA GEOGRÁFICA (mapa do site montra / "perto de mim" no mobile)
+# =====================================================
+
+async def _geo_filters(
+    current_user: Optional[User],
+    db: AsyncSession,
+    **filters,
+) -> geo.GeoFilters:
+    """Mesmas regras de visibilidade de list_properties aplicadas ao índice geográfico"""
+    privileged_roles = {UserRole.ADMIN.value, "staff", "leader", UserRole.COORDINATOR.value}
+    if current_user is None:
+        return geo.GeoFilters(published_only=True, hide_cancelled=True, **filters)
+    if current_user.role in privileged_roles:
+        return geo.GeoFilters(**filters)
+    if not current_user.agent_id:
+        raise HTTPException(status_code=403, detail="Utilizador não tem agente associado")
+    team_agent_ids = await _get_team_agent_ids(db, current_user.agent_id)
+    return geo.GeoFilters(agent_ids=team_agent_ids or [current_user.agent_id], **filters)
+
+
+async def _geo_markers(db: AsyncSession, hits: list) -> list[dict]:
+    """Carrega os marcadores e aplica o watermark do tenant às miniaturas"""
+    markers = await db.run_sync(geo.load_markers, hits)
+    watermark_settings = await db.run_sync(get_watermark_settings_for_response)
+    if watermark_settings:
+        for marker in markers:
+            if marker["thumbnail"]:
+                marker["thumbnail"] = apply_watermark_to_images(
+                    images=[marker["thumbnail"]], watermark_settings=watermark_settings
+                )[0]
+    return markers
+
+
+@router.get("/geo/radius")
+async def geo_search_radius(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5.0, gt=0, le=500),
+    limit: int = Query(100, ge=1, le=geo.GEO_MAX_RESULTS),
+    business_type: Optional[str] = None,
+    property_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    current_user: User | None = Depends(get_optional_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Imóveis num raio (km) à volta de um ponto, ordenados por distância."""
+    filters = await _geo_filters(
+        current_user, db, business_type=business_type, property_type=property_type,
+        min_price=min_price, max_price=max_price,
+    )
+    index = await db.run_sync(geo.get_geo_index)
+    hits = geo.search_radius(index, lat, lon, radius_km * 1000, filters, limit=limit)
+    return {"total": len(hits), "properties": await _geo_markers(db, hits)}
+
+
+@router.get("/geo/nearest")
+async def geo_search_nearest(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(20, ge=1, le=geo.GEO_MAX_RESULTS),
+    max_km: float = Query(50.0, gt=0, le=500),
+    business_type: Optional[str] = None,
+    property_type: Optional[str] = None,
+    current_user: User | None = Depends(get_optional_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Os N imóveis mais próximos de um ponto (até max_km)."""
+    filters = await _geo_filters(current_user, db, business_type=business_type, property_type=property_type)
+    index = await db.run_sync(geo.get_geo_index)
+    hits = geo.search_nearest(index, lat, lon, limit, filters, max_radius_m=max_km * 1000)
+    return {"total": len(hits), "properties": await _geo_markers(db, hits)}
+
+
+@router.get("/geo/bbox")
+async def geo_search_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: Optional[int] = Query(None, ge=0, le=22),
+    limit: int = Query(200, ge=1, le=geo.GEO_MAX_RESULTS),
+    business_type: Optional[str] = None,
+    property_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    current_user: User | None = Depends(get_optional_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Imóveis dentro da viewport do mapa.
+
+    Com `zoom`, devolve clusters (centróide + contagem) em vez de imóveis,
+    para o mapa não ter de descarregar o catálogo inteiro.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Bounding box inválida")
+    filters = await _geo_filters(
+        current_user, db, business_type=business_type, property_type=property_type,
+        min_price=min_price, max_price=max_price,
+    )
+    index = await db.run_sync(geo.get_geo_index)
+    positions = geo.search_bbox(index, min_lat, min_lon, max_lat, max_lon, filters)
+    if zoom is not None:
+        return {"total": int(len(positions)), "clusters": geo.cluster_points(index, positions, zoom)}
+    hits = [(int(pid), None) for pid in index.ids[positions[:limit]]]
+    return {"total": int(len(positions)), "properties": await _geo_markers(db, hits)}
 
 
 @router.get("/{property_id}", response_model=schemas.PropertyOut)
-def get_property(
+async def get_property(
     property_id: int, 
-    current_user: User | None = Depends(get_optional_user),
-    db: Session = Depends(get_db)
+    current_user: User | None = Depends(get_optional_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obter detalhes de uma propriedade.
@@ -494,9 +609,7 @@ def get_property(
     - Agent autenticado: apenas se for da sua equipa
     - Admin/Staff/Leader: qualquer imóvel
     """
-    from app.agents.models import Agent
-    
-    property = services.get_property(db, property_id)
+    property = await services.get_property_async(db, property_id)
     if not property:
         raise HTTPException(status_code=404, detail="Property not found")
     
@@ -511,12 +624,10 @@ def get_property(
         pass
     else:
         # Agente - só pode ver imóveis da sua equipa
-        agent = db.query(Agent).filter(Agent.id == current_user.agent_id).first()
+        team_agent_ids = await _get_team_agent_ids(db, current_user.agent_id)
         
-        if agent and agent.team_id:
+        if team_agent_ids:
             # Verificar se o imóvel pertence a alguém da equipa
-            team_agents = db.query(Agent).filter(Agent.team_id == agent.team_id).all()
-            team_agent_ids = [a.id for a in team_agents]
             if property.agent_id not in team_agent_ids:
                 raise HTTPException(status_code=403, detail="Não tem permissão para ver este imóvel")
         else:
@@ -525,7 +636,21 @@ def get_property(
                 raise HTTPException(status_code=403, detail="Não tem permissão para ver este imóvel")
     
     # Aplicar watermark dinamicamente às imagens (isolado por tenant)
-    return apply_watermark_to_property(property, db)
+    watermarked = await apply_watermark_to_properties_async([property], db)
+    return watermarked[0]
+
+
+async def _get_team_agent_ids(db: AsyncSession, agent_id: Optional[int]) -> List[int]:
+    """IDs dos agentes da equipa do agente (lista vazia se não tiver equipa)"""
+    from app.agents.models import Agent
+    
+    if not agent_id:
+        return []
+    team_id = (await db.execute(select(Agent.team_id).where(Agent.id == agent_id))).scalar()
+    if not team_id:
+        return []
+    result = await db.execute(select(Agent.id).where(Agent.team_id == team_id))
+    return list(result.scalars().all())
 
 
 @router.post("/", response_model=schemas.PropertyOut, status_code=201)
@@ -562,6 +687,60 @@ def delete_property(
     return property
 
 
+async def _read_image_uploads(files: List[UploadFile]) -> tuple[List[str], List[bytes], List[str]]:
+    """
+    Valida tipo/tamanho e lê os ficheiros enviados.
+
+    Returns:
+        (filenames aceites, conteúdos, erros)
+    """
+    filenames, contents, errors = [], [], []
+    for upload in files:
+        if not upload.content_type or not upload.content_type.startswith(ALLOWED_MIME_PREFIX):
+            errors.append(f"{upload.filename}: Tipo não suportado")
+            continue
+
+        content = await upload.read()
+        if len(content) > MAX_UPLOAD_BYTES:
+            errors.append(f"{upload.filename}: Excede {MAX_UPLOAD_BYTES // (1024*1024)}MB")
+            continue
+
+        filenames.append(upload.filename)
+        contents.append(content)
+    return filenames, contents, errors
+
+
+async def _prepare_image_job(property_id: int, files: List[UploadFile], user: User, db: Session):
+    """
+    Validações comuns aos uploads de imagens: imóvel, limite de imagens,
+    ficheiros e watermark do tenant (resolvido uma vez, fora do event loop).
+    """
+    property_obj = await run_in_threadpool(services.get_property, db, property_id)
+    if not property_obj:
+        raise HTTPException(status_code=404, detail="Property not found")
+
+    # Verificar limite de 30 imagens
+    MAX_IMAGES = image_jobs.MAX_IMAGES_PER_PROPERTY
+    current_count = len(property_obj.images or [])
+    if current_count + len(files) > MAX_IMAGES:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Limite de {MAX_IMAGES} imagens excedido. Atual: {current_count}, A adicionar: {len(files)}"
+        )
+
+    filenames, contents, errors = await _read_image_uploads(files)
+    watermark = await run_in_threadpool(get_watermark_asset, db) if contents else None
+
+    job = await image_jobs.create_job(
+        property_id,
+        filenames,
+        agent_id=getattr(user, "agent_id", None),
+        watermark_tenant=_get_cache_key(),
+        errors=errors,
+    )
+    return job, contents, watermark
+
+
 @router.post("/{property_id}/upload")
 async def upload_property_images(
     property_id: int,
@@ -574,113 +753,64 @@ async def upload_property_images(
     
     Suporta múltiplos arquivos. Cria versões otimizadas automaticamente.
     Storage configurável via ENV (ver app/core/storage.py).
+    O processamento corre no pool de imagens (ver image_jobs); para não
+    esperar pela resposta usar POST /{property_id}/upload-jobs.
     
     LIMITE: Máximo 30 imagens por propriedade.
     """
-    # Rollback de qualquer transação pendente/abortada
-    try:
-        db.rollback()
-    except:
-        pass
-    
-    property_obj = services.get_property(db, property_id)
-    if not property_obj:
-        raise HTTPException(status_code=404, detail="Property not found")
+    job, contents, watermark = await _prepare_image_job(property_id, files, user, db)
+    await image_jobs.run_job(job, contents, watermark)
 
-    urls = list(property_obj.images or [])
-    
-    # Verificar limite de 30 imagens
-    MAX_IMAGES = 30
-    current_count = len(urls)
-    if current_count + len(files) > MAX_IMAGES:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Limite de {MAX_IMAGES} imagens excedido. Atual: {current_count}, A adicionar: {len(files)}"
-        )
-    
-    uploaded_count = 0
-    errors = []
-    
-    for upload in files:
-        if not upload.content_type or not upload.content_type.startswith(ALLOWED_MIME_PREFIX):
-            errors.append(f"{upload.filename}: Tipo não suportado")
-            continue
+    if job.uploaded > 0 and job.status == image_jobs.JOB_FAILED:
+        raise HTTPException(status_code=500, detail=job.errors[-1])
 
-        try:
-            content = await upload.read()
-            if len(content) > MAX_UPLOAD_BYTES:
-                errors.append(f"{upload.filename}: Excede {MAX_UPLOAD_BYTES // (1024*1024)}MB")
-                continue
-
-            # Otimizar e redimensionar imagem automaticamente
-            # Criar 3 versões: thumbnail, medium, large
-            base_name = os.path.splitext(upload.filename)[0]
-            # Sanitizar nome do ficheiro
-            base_name = "".join(c for c in base_name if c.isalnum() or c in "._- ")[:50]
-            
-            saved_urls = []
-            for size_name in ["thumbnail", "medium", "large"]:
-                optimized_bytes, ext = optimize_image(content, upload.filename, size_name, db=db)
-                
-                # Nome do arquivo: original_thumbnail.webp, original_medium.webp, etc.
-                filename = f"{base_name}_{size_name}{ext}"
-                
-                # Upload para storage persistente (Cloudinary/S3/etc)
-                from io import BytesIO
-                file_obj = BytesIO(optimized_bytes)
-                
-                print(f"[Upload] Uploading {filename} to folder properties/{property_id}")
-                url = await storage.upload_file(
-                    file=file_obj,
-                    folder=f"properties/{property_id}",
-                    filename=filename,
-                    public=True
-                )
-                print(f"[Upload] Success! URL: {url}")
-                
-                saved_urls.append(url)
-            
-            # Adicionar apenas a versão 'large' ao array principal (compatibilidade)
-            urls.append(saved_urls[2])  # large
-            uploaded_count += 1
-            
-        except Exception as e:
-            print(f"[Upload] Erro ao processar {upload.filename}: {e}")
-            errors.append(f"{upload.filename}: {str(e)[:100]}")
-            # Rollback para limpar transação abortada
-            try:
-                db.rollback()
-            except:
-                pass
-            continue
+    urls = job.images
+    if not urls:
+        property_obj = await run_in_threadpool(services.get_property, db, property_id)
+        urls = list(property_obj.images or []) if property_obj else []
 
-    # Só atualiza se houve uploads com sucesso
-    if uploaded_count > 0:
-        try:
-            services.update_property(
-                db,
-                property_id,
-                schemas.PropertyUpdate(images=urls),
-            )
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(status_code=500, detail=f"Erro ao guardar imagens: {str(e)}")
-    
     response_data = {
-        "uploaded": uploaded_count, 
+        "uploaded": job.uploaded, 
         "urls": urls,
         "total_images": len(urls),
-        "message": f"{uploaded_count} imagem(ns) carregada(s) com sucesso"
+        "message": f"{job.uploaded} imagem(ns) carregada(s) com sucesso"
     }
     
-    if errors:
-        response_data["errors"] = errors
-        response_data["message"] += f". {len(errors)} erro(s)."
+    if job.errors:
+        response_data["errors"] = job.errors
+        response_data["message"] += f". {len(job.errors)} erro(s)."
     
     return JSONResponse(response_data)
 
 
+@router.post("/{property_id}/upload-jobs", status_code=202)
+async def create_property_image_job(
+    property_id: int,
+    files: List[UploadFile] = File(...),
+    user=Depends(require_staff),
+    db: Session = Depends(get_db),
+):
+    """
+    Aceita as imagens originais e devolve logo um job_id.
+
+    O resize/watermark/encode corre em background; acompanhar via
+    GET /properties/upload-jobs/{job_id} ou pelo evento WebSocket
+    "image_job_progress".
+    """
+    job, contents, watermark = await _prepare_image_job(property_id, files, user, db)
+    image_jobs.submit_job(job, contents, watermark)
+    return job.to_dict()
+
+
+@router.get("/upload-jobs/{job_id}")
+def get_property_image_job(job_id: str, user=Depends(require_staff), db: Session = Depends(get_db)):
+    """Estado de um job de upload de imagens (gravado na BD do tenant)."""
+    job = image_jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 @router.post("/{property_id}/upload-video")
 async def upload_property_video(
     property_id: int,
@@ -1,14 +1,27 @@
 from datetime import datetime, timezone
 from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .models import Property, PropertyStatus
 from .schemas import PropertyCreate, PropertyUpdate
+from app.core.pagination import Keyset, KeysetColumn
+from app.search.services import search_clause
 
 
-def get_properties(
-    db: Session,
+# Listagem sem pesquisa: mais recentes primeiro, paginada por cursor (id)
+PROPERTIES_KEYSET = Keyset(KeysetColumn(Property.id, descending=True))
+
+
+def _uses_keyset(skip: int = 0, search: str | None = None, cursor: str | None = None, **_) -> bool:
+    """Cursor quando não há pesquisa (ordem por relevância) nem skip legado"""
+    return not search and (bool(cursor) or not skip)
+
+
+def build_properties_query(
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = None,
     search: str | None = None,
     status: str | None = None,
     is_published: int | None = None,
@@ -16,30 +29,68 @@ def get_properties(
     agent_ids: List[int] | None = None,
     hide_cancelled: bool = False,
 ):
-    query = db.query(Property)
+    """Statement de listagem de imóveis (partilhado pelas versões sync e async)"""
+    query = select(Property)
     
     # Filtro por lista de agentes (equipa) tem prioridade sobre agent_id único
     if agent_ids:
-        query = query.filter(Property.agent_id.in_(agent_ids))
+        query = query.where(Property.agent_id.in_(agent_ids))
     elif agent_id:
-        query = query.filter(Property.agent_id == agent_id)
+        query = query.where(Property.agent_id == agent_id)
     
     if search:
-        like = f"%{search}%"
-        query = query.filter(Property.title.ilike(like) | Property.reference.ilike(like) | Property.location.ilike(like))
+        # Full-text/trigramas em PostgreSQL (ordenado por relevância); ILIKE em SQLite
+        condition, rank = search_clause("properties", search)
+        query = query.where(condition)
+        if rank is not None:
+            query = query.order_by(rank.desc(), Property.id.desc())
     if status and status in {s.value for s in PropertyStatus}:
-        query = query.filter(Property.status == PropertyStatus(status))
+        query = query.where(Property.status == PropertyStatus(status))
     if is_published is not None:
-        query = query.filter(Property.is_published == is_published)
+        query = query.where(Property.is_published == is_published)
     if hide_cancelled:
-        query = query.filter(Property.status != PropertyStatus.CANCELLED.value)
-    return query.offset(skip).limit(limit).all()
+        query = query.where(Property.status != PropertyStatus.CANCELLED.value)
+    if _uses_keyset(skip, search, cursor):
+        # LIMIT limit+1: a linha extra indica se há próxima página
+        return PROPERTIES_KEYSET.apply(query, cursor, limit)
+    if not search:
+        query = query.order_by(Property.id.desc())
+    return query.offset(skip).limit(limit)
+
+
+def _page(rows, **filters):
+    if _uses_keyset(**filters):
+        return PROPERTIES_KEYSET.page(rows, filters.get("limit", 100))
+    return list(rows), None
+
+
+def get_properties_page(db: Session, **filters):
+    """(imóveis, cursor da próxima página ou None)"""
+    return _page(db.execute(build_properties_query(**filters)).scalars().all(), **filters)
+
+
+async def get_properties_page_async(db: AsyncSession, **filters):
+    result = await db.execute(build_properties_query(**filters))
+    return _page(result.scalars().all(), **filters)
+
+
+def get_properties(db: Session, **filters):
+    return get_properties_page(db, **filters)[0]
+
+
+async def get_properties_async(db: AsyncSession, **filters):
+    return (await get_properties_page_async(db, **filters))[0]
 
 
 def get_property(db: Session, property_id: int):
     return db.query(Property).filter(Property.id == property_id).first()
 
 
+async def get_property_async(db: AsyncSession, property_id: int):
+    result = await db.execute(select(Property).where(Property.id == property_id))
+    return result.scalars().first()
+
+
 def create_property(db: Session, property: PropertyCreate):
     payload = property.model_dump()
     if not payload.get("title"):
@@ -68,7 +119,7 @@ def update_property(db: Session, property_id: int, property_update: PropertyUpda
     for key, value in update_data.items():
         setattr(db_property, key, value)
     
-    db_property.updated_at = datetime.now(timezone.utc)
+    db_property.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(db_property)
     return db_property
@@ -117,3 +117,205 @@ def test_upload_images():
     get_resp = client.get(f"/properties/{prop_id}")
     assert get_resp.status_code == 200
     assert len(get_resp.json().get("images", [])) == 1
+
+
+def test_render_variants_sizes():
+    import io
+    from PIL import Image
+    from app.properties.images import IMAGE_SIZES, render_variants
+
+    buf = io.BytesIO()
+    Image.new("RGB", (2400, 1600), (120, 80, 40)).save(buf, format="JPEG")
+
+    variants = render_variants(buf.getvalue())
+    assert set(variants) == set(IMAGE_SIZES)
+    for size_name, (data, ext) in variants.items():
+        assert ext == ".webp"
+        width, height = Image.open(io.BytesIO(data)).size
+        assert width <= IMAGE_SIZES[size_name][0] and height <= IMAGE_SIZES[size_name][1]
+
+
+def test_watermark_tile_cache_lru_and_invalidation():
+    from PIL import Image
+    from app.properties.images import WatermarkTileCache
+
+    cache = WatermarkTileCache(max_bytes=2 * 10 * 10 * 4)
+    tile = Image.new("RGBA", (10, 10))
+    cache.put(("a", "fp", 320), tile)
+    cache.put(("b", "fp", 320), tile)
+    assert cache.get(("a", "fp", 320)) is tile
+    cache.put(("b", "fp", 800), tile)  # evicta a entrada menos usada ("b", 320)
+    assert cache.get(("b", "fp", 320)) is None
+    assert cache.get(("a", "fp", 320)) is tile
+
+    cache.invalidate("a")
+    assert cache.get(("a", "fp", 320)) is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_geo_index_radius_nearest_and_clusters():
+    from app.properties import geo
+
+    # (id, lat, lon, status, is_published, agent_id, business_type, property_type, price)
+    rows = [
+        (1, 38.7223, -9.1393, "AVAILABLE", 1, 1, "venda", "apartamento", 300000),   # Lisboa
+        (2, 38.7250, -9.1500, "AVAILABLE", 0, 1, "venda", "apartamento", 250000),   # Lisboa, rascunho
+        (3, 38.6979, -9.4215, "AVAILABLE", 1, 2, "venda", "moradia", 900000),       # Cascais
+        (4, 41.1579, -8.6291, "AVAILABLE", 1, 2, "venda", "apartamento", 200000),   # Porto
+        (5, 38.7300, -9.1400, "CANCELLED", 1, 1, "venda", "apartamento", 280000),
+    ]
+    index = geo.GeoIndex(rows)
+    public = geo.GeoFilters(published_only=True, hide_cancelled=True)
+
+    near_lisbon = geo.search_radius(index, 38.7223, -9.1393, 5000)
+    assert [pid for pid, _ in near_lisbon] == [1, 5, 2]
+    assert [pid for pid, _ in geo.search_radius(index, 38.7223, -9.1393, 5000, public)] == [1]
+    assert [pid for pid, _ in geo.search_nearest(index, 38.7223, -9.1393, 3, public, max_radius_m=400000)] == [1, 3, 4]
+
+    positions = geo.search_bbox(index, 38.0, -10.0, 39.0, -9.0, public)
+    assert sorted(index.ids[positions].tolist()) == [1, 3]
+    clusters = geo.cluster_points(index, geo.search_bbox(index, 36.0, -10.0, 42.0, -6.0), zoom=6)
+    assert sum(c["count"] for c in clusters) == 5
+    assert abs(geo.haversine_m(38.7223, -9.1393, 41.1579, -8.6291) - 274000) < 2000
+
+
+def test_image_job_status_is_persisted_and_appends_keep_concurrent_uploads(isolated_db, monkeypatch):
+    import asyncio
+    from sqlalchemy.orm import Session
+    from app.properties import image_jobs
+    from app.properties.models import Property
+
+    db = isolated_db
+    bind = db.get_bind()
+    monkeypatch.setattr(image_jobs, "tenant_session", lambda schema: Session(bind=bind))
+    prop = Property(reference="IMG-1", title="Imagens", price=100000, images=["a.jpg"])
+    db.add(prop)
+    db.commit()
+
+    job = asyncio.run(image_jobs.create_job(prop.id, ["x.jpg", "y.jpg"], errors=["z.gif: Tipo não suportado"]))
+    # Outro worker lê o estado da BD
+    status = image_jobs.get_job(db, job.id)
+    assert status["status"] == image_jobs.JOB_QUEUED and status["total"] == 2
+    assert status["errors"] == ["z.gif: Tipo não suportado"]
+    assert image_jobs.get_job(db, "nao-existe") is None
+
+    job.status = image_jobs.JOB_PROCESSING
+    job.results[0], job.processed = "x_large.jpg", 1
+    stale = dict(job.values())
+    job.results[1], job.processed = "y_large.jpg", 2
+    image_jobs._save_job(job)
+    # Uma gravação atrasada com menos ficheiros processados não faz recuar o estado
+    job.results[1], job.processed = None, 1
+    image_jobs._save_job(job)
+    db.expire_all()
+    assert image_jobs.get_job(db, job.id)["urls"] == ["x_large.jpg", "y_large.jpg"] != stale["results"]
+
+    # Dois jobs do mesmo imóvel: cada um relê a lista com a linha bloqueada (FOR UPDATE no PostgreSQL)
+    assert image_jobs._append_property_images(None, prop.id, ["b.jpg"]) == ["a.jpg", "b.jpg"]
+    assert image_jobs._append_property_images(None, prop.id, ["c.jpg"]) == ["a.jpg", "b.jpg", "c.jpg"]
+    db.expire_all()
+    assert db.get(Property, prop.id).images == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+def test_fast_list_serialization_matches_response_model_path(isolated_db):
+    """[user-020] RowSerializer + dumps = response_model + jsonable_encoder (bytes iguais), sem mexer no ORM."""
+    import json
+    from datetime import datetime
+    from fastapi.encoders import jsonable_encoder
+    from app.core.cloudinary_watermark import apply_watermark_to_images, make_images_watermarker
+    from app.core.responses import FastJSONResponse
+    from app.properties import schemas
+    from app.properties.models import Property, PropertyStatus
+    from app.properties.routes import PROPERTY_SERIALIZER
+
+    db = isolated_db
+    upload = "https://res.cloudinary.com/demo/image/upload/v1700000000/crm-plus/properties/casa.jpg"
+    db.add_all([
+        Property(reference="FAST-1", title="Moradia Ção", price=350000.0, usable_area=180.25,
+                 images=[upload, "/media/properties/1/local.webp"], bedrooms=4,
+                 created_at=datetime(2026, 3, 1, 10, 30, 0, 123456)),
+        Property(reference="FAST-2", title="Terreno", price=90000.0, status=PropertyStatus.RESERVED.value,
+                 images=None, latitude=39.74, longitude=-8.81),
+    ])
+    db.commit()
+    properties = db.query(Property).order_by(Property.id).all()
+    settings = {"enabled": True, "public_id": "crm-plus/watermarks/acme/watermark", "scale": 0.2}
+
+    fast = PROPERTY_SERIALIZER.many(properties, images=make_images_watermarker(settings))
+    assert properties[0].images[0] == upload  # objetos ORM intactos
+
+    # Caminho antigo: watermark atribuído ao ORM, validação e jsonable_encoder
+    for prop in properties:
+        if prop.images:
+            prop.images = apply_watermark_to_images(prop.images, settings)
+    slow = jsonable_encoder([schemas.PropertyOut.model_validate(prop) for prop in properties])
+    db.rollback()
+
+    expected = json.dumps(slow, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    assert FastJSONResponse(fast).body == expected
+    assert "l_crm-plus:watermarks:acme:watermark" in fast[0]["images"][0]
+    assert fast[0]["images"][1] == "/media/properties/1/local.webp"
+    assert fast[1]["images"] is None
+
+
+def test_render_variants_match_per_size_path_and_shrink_on_load(monkeypatch):
+    """[user-006] Uma passagem = optimize_image_bytes por tamanho (dimensões, formato, píxeis); JPEG com draft()."""
+    import io
+    from PIL import Image, ImageChops, ImageDraw, ImageStat, JpegImagePlugin
+    from app.properties import images
+
+    def encoded(mode, size, fmt):
+        img = Image.new(mode, size)
+        draw = ImageDraw.Draw(img)
+        for x in range(0, size[0], 40):
+            fill = x % 255 if mode == "L" else (x % 255, 90, 200, 180)[:len(mode)]
+            draw.rectangle((x, 0, x + 19, size[1]), fill=fill)
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, quality=95)
+        return buf.getvalue()
+
+    def decode(data):
+        img = Image.open(io.BytesIO(data))
+        assert img.format == "WEBP"
+        return img.convert("RGB")
+
+    logo = Image.new("RGBA", (200, 80), (255, 255, 255, 255))
+    buf = io.BytesIO()
+    logo.save(buf, format="PNG")
+    logo_bytes = buf.getvalue()
+    settings = {"opacity": 0.5, "scale": 0.2, "position": "bottom-right"}
+
+    drafts = []
+    original_draft = JpegImagePlugin.JpegImageFile.draft
+
+    def spy_draft(self, mode, size):
+        result = original_draft(self, mode, size)
+        drafts.append((size, self.size))
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", spy_draft)
+    sources = {
+        "jpeg": encoded("RGB", (4000, 3000), "JPEG"),
+        "cmyk": encoded("CMYK", (1200, 1800), "JPEG"),
+        "png_rgba": encoded("RGBA", (1000, 640), "PNG"),
+        "grayscale_small": encoded("L", (240, 160), "PNG"),
+    }
+    for name, data in sources.items():
+        for watermark, wm_settings in ((None, None), (logo_bytes, settings)):
+            variants = images.render_variants(data, watermark, wm_settings, tenant="test")
+            assert set(variants) == set(images.IMAGE_SIZES), name
+            decoded_logo = images.decode_watermark(watermark)
+            for size_name, (fast, ext) in variants.items():
+                slow, slow_ext = images.optimize_image_bytes(data, size_name, decoded_logo, wm_settings)
+                assert ext == slow_ext == ".webp"
+                fast_img, slow_img = decode(fast), decode(slow)
+                assert abs(fast_img.size[0] - slow_img.size[0]) <= 1 and abs(fast_img.size[1] - slow_img.size[1]) <= 1, (name, size_name)
+                slow_img = slow_img.resize(fast_img.size)
+                diff = ImageStat.Stat(ImageChops.difference(fast_img, slow_img)).mean
+                assert max(diff) < 8, (name, size_name, watermark is not None, diff)
+
+    # Shrink-on-load: o JPEG 4000x3000 é descodificado a 1/2 (>= 1920 de largura), nunca abaixo do large
+    jpeg_drafts = [decoded for requested, decoded in drafts if requested == (1920, 1440)]
+    assert jpeg_drafts and all(decoded == (2000, 1500) for decoded in jpeg_drafts)
+    large = Image.open(io.BytesIO(images.render_variants(sources["jpeg"])["large"][0]))
+    assert large.size == (1920, 1440)
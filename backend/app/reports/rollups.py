@@ -0,0 +1,592 @@
+"""
+Rollups diários por tenant para relatórios de séries temporais.
+
+Cada métrica (leads, imóveis, visitas, propostas, escrituras) é agregada
+por dia e por até três dimensões na tabela daily_rollups. Os relatórios
+(/reports/timeseries) somam rollups: o custo depende do número de dias do
+intervalo (e da cardinalidade da dimensão pedida), não do número de linhas
+das tabelas de origem.
+
+Manutenção incremental:
+    - os dias afetados por escritas ORM numa entidade de uma métrica (data
+      nova e, se mudou, a anterior) são recolhidos em cada flush e marcados
+      em rollup_dirty_days uma vez por transação (before_commit), com um
+      INSERT só de acréscimo: escritores concorrentes não disputam linhas;
+      após o commit o worker é acordado
+    - o worker (arrancado no lifespan) procura os tenants com dias marcados
+      numa única conexão do engine default (database.scan_schemas, sem tocar
+      no LRU de pools) e só esses abrem sessão no seu pool; cada dia é
+      recalculado com um único GROUP BY sobre [dia, dia + 1), servido pelo
+      índice da coluna de data, e confirmado na sua própria transação. Em
+      PostgreSQL o dia é reservado com um advisory lock transacional (seguro
+      com várias réplicas)
+    - o catch-up periódico recalcula os últimos ROLLUP_CATCHUP_DAYS dias
+      (cobre UPDATE em massa e SQL raw, que não passam pelo flush) e faz o
+      backfill completo das métricas ainda sem rollups, no mesmo varrimento
+
+Os dias são UTC. Quem altere dados antigos fora do ORM deve chamar
+mark_dirty() ou rebuild() para o intervalo afetado.
+
+Configuração via ENV:
+    ROLLUP_WORKER_ENABLED               "false" para desligar (default: true)
+    ROLLUP_WORKER_INTERVAL              segundos entre passagens (default: 30)
+    ROLLUP_BATCH_SIZE                   dias recalculados por tenant por passagem (default: 200)
+    ROLLUP_WORKER_TENANT_CONCURRENCY    tenants processados em paralelo (default: 2)
+    ROLLUP_CATCHUP_INTERVAL             segundos entre catch-ups (default: 3600)
+    ROLLUP_CATCHUP_DAYS                 dias recentes recalculados no catch-up (default: 2)
+    ROLLUP_MAX_RANGE_DAYS               intervalo máximo de uma série (default: 1830)
+"""
+import asyncio
+import os
+import time as time_module
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, String, cast, delete, event, func, inspect, insert, literal, null, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import get_tenant_schema, list_tenant_schemas, scan_schemas, tenant_session
+from app.leads.models import Lead
+from app.models.escritura import Escritura
+from app.models.proposal import Proposal
+from app.models.report_rollup import DailyRollup, RollupDirtyDay
+from app.models.visit import Visit
+from app.properties.models import Property
+
+ROLLUP_WORKER_ENABLED = os.getenv("ROLLUP_WORKER_ENABLED", "true").lower() not in ("0", "false", "no")
+ROLLUP_WORKER_INTERVAL = float(os.getenv("ROLLUP_WORKER_INTERVAL", "30"))
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "200"))
+ROLLUP_WORKER_TENANT_CONCURRENCY = int(os.getenv("ROLLUP_WORKER_TENANT_CONCURRENCY", "2"))
+ROLLUP_CATCHUP_INTERVAL = float(os.getenv("ROLLUP_CATCHUP_INTERVAL", "3600"))
+ROLLUP_CATCHUP_DAYS = int(os.getenv("ROLLUP_CATCHUP_DAYS", "2"))
+ROLLUP_MAX_RANGE_DAYS = int(os.getenv("ROLLUP_MAX_RANGE_DAYS", "1830"))
+
+INTERVALS = ("day", "week", "month")
+DIM_COLUMNS = ("dim1", "dim2", "dim3")
+
+
+class RollupMetric:
+    """
+    Métrica agregada por dia: modelo, coluna de data, dimensões e valor.
+
+    dimensions: (nome, atributo, tipo) com tipo "text", "lower" (normalizado
+    em minúsculas) ou "id" (devolvido como int).
+    """
+
+    def __init__(self, name: str, model: type, date_attribute: str,
+                 dimensions: Iterable[Tuple[str, str, str]], amount_attribute: Optional[str] = None):
+        self.name = name
+        self.model = model
+        self.date_attribute = date_attribute
+        self.dimensions = tuple(dimensions)
+        self.amount_attribute = amount_attribute
+        # Atributos cuja alteração muda os rollups do dia
+        self.watched = (date_attribute, *(attr for _, attr, _ in self.dimensions),
+                        *((amount_attribute,) if amount_attribute else ()))
+
+    @property
+    def dimension_names(self) -> List[str]:
+        return [name for name, _, _ in self.dimensions]
+
+    def dimension_column(self, name: str):
+        """Coluna de daily_rollups onde fica a dimensão `name`."""
+        index = self.dimension_names.index(name)
+        return getattr(DailyRollup, DIM_COLUMNS[index])
+
+    def dimension_kind(self, name: str) -> str:
+        return self.dimensions[self.dimension_names.index(name)][2]
+
+    def dimension_expressions(self) -> list:
+        """Expressões SQL das dimensões, em texto ('' para NULL)."""
+        expressions = []
+        for _, attribute, kind in self.dimensions:
+            column = getattr(self.model, attribute)
+            if kind == "lower":
+                column = func.lower(column)
+            expressions.append(func.coalesce(cast(column, String), ""))
+        return expressions
+
+
+METRICS: Dict[str, RollupMetric] = {
+    metric.name: metric for metric in (
+        RollupMetric("leads", Lead, "created_at",
+                     [("source", "source", "lower"), ("status", "status", "lower"), ("agent_id", "assigned_agent_id", "id")]),
+        RollupMetric("properties", Property, "created_at",
+                     [("status", "status", "text"), ("municipality", "municipality", "text"), ("typology", "typology", "text")]),
+        RollupMetric("visits", Visit, "scheduled_date",
+                     [("status", "status", "text"), ("agent_id", "agent_id", "id")]),
+        RollupMetric("proposals", Proposal, "created_at",
+                     [("status", "status", "text"), ("agent_id", "agent_id", "id"), ("proposal_type", "proposal_type", "text")],
+                     amount_attribute="proposed_value"),
+        RollupMetric("escrituras", Escritura, "data_escritura",
+                     [("status", "status", "text"), ("agent_id", "agent_id", "id")],
+                     amount_attribute="valor_venda"),
+    )
+}
+
+_METRICS_BY_MODEL = {metric.model: metric for metric in METRICS.values()}
+
+
+def get_metric(name: str) -> RollupMetric:
+    metric = METRICS.get(name)
+    if metric is None:
+        raise ValueError(f"Métrica desconhecida: {name}. Disponíveis: {', '.join(METRICS)}")
+    return metric
+
+
+def _utc_day(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date()
+    return value
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+# =====================================================
+# RECÁLCULO
+# =====================================================
+
+def rebuild(db: Session, metric: RollupMetric, start: date, end: date) -> None:
+    """Recalcula os rollups de `metric` para os dias [start, end) num único GROUP BY."""
+    table = DailyRollup.__table__
+    date_column = getattr(metric.model, metric.date_attribute)
+    day = func.date(date_column, type_=Date)
+    dimensions = metric.dimension_expressions()
+    padding = [literal("") for _ in range(len(DIM_COLUMNS) - len(dimensions))]
+    amount = (
+        func.sum(getattr(metric.model, metric.amount_attribute)) if metric.amount_attribute else null()
+    )
+
+    db.execute(delete(table).where(table.c.metric == metric.name, table.c.day >= start, table.c.day < end))
+    rows = (
+        select(literal(metric.name), day, *dimensions, *padding, func.count(), amount, literal(datetime.utcnow()))
+        .where(date_column >= _day_start(start), date_column < _day_start(end))
+        .group_by(day, *dimensions)
+    )
+    db.execute(insert(table).from_select(
+        ["metric", "day", *DIM_COLUMNS, "count", "amount", "updated_at"], rows
+    ))
+
+
+def rebuild_all(db: Session, metric: RollupMetric) -> int:
+    """Backfill completo de `metric` (do primeiro ao último dia com dados); devolve o nº de dias."""
+    date_column = getattr(metric.model, metric.date_attribute)
+    first, last = db.execute(select(func.min(date_column), func.max(date_column))).one()
+    if first is None:
+        return 0
+    start, end = _utc_day(first), _utc_day(last) + timedelta(days=1)
+    rebuild(db, metric, start, end)
+    return (end - start).days
+
+
+def mark_dirty(connection, days: Iterable[Tuple[str, date]]) -> None:
+    """Marca (métrica, dia) para recálculo (INSERT só de acréscimo, sem conflitos entre escritores)."""
+    days = sorted({(name, day) for name, day in days if day is not None})
+    if not days:
+        return
+    now = datetime.utcnow()
+    connection.execute(
+        insert(RollupDirtyDay.__table__),
+        [{"metric": name, "day": day, "marked_at": now} for name, day in days],
+    )
+
+
+def _claim_day(db: Session, metric_name: str, day: date) -> bool:
+    """PostgreSQL: advisory lock transacional de (tenant, métrica, dia); False se outra réplica o tem."""
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    schema = getattr(db, "tenant_schema", None) or get_tenant_schema() or "public"
+    key = f"rollup:{schema}:{metric_name}:{day.isoformat()}"
+    return bool(db.execute(select(func.pg_try_advisory_xact_lock(func.hashtext(key)))).scalar())
+
+
+def refresh_day(db: Session, metric_name: str, day: date) -> bool:
+    """
+    Recalcula um dia e consome as marcas lidas antes do recálculo, numa
+    transação própria. Marcas confirmadas entretanto ficam para a próxima
+    passagem. False se o dia está a ser recalculado noutra réplica.
+    """
+    table = RollupDirtyDay.__table__
+    if not _claim_day(db, metric_name, day):
+        db.rollback()
+        return False
+    ids = db.execute(
+        select(table.c.id).where(table.c.metric == metric_name, table.c.day == day)
+    ).scalars().all()
+    if metric_name in METRICS:
+        rebuild(db, METRICS[metric_name], day, day + timedelta(days=1))
+    if ids:
+        db.execute(delete(table).where(table.c.id.in_(ids)))
+    db.commit()
+    return True
+
+
+def has_dirty_days(db: Session) -> bool:
+    return db.execute(select(RollupDirtyDay.id).limit(1)).first() is not None
+
+
+def process_dirty(db: Session, limit: int = ROLLUP_BATCH_SIZE, metric: Optional[str] = None,
+                  since: Optional[date] = None, until: Optional[date] = None) -> int:
+    """
+    Recalcula até `limit` dias marcados (opcionalmente só de uma
+    métrica/intervalo), com commit por dia; devolve quantos recalculou.
+    """
+    table = RollupDirtyDay.__table__
+    query = (
+        select(table.c.metric, table.c.day)
+        .group_by(table.c.metric, table.c.day)
+        .order_by(table.c.day, table.c.metric)
+        .limit(limit)
+    )
+    if metric is not None:
+        query = query.where(table.c.metric == metric)
+    if since is not None:
+        query = query.where(table.c.day >= since)
+    if until is not None:
+        query = query.where(table.c.day <= until)
+
+    days = db.execute(query).all()
+    return sum(refresh_day(db, row.metric, row.day) for row in days)
+
+
+def catch_up(db: Session, days: int = ROLLUP_CATCHUP_DAYS) -> dict:
+    """Backfill das métricas sem rollups e recálculo dos últimos `days` dias."""
+    backfilled = {}
+    for metric in METRICS.values():
+        has_rollups = db.execute(
+            select(DailyRollup.id).where(DailyRollup.metric == metric.name).limit(1)
+        ).first()
+        if not has_rollups:
+            backfilled[metric.name] = rebuild_all(db, metric)
+            db.commit()
+    today = datetime.utcnow().date()
+    for name in METRICS:
+        for offset in range(days):
+            day = today - timedelta(days=offset)
+            if not refresh_day(db, name, day):
+                # Em recálculo noutra réplica: fica marcado para a passagem seguinte
+                mark_dirty(db.connection(), [(name, day)])
+                db.commit()
+    return backfilled
+
+
+# =====================================================
+# MARCAÇÃO NO COMMIT
+# =====================================================
+
+def _collect_days(session: Session) -> set:
+    days = set()
+    for obj in session.new:
+        metric = _METRICS_BY_MODEL.get(type(obj))
+        if metric is not None:
+            # Sem data (server_default now()): dia corrente
+            value = inspect(obj).dict.get(metric.date_attribute)
+            days.add((metric.name, _utc_day(value) or datetime.utcnow().date()))
+    for obj in session.deleted:
+        metric = _METRICS_BY_MODEL.get(type(obj))
+        if metric is not None:
+            days.add((metric.name, _utc_day(getattr(obj, metric.date_attribute))))
+    for obj in session.dirty:
+        metric = _METRICS_BY_MODEL.get(type(obj))
+        if metric is None:
+            continue
+        attrs = inspect(obj).attrs
+        if not any(attrs[attribute].history.has_changes() for attribute in metric.watched):
+            continue
+        days.update((metric.name, _utc_day(old)) for old in attrs[metric.date_attribute].history.deleted)
+        days.add((metric.name, _utc_day(getattr(obj, metric.date_attribute))))
+    return days
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_dirty_days(session: Session, flush_context, instances) -> None:
+    # Antes do flush: objetos apagados ainda podem carregar a data. O dia
+    # anterior de uma data alterada está no histórico graças ao active_history
+    # das colunas de data (column_property nos modelos).
+    days = _collect_days(session)
+    if days:
+        session.info.setdefault("rollup_days", set()).update(days)
+
+
+@event.listens_for(Session, "before_commit")
+def _mark_dirty_before_commit(session: Session) -> None:
+    # Uma só marcação por transação, com os dias de todos os flushes. O flush
+    # final do commit corre depois deste evento: faz-se aqui para o incluir.
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    days = session.info.pop("rollup_days", None)
+    if days:
+        mark_dirty(session.connection(), days)
+        session.info["rollup_notify"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_worker(session: Session) -> None:
+    if session.info.pop("rollup_notify", None):
+        rollup_worker.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty_days(session: Session) -> None:
+    session.info.pop("rollup_days", None)
+    session.info.pop("rollup_notify", None)
+
+
+# =====================================================
+# SÉRIES TEMPORAIS
+# =====================================================
+
+def _bucket(day: date, interval: str) -> date:
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _buckets(date_from: date, date_to: date, interval: str) -> List[date]:
+    buckets = []
+    current = _bucket(date_from, interval)
+    while current <= date_to:
+        buckets.append(current)
+        if interval == "month":
+            current = (current + timedelta(days=32)).replace(day=1)
+        else:
+            current += timedelta(days=7 if interval == "week" else 1)
+    return buckets
+
+
+def _parse_key(metric: RollupMetric, dimension: str, raw: str):
+    if raw == "":
+        return None
+    if metric.dimension_kind(dimension) == "id":
+        try:
+            return int(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def timeseries(db: Session, metric_name: str, date_from: date, date_to: date, interval: str = "day",
+               group_by: Optional[str] = None, filters: Optional[Dict[str, str]] = None,
+               refresh_pending: bool = True) -> dict:
+    """
+    Série de `metric_name` entre date_from e date_to (inclusive), agrupada por
+    dia/semana/mês e opcionalmente por uma dimensão, a partir dos rollups.
+    """
+    metric = get_metric(metric_name)
+    if interval not in INTERVALS:
+        raise ValueError(f"Intervalo inválido: {interval}. Disponíveis: {', '.join(INTERVALS)}")
+    if date_to < date_from:
+        raise ValueError("date_to anterior a date_from")
+    if (date_to - date_from).days > ROLLUP_MAX_RANGE_DAYS:
+        raise ValueError(f"Intervalo máximo: {ROLLUP_MAX_RANGE_DAYS} dias")
+    filters = filters or {}
+    for dimension in ([group_by] if group_by else []) + list(filters):
+        if dimension not in metric.dimension_names:
+            raise ValueError(
+                f"Dimensão inválida para {metric.name}: {dimension}. Disponíveis: {', '.join(metric.dimension_names)}"
+            )
+
+    if refresh_pending:
+        # Dias ainda por recalcular no intervalo (tipicamente hoje): leitura consistente com as escritas
+        process_dirty(db, metric=metric.name, since=date_from, until=date_to)
+
+    key_column = metric.dimension_column(group_by) if group_by else literal("")
+    query = (
+        select(
+            DailyRollup.day, key_column.label("key"),
+            func.sum(DailyRollup.count).label("count"), func.sum(DailyRollup.amount).label("amount"),
+        )
+        .where(DailyRollup.metric == metric.name, DailyRollup.day >= date_from, DailyRollup.day <= date_to)
+        .group_by(DailyRollup.day, *([key_column] if group_by else []))
+    )
+    for dimension, value in filters.items():
+        if metric.dimension_kind(dimension) == "lower":
+            value = value.lower()
+        query = query.where(metric.dimension_column(dimension) == value)
+
+    counts = defaultdict(lambda: defaultdict(int))
+    amounts = defaultdict(lambda: defaultdict(float))
+    if not group_by:
+        counts[""]  # série única, mesmo sem dados (zeros)
+    for row in db.execute(query):
+        bucket = _bucket(row.day, interval)
+        counts[row.key][bucket] += row.count or 0
+        amounts[row.key][bucket] += float(row.amount or 0)
+
+    buckets = _buckets(date_from, date_to, interval)
+    series = []
+    for key in counts:
+        points = []
+        for bucket in buckets:
+            point = {"period": bucket.isoformat(), "count": counts[key].get(bucket, 0)}
+            if metric.amount_attribute:
+                point["amount"] = round(amounts[key].get(bucket, 0.0), 2)
+            points.append(point)
+        entry = {
+            "key": _parse_key(metric, group_by, key) if group_by else None,
+            "total": sum(counts[key].values()),
+            "points": points,
+        }
+        if metric.amount_attribute:
+            entry["amount_total"] = round(sum(amounts[key].values()), 2)
+        series.append(entry)
+    series.sort(key=lambda entry: entry["total"], reverse=True)
+
+    return {
+        "metric": metric.name,
+        "interval": interval,
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "group_by": group_by,
+        "filters": filters,
+        "total": sum(entry["total"] for entry in series),
+        "series": series,
+    }
+
+
+def describe_metrics() -> List[dict]:
+    return [
+        {"metric": metric.name, "dimensions": metric.dimension_names, "has_amount": bool(metric.amount_attribute)}
+        for metric in METRICS.values()
+    ]
+
+
+# =====================================================
+# WORKER
+# =====================================================
+
+def _scan_tenant(db: Session, schema: Optional[str], with_catch_up: bool) -> bool:
+    """Catch-up (se devido) e verificação de dias marcados, na conexão partilhada do varrimento."""
+    if with_catch_up:
+        for name, days in catch_up(db).items():
+            if days:
+                print(f"[RollupWorker] Backfill {name} ({schema or 'default'}): {days} dias")
+    return has_dirty_days(db)
+
+
+def dirty_schemas(schemas: List[Optional[str]], with_catch_up: bool, bind=None) -> List[Optional[str]]:
+    """Schemas com dias marcados, verificados numa única conexão do engine default."""
+    found = scan_schemas(
+        schemas, lambda db, schema: _scan_tenant(db, schema, with_catch_up), bind=bind, tag="RollupWorker"
+    )
+    return list(found)
+
+
+def _refresh_tenant(schema: Optional[str], batch_size: int) -> int:
+    db = tenant_session(schema)
+    try:
+        return process_dirty(db, limit=batch_size)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class RollupWorker:
+    """Loop de recálculo dos dias marcados em todos os tenants."""
+
+    def __init__(
+        self,
+        interval: float = ROLLUP_WORKER_INTERVAL,
+        batch_size: int = ROLLUP_BATCH_SIZE,
+        tenant_concurrency: int = ROLLUP_WORKER_TENANT_CONCURRENCY,
+        catch_up_interval: float = ROLLUP_CATCHUP_INTERVAL,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.tenant_concurrency = max(1, tenant_concurrency)
+        self.catch_up_interval = catch_up_interval
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._last_catch_up: Optional[float] = None
+        self.stats = defaultdict(int)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._last_catch_up = None
+        self._task = self._loop.create_task(self._run())
+        print(f"[RollupWorker] Iniciado (intervalo {self.interval}s)")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        print("[RollupWorker] Parado")
+
+    def notify(self) -> None:
+        """Acorda o worker já (pode ser chamado de threads do threadpool)."""
+        if self._loop is not None and self._wake is not None and self.running:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[RollupWorker] Erro na passagem: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def run_once(self) -> int:
+        """Uma passagem por todos os tenants; devolve o número de dias recalculados."""
+        self.stats["runs"] += 1
+        now = time_module.monotonic()
+        with_catch_up = self._last_catch_up is None or now - self._last_catch_up >= self.catch_up_interval
+        if with_catch_up:
+            self._last_catch_up = now
+            self.stats["catch_ups"] += 1
+
+        schemas = await run_in_threadpool(list_tenant_schemas, "rollup_dirty_days")
+        # Só os tenants com dias marcados abrem sessão no seu pool
+        schemas = await run_in_threadpool(dirty_schemas, schemas, with_catch_up)
+        tenant_slots = asyncio.Semaphore(self.tenant_concurrency)
+
+        async def per_tenant(schema: Optional[str]) -> int:
+            async with tenant_slots:
+                return await run_in_threadpool(_refresh_tenant, schema, self.batch_size)
+
+        results = await asyncio.gather(*(per_tenant(schema) for schema in schemas), return_exceptions=True)
+        processed = 0
+        for schema, result in zip(schemas, results):
+            if isinstance(result, Exception):
+                print(f"[RollupWorker] Erro no tenant {schema}: {result}")
+                continue
+            processed += result
+            if result >= self.batch_size and self._wake is not None:
+                # Ainda há dias em fila neste tenant: nova passagem sem esperar
+                self._wake.set()
+        self.stats["days"] += processed
+        return processed
+
+
+# Singleton global
+rollup_worker = RollupWorker()
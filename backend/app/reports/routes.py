@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from app.database import get_db
-from . import services
+from app.security import require_staff
+from . import rollups, services
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
@@ -19,3 +23,37 @@ def properties_summary(db: Session = Depends(get_db)):
 @router.get("/agents")
 def agents_summary(db: Session = Depends(get_db)):
     return services.get_agents_summary(db)
+
+
+@router.get("/timeseries")
+def list_timeseries_metrics(current_user=Depends(require_staff)):
+    """Métricas disponíveis em séries temporais e respetivas dimensões."""
+    return {"metrics": rollups.describe_metrics(), "intervals": list(rollups.INTERVALS)}
+
+
+@router.get("/timeseries/{metric}")
+def get_timeseries(
+    metric: str,
+    request: Request,
+    date_from: Optional[date] = Query(None, description="Início (inclusive); default: 30 dias antes de date_to"),
+    date_to: Optional[date] = Query(None, description="Fim (inclusive); default: hoje (UTC)"),
+    interval: str = Query("day", description="day, week ou month"),
+    group_by: Optional[str] = Query(None, description="Dimensão para separar séries (p.ex. source, status, agent_id)"),
+    db: Session = Depends(get_db),
+    current_user=Depends(require_staff),
+):
+    """
+    Série temporal de uma métrica a partir dos rollups diários.
+
+    Filtros por dimensão como query params (p.ex. ?status=converted&agent_id=3).
+    """
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - timedelta(days=29)
+    if metric not in rollups.METRICS:
+        raise HTTPException(status_code=404, detail=f"Métrica desconhecida: {metric}")
+    dimensions = rollups.METRICS[metric].dimension_names
+    filters = {name: request.query_params[name] for name in dimensions if name in request.query_params}
+    try:
+        return rollups.timeseries(db, metric, date_from, date_to, interval=interval, group_by=group_by, filters=filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -24,3 +24,93 @@ def test_agents_summary():
     assert response.status_code == 200
     data = response.json()
     assert "total_agents" in data
+
+
+def test_timeseries_rollups_follow_writes(isolated_db):
+    from datetime import datetime, timedelta
+    from sqlalchemy import func, select
+    from app.agents.models import Agent
+    from app.leads.models import Lead
+    from app.models.proposal import Proposal
+    from app.models.report_rollup import RollupDirtyDay
+    from app.reports import rollups
+
+    db = isolated_db
+    today = datetime.utcnow().date()
+    noon = datetime.combine(today, datetime.min.time()) + timedelta(hours=12)
+    ana = Agent(name="Ana", email="ana.rollups@example.com")
+    db.add(ana)
+    db.flush()
+
+    def lead(status, source, days_ago):
+        return Lead(name=f"{status}-{source}", status=status, source=source,
+                    assigned_agent_id=ana.id, created_at=noon - timedelta(days=days_ago))
+
+    db.add_all([
+        lead("new", "website", 0), lead("NEW", "Website", 0), lead("converted", "phone", 0),
+        lead("new", "email", 3), lead("new", "website", 40),
+    ])
+    db.add(Proposal(proposal_number="P-ROLLUP-1", agent_id=ana.id, opportunity_id=1, proposed_value=250000))
+    db.commit()
+    # Marcas só de acréscimo: uma por transação e dia, sem upsert entre escritores
+    extra = [lead("new", "website", 0), lead("lost", "website", 0)]
+    db.add(extra[0])
+    db.flush()
+    db.add(extra[1])
+    db.flush()
+    db.commit()
+    marks = select(func.count()).select_from(RollupDirtyDay).where(
+        RollupDirtyDay.metric == "leads", RollupDirtyDay.day == today
+    )
+    assert db.execute(marks).scalar() == 2
+
+    # Backfill do histórico + dias marcados nos commits
+    rollups.catch_up(db, days=0)
+    assert rollups.dirty_schemas([None], with_catch_up=False, bind=db.get_bind()) == [None]
+    dirty = set(db.execute(select(RollupDirtyDay.metric, RollupDirtyDay.day)).all())
+    assert ("leads", today) in dirty and ("leads", today - timedelta(days=3)) in dirty
+    assert ("proposals", today) in dirty
+    assert rollups.process_dirty(db) == len(dirty)
+    assert not rollups.has_dirty_days(db)
+    assert rollups.dirty_schemas([None], with_catch_up=False, bind=db.get_bind()) == []
+    for obj in extra:
+        db.delete(obj)
+    db.commit()
+    assert rollups.process_dirty(db) == 1
+
+    series = rollups.timeseries(db, "leads", today - timedelta(days=6), today, refresh_pending=False)
+    assert series["total"] == 4
+    points = series["series"][0]["points"]
+    assert len(points) == 7 and points[-1] == {"period": today.isoformat(), "count": 3}
+    assert points[3]["count"] == 1 and points[0]["count"] == 0
+
+    by_source = rollups.timeseries(db, "leads", today - timedelta(days=6), today, group_by="source",
+                                   refresh_pending=False)
+    assert [(s["key"], s["total"]) for s in by_source["series"]] == [("website", 2), ("email", 1), ("phone", 1)]
+    filtered = rollups.timeseries(db, "leads", today - timedelta(days=60), today, interval="month",
+                                  filters={"status": "NEW", "agent_id": str(ana.id)}, refresh_pending=False)
+    assert filtered["total"] == 4
+
+    proposals = rollups.timeseries(db, "proposals", today, today, group_by="agent_id", refresh_pending=False)
+    assert proposals["series"][0]["key"] == ana.id and proposals["series"][0]["amount_total"] == 250000.0
+
+    # Mudar a data de uma lead recalcula o dia novo e o anterior
+    moved = db.execute(select(Lead).where(Lead.source == "email")).scalar_one()
+    db.expire(moved)  # o dia anterior vem do active_history da coluna
+    moved.created_at = noon - timedelta(days=1)
+    moved.status = "contacted"
+    db.commit()
+    daily = rollups.timeseries(db, "leads", today - timedelta(days=6), today)
+    counts = [point["count"] for point in daily["series"][0]["points"]]
+    assert counts[3] == 0 and counts[5] == 1 and daily["total"] == 4
+    assert db.execute(select(RollupDirtyDay)).first() is None
+
+    # Recalcular do zero dá o mesmo resultado que a manutenção incremental
+    rollups.rebuild_all(db, rollups.METRICS["leads"])
+    db.commit()
+    assert rollups.timeseries(db, "leads", today - timedelta(days=6), today) == daily
+    rollups.catch_up(db, days=2)
+    assert rollups.timeseries(db, "leads", today - timedelta(days=6), today, refresh_pending=False) == daily
+
+    with pytest.raises(ValueError):
+        rollups.timeseries(db, "leads", today, today, group_by="municipality")
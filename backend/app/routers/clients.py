@@ -4,13 +4,16 @@ CRUD completo + auto-criação via angariações + lembretes aniversários
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, extract, func
+from sqlalchemy import and_, or_, extract, func, select, literal, exists, union_all
 from typing import Optional, List, Dict, Any
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 from pydantic import BaseModel, Field
 from app.database import get_db
 from app.models.client import Client, ClientTransacao
+from app.search.services import search_clause
+from app.core.pagination import Keyset, KeysetColumn
+from app.core.responses import FastJSONResponse
 
 
 router = APIRouter(prefix="/clients", tags=["clients"])
@@ -276,6 +279,10 @@ class ClientResponse(BaseModel):
 
 # === Endpoints ===
 
+# Ordenação por nome (indexado), id desempata homónimos
+CLIENTS_KEYSET = Keyset(KeysetColumn(Client.nome), KeysetColumn(Client.id))
+
+
 @router.get("/")
 def list_clients(
     agent_id: Optional[int] = Query(None, description="Filtrar por agente"),
@@ -285,12 +292,16 @@ def list_clients(
     is_active: Optional[bool] = Query(True, description="Filtrar por estado ativo"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior (em vez de skip)"),
     db: Session = Depends(get_db)
 ):
     """
     Listar clientes com filtros
     - Agente: vê apenas os seus clientes
     - Admin agência: vê todos os clientes da agência
+    
+    Paginação por cursor (next_cursor); `total` só é calculado na primeira
+    página (com cursor vem a None). Com pesquisa ordena por relevância e usa skip.
     """
     query = db.query(Client)
     
@@ -304,27 +315,60 @@ def list_clients(
     if is_active is not None:
         query = query.filter(Client.is_active == is_active)
     
-    # Pesquisa
+    # Pesquisa (sem acentos/erros de escrita, por relevância; telefone e NIF por dígitos)
+    rank = None
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            or_(
-                Client.nome.ilike(search_term),
-                Client.nif.ilike(search_term),
-                Client.telefone.ilike(search_term),
-                Client.email.ilike(search_term)
-            )
-        )
+        condition, rank = search_clause("clients", search, db)
+        query = query.filter(condition)
     
-    # Ordenar por nome
-    query = query.order_by(Client.nome.asc())
+    total = query.count() if not cursor else None
     
-    total = query.count()
-    clients = query.offset(skip).limit(limit).all()
+    next_cursor = None
+    if rank is not None:
+        # Relevância não é uma chave estável para cursor
+        clients = query.order_by(rank.desc(), Client.nome.asc()).offset(skip).limit(limit).all()
+    elif skip and not cursor:
+        clients = query.order_by(*CLIENTS_KEYSET.order_by()).offset(skip).limit(limit).all()
+    else:
+        clients, next_cursor = CLIENTS_KEYSET.page(CLIENTS_KEYSET.apply(query, cursor, limit).all(), limit)
     
-    return {
+    # Dicts já prontos: orjson direto, sem jsonable_encoder (até 500 clientes)
+    return FastJSONResponse({
         "total": total,
-        "items": [c.to_dict() for c in clients]
+        "items": [c.to_dict() for c in clients],
+        "next_cursor": next_cursor,
+    })
+
+
+def _lead_as_client(lead) -> dict:
+    """Lead do site no formato de cliente (cliente virtual com source_type="website_lead")"""
+    return {
+        "id": f"lead_{lead.id}",  # Prefixo para distinguir
+        "lead_id": lead.id,
+        "agent_id": lead.assigned_agent_id,
+        "agency_id": None,
+        "nome": lead.name,
+        "email": lead.email,
+        "telefone": lead.phone,
+        "notas": lead.message,
+        "client_type": "lead",
+        "origin": "website",
+        "source_type": "website_lead",  # Identificador especial
+        "property_id": lead.property_id,
+        "status": lead.status,
+        "created_at": lead.created_at.isoformat() if lead.created_at else None,
+        "is_active": True,
+        # Campos vazios para compatibilidade
+        "nif": None,
+        "cc": None,
+        "cc_validade": None,
+        "data_nascimento": None,
+        "telefone_alt": None,
+        "morada": None,
+        "codigo_postal": None,
+        "localidade": None,
+        "distrito": None,
+        "tags": [],
     }
 
 
@@ -336,6 +380,7 @@ def list_clients_with_leads(
     search: Optional[str] = Query(None, description="Pesquisar por nome ou telefone"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior (em vez de skip)"),
     db: Session = Depends(get_db)
 ):
     """
@@ -345,107 +390,82 @@ def list_clients_with_leads(
     - Agente: vê apenas os seus clientes + as suas leads atribuídas
     
     Leads aparecem como clientes virtuais com source="website_lead"
+    
+    Clientes e leads são juntos num UNION ALL ordenado por nome e paginado
+    por cursor na BD; só as linhas da página são carregadas. As contagens
+    (total, clients_count, leads_count) só vêm na primeira página.
     """
     # Import local para evitar importação circular
     from app.leads.models import Lead
     
-    results = []
-    
-    # 1. Buscar clientes
-    client_query = db.query(Client).filter(Client.is_active == True)
-    
+    # 1. Clientes
+    client_filters = [Client.is_active == True]
     if agent_id:
-        client_query = client_query.filter(Client.agent_id == agent_id)
+        client_filters.append(Client.agent_id == agent_id)
     if agency_id:
-        client_query = client_query.filter(Client.agency_id == agency_id)
-    
+        client_filters.append(Client.agency_id == agency_id)
     if search:
-        search_term = f"%{search}%"
-        client_query = client_query.filter(
-            or_(
-                Client.nome.ilike(search_term),
-                Client.telefone.ilike(search_term),
-                Client.email.ilike(search_term)
-            )
-        )
-    
-    clients = client_query.order_by(Client.nome.asc()).all()
+        client_filters.append(search_clause("clients", search, db)[0])
     
-    # IDs de leads já sincronizadas
-    synced_lead_ids = set(c.lead_id for c in clients if c.lead_id)
+    client_rows = select(
+        func.lower(Client.nome).label("sort_name"),
+        literal("client").label("source_type"),
+        Client.id.label("row_id"),
+    ).where(*client_filters)
+    parts = [client_rows]
     
-    for client in clients:
-        results.append({
-            **client.to_dict(),
-            "source_type": "client"
-        })
-    
-    # 2. Buscar leads do site não sincronizadas
+    # 2. Leads do site não sincronizadas com nenhum dos clientes acima
+    lead_filters = []
     if include_leads:
-        lead_query = db.query(Lead)
-        
-        # Excluir leads já sincronizadas
-        if synced_lead_ids:
-            lead_query = lead_query.filter(~Lead.id.in_(synced_lead_ids))
-        
+        synced = select(Client.id).where(*client_filters, Client.lead_id == Lead.id)
+        lead_filters.append(~exists(synced))
         if agent_id:
-            lead_query = lead_query.filter(Lead.assigned_agent_id == agent_id)
-        
+            lead_filters.append(Lead.assigned_agent_id == agent_id)
         if search:
-            search_term = f"%{search}%"
-            lead_query = lead_query.filter(
-                or_(
-                    Lead.name.ilike(search_term),
-                    Lead.phone.ilike(search_term),
-                    Lead.email.ilike(search_term)
-                )
-            )
-        
-        leads = lead_query.order_by(Lead.created_at.desc()).all()
-        
-        for lead in leads:
-            # Converter lead para formato de cliente
-            results.append({
-                "id": f"lead_{lead.id}",  # Prefixo para distinguir
-                "lead_id": lead.id,
-                "agent_id": lead.assigned_agent_id,
-                "agency_id": None,
-                "nome": lead.name,
-                "email": lead.email,
-                "telefone": lead.phone,
-                "notas": lead.message,
-                "client_type": "lead",
-                "origin": "website",
-                "source_type": "website_lead",  # Identificador especial
-                "property_id": lead.property_id,
-                "status": lead.status,
-                "created_at": lead.created_at.isoformat() if lead.created_at else None,
-                "is_active": True,
-                # Campos vazios para compatibilidade
-                "nif": None,
-                "cc": None,
-                "cc_validade": None,
-                "data_nascimento": None,
-                "telefone_alt": None,
-                "morada": None,
-                "codigo_postal": None,
-                "localidade": None,
-                "distrito": None,
-                "tags": [],
-            })
-    
-    # Ordenar resultados por nome
-    results.sort(key=lambda x: x.get("nome", "").lower())
-    
-    total = len(results)
-    paginated = results[skip:skip + limit]
-    
-    return {
-        "total": total,
-        "items": paginated,
-        "clients_count": len([r for r in results if r.get("source_type") == "client"]),
-        "leads_count": len([r for r in results if r.get("source_type") == "website_lead"])
-    }
+            lead_filters.append(search_clause("leads", search, db)[0])
+        parts.append(select(
+            func.lower(Lead.name).label("sort_name"),
+            literal("website_lead").label("source_type"),
+            Lead.id.label("row_id"),
+        ).where(*lead_filters))
+    
+    merged = union_all(*parts).subquery("merged")
+    keyset = Keyset(
+        KeysetColumn(merged.c.sort_name, name="sort_name"),
+        KeysetColumn(merged.c.source_type, name="source_type"),
+        KeysetColumn(merged.c.row_id, name="row_id"),
+    )
+    page_query = select(merged.c.sort_name, merged.c.source_type, merged.c.row_id)
+    next_cursor = None
+    if skip and not cursor:
+        rows = db.execute(page_query.order_by(*keyset.order_by()).offset(skip).limit(limit)).all()
+    else:
+        rows, next_cursor = keyset.page(db.execute(keyset.apply(page_query, cursor, limit)).all(), limit)
+    
+    # Carregar só os registos da página
+    client_ids = [r.row_id for r in rows if r.source_type == "client"]
+    lead_ids = [r.row_id for r in rows if r.source_type == "website_lead"]
+    clients = {c.id: c for c in db.query(Client).filter(Client.id.in_(client_ids)).all()} if client_ids else {}
+    leads = {l.id: l for l in db.query(Lead).filter(Lead.id.in_(lead_ids)).all()} if lead_ids else {}
+    
+    items = []
+    for r in rows:
+        if r.source_type == "client" and r.row_id in clients:
+            items.append({**clients[r.row_id].to_dict(), "source_type": "client"})
+        elif r.source_type == "website_lead" and r.row_id in leads:
+            items.append(_lead_as_client(leads[r.row_id]))
+    
+    result = {"items": items, "next_cursor": next_cursor}
+    if cursor:
+        result.update(total=None, clients_count=None, leads_count=None)
+    else:
+        clients_count = db.execute(select(func.count()).select_from(Client).where(*client_filters)).scalar() or 0
+        leads_count = (
+            db.execute(select(func.count()).select_from(Lead).where(*lead_filters)).scalar() or 0
+            if include_leads else 0
+        )
+        result.update(total=clients_count + leads_count, clients_count=clients_count, leads_count=leads_count)
+    return FastJSONResponse(result)
 
 
 @router.get("/birthdays")
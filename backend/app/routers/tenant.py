@@ -9,8 +9,8 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 
+from app.core import tenant_config
 from app.database import get_db, current_tenant_schema
-from app.platform.models import Tenant
 
 router = APIRouter(prefix="/tenant", tags=["tenant"])
 
@@ -198,8 +198,8 @@ class TerminologyResponse(BaseModel):
     terminology: Dict[str, str]
 
 
-def get_current_tenant(db: Session) -> Optional[Tenant]:
-    """Obtém o tenant atual baseado no schema activo"""
+def get_current_tenant(db: Session) -> Optional[Dict[str, Any]]:
+    """Obtém o tenant atual (registo em cache) baseado no schema activo"""
     schema = current_tenant_schema.get()
     if not schema or schema == "public":
         return None
@@ -210,7 +210,17 @@ def get_current_tenant(db: Session) -> Optional[Tenant]:
     else:
         slug = schema
     
-    return db.query(Tenant).filter(Tenant.slug == slug).first()
+    return tenant_config.tenant_record(db, slug)
+
+
+def _sector_terminology(sector: str) -> Dict[str, str]:
+    terminology = SECTOR_TERMINOLOGY.get(sector, SECTOR_TERMINOLOGY["real_estate"])
+    
+    # Se tiver terminologia customizada, fazer merge
+    # if tenant.custom_terminology:
+    #     terminology = {**terminology, **tenant.custom_terminology}
+    
+    return terminology
 
 
 @router.get("/config", response_model=TenantConfigResponse)
@@ -221,36 +231,35 @@ async def get_tenant_config(
     """
     Obter configuração completa do tenant actual.
     Inclui sector, terminologia, branding e features.
+    Servido da cache de configuração do tenant, com ETag.
     """
     tenant = get_current_tenant(db)
     
     if not tenant:
         # Fallback para tenant default ou primeiro tenant
-        tenant = db.query(Tenant).filter(Tenant.is_active == True).first()
+        tenant = tenant_config.default_tenant_record(db)
     
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant não encontrado")
     
-    sector = tenant.sector or "real_estate"
-    terminology = SECTOR_TERMINOLOGY.get(sector, SECTOR_TERMINOLOGY["real_estate"])
-    
-    # Se tiver terminologia customizada, fazer merge
-    # if tenant.custom_terminology:
-    #     terminology = {**terminology, **tenant.custom_terminology}
+    def build():
+        sector = tenant["sector"] or "real_estate"
+        return TenantConfigResponse(
+            slug=tenant["slug"],
+            name=tenant["name"],
+            sector=sector,
+            terminology=_sector_terminology(sector),
+            branding={
+                "logo_url": tenant["logo_url"],
+                "primary_color": tenant["primary_color"] or "#00d9ff",
+                "secondary_color": tenant["secondary_color"] or "#8b5cf6",
+            },
+            features=tenant["features"] or {},
+            plan=tenant["plan"] or "basic",
+        ).model_dump()
     
-    return TenantConfigResponse(
-        slug=tenant.slug,
-        name=tenant.name,
-        sector=sector,
-        terminology=terminology,
-        branding={
-            "logo_url": tenant.logo_url,
-            "primary_color": tenant.primary_color or "#00d9ff",
-            "secondary_color": tenant.secondary_color or "#8b5cf6",
-        },
-        features=tenant.features or {},
-        plan=tenant.plan or "basic",
-    )
+    body, etag = tenant_config.cached_payload(("config", tenant["slug"]), build)
+    return tenant_config.conditional_response(request, body, etag)
 
 
 @router.get("/terminology", response_model=TerminologyResponse)
@@ -260,25 +269,24 @@ async def get_tenant_terminology(
 ):
     """
     Obter apenas a terminologia do tenant actual.
-    Endpoint leve para apps mobile carregarem termos.
+    Endpoint leve para apps mobile carregarem termos (com ETag).
     """
     tenant = get_current_tenant(db)
     
     if not tenant:
         # Fallback para tenant default
-        tenant = db.query(Tenant).filter(Tenant.is_active == True).first()
+        tenant = tenant_config.default_tenant_record(db)
     
-    sector = tenant.sector if tenant else "real_estate"
-    terminology = SECTOR_TERMINOLOGY.get(sector, SECTOR_TERMINOLOGY["real_estate"])
+    sector = (tenant["sector"] if tenant else None) or "real_estate"
     
-    # Se tiver terminologia customizada, fazer merge
-    # if tenant and tenant.custom_terminology:
-    #     terminology = {**terminology, **tenant.custom_terminology}
+    def build():
+        return TerminologyResponse(
+            sector=sector,
+            terminology=_sector_terminology(sector),
+        ).model_dump()
     
-    return TerminologyResponse(
-        sector=sector,
-        terminology=terminology,
-    )
+    body, etag = tenant_config.cached_payload(("terminology", sector), build)
+    return tenant_config.conditional_response(request, body, etag)
 
 
 @router.get("/sectors")
@@ -12,9 +12,10 @@ import jwt
 import os
 
 from app.database import get_db
-from app.models.website_client import WebsiteClient, LeadDistributionCounter
+from app.models.website_client import WebsiteClient
 from app.users.models import User
 from app.agents.models import Agent  # Usar tabela Agent para listar agentes
+from app.leads import assignment
 from app.schemas.website_client import (
     WebsiteClientRegister,
     WebsiteClientLogin,
@@ -71,8 +72,8 @@ def get_sales_agents(db: Session) -> List[Agent]:
     # - Marisa Barosa (arrendamento): email = arrendamentosleiria@imoveismais.pt
     # - Agência Leiria: nome = "Imóveis Mais Leiria"
     return db.query(Agent).filter(
-        Agent.name != "Imóveis Mais Leiria",  # Excluir agência
-        Agent.email != "arrendamentosleiria@imoveismais.pt"  # Excluir agente de arrendamento
+        Agent.name != assignment.AGENCY_AGENT_NAME,  # Excluir agência
+        Agent.email != assignment.RENTAL_AGENT_EMAIL  # Excluir agente de arrendamento
     ).order_by(Agent.name).all()
 
 
@@ -80,36 +81,13 @@ def get_next_agent_round_robin(db: Session, client_type: str) -> int:
     """
     Obter próximo agente usando round-robin.
     Filas separadas para investidores e pontuais.
-    """
-    # Buscar ou criar contador para este tipo
-    counter = db.query(LeadDistributionCounter).filter(
-        LeadDistributionCounter.counter_type == client_type
-    ).first()
-    
-    if not counter:
-        counter = LeadDistributionCounter(
-            counter_type=client_type,
-            last_agent_index=0
-        )
-        db.add(counter)
-        db.commit()
-        db.refresh(counter)
-    
-    # Obter lista de agentes de venda
-    agents = get_sales_agents(db)
     
-    if not agents:
-        return None
-    
-    # Calcular próximo índice (round-robin)
-    next_index = (counter.last_agent_index + 1) % len(agents)
-    
-    # Atualizar contador
-    counter.last_agent_index = next_index
-    counter.updated_at = datetime.utcnow()
-    db.commit()
-    
-    return agents[next_index].id
+    O contador avança atomicamente (UPDATE ... RETURNING numa transação
+    própria): registos em simultâneo recebem agentes diferentes sem
+    esperarem uns pelos outros. A lista de agentes de venda vem da cache
+    do pool "sales".
+    """
+    return assignment.next_agent(db, client_type, pool="sales")
 
 
 def assign_agent_to_client(db: Session, interest_type: str, client_type: str, selected_agent_id: int = None) -> tuple:
@@ -126,7 +104,7 @@ def assign_agent_to_client(db: Session, interest_type: str, client_type: str, se
     
     # Arrendamento → Marisa Barosa (buscar ID da tabela Agent)
     if interest_type == "arrendamento":
-        marisa = db.query(Agent).filter(Agent.email == "arrendamentosleiria@imoveismais.pt").first()
+        marisa = db.query(Agent).filter(Agent.email == assignment.RENTAL_AGENT_EMAIL).first()
         return (marisa.id if marisa else None, False)
     
     # Compra → Round-robin por tipo de cliente
@@ -0,0 +1,27 @@
+"""
+Schemas para a sincronização incremental da app mobile (POST /mobile/sync)
+"""
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+
+class SyncRequest(BaseModel):
+    """Watermarks por entidade devolvidos na sincronização anterior"""
+    watermarks: Dict[str, Optional[str]] = Field(default_factory=dict, description="entidade -> watermark (vazio = snapshot completo)")
+    entities: Optional[List[str]] = Field(default=None, description="properties, leads, tasks, visits, events (default: todas)")
+    limit: int = Field(default=200, ge=1, le=1000, description="Máximo de linhas por entidade nesta resposta")
+    my_properties: bool = Field(default=False, description="Sincronizar apenas os imóveis do agente")
+
+
+class SyncEntityDelta(BaseModel):
+    """Alterações de uma entidade: aplicar deleted antes de upserts"""
+    upserts: List[Dict[str, Any]]
+    deleted: List[int]
+    watermark: str
+    has_more: bool
+    reset: bool
+
+
+class SyncResponse(BaseModel):
+    server_time: str
+    entities: Dict[str, SyncEntityDelta]
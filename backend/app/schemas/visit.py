@@ -242,3 +242,4 @@ class VisitListResponse(BaseModel):
     page: int
     per_page: int
     pages: int
+    next_cursor: Optional[str] = None  # cursor para a página seguinte (None = última)
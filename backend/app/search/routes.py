@@ -0,0 +1,91 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.security import require_staff
+from app.users.models import User, UserRole
+from app.agents.models import Agent
+from app.leads.models import Lead
+from app.models.client import Client
+from app.properties.models import Property
+from . import services
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+PRIVILEGED_ROLES = {UserRole.ADMIN.value, "staff", "leader", UserRole.COORDINATOR.value}
+
+
+def _visibility_filters(db: Session, user: User) -> dict:
+    """Admin/staff vêem tudo; agentes vêem os imóveis da equipa e os seus clientes/leads"""
+    if user.role in PRIVILEGED_ROLES:
+        return {"properties": [], "clients": [], "leads": []}
+    if not user.agent_id:
+        raise HTTPException(status_code=403, detail="Utilizador não tem agente associado")
+    team_id = db.query(Agent.team_id).filter(Agent.id == user.agent_id).scalar()
+    team_ids = [a for (a,) in db.query(Agent.id).filter(Agent.team_id == team_id).all()] if team_id else []
+    return {
+        "properties": [Property.agent_id.in_(team_ids or [user.agent_id])],
+        "clients": [Client.agent_id == user.agent_id],
+        "leads": [Lead.assigned_agent_id == user.agent_id],
+    }
+
+
+def _property_item(obj: Property, score: float) -> dict:
+    return {
+        "id": obj.id,
+        "title": obj.title,
+        "subtitle": " · ".join(p for p in [obj.reference, obj.municipality or obj.location] if p),
+        "price": obj.price,
+        "status": obj.status,
+        "score": score,
+    }
+
+
+def _client_item(obj: Client, score: float) -> dict:
+    return {
+        "id": obj.id,
+        "title": obj.nome,
+        "subtitle": " · ".join(p for p in [obj.telefone, obj.email] if p),
+        "client_type": obj.client_type,
+        "agent_id": obj.agent_id,
+        "score": score,
+    }
+
+
+def _lead_item(obj: Lead, score: float) -> dict:
+    return {
+        "id": obj.id,
+        "title": obj.name,
+        "subtitle": " · ".join(p for p in [obj.phone, obj.email] if p),
+        "status": obj.status,
+        "assigned_agent_id": obj.assigned_agent_id,
+        "score": score,
+    }
+
+
+_SERIALIZERS = {"properties": _property_item, "clients": _client_item, "leads": _lead_item}
+
+
+@router.get("/")
+def unified_search(
+    q: str = Query(..., min_length=2, max_length=100, description="Texto, referência, telefone ou NIF"),
+    types: Optional[str] = Query(None, description="properties,clients,leads (default: todos)"),
+    limit: int = Query(10, ge=1, le=50, description="Resultados por tipo"),
+    db: Session = Depends(get_db),
+    user: User = Depends(require_staff),
+):
+    """
+    Pesquisa unificada (sem acentos, tolerante a erros de escrita) em imóveis,
+    clientes e leads, ordenada por relevância.
+    """
+    requested = [t.strip() for t in (types or ",".join(services.ENTITIES)).split(",") if t.strip()]
+    unknown = [t for t in requested if t not in services.ENTITIES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Tipos inválidos: {', '.join(unknown)}")
+
+    filters = _visibility_filters(db, user)
+    results = {}
+    for entity in requested:
+        hits = services.search_entity(db, entity, q, limit=limit, filters=filters[entity])
+        results[entity] = [_SERIALIZERS[entity](obj, score) for obj, score in hits]
+    return {"query": q, "results": results}
@@ -0,0 +1,286 @@
+"""
+Pesquisa de imóveis, clientes e leads.
+
+PostgreSQL: full-text em português sem acentos (to_tsvector + GIN sobre
+public.f_unaccent) para imóveis e trigramas (pg_trgm, GIN) para nomes,
+emails, telefones, NIFs e referências — as expressões abaixo são as mesmas
+dos índices criados na migração 20261016_search_indexes, para o planner os
+usar. Os resultados vêm ordenados por relevância (ts_rank / word_similarity).
+
+SQLite (dev): índice invertido em memória por tenant (tokens normalizados,
+prefixos e trigramas para erros de escrita), invalidado pelos commits dos
+modelos. Sem sessão (statement partilhado sync/async) cai para ILIKE.
+
+Configuração via ENV:
+    SEARCH_INDEX_TTL        segundos até reconstruir o índice em memória (default: 120)
+    SEARCH_MAX_CANDIDATES   máximo de ids devolvidos pelo índice em memória (default: 1000)
+"""
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, false, func, literal, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import TenantCache, track_model_changes
+from app.database import DATABASE_URL
+from app.leads.models import Lead
+from app.models.client import Client
+from app.properties.models import Property
+
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "120"))
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+
+MIN_DIGITS = 3          # termos com >= 3 dígitos também procuram em telefones/NIFs
+FUZZY_MIN_LENGTH = 4    # tokens mais curtos só fazem match exato/prefixo
+FUZZY_MIN_SIMILARITY = 0.45
+
+IS_POSTGRES = bool(DATABASE_URL)
+
+# entidade -> (modelo, campos de texto com peso, campos numéricos)
+ENTITIES = {
+    "properties": (Property, {"title": 1.0, "reference": 1.0, "location": 0.6, "municipality": 0.6, "parish": 0.5}, ()),
+    "clients": (Client, {"nome": 1.0, "email": 0.7}, ("nif", "telefone")),
+    "leads": (Lead, {"name": 1.0, "email": 0.7}, ("phone",)),
+}
+
+search_index_cache = TenantCache(
+    "search_index", ttl=SEARCH_INDEX_TTL, max_entries=64, topics=("properties", "clients", "leads")
+)
+track_model_changes(Property, "properties")
+track_model_changes(Client, "clients")
+track_model_changes(Lead, "leads")
+
+
+def normalize(text) -> str:
+    """Minúsculas e sem acentos ('João' -> 'joao')."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text) -> List[str]:
+    return re.findall(r"\w+", normalize(text))
+
+
+def digits_of(text) -> str:
+    return re.sub(r"\D", "", str(text or ""))
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# =====================================================
+# POSTGRESQL (expressões iguais às dos índices)
+# =====================================================
+
+_EMPTY = literal_column("''")
+_PT = literal_column("'portuguese'::regconfig")
+
+
+def _coalesce(column):
+    return func.coalesce(column, _EMPTY)
+
+
+def _unaccent_lower(column):
+    return func.public.f_unaccent(func.lower(_coalesce(column)))
+
+
+def _digits_expr(column):
+    return func.regexp_replace(_coalesce(column), literal_column("'[^0-9]'"), _EMPTY, literal_column("'g'"))
+
+
+def property_tsvector():
+    document = _coalesce(Property.title)
+    for column in (Property.reference, Property.location, Property.municipality, Property.parish):
+        document = document.op("||")(literal_column("' '")).op("||")(_coalesce(column))
+    return func.to_tsvector(_PT, func.public.f_unaccent(document))
+
+
+def _tsquery(term: str):
+    """'casa lisb' -> to_tsquery('casa:* & lisb:*') (prefixos, para pesquisa à medida que se escreve)"""
+    tokens = tokenize(term)
+    if not tokens:
+        return None
+    return func.to_tsquery(_PT, literal(" & ".join(f"{token}:*" for token in tokens)))
+
+
+def _contains(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _pg_text_match(column, norm: str):
+    expr = _unaccent_lower(column)
+    condition = or_(expr.like(_contains(norm), escape="\\"), literal(norm).op("<%")(expr))
+    return condition, func.word_similarity(literal(norm), expr)
+
+
+def _pg_clause(entity: str, term: str):
+    model, text_fields, digit_fields = ENTITIES[entity]
+    norm = normalize(term).strip()
+    digits = digits_of(term)
+    conditions, ranks = [], []
+
+    if entity == "properties":
+        tsquery = _tsquery(term)
+        if tsquery is not None:
+            tsvector = property_tsvector()
+            conditions.append(tsvector.op("@@")(tsquery))
+            ranks.append(func.ts_rank(tsvector, tsquery))
+        reference_match = func.lower(_coalesce(Property.reference)).like(_contains(norm), escape="\\")
+        conditions.append(reference_match)
+        ranks.append(case((reference_match, 1.0), else_=0.0))
+        title_match, title_rank = _pg_text_match(Property.title, norm)
+        conditions.append(title_match)
+        ranks.append(title_rank)
+    else:
+        for name in text_fields:
+            match, rank = _pg_text_match(getattr(model, name), norm)
+            conditions.append(match)
+            ranks.append(rank * text_fields[name])
+
+    if len(digits) >= MIN_DIGITS:
+        for name in digit_fields:
+            digit_match = _digits_expr(getattr(model, name)).like(f"%{digits}%")
+            conditions.append(digit_match)
+            ranks.append(case((digit_match, 1.0), else_=0.0))
+
+    return or_(*conditions), func.greatest(*ranks) if len(ranks) > 1 else ranks[0]
+
+
+# =====================================================
+# ÍNDICE EM MEMÓRIA (SQLite / dev)
+# =====================================================
+
+class MemorySearchIndex:
+    """Índice invertido com prefixos, trigramas de tokens e substrings de dígitos."""
+
+    def __init__(self, docs: Iterable[Tuple[int, Dict[str, object]]], weights: Dict[str, float], digit_fields: Iterable[str] = ()):
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.token_trigrams: Dict[str, set] = defaultdict(set)
+        self.digit_trigrams: Dict[str, set] = defaultdict(set)
+        self.digits: Dict[int, List[str]] = {}
+        digit_fields = tuple(digit_fields)
+        for doc_id, fields in docs:
+            for name, weight in weights.items():
+                for token in tokenize(fields.get(name)):
+                    postings = self.postings[token]
+                    postings[doc_id] = max(postings.get(doc_id, 0.0), weight)
+            values = [digits_of(fields.get(name)) for name in digit_fields]
+            values = [v for v in values if v]
+            if values:
+                self.digits[doc_id] = values
+                for value in values:
+                    for gram in _trigrams(value):
+                        self.digit_trigrams[gram].add(doc_id)
+        self.vocabulary = sorted(self.postings)
+        for token in self.vocabulary:
+            if len(token) >= FUZZY_MIN_LENGTH:
+                for gram in _trigrams(token):
+                    self.token_trigrams[gram].add(token)
+
+    def _token_matches(self, query_token: str) -> Dict[str, float]:
+        """Tokens do vocabulário que correspondem a query_token -> qualidade do match."""
+        matches = {}
+        start = bisect_left(self.vocabulary, query_token)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(query_token):
+                break
+            matches[token] = 1.0 if token == query_token else 0.8
+        if len(query_token) >= FUZZY_MIN_LENGTH:
+            grams = _trigrams(query_token)
+            counts: Dict[str, int] = defaultdict(int)
+            for gram in grams:
+                for token in self.token_trigrams.get(gram, ()):
+                    counts[token] += 1
+            for token, shared in counts.items():
+                similarity = shared / len(grams | _trigrams(token))
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    matches[token] = max(matches.get(token, 0.0), 0.6 * similarity)
+        return matches
+
+    def _digit_matches(self, digits: str) -> set:
+        grams = [g for g in _trigrams(digits) if g.strip() and len(g.strip()) == 3]
+        if not grams:
+            return set()
+        candidates = set.intersection(*(self.digit_trigrams.get(g, set()) for g in grams))
+        return {doc_id for doc_id in candidates if any(digits in v for v in self.digits[doc_id])}
+
+    def search(self, term: str, limit: int = SEARCH_MAX_CANDIDATES) -> List[Tuple[int, float]]:
+        """[(id, score)] por relevância; todos os tokens têm de corresponder (AND)."""
+        scores: Optional[Dict[int, float]] = None
+        for query_token in tokenize(term):
+            token_scores: Dict[int, float] = {}
+            for token, quality in self._token_matches(query_token).items():
+                for doc_id, weight in self.postings[token].items():
+                    token_scores[doc_id] = max(token_scores.get(doc_id, 0.0), quality * weight)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc_id: s + token_scores[doc_id] for doc_id, s in scores.items() if doc_id in token_scores}
+        scores = scores or {}
+
+        digits = digits_of(term)
+        if len(digits) >= MIN_DIGITS:
+            for doc_id in self._digit_matches(digits):
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+def _build_memory_index(db: Session, entity: str) -> MemorySearchIndex:
+    model, text_fields, digit_fields = ENTITIES[entity]
+    names = list(text_fields) + list(digit_fields)
+    rows = db.execute(select(model.id, *(getattr(model, name) for name in names))).all()
+    docs = ((row[0], dict(zip(names, row[1:]))) for row in rows)
+    return MemorySearchIndex(docs, text_fields, digit_fields)
+
+
+def get_memory_index(db: Session, entity: str) -> MemorySearchIndex:
+    return search_index_cache.get_or_set(entity, lambda: _build_memory_index(db, entity))
+
+
+# =====================================================
+# API
+# =====================================================
+
+def search_clause(entity: str, term: str, db: Optional[Session] = None):
+    """
+    (condição WHERE, expressão de relevância) para pesquisar `term` em `entity`.
+
+    Usado pelas listagens existentes: filtrar com a condição e ordenar por
+    relevância desc. Sem PostgreSQL usa o índice em memória (precisa de db)
+    ou, sem sessão, ILIKE nos campos de texto (relevância None: manter a ordem).
+    """
+    model, text_fields, digit_fields = ENTITIES[entity]
+    if IS_POSTGRES:
+        return _pg_clause(entity, term)
+    if db is not None:
+        hits = get_memory_index(db, entity).search(term)
+        if not hits:
+            return false(), literal(0.0)
+        scores = dict(hits)
+        return model.id.in_(list(scores)), case(scores, value=model.id, else_=0.0)
+    like = f"%{term}%"
+    fields = list(text_fields) + list(digit_fields)
+    return or_(*(getattr(model, name).ilike(like) for name in fields)), None
+
+
+def search_entity(db: Session, entity: str, term: str, limit: int = 10, filters: Iterable = ()) -> List[Tuple[object, float]]:
+    """[(objeto, score)] de `entity` por relevância, com filtros extra (visibilidade)."""
+    model = ENTITIES[entity][0]
+    condition, rank = search_clause(entity, term, db)
+    rank = literal(0.0) if rank is None else rank
+    query = select(model, rank.label("score")).where(condition)
+    for extra in filters:
+        query = query.where(extra)
+    query = query.order_by(rank.desc(), model.id.desc()).limit(limit)
+    return [(row[0], round(float(row[1] or 0.0), 4)) for row in db.execute(query).all()]
@@ -0,0 +1,114 @@
+from app.search.services import MemorySearchIndex, normalize
+
+
+def test_memory_index_accents_prefix_fuzzy_and_digits():
+    docs = [
+        (1, {"nome": "João Conceição", "email": "joao@exemplo.pt", "telefone": "+351 912 345 678", "nif": "123456789"}),
+        (2, {"nome": "Joana Silva", "email": "joana@exemplo.pt", "telefone": "913000111", "nif": None}),
+        (3, {"nome": "Pedro Conceicao", "email": None, "telefone": None, "nif": "987654321"}),
+    ]
+    index = MemorySearchIndex(docs, {"nome": 1.0, "email": 0.7}, ("nif", "telefone"))
+
+    assert normalize("Conceição") == "conceicao"
+    assert [doc_id for doc_id, _ in index.search("joao conceicao")] == [1]
+    assert {doc_id for doc_id, _ in index.search("conceição")} == {1, 3}
+    assert [doc_id for doc_id, _ in index.search("jo")][:2] == [1, 2]       # prefixo
+    assert [doc_id for doc_id, _ in index.search("conseicao")][:2] == [1, 3]  # erro de escrita
+    assert [doc_id for doc_id, _ in index.search("912 345")] == [1]           # telefone com espaços
+    assert [doc_id for doc_id, _ in index.search("654321")] == [3]            # NIF parcial
+
+
+def test_search_endpoint_visibility_digits_and_ilike_fallback(isolated_db):
+    """[user-013] GET /search/: filtros de visibilidade por papel, telefones/NIFs por dígitos, ILIKE sem sessão."""
+    from fastapi.testclient import TestClient
+    from sqlalchemy import or_
+    from app.agents.models import Agent
+    from app.database import get_db
+    from app.leads.models import Lead
+    from app.main import app
+    from app.models.client import Client
+    from app.properties import services as property_services
+    from app.properties.models import Property
+    from app.search import services
+    from app.security import require_staff
+    from app.teams.models import Team
+    from app.users.models import User, UserRole
+
+    db = isolated_db
+    team = Team(name="Equipa Leiria")
+    db.add(team)
+    db.flush()
+    ana = Agent(name="Ana", email="ana@acme.pt", team_id=team.id)
+    rui = Agent(name="Rui", email="rui@acme.pt", team_id=team.id)
+    eva = Agent(name="Eva", email="eva@acme.pt")
+    db.add_all([ana, rui, eva])
+    db.flush()
+    db.add_all([
+        Property(reference="LEI-001", title="Moradia em Leiria", municipality="Leiria", price=300000, agent_id=ana.id),
+        Property(reference="LEI-002", title="Apartamento Leiria centro", municipality="Leiria", price=180000, agent_id=rui.id),
+        Property(reference="POR-001", title="Loft Porto", location="Leiria (zona norte)", price=250000, agent_id=eva.id),
+        Client(agent_id=ana.id, nome="João Conceição", telefone="+351 912 345 678", nif="123456789"),
+        Client(agent_id=eva.id, nome="Joana Conceição", telefone="912345000", nif="987654321"),
+        Lead(name="Conceição Lopes", phone="912-345-999", assigned_agent_id=ana.id),
+        Lead(name="Conceição Faria", phone="912345111", assigned_agent_id=rui.id),
+    ])
+    db.commit()
+
+    admin = User(email="admin@acme.pt", hashed_password="x", full_name="Admin", role=UserRole.ADMIN.value)
+    agent = User(email="ana@acme.pt", hashed_password="x", full_name="Ana", role=UserRole.AGENT.value, agent_id=ana.id)
+    orphan = User(email="sem@acme.pt", hashed_password="x", full_name="Sem agente", role=UserRole.AGENT.value)
+    current = {"user": admin}
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[require_staff] = lambda: current["user"]
+    services.search_index_cache.clear()
+    client = TestClient(app)
+
+    def search(q, **params):
+        response = client.get("/search/", params={"q": q, **params})
+        assert response.status_code == 200, response.text
+        return {entity: [item["title"] for item in items] for entity, items in response.json()["results"].items()}
+
+    try:
+        # Admin vê tudo; sem acentos e com relevância
+        everything = search("conceicao")
+        assert set(everything["clients"]) == {"João Conceição", "Joana Conceição"}
+        assert set(everything["leads"]) == {"Conceição Lopes", "Conceição Faria"}
+        assert set(search("leiria", types="properties")["properties"]) == {
+            "Moradia em Leiria", "Apartamento Leiria centro", "Loft Porto",
+        }
+
+        # Agente: imóveis da equipa, só os seus clientes e leads
+        current["user"] = agent
+        assert set(search("leiria", types="properties")["properties"]) == {"Moradia em Leiria", "Apartamento Leiria centro"}
+        mine = search("conceicao", types="clients,leads")
+        assert mine == {"clients": ["João Conceição"], "leads": ["Conceição Lopes"]}
+
+        # Dígitos: telefones com espaços/hífens e NIF parcial
+        assert search("912 345", types="clients,leads") == {"clients": ["João Conceição"], "leads": ["Conceição Lopes"]}
+        current["user"] = admin
+        assert search("654321", types="clients")["clients"] == ["Joana Conceição"]
+        assert set(search("912345", types="leads")["leads"]) == {"Conceição Lopes", "Conceição Faria"}
+        assert len(search("912345", types="leads", limit=1)["leads"]) == 1
+
+        # Commits invalidam o índice em memória
+        db.add(Lead(name="Conceição Nova", phone="919000000", assigned_agent_id=ana.id))
+        db.commit()
+        assert "Conceição Nova" in search("conceicao", types="leads")["leads"]
+
+        # Erros: tipo desconhecido, termo curto, agente sem agent_id
+        assert client.get("/search/", params={"q": "leiria", "types": "casas"}).status_code == 400
+        assert client.get("/search/", params={"q": "l"}).status_code == 422
+        current["user"] = orphan
+        assert client.get("/search/", params={"q": "leiria"}).status_code == 403
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(require_staff, None)
+        services.search_index_cache.clear()
+
+    # Sem sessão (statement partilhado sync/async): ILIKE nos campos, sem relevância
+    condition, rank = services.search_clause("properties", "Leiria")
+    assert rank is None
+    expected = db.query(Property).filter(or_(Property.title.ilike("%Leiria%"), Property.location.ilike("%Leiria%"),
+                                             Property.municipality.ilike("%Leiria%"))).order_by(Property.id).all()
+    assert db.query(Property).filter(condition).order_by(Property.id).all() == expected
+    assert {p.id for p in property_services.get_properties(db, search="Leiria")} == {p.id for p in expected}
@@ -1,6 +1,9 @@
 import os
 import logging
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 from datetime import datetime, timedelta
 
 import jwt
@@ -76,38 +79,246 @@ def extract_token(req: Request) -> Optional[str]:
     return None
 
 
+def check_token_tenant(payload: dict, req: Request):
+    """
+    SECURITY: Validar que o token pertence ao tenant atual.
+    Se o token tem tenant_slug, DEVE corresponder ao tenant do request.
+    """
+    token_tenant = payload.get("tenant_slug")
+    request_tenant = getattr(req.state, 'tenant_slug', None)
+    
+    if token_tenant and request_tenant and token_tenant != request_tenant:
+        print(f"[SECURITY] Cross-tenant access attempt! Token tenant: {token_tenant}, Request tenant: {request_tenant}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Token não válido para este tenant. Faça login novamente."
+        )
+
+
+def get_token_payload(req: Request) -> Optional[dict]:
+    """
+    Decodifica o token do request uma única vez (contexto de auth por request).
+    O payload fica em req.state.auth_payload e é reutilizado por todas as
+    dependencies do mesmo request. Devolve None se não houver token;
+    levanta HTTPException 401 se o token for inválido.
+    """
+    payload = getattr(req.state, "auth_payload", None)
+    if payload is not None:
+        return payload
+    
+    token = extract_token(req)
+    if not token:
+        return None
+    
+    payload = decode_token(token)
+    req.state.auth_payload = payload
+    return payload
+
+
+# =====================================================
+# CACHE DE PRINCIPAIS (user id -> dados do utilizador)
+# =====================================================
+
+class Principal:
+    """
+    Utilizador autenticado devolvido pelas dependencies de auth: cópia só de
+    leitura das colunas de User (sem hashed_password), não ligada a nenhuma
+    sessão. Para alterar o utilizador, carregá-lo na sessão do request
+    (db.get(User, principal.id)).
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, values: dict):
+        object.__setattr__(self, "_values", dict(values))
+
+    def __getattr__(self, name: str):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError("Principal é só de leitura")
+
+    def __repr__(self) -> str:
+        return f"Principal(id={self._values.get('id')}, email={self._values.get('email')!r})"
+
+
+class PrincipalCache:
+    """
+    Cache curto e limitado de utilizadores autenticados, por schema de tenant.
+
+    Evita o SELECT de User em cada request autenticado. As entradas são
+    snapshots das colunas do User e cada hit devolve um Principal. As
+    invalidações (utilizador alterado/removido) são aplicadas localmente e
+    publicadas no event bus para os outros processos.
+    """
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Optional[str], int], Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _schema_key(schema: Optional[str]) -> Optional[str]:
+        """'public' e ausência de tenant partilham a mesma partição"""
+        from app.database import DEFAULT_SCHEMA
+        return None if schema in (None, DEFAULT_SCHEMA) else schema
+    
+    def get(self, schema: Optional[str], user_id: int) -> Optional[dict]:
+        key = (self._schema_key(schema), user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            snapshot, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+    
+    def put(self, schema: Optional[str], user_id: int, snapshot: dict):
+        key = (self._schema_key(schema), user_id)
+        with self._lock:
+            self._entries[key] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id: int, schema: Optional[str] = None):
+        """Remove um utilizador (do schema indicado ou do tenant atual)"""
+        from app.database import current_tenant_schema
+        key = (self._schema_key(schema if schema is not None else current_tenant_schema.get()), user_id)
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def invalidate_tenant(self, schema: Optional[str] = None):
+        """Remove todos os utilizadores de um tenant (ou do tenant atual)"""
+        from app.database import current_tenant_schema
+        target = self._schema_key(schema if schema is not None else current_tenant_schema.get())
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == target]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get("PRINCIPAL_CACHE_MAX_ENTRIES", "5000"))
+
+principal_cache = PrincipalCache(ttl=PRINCIPAL_CACHE_TTL, max_entries=PRINCIPAL_CACHE_MAX_ENTRIES)
+
+
+# Evento do bus com invalidações da cache ({"user_id": id} ou {"user_id": None} = tenant inteiro)
+PRINCIPAL_INVALIDATED_EVENT = "principal_invalidated"
+
+
+def _publish_invalidation(user_id: Optional[int], schema: Optional[str]):
+    from app.core.events import event_bus
+    from app.database import current_tenant_schema
+    schema = schema if schema is not None else current_tenant_schema.get()
+    event_bus.publish_threadsafe(PRINCIPAL_INVALIDATED_EVENT, {"user_id": user_id}, tenant_schema=schema)
+
+
+def invalidate_principal(user_id: int, schema: Optional[str] = None):
+    """Invalidar o utilizador na cache de principais de todos os processos (após alterar role/estado)"""
+    principal_cache.invalidate(user_id, schema)
+    _publish_invalidation(user_id, schema)
+
+
+def invalidate_tenant_principals(schema: Optional[str] = None):
+    """Invalidar todos os utilizadores de um tenant (SQL raw sobre utilizadores)"""
+    principal_cache.invalidate_tenant(schema)
+    _publish_invalidation(None, schema)
+
+
+def _on_principal_invalidated(event):
+    """Invalidação publicada por outro processo (as do próprio já foram aplicadas)"""
+    from app.core.events import event_bus
+    from app.database import DEFAULT_SCHEMA
+    if event.origin == event_bus.node_id:
+        return
+    schema = event.tenant_schema or DEFAULT_SCHEMA
+    user_id = event.data.get("user_id")
+    if user_id is None:
+        principal_cache.invalidate_tenant(schema)
+    else:
+        principal_cache.invalidate(user_id, schema)
+
+
+def _subscribe_invalidations():
+    from app.core.events import event_bus
+    event_bus.subscribe(PRINCIPAL_INVALIDATED_EVENT, _on_principal_invalidated)
+
+
+_subscribe_invalidations()
+
+
+def _user_snapshot(user) -> dict:
+    from sqlalchemy import inspect as sa_inspect
+    return {
+        attr.key: getattr(user, attr.key)
+        for attr in sa_inspect(type(user)).column_attrs
+        if attr.key != "hashed_password"
+    }
+
+
+def _cached_user(payload: dict) -> Optional[Principal]:
+    """Obtém o utilizador do token a partir da cache (None em caso de miss)"""
+    from app.database import current_tenant_schema
+    user_id = payload.get("user_id")
+    if not user_id:
+        return None
+    snapshot = principal_cache.get(current_tenant_schema.get(), user_id)
+    return Principal(snapshot) if snapshot is not None else None
+
+
+def _remember_user(user) -> Principal:
+    """Guarda o utilizador na cache e devolve-o como Principal (desligado da sessão)"""
+    from app.database import current_tenant_schema
+    snapshot = _user_snapshot(user)
+    principal_cache.put(current_tenant_schema.get(), user.id, snapshot)
+    return Principal(snapshot)
+
+
 def get_current_user(req: Request, db: Session = Depends(lambda: None)):
-    """Dependency para obter utilizador autenticado atual"""
-    from app.database import get_db
+    """
+    Dependency para obter utilizador autenticado atual.
+    O token é decodificado uma vez por request e o utilizador vem da cache
+    de principais quando possível (sem query à BD).
+    """
+    from app.database import SessionLocal
     from app.users.models import User
     
-    try:
-        if db is None:
-            db = next(get_db())
-    except Exception as e:
-        print(f"[GET_CURRENT_USER] DB connection error: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro de conexão à BD")
-    
     token = extract_token(req)
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais em falta")
     
     try:
-        payload = decode_token(token)
+        payload = get_token_payload(req)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Token inválido: {str(e)}")
     
-    # ✅ SECURITY: Validar que o token pertence ao tenant atual
-    token_tenant = payload.get("tenant_slug")
-    request_tenant = getattr(req.state, 'tenant_slug', None)
+    check_token_tenant(payload, req)
     
-    # Se o token tem tenant_slug, DEVE corresponder ao tenant do request
-    if token_tenant and request_tenant and token_tenant != request_tenant:
-        print(f"[SECURITY] Cross-tenant access attempt! Token tenant: {token_tenant}, Request tenant: {request_tenant}")
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Token não válido para este tenant. Faça login novamente."
-        )
+    user = _cached_user(payload)
+    if user is not None:
+        if not user.is_active:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Utilizador inativo")
+        return user
+    
+    own_session = db is None
+    try:
+        if own_session:
+            db = SessionLocal()
+    except Exception as e:
+        print(f"[GET_CURRENT_USER] DB connection error: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro de conexão à BD")
     
     try:
         user_id = payload.get("user_id")
@@ -128,6 +339,8 @@ def get_current_user(req: Request, db: Session = Depends(lambda: None)):
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Utilizador não encontrado")
         
+        user = _remember_user(user)
+        
         if not user.is_active:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Utilizador inativo")
         
@@ -139,6 +352,9 @@ def get_current_user(req: Request, db: Session = Depends(lambda: None)):
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro ao obter utilizador: {str(e)}")
+    finally:
+        if own_session:
+            db.close()
 
 
 def require_staff(req: Request, db: Session = Depends(lambda: None)):
@@ -155,39 +371,114 @@ def require_staff(req: Request, db: Session = Depends(lambda: None)):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro de autenticação: {str(e)}")
 
 
-def get_optional_user(req: Request, db: Session = Depends(lambda: None)) -> Optional["User"]:
+def get_optional_user(req: Request, db: Session = Depends(lambda: None)) -> Optional[Principal]:
     """
     Dependency para obter utilizador autenticado, se existir.
     Retorna None se não houver autenticação (para endpoints públicos).
     """
-    from app.database import get_db
+    from app.database import SessionLocal
     from app.users.models import User
     
-    if db is None:
-        db = next(get_db())
+    try:
+        payload = get_token_payload(req)
+    except Exception:
+        return None  # Token inválido - tratar como acesso público
+    if payload is None:
+        return None  # Sem autenticação - acesso público
+    
+    user = _cached_user(payload)
+    if user is not None:
+        return user if user.is_active else None
+    
+    user_id = payload.get("user_id")
+    email = payload.get("email")
+    if not user_id and not email:
+        return None
     
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        if user_id:
+            user = db.query(User).filter(User.id == user_id).first()
+        else:
+            user = db.query(User).filter(User.email == email).first()
+        if user:
+            user = _remember_user(user)
+    finally:
+        if own_session:
+            db.close()
+    
+    if user and user.is_active:
+        return user
+    return None
+
+
+async def get_current_user_async(req: Request) -> Principal:
+    """
+    Versão assíncrona de get_current_user (AsyncSession).
+    Usada pelos endpoints de leitura assíncronos para não ocupar o threadpool.
+    """
     token = extract_token(req)
     if not token:
-        return None  # Sem autenticação - acesso público
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais em falta")
     
     try:
-        payload = decode_token(token)
+        payload = get_token_payload(req)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Token inválido: {str(e)}")
+    
+    check_token_tenant(payload, req)
+    
+    if not payload.get("user_id") and not payload.get("email"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido - sem user_id nem email")
+    
+    user = await _load_user_async(payload)
+    
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Utilizador não encontrado")
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Utilizador inativo")
+    return user
+
+
+async def get_optional_user_async(req: Request) -> Optional[Principal]:
+    """Versão assíncrona de get_optional_user (None se não autenticado)"""
+    try:
+        payload = get_token_payload(req)
     except Exception:
-        return None  # Token inválido - tratar como acesso público
+        return None
+    if payload is None:
+        return None
+    
+    user = await _load_user_async(payload)
+    if user and user.is_active:
+        return user
+    return None
+
+
+async def _load_user_async(payload: dict) -> Optional[Principal]:
+    """Utilizador do token: cache de principais ou query com AsyncSession"""
+    from sqlalchemy import select
+    from app.database_async import AsyncSessionLocal
+    from app.users.models import User
+    
+    user = _cached_user(payload)
+    if user is not None:
+        return user
     
     user_id = payload.get("user_id")
     email = payload.get("email")
-    
     if user_id:
-        user = db.query(User).filter(User.id == user_id).first()
+        stmt = select(User).where(User.id == user_id)
     elif email:
-        user = db.query(User).filter(User.email == email).first()
+        stmt = select(User).where(User.email == email)
     else:
         return None
     
-    if user and user.is_active:
-        return user
-    return None
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(stmt)).scalars().first()
+        return _remember_user(user) if user else None
 
 
 def require_admin(req: Request, db: Session = Depends(lambda: None)):
@@ -203,19 +494,14 @@ def get_effective_agent_id(req: Request, db: Session = Depends(lambda: None)) ->
     Obtém o agent_id efetivo do token JWT.
     Para assistentes, retorna o works_for_agent_id (que está no token como agent_id).
     Para agentes normais, retorna o próprio agent_id.
+    Reutiliza o payload já decodificado no request (sem segunda decodificação).
     """
-    token = extract_token(req)
-    print(f"[GET_EFFECTIVE_AGENT_ID] Token extracted: {token[:50] if token else 'None'}...")
-    
-    if not token:
-        print("[GET_EFFECTIVE_AGENT_ID] No token found!")
-        return None
-    
     try:
-        payload = decode_token(token)
-        agent_id = payload.get("agent_id")
-        print(f"[GET_EFFECTIVE_AGENT_ID] Payload: {payload}, agent_id: {agent_id}")
-        return agent_id
+        payload = get_token_payload(req)
     except Exception as e:
-        print(f"[GET_EFFECTIVE_AGENT_ID] Error decoding token: {e}")
+        logger.debug(f"[GET_EFFECTIVE_AGENT_ID] Token inválido: {e}")
+        return None
+    
+    if payload is None:
         return None
+    return payload.get("agent_id")
@@ -1,6 +1,6 @@
 from enum import Enum as PyEnum
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, event
+from sqlalchemy.orm import relationship, object_session
 from datetime import datetime
 from app.database import Base
 
@@ -40,3 +40,13 @@ class User(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_principal(mapper, connection, target):
+    """Remove o utilizador da cache de principais quando é alterado/eliminado"""
+    from app.security import invalidate_principal
+    session = object_session(target)
+    invalidate_principal(target.id, getattr(session, "tenant_schema", None))
+
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+from starlette.requests import Request
+
+
+def _request(token):
+    return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+
+def test_principal_cache_hits_invalidates_on_update_and_rejects_inactive(isolated_db):
+    from app.security import Principal, create_access_token, get_current_user, principal_cache
+    from app.users.models import User
+
+    db = isolated_db
+    principal_cache.clear()
+    user = User(email="ana@example.com", hashed_password="x", full_name="Ana", role="agent")
+    db.add(user)
+    db.commit()
+    token = create_access_token(user.id, user.email, user.role)
+
+    selects = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: selects.append(args[2]))
+    try:
+        first = get_current_user(_request(token), db)
+        assert isinstance(first, Principal) and first.full_name == "Ana"
+        assert not hasattr(first, "hashed_password")
+        with pytest.raises(AttributeError):
+            first.role = "admin"
+
+        # Hit: nenhuma query e um novo pedido (novo request) recebe o mesmo utilizador
+        queries = len(selects)
+        assert get_current_user(_request(token), db).id == user.id
+        assert len(selects) == queries
+
+        # Alterar o utilizador pelo ORM invalida a entrada
+        user.full_name = "Ana Maria"
+        db.commit()
+        assert get_current_user(_request(token), db).full_name == "Ana Maria"
+        assert len(selects) > queries
+
+        # Desativado: rejeitado mesmo com a entrada anterior em cache
+        user.is_active = False
+        db.commit()
+        with pytest.raises(HTTPException) as exc:
+            get_current_user(_request(token), db)
+        assert exc.value.status_code == 403
+        with pytest.raises(HTTPException):
+            get_current_user(_request(token), db)
+    finally:
+        principal_cache.clear()
+
+
+def test_principal_invalidations_travel_over_the_event_bus():
+    from app.core.events import Event, event_bus
+    from app.security import (
+        PRINCIPAL_INVALIDATED_EVENT,
+        _on_principal_invalidated,
+        invalidate_principal,
+        invalidate_tenant_principals,
+        principal_cache,
+    )
+
+    published = []
+
+    async def scenario():
+        event_bus.subscribe(PRINCIPAL_INVALIDATED_EVENT, published.append)
+        try:
+            invalidate_principal(7, "tenant_a")
+            invalidate_tenant_principals("tenant_b")
+            await asyncio.sleep(0.01)
+            await event_bus.drain()
+        finally:
+            event_bus.unsubscribe(PRINCIPAL_INVALIDATED_EVENT, published.append)
+
+    asyncio.run(scenario())
+    assert [(e.data["user_id"], e.tenant_schema) for e in published] == [(7, "tenant_a"), (None, "tenant_b")]
+
+    # Invalidação vinda de outro processo aplica-se à cache local
+    principal_cache.put("tenant_a", 7, {"id": 7})
+    principal_cache.put("tenant_b", 8, {"id": 8})
+    principal_cache.put("tenant_b", 9, {"id": 9})
+    for user_id, schema in ((7, "tenant_a"), (None, "tenant_b")):
+        remote = Event(PRINCIPAL_INVALIDATED_EVENT, {"user_id": user_id}, tenant_schema=schema)
+        remote.origin = "outro-worker"
+        _on_principal_invalidated(remote)
+    assert principal_cache.get("tenant_a", 7) is None
+    assert principal_cache.get("tenant_b", 8) is None and principal_cache.get("tenant_b", 9) is None
@@ -0,0 +1,154 @@
+"""
+Benchmark da serialização das listagens (antes/depois do FastJSONResponse)
+
+Compara, com payloads realistas construídos em memória (sem BD):
+- GET /properties/: response_model (validação por objeto + json stdlib)
+  vs RowSerializer + watermark por lista + orjson
+- GET /clients/: dict via to_dict() + jsonable_encoder + json stdlib
+  vs to_dict() + orjson
+- tamanho e tempo de compressão gzip/brotli dos corpos
+
+Uso:
+    cd backend && PYTHONPATH=. python benchmark_serialization.py [n_linhas] [repeticoes]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.core.cloudinary_watermark import apply_watermark_to_images, make_images_watermarker
+from app.core.responses import ORJSON_AVAILABLE, FastJSONResponse
+from app.middleware.compression import BROTLI_AVAILABLE, compress
+from app.models.client import Client
+from app.properties import schemas
+from app.properties.models import Property
+from app.properties.routes import PROPERTY_SERIALIZER
+
+WATERMARK = {
+    "enabled": True,
+    "public_id": "crm-plus/watermarks/benchmark/watermark",
+    "scale": 0.15,
+    "opacity": 0.6,
+    "position": "bottom-right",
+}
+
+
+def make_properties(n: int) -> list:
+    base = datetime(2026, 1, 1, 9, 30)
+    return [
+        Property(
+            id=i, reference=f"BM{i:05d}", title=f"Apartamento T{i % 5} com varanda",
+            business_type="venda", property_type="apartamento", typology=f"T{i % 5}",
+            description="Apartamento renovado, muito luminoso, perto de transportes. " * 8,
+            observations=None, price=150000.0 + i * 1000, usable_area=85.5, land_area=None,
+            location="Lisboa, Avenidas Novas", municipality="Lisboa", parish="Avenidas Novas",
+            condition="usado", energy_certificate="B",
+            images=[
+                f"https://res.cloudinary.com/crmplus/image/upload/v1700000{i:03d}/crm-plus/properties/{i}/{k}.jpg"
+                for k in range(12)
+            ],
+            is_published=1, is_featured=int(i % 7 == 0), latitude=38.74 + i * 1e-4, longitude=-9.14,
+            bedrooms=i % 5, bathrooms=2, parking_spaces=1, video_url=None,
+            status="AVAILABLE", agent_id=i % 20 + 1,
+            created_at=base + timedelta(minutes=i), updated_at=base + timedelta(hours=i),
+        )
+        for i in range(n)
+    ]
+
+
+def make_clients(n: int) -> list:
+    base = datetime(2026, 1, 1, 9, 30)
+    return [
+        Client(
+            id=i, agent_id=i % 20 + 1, agency_id=1, client_type="comprador", origin="website",
+            is_empresa=False, nome=f"Cliente Benchmark {i}", nif=f"{200000000 + i}",
+            cc=f"{10000000 + i}", cc_validade=date(2030, 1, 1), data_nascimento=date(1980, 1, 1 + i % 28),
+            nacionalidade="Portuguesa", profissao="Engenheiro", estado_civil="casado",
+            email=f"cliente{i}@example.com", telefone="912345678", morada="Rua das Flores, 10",
+            codigo_postal="1000-100", localidade="Lisboa", distrito="Lisboa", pais="Portugal",
+            documentos=[{"type": "cc", "url": f"https://example.com/docs/{i}.pdf"}],
+            notas="Procura T2/T3 em Lisboa, orçamento até 400k. " * 3,
+            tags=["comprador", "lisboa"], preferencias={"tipologia": ["T2", "T3"], "max": 400000},
+            is_active=True, is_verified=False,
+            created_at=base + timedelta(minutes=i), updated_at=base + timedelta(hours=i),
+        )
+        for i in range(n)
+    ]
+
+
+def bench(label: str, fn, setup, repeats: int, results: list) -> bytes:
+    """Mediana de `repeats` execuções de fn(setup()); setup fora da medição."""
+    timings = []
+    body = b""
+    for _ in range(repeats):
+        data = setup()
+        start = time.perf_counter()
+        body = fn(data)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    results.append(f"  {label:<44} mediana {timings[len(timings) // 2] * 1000:8.2f} ms   {len(body) / 1024:8.1f} KiB")
+    return body
+
+
+def properties_before(properties: list) -> bytes:
+    # Caminho antigo: watermark nos objetos ORM (log por lista), response_model, json stdlib
+    for prop in properties:
+        prop.images = apply_watermark_to_images(prop.images, WATERMARK)
+    adapter = TypeAdapter(list[schemas.PropertyOut])
+    content = adapter.dump_python(adapter.validate_python(properties, from_attributes=True), mode="json")
+    return JSONResponse(content).body
+
+
+def properties_after(properties: list) -> bytes:
+    return FastJSONResponse(PROPERTY_SERIALIZER.many(properties, images=make_images_watermarker(WATERMARK))).body
+
+
+def clients_before(clients: list) -> bytes:
+    return JSONResponse(jsonable_encoder({"total": len(clients), "items": [c.to_dict() for c in clients]})).body
+
+
+def clients_after(clients: list) -> bytes:
+    return FastJSONResponse({"total": len(clients), "items": [c.to_dict() for c in clients]}).body
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"orjson: {'sim' if ORJSON_AVAILABLE else 'não'} | brotli: {'sim' if BROTLI_AVAILABLE else 'não'} | {n} linhas, {repeats} repetições")
+
+    clients = make_clients(n)
+    results = []
+    # Os logs de auditoria do watermark ficam fora do output do benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert properties_after(make_properties(n)) == properties_before(make_properties(n))
+        assert json.loads(clients_after(clients)) == json.loads(clients_before(clients))
+
+        # O caminho antigo altera os objetos (watermark): dados novos por repetição
+        results.append("GET /properties/")
+        bench("antes (response_model + json)", properties_before, lambda: make_properties(n), repeats, results)
+        properties_body = bench("depois (RowSerializer + orjson)", properties_after, lambda: make_properties(n), repeats, results)
+        results.append("GET /clients/")
+        clients_body = bench("antes (to_dict + jsonable_encoder + json)", clients_before, lambda: clients, repeats, results)
+        bench("depois (to_dict + orjson)", clients_after, lambda: clients, repeats, results)
+    print("\n".join(results))
+
+    print("Compressão")
+    for label, payload in (("properties", properties_body), ("clients", clients_body)):
+        for encoding in ["gzip"] + (["br"] if BROTLI_AVAILABLE else []):
+            start = time.perf_counter()
+            compressed = compress(payload, encoding)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(
+                f"  {label:<12} {encoding:<5} {len(payload) / 1024:8.1f} KiB -> {len(compressed) / 1024:7.1f} KiB "
+                f"({len(compressed) / len(payload):5.1%})  {elapsed:6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()